@@ -24,11 +24,14 @@
 # In the .pyx file, Cython declared variables will also get cimported.
 from commons import *
 
+# OpenMP parallelization
+from cython.parallel import prange, threadid
+
 # Cython imports
 cimport('from mesh import diff_domain')
 cimport('from communication import communicate_domain, get_buffer')
 cimport('from graphics import plot_powerspec')
-cimport('from mesh import CIC_components2φ_general, fft, slab_decompose')
+cimport('from mesh import CIC_components2φ_general, fft_forward, fourier_grid_start')
 
 
 
@@ -61,6 +64,7 @@ cimport('from mesh import CIC_components2φ_general, fft, slab_decompose')
                 interpolation_quantities=list,
                 j='Py_ssize_t',
                 j_global='Py_ssize_t',
+                j_start='Py_ssize_t',
                 k='Py_ssize_t',
                 k_bin_index='Py_ssize_t',
                 k_magnitude='double',
@@ -70,12 +74,15 @@ cimport('from mesh import CIC_components2φ_general, fft, slab_decompose')
                 kj='Py_ssize_t',
                 kj2='Py_ssize_t',
                 kk='Py_ssize_t',
+                kk_start='Py_ssize_t',
                 longest_name_size='Py_ssize_t',
                 max_n_modes='Py_ssize_t',
+                n_modes_threads='double[:, ::1]',
                 nyquist='Py_ssize_t',
                 power='double[::1]',
                 power_dict=object,  # OrderedDict
                 power_jik='double',
+                power_threads='double[:, ::1]',
                 reciprocal_sqrt_deconv_ij='double',
                 reciprocal_sqrt_deconv_ijk='double',
                 reciprocal_sqrt_deconv_j='double',
@@ -95,6 +102,7 @@ cimport('from mesh import CIC_components2φ_general, fft, slab_decompose')
                 slab_particles_jik='double*',
                 spectrum_plural=str,
                 symmetry_multiplicity='int',
+                thread='int',
                 topline=list,
                 Σmass='double',
                 σ_dict=object,  # OrderedDict
@@ -164,23 +172,30 @@ def powerspec(components, filename):
         # fluid/particle components are present.
         any_particles = ('particles' in φ_dict)
         any_fluid     = ('fluid'     in φ_dict)
-        # Slab decompose the grids
+        # Do a forward Fourier transform of the grids,
+        # decomposing them into slabs or pencils.
         slab_dict = {
-            representation: slab_decompose(φ, f'φ_{representation}_slab', prepare_fft=True)
+            representation: fft_forward(φ, f'φ_{representation}_slab')
             for representation, φ in φ_dict.items()
             }
+        # The global j and k indices of the first local element
+        j_start, kk_start = fourier_grid_start(φ_gridsize)
         if any_fluid:
             slab_fluid = slab_dict['fluid']
         if any_particles:
             slab_particles = slab_dict['particles']
-        # Do a forward in-place Fourier transform of the slabs
         for slab in slab_dict.values():
-            fft(slab, 'forward')
             size_j, size_i, size_k = slab.shape[0], slab.shape[1], slab.shape[2]
         # Flag specifying whether or not n_modes has been computed
         fill_n_modes = (n_modes[0] == -1)
         if fill_n_modes:
             n_modes[0] = 0
+        # The binning below is carried out in parallel by num_threads
+        # threads, each of which accumulate the power and the number
+        # of modes within its own row of these buffers.
+        power_threads = get_buffer((num_threads, power.shape[0]), 'power_threads', nullify=True)
+        n_modes_threads = get_buffer((num_threads, power.shape[0]), 'n_modes_threads',
+            nullify=True)
         # Begin loop over slabs. As the first and second dimensions
         # are transposed due to the FFT, start with the j-dimension.
         nyquist = φ_gridsize//2
@@ -188,7 +203,7 @@ def powerspec(components, filename):
             # The j-component of the wave vector (grid units).
             # Since the slabs are distributed along the j-dimension,
             # an offset must be used.
-            j_global = ℤ[size_j*rank] + j
+            j_global = j_start + j
             if j_global > ℤ[φ_gridsize//2]:
                 kj = j_global - φ_gridsize
             else:
@@ -199,8 +214,12 @@ def powerspec(components, filename):
             with unswitch(1):
                 if any_particles:
                     reciprocal_sqrt_deconv_j = sinc(kj*ℝ[π/φ_gridsize])
-            # Loop over the entire first dimension
-            for i in range(φ_gridsize):
+            # Loop over the entire first dimension, in parallel.
+            # Integer powers are written out as products below,
+            # as required within the parallel loop (see the
+            # gravity_pairwise_tiled function in the gravity module).
+            for i in prange(φ_gridsize, nogil=True, num_threads=num_threads):
+                thread = threadid()
                 # The i-component of the wave vector
                 if i > ℤ[φ_gridsize//2]:
                     ki = i - φ_gridsize
@@ -217,10 +236,12 @@ def powerspec(components, filename):
                 # as contiguous pairs of elements are the real and
                 # imaginary part of the same complex number.
                 for k in range(0, size_k, 2):
-                    # The k-component of the wave vector
-                    kk = k//2
+                    # The k-component of the wave vector. With pencil
+                    # decomposition, the k-dimension is
+                    # distributed as well.
+                    kk = kk_start + k//2
                     # The squared magnitude of the wave vector
-                    k2 = ℤ[ki**2 + kj2] + kk**2
+                    k2 = ℤ[ki*ki + kj2] + kk*kk
                     # Skip the DC component.
                     # For some reason, the k = k_max mode is
                     # highly uncertain. Skip this as well.
@@ -244,7 +265,7 @@ def powerspec(components, filename):
                             )
                             # The total factor
                             # for a complete deconvolution.
-                            deconv_ijk = 1/reciprocal_sqrt_deconv_ijk**2
+                            deconv_ijk = 1/(reciprocal_sqrt_deconv_ijk*reciprocal_sqrt_deconv_ijk)
                             # Carry out the deconvolution
                             slab_particles_jik[0] *= deconv_ijk  # Real part
                             slab_particles_jik[1] *= deconv_ijk  # Imag part
@@ -260,8 +281,10 @@ def powerspec(components, filename):
                             slab_particles_jik = cython.address(slab_particles[j, i, k:])
                             slab_fluid_jik     = cython.address(slab_fluid    [j, i, k:])
                             power_jik = (
-                                  (slab_particles_jik[0] + slab_fluid_jik[0])**2
-                                + (slab_particles_jik[1] + slab_fluid_jik[1])**2
+                                  (slab_particles_jik[0] + slab_fluid_jik[0])
+                                 *(slab_particles_jik[0] + slab_fluid_jik[0])
+                                + (slab_particles_jik[1] + slab_fluid_jik[1])
+                                 *(slab_particles_jik[1] + slab_fluid_jik[1])
                             )
                         elif any_particles:
                             # Pointer to the [j, i, k]'th element of the
@@ -270,7 +293,10 @@ def powerspec(components, filename):
                             # Re = slab_particles_jik[0],
                             # Im = slab_particles_jik[1].
                             slab_particles_jik = cython.address(slab_particles[j, i, k:])
-                            power_jik = slab_particles_jik[0]**2 + slab_particles_jik[1]**2
+                            power_jik = (
+                                  slab_particles_jik[0]*slab_particles_jik[0]
+                                + slab_particles_jik[1]*slab_particles_jik[1]
+                            )
                         elif any_fluid:
                             # Pointer to the [j, i, k]'th element of the
                             # fluid slab.
@@ -278,7 +304,10 @@ def powerspec(components, filename):
                             # Re = slab_fluid_jik[0],
                             # Im = slab_fluid_jik[1].
                             slab_fluid_jik = cython.address(slab_fluid[j, i, k:])
-                            power_jik = slab_fluid_jik[0]**2 + slab_fluid_jik[1]**2
+                            power_jik = (
+                                  slab_fluid_jik[0]*slab_fluid_jik[0]
+                                + slab_fluid_jik[1]*slab_fluid_jik[1]
+                            )
                     # Because of the complex-conjugate symmetry,
                     # the slabs only contain the half with
                     # positive kk frequencies. Including this
@@ -296,10 +325,16 @@ def powerspec(components, filename):
                     with unswitch(3):
                         if fill_n_modes:
                             # Increase the multiplicity
-                            n_modes[k_bin_index] += symmetry_multiplicity
+                            n_modes_threads[thread, k_bin_index] += symmetry_multiplicity
                     # Increase the power in this bin.
                     # For now, power holds the sum of powers.
-                    power[k_bin_index] += symmetry_multiplicity*power_jik
+                    power_threads[thread, k_bin_index] += symmetry_multiplicity*power_jik
+        # Sum up the contributions from all threads
+        for thread in range(num_threads):
+            for k_bin_index in range(power.shape[0]):
+                power[k_bin_index] += power_threads[thread, k_bin_index]
+                if fill_n_modes:
+                    n_modes[k_bin_index] += int(n_modes_threads[thread, k_bin_index])
         # Sum power into the master process
         Reduce(sendbuf=(MPI.IN_PLACE if master else power),
                recvbuf=(power        if master else None),
@@ -558,7 +593,7 @@ if any(powerspec_times.values()) or special_params.get('special') == 'powerspec'
                i='Py_ssize_t',
                j='Py_ssize_t',
                k='Py_ssize_t',
-               mom='double*',
+               mom='particle_float*',
                mom_i='double',
                names=list,
                w_eff='double',
@@ -170,25 +170,38 @@ Allgather = lambda sendbuf, recvbuf: comm.Allgather(
     buf_and_dtype(sendbuf), recvbuf)
 Allgatherv = lambda sendbuf, recvbuf: comm.Allgatherv(
     buf_and_dtype(sendbuf), recvbuf)
+Allreduce = lambda sendbuf, recvbuf, op=MPI.SUM: comm.Allreduce(
+    buf_and_dtype(sendbuf), recvbuf, op)
+Alltoall = lambda sendbuf, recvbuf: comm.Alltoall(
+    buf_and_dtype(sendbuf), recvbuf)
+Alltoallv = lambda sendbuf, recvbuf: comm.Alltoallv(sendbuf, recvbuf)
 Barrier = comm.Barrier
 Bcast = lambda buf, root=master_rank: comm.Bcast(buf_and_dtype(buf), root)
 Gather = lambda sendbuf, recvbuf, root=master_rank: comm.Gather(
     buf_and_dtype(sendbuf), recvbuf, root)
 Gatherv = lambda sendbuf, recvbuf, root=master_rank: comm.Gatherv(
     buf_and_dtype(sendbuf), recvbuf, root)
+Irecv = lambda buf, source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG: comm.Irecv(
+    buf_and_dtype(buf), source, tag)
 Isend = lambda buf, dest, tag=0: comm.Isend(buf_and_dtype(buf), dest, tag)
 Reduce = lambda sendbuf, recvbuf, op=MPI.SUM, root=master_rank: comm.Reduce(
     buf_and_dtype(sendbuf), recvbuf, op, root)
 Recv = lambda buf, source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG: comm.Recv(
     buf_and_dtype(buf), source, tag)
+Recv_init = lambda buf, source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG: comm.Recv_init(
+    buf_and_dtype(buf), source, tag)
 Send = lambda buf, dest, tag=0: comm.Send(buf_and_dtype(buf), dest, tag)
+Send_init = lambda buf, dest, tag=0: comm.Send_init(buf_and_dtype(buf), dest, tag)
 Sendrecv = (lambda sendbuf, dest, sendtag=0, recvbuf=None, source=MPI.ANY_SOURCE,
     recvtag=MPI.ANY_TAG, status=None: comm.Sendrecv(buf_and_dtype(sendbuf), dest, sendtag,
         recvbuf, source, recvtag, status)
 )
+Startall = MPI.Prequest.Startall
+Waitall = MPI.Request.Waitall
 allgather  = comm.allgather
 allreduce  = comm.allreduce
 bcast      = lambda obj, root=master_rank: comm.bcast (obj, root)
+exscan     = lambda obj, op=MPI.SUM: comm.exscan(obj, op)  # None on rank 0
 gather     = lambda obj, root=master_rank: comm.gather(obj, root)
 iprobe     = comm.iprobe
 isend      = comm.isend
@@ -753,6 +766,8 @@ if not cython.compiled:
             return a
     # Dummy fused types
     number = number2 = integer = floating = signed_number = signed_number2 = number_mv = []
+    # In pure Python, particle data is always stored in double precision
+    single_precision = False
     # Mathematical functions
     from numpy import (sin, cos, tan,
                        arcsin, arccos, arctan, arctan2,
@@ -935,6 +950,23 @@ ctypedef fused signed_number2:
     cython.int
     cython.float
     cython.double
+# Floating-point type used for storing particle positions and momenta.
+# This is a double unless the code is built with single_precision=True,
+# in which case it is a float. Cython always sees a double, so that all
+# arithmetic on particle data is carried out in double precision.
+# The single_precision flag tells which of the two is in use.
+cdef extern from *:
+    '''
+    #ifdef SINGLE_PRECISION_PARTICLES
+    typedef float particle_float;
+    static int single_precision_particles = 1;
+    #else
+    typedef double particle_float;
+    static int single_precision_particles = 0;
+    #endif
+    '''
+    ctypedef double particle_float
+    bint single_precision "single_precision_particles"
 # Mathematical functions
 from libc.math cimport (sin, cos, tan,
                         asin  as arcsin,
@@ -952,14 +984,18 @@ from libc.math cimport (sin, cos, tan,
                         fmod,
                         )
 """)
+# Add the particle storage type to the C to NumPy dtype mapping
+C2np['particle_float'] = C2np['float' if single_precision else 'double']
 # Custom extension types using @cython.cclass will be found by the
 # pyxpp preprocessor. A comment containing such types will be placed in
 # the .pyx version of the given .py file. These are then collected
 # together into the .types.pyx file. The content of the cython_gsl
-# module cimported above also contains some extension types however.
-# Here we add this comment manually, directly in the .py file.
+# module cimported above also contains some extension types however,
+# and the particle_float type declared above must likewise be known to
+# other modules. Here we add this comment manually, directly in the
+# .py file.
 # Extension types implemented by this module:
-#     gsl_...: from cython_gsl cimport *
+#     gsl_...: from cython_gsl cimport *, particle_float: from commons cimport particle_float
 
 
 
@@ -1817,16 +1853,37 @@ cython.declare(# Input/output
                output_bases=dict,
                output_times=dict,
                autosave_interval='double',
+               autosave_checkpoint='bint',
                snapshot_select=dict,
+               snapshot_compression=str,
+               snapshot_shuffle='bint',
+               snapshot_chunk_size='Py_ssize_t',
+               snapshot_mantissa_bits='int',
+               snapshot_numfiles='int',
+               snapshot_async='bint',
+               snapshot_single_precision='bint',
                powerspec_select=dict,
                render2D_select=dict,
                render3D_select=dict,
                # Numerical parameter
                boxsize='double',
                ewald_gridsize='Py_ssize_t',
+               ewald_interp_order='int',
                φ_gridsize='ptrdiff_t',
                p3m_scale='double',
                p3m_cutoff='double',
+               p3m_table_order='int',
+               p3m_table_size='Py_ssize_t',
+               pp_tile_size='Py_ssize_t',
+               tree_opening_angle='double',
+               N_rungs='int',
+               rung_accuracy='double',
+               num_threads='int',
+               domain_rebalance_period='Py_ssize_t',
+               domain_rebalance_weight=str,
+               particle_shrink_threshold='double',
+               particle_reorder_period='Py_ssize_t',
+               buffer_release_period='Py_ssize_t',
                R_tophat='double',
                modes_per_decade='double',
                # Cosmology
@@ -1847,6 +1904,8 @@ cython.declare(# Input/output
                # Simlation options
                fftw_wisdom_rigor=str,
                fftw_wisdom_reuse='bint',
+               fft_decomposition=str,
+               φ_fourier_differentiation='bint',
                random_seed='unsigned long int',
                fluid_scheme_select=dict,
                fluid_options=dict,
@@ -1905,6 +1964,8 @@ autosave_interval = float(
       else   user_params.get('autosave_interval', 0)
 )
 user_params['autosave_interval'] = autosave_interval
+autosave_checkpoint = bool(user_params.get('autosave_checkpoint', False))
+user_params['autosave_checkpoint'] = autosave_checkpoint
 snapshot_select = {'all': True}
 if user_params.get('snapshot_select'):
     if isinstance(user_params['snapshot_select'], dict):
@@ -1913,6 +1974,20 @@ if user_params.get('snapshot_select'):
     else:
         snapshot_select = {'all': user_params['snapshot_select']}
 user_params['snapshot_select'] = snapshot_select
+snapshot_compression = str(user_params.get('snapshot_compression', '')).lower()
+user_params['snapshot_compression'] = snapshot_compression
+snapshot_shuffle = bool(user_params.get('snapshot_shuffle', True))
+user_params['snapshot_shuffle'] = snapshot_shuffle
+snapshot_chunk_size = to_int(user_params.get('snapshot_chunk_size', 0))
+user_params['snapshot_chunk_size'] = snapshot_chunk_size
+snapshot_mantissa_bits = int(user_params.get('snapshot_mantissa_bits', 0))
+user_params['snapshot_mantissa_bits'] = snapshot_mantissa_bits
+snapshot_numfiles = int(user_params.get('snapshot_numfiles', 1))
+user_params['snapshot_numfiles'] = snapshot_numfiles
+snapshot_async = bool(user_params.get('snapshot_async', False))
+user_params['snapshot_async'] = snapshot_async
+snapshot_single_precision = bool(user_params.get('snapshot_single_precision', False))
+user_params['snapshot_single_precision'] = snapshot_single_precision
 powerspec_select = {'all': True, 'all combinations': True}
 if user_params.get('powerspec_select'):
     if isinstance(user_params['powerspec_select'], dict):
@@ -1964,12 +2039,38 @@ boxsize = float(user_params.get('boxsize', 1))
 user_params['boxsize'] = boxsize
 ewald_gridsize = to_int(user_params.get('ewald_gridsize', 64))
 user_params['ewald_gridsize'] = ewald_gridsize
+ewald_interp_order = int(user_params.get('ewald_interp_order', 1))
+user_params['ewald_interp_order'] = ewald_interp_order
 φ_gridsize = to_int(user_params.get('φ_gridsize', 64))
 user_params['φ_gridsize'] = φ_gridsize
 p3m_scale = float(user_params.get('p3m_scale', 1.25))
 user_params['p3m_scale'] = p3m_scale
 p3m_cutoff = float(user_params.get('p3m_cutoff', 4.8))
 user_params['p3m_cutoff'] = p3m_cutoff
+p3m_table_order = int(user_params.get('p3m_table_order', 3))
+user_params['p3m_table_order'] = p3m_table_order
+p3m_table_size = to_int(user_params.get('p3m_table_size', 2**14))
+user_params['p3m_table_size'] = p3m_table_size
+pp_tile_size = to_int(user_params.get('pp_tile_size', 512))
+user_params['pp_tile_size'] = pp_tile_size
+tree_opening_angle = float(user_params.get('tree_opening_angle', 0.5))
+user_params['tree_opening_angle'] = tree_opening_angle
+N_rungs = int(user_params.get('N_rungs', 1))
+user_params['N_rungs'] = N_rungs
+rung_accuracy = float(user_params.get('rung_accuracy', 0.025))
+user_params['rung_accuracy'] = rung_accuracy
+num_threads = int(user_params.get('num_threads', os.environ.get('OMP_NUM_THREADS', 1)))
+user_params['num_threads'] = num_threads
+domain_rebalance_period = to_int(user_params.get('domain_rebalance_period', 0))
+user_params['domain_rebalance_period'] = domain_rebalance_period
+domain_rebalance_weight = str(user_params.get('domain_rebalance_weight', 'particles'))
+user_params['domain_rebalance_weight'] = domain_rebalance_weight
+particle_shrink_threshold = float(user_params.get('particle_shrink_threshold', 0))
+user_params['particle_shrink_threshold'] = particle_shrink_threshold
+particle_reorder_period = to_int(user_params.get('particle_reorder_period', 0))
+user_params['particle_reorder_period'] = particle_reorder_period
+buffer_release_period = to_int(user_params.get('buffer_release_period', 0))
+user_params['buffer_release_period'] = buffer_release_period
 R_tophat = float(user_params.get('R_tophat', -1))  # Defautl value will be set later
 user_params['R_tophat'] = R_tophat
 modes_per_decade = float(user_params.get('modes_per_decade', 100))
@@ -2098,6 +2199,10 @@ fftw_wisdom_rigor = user_params.get('fftw_wisdom_rigor', 'estimate').lower()
 user_params['fftw_wisdom_rigor'] = fftw_wisdom_rigor
 fftw_wisdom_reuse = bool(user_params.get('fftw_wisdom_reuse', True))
 user_params['fftw_wisdom_reuse'] = fftw_wisdom_reuse
+fft_decomposition = str(user_params.get('fft_decomposition', 'slab')).lower()
+user_params['fft_decomposition'] = fft_decomposition
+φ_fourier_differentiation = bool(user_params.get('φ_fourier_differentiation', False))
+user_params['φ_fourier_differentiation'] = φ_fourier_differentiation
 random_seed = to_int(user_params.get('random_seed', 1))
 user_params['random_seed'] = random_seed
 fluid_scheme_select = {'all': 'Kurganov-Tadmor'}
@@ -2475,6 +2580,10 @@ units_dict.setdefault(unicode('ρ_mbar')       , ρ_mbar                )
 # Add dimensionless sizes
 units_dict.setdefault('p3m_scale'          , p3m_scale          )
 units_dict.setdefault('p3m_cutoff'         , p3m_cutoff         )
+units_dict.setdefault('p3m_table_size'     , p3m_table_size     )
+units_dict.setdefault('pp_tile_size'       , pp_tile_size       )
+units_dict.setdefault('tree_opening_angle' , tree_opening_angle )
+units_dict.setdefault('rung_accuracy'      , rung_accuracy      )
 units_dict.setdefault('ewald_gridsize'     , ewald_gridsize     )
 units_dict.setdefault('render3D_resolution', render3D_resolution)
 units_dict.setdefault('slab_size_padding'  , slab_size_padding  )
@@ -2786,6 +2895,7 @@ def pairmin(a, b):
 if not cython.compiled:
     mod = np.mod
 else:
+    @cython.nogil
     @cython.header(# Arguments
                    x=signed_number,
                    length=signed_number,
@@ -2867,6 +2977,7 @@ else:
     """
 
 # Unnormalized sinc function (faster than gsl_sf_sinc)
+@cython.nogil
 @cython.header(x='double',
                y='double',
                returns='double',
@@ -3200,11 +3311,69 @@ def open_hdf5(filename, **kwargs):
 # Sanity checks and corrections/additions to user parameters #
 ##############################################################
 # Abort on unrecognized snapshot_type
-if snapshot_type not in ('standard', 'gadget2'):
+if snapshot_type not in ('standard', 'gadget2', 'gadgethdf5'):
     abort('Does not recognize snapshot type "{}"'.format(user_params['snapshot_type']))
+# Abort on illegal snapshot storage specifications
+if snapshot_compression not in ('', 'gzip', 'lzf'):
+    abort(f'Does not recognize snapshot compression "{snapshot_compression}"')
+if snapshot_chunk_size < 0:
+    abort(f'A snapshot_chunk_size of {snapshot_chunk_size} was specified, '
+          f'but it must be non-negative')
+if snapshot_mantissa_bits < 0:
+    abort(f'A snapshot_mantissa_bits of {snapshot_mantissa_bits} was specified, '
+          f'but it must be non-negative')
+if snapshot_numfiles < 1:
+    abort(f'A snapshot_numfiles of {snapshot_numfiles} was specified, '
+          f'but at least one file is needed')
 # Abort on illegal FFTW rigor
 if fftw_wisdom_rigor not in ('estimate', 'measure', 'patient', 'exhaustive'):
     abort('Does not recognize FFTW rigor "{}"'.format(user_params['fftw_wisdom_rigor']))
+if fft_decomposition not in ('slab', 'pencil'):
+    abort(f'Does not recognize FFT decomposition "{fft_decomposition}"')
+# Abort on unsupported interpolation order or too small size
+# of the short-range force table.
+if p3m_table_order not in (0, 1, 3):
+    abort(f'A p3m_table_order of {p3m_table_order} was specified, but only 0 (no table), 1 (linear) and 3 (cubic) are implemented')
+if p3m_table_order and p3m_table_size < 4:
+    abort(f'A p3m_table_size of {p3m_table_size} was specified, but at least 4 is required')
+# Abort on unsupported Ewald interpolation order
+if ewald_interp_order not in (1, 3):
+    abort(f'An ewald_interp_order of {ewald_interp_order} was specified, but only 1 (CIC) and 3 (tricubic) are implemented')
+if ewald_gridsize < 2:
+    abort(f'An ewald_gridsize of {ewald_gridsize} was specified, but at least 2 is required')
+# Abort on negative PP tile size
+if pp_tile_size < 0:
+    abort(f'A pp_tile_size of {pp_tile_size} was specified, but it must be non-negative')
+# Abort on non-positive tree opening angle
+if tree_opening_angle <= 0:
+    abort(f'A tree_opening_angle of {tree_opening_angle} was specified, but 0 < θ is required')
+# Abort on illegal number of time step rungs or rung accuracy
+if not 1 <= N_rungs <= 16:
+    abort(f'N_rungs = {N_rungs} was specified, but 1 ≤ N_rungs ≤ 16 is required')
+if rung_accuracy <= 0:
+    abort(f'A rung_accuracy of {rung_accuracy} was specified, but it must be positive')
+# Abort on illegal number of OpenMP threads
+if num_threads < 1:
+    abort(f'num_threads = {num_threads} was specified, but at least 1 thread is required')
+# Abort on illegal domain rebalancing specifications
+if domain_rebalance_period < 0:
+    abort(f'A domain_rebalance_period of {domain_rebalance_period} was specified, '
+          f'but it must be non-negative')
+if domain_rebalance_weight not in ('particles', 'cost'):
+    abort(f'A domain_rebalance_weight of "{domain_rebalance_weight}" was specified, '
+          f'but only "particles" and "cost" are implemented')
+# Abort on illegal particle memory shrink threshold
+if not (0 <= particle_shrink_threshold < 1):
+    abort(f'A particle_shrink_threshold of {particle_shrink_threshold} was specified, '
+          f'but it must lie in the interval [0, 1)')
+# Abort on illegal particle reordering period
+if particle_reorder_period < 0:
+    abort(f'A particle_reorder_period of {particle_reorder_period} was specified, '
+          f'but it must be non-negative')
+# Abort on illegal buffer release period
+if buffer_release_period < 0:
+    abort(f'A buffer_release_period of {buffer_release_period} was specified, '
+          f'but it must be non-negative')
 # Warn if random_seed is chosen to be 0, as this may lead to clashes
 # with the default seed used by GSL.
 if random_seed < 1:
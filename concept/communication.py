@@ -111,40 +111,50 @@ def find_N_recv(N_send):
                component='Component',
                reset_buffers='bint',
                # Locals
-               ID_recv='int',
-               ID_send='int',
+               N_fields='Py_ssize_t',
                N_local='Py_ssize_t',
                N_needed='Py_ssize_t',
                N_recv='Py_ssize_t[::1]',
                N_recv_j='Py_ssize_t',
-               N_recv_max='Py_ssize_t',
+               N_recv_round_tot='Py_ssize_t',
                N_recv_tot='Py_ssize_t',
+               N_round_max='Py_ssize_t',
+               N_rounds='Py_ssize_t',
                N_send_j='Py_ssize_t',
-               N_send_max='Py_ssize_t',
+               N_send_round_tot='Py_ssize_t',
                N_send_tot='Py_ssize_t',
                N_send_tot_global='Py_ssize_t',
-               buffer_name=object,  # int or str
+               buffer_mv='double[::1]',
+               field='Py_ssize_t',
+               field_data='particle_float*',
                holes_filled='Py_ssize_t',
                i='Py_ssize_t',
+               i_start='Py_ssize_t',
                index_recv_j='Py_ssize_t',
                indices_send_j='Py_ssize_t*',
                j='int',
                k='Py_ssize_t',
                k_start='Py_ssize_t',
-               momx='double*',
-               momx_mv='double[::1]',
-               momy='double*',
-               momy_mv='double[::1]',
-               momz='double*',
-               momz_mv='double[::1]',
+               momx='particle_float*',
+               momy='particle_float*',
+               momz='particle_float*',
+               offset='Py_ssize_t',
                owner='int',
-               posx='double*',
-               posx_mv='double[::1]',
-               posy='double*',
-               posy_mv='double[::1]',
-               posz='double*',
-               posz_mv='double[::1]',
-               sendbuf_mv='double[::1]',
+               posx='particle_float*',
+               posy='particle_float*',
+               posz='particle_float*',
+               r='Py_ssize_t',
+               recvbuf='particle_float*',
+               recvbuf_mv=object,  # particle_float[::1]
+               recvcounts='int[::1]',
+               recvdispls='int[::1]',
+               rung='char*',
+               sendbuf='particle_float*',
+               sendbuf_mv=object,  # particle_float[::1]
+               sendcounts='int[::1]',
+               senddispls='int[::1]',
+               size_recv='Py_ssize_t',
+               size_send='Py_ssize_t',
                Δmemory='Py_ssize_t',
                )
 def exchange(component, reset_buffers=False):
@@ -152,8 +162,14 @@ def exchange(component, reset_buffers=False):
     so that every particle resides on the process in charge of the
     domain where the particle is located. The variable indices_send
     holds arrays of indices of particles to send to the different
-    processes, while particle data is copied to sendbuf before it is
-    send. These two variables will grow in size if needed. Call with
+    processes, while particle data is packed into a single send buffer
+    before it is send. All particle fields destined for a given process
+    are packed into a single message, and all messages are communicated
+    using a single Alltoallv, in which processes with no particles to
+    exchange (usually all but the neighbouring ones) take no part.
+    Exchanges too large for the int counts of Alltoallv are split
+    into several rounds.
+    The index buffers will grow in size if needed. Call with
     reset_buffers=True to reset these variables to their most basic
     forms, freeing up memory.
     """
@@ -195,95 +211,129 @@ def exchange(component, reset_buffers=False):
         return
     # Print out exchange message
     masterprint('Exchanging {} of the {} particles ...'.format(N_send_tot_global, component.name))
-    # Grab a buffer for holding the data to be send.
-    # The 'send' buffer is also used internally by smart_mpi.
-    buffer_name = 'send'
-    N_send_max = max(N_send)
-    sendbuf_mv = get_buffer(N_send_max, buffer_name)
-    # Find out how many particles to receive
-    N_recv = find_N_recv(N_send)
-    # The maximum number of particles to
-    # receive is stored in entrance rank.
-    N_recv_max = N_recv[rank]
-    N_recv_tot = sum(N_recv) - N_recv_max
+    # Find out how many particles to receive from each process
+    N_recv = empty(nprocs, dtype=C2np['Py_ssize_t'])
+    Alltoall(N_send, N_recv)
+    N_recv_tot = sum(N_recv)
     # Enlarge the component data attributes, if needed. This may not be
     # strcitly necessary as more particles may be send than received.
+    # The allocation grows geometrically, leaving room for particles
+    # received in future exchanges.
     N_needed = N_local + N_recv_tot
     if component.N_allocated < N_needed:
-        component.resize(N_needed)
+        component.grow(N_needed)
         # Reextract position pointers
         posx = component.posx
         posy = component.posy
         posz = component.posz
-    # Extract momenta pointers and all memory views
-    # of the possibly resized data.
+    # Extract momenta pointers of the possibly resized data
     momx = component.momx
     momy = component.momy
     momz = component.momz
-    posx_mv = component.posx_mv
-    posy_mv = component.posy_mv
-    posz_mv = component.posz_mv
-    momx_mv = component.momx_mv
-    momy_mv = component.momy_mv
-    momz_mv = component.momz_mv
-    # Exchange particles between processes
+    rung = component.rung
+    # The particle fields to exchange. The time step rungs are only
+    # needed when using block time steps, in which case they are
+    # packed together with the other fields. As rungs are small
+    # integers, they are represented exactly as particle_float.
+    exchange_fields[0] = posx
+    exchange_fields[1] = posy
+    exchange_fields[2] = posz
+    exchange_fields[3] = momx
+    exchange_fields[4] = momy
+    exchange_fields[5] = momz
+    N_fields = 6 + (N_rungs > 1)
+    # The counts and displacements of Alltoallv are C ints, limiting
+    # the number of elements communicated to and from each process.
+    # Large exchanges are therefore carried out over several rounds,
+    # each round communicating an equal share of the particles to be
+    # sent to and received from each process. The number of rounds is
+    # the same on all processes. Each share of a round deviates by less
+    # than one particle from its exact fraction, hence the margin.
+    N_round_max = (2**31 - 1)//N_fields - nprocs
+    N_rounds = 1 + allreduce(pairmax(N_send_tot, N_recv_tot)//N_round_max, op=MPI.MAX)
+    if N_rounds > 1:
+        masterprint(f'Splitting the exchange into {N_rounds} rounds')
+    sendcounts = empty(nprocs, dtype=C2np['int'])
+    senddispls = empty(nprocs, dtype=C2np['int'])
+    recvcounts = empty(nprocs, dtype=C2np['int'])
+    recvdispls = empty(nprocs, dtype=C2np['int'])
     index_recv_j = N_local
-    for j in range(1, nprocs):
-        # Process ranks to send/receive to/from
-        ID_send = mod(rank + j, nprocs)
-        ID_recv = mod(rank - j, nprocs)
-        # Number of particles to send/receive
-        N_send_j = N_send[ID_send]
-        N_recv_j = N_recv[ID_recv]
-        # The indices of particles to send and the index from
-        # which received particles are allowed to be appended.
-        indices_send_j = indices_send[ID_send]
-        # Send/receive posx
-        for i in range(N_send_j):
-            sendbuf_mv[i] = posx[indices_send_j[i]]
-        Sendrecv(sendbuf_mv[:N_send_j],
-                 dest=ID_send,
-                 recvbuf=posx_mv[index_recv_j:],
-                 source=ID_recv)
-        # Send/receive posy
-        for i in range(N_send_j):
-            sendbuf_mv[i] = posy[indices_send_j[i]]
-        Sendrecv(sendbuf_mv[:N_send_j],
-                 dest=ID_send,
-                 recvbuf=posy_mv[index_recv_j:],
-                 source=ID_recv)
-        # Send/receive posz
-        for i in range(N_send_j):
-            sendbuf_mv[i] = posz[indices_send_j[i]]
-        Sendrecv(sendbuf_mv[:N_send_j],
-                 dest=ID_send,
-                 recvbuf=posz_mv[index_recv_j:],
-                 source=ID_recv)
-        # Send/receive momx
-        for i in range(N_send_j):
-            sendbuf_mv[i] = momx[indices_send_j[i]]
-        Sendrecv(sendbuf_mv[:N_send_j],
-                 dest=ID_send,
-                 recvbuf=momx_mv[index_recv_j:],
-                 source=ID_recv)
-        # Send/receive momy
-        for i in range(N_send_j):
-            sendbuf_mv[i] = momy[indices_send_j[i]]
-        Sendrecv(sendbuf_mv[:N_send_j],
-                 dest=ID_send,
-                 recvbuf=momy_mv[index_recv_j:],
-                 source=ID_recv)
-        # Send/receive momz
-        for i in range(N_send_j):
-            sendbuf_mv[i] = momz[indices_send_j[i]]
-        Sendrecv(sendbuf_mv[:N_send_j],
-                 dest=ID_send,
-                 recvbuf=momz_mv[index_recv_j:],
-                 source=ID_recv)
-        # Update the start index for received data
-        index_recv_j += N_recv_j
-        # Mark the holes in the data by setting posx[hole] = -1
-        for k in range(N_send_j):
+    for r in range(N_rounds):
+        # The number of particles to send and receive in this round
+        N_send_round_tot = 0
+        N_recv_round_tot = 0
+        for j in range(nprocs):
+            N_send_round_tot += (N_send[j]*(r + 1))//N_rounds - (N_send[j]*r)//N_rounds
+            N_recv_round_tot += (N_recv[j]*(r + 1))//N_rounds - (N_recv[j]*r)//N_rounds
+        # Grab buffers for holding the packed data to be send and
+        # received. The 'send' buffer is also used internally by
+        # smart_mpi. As these buffers contain doubles, we reinterpret
+        # their memory as holding the type used for storing particle
+        # data, which may be float, so that only this type is
+        # communicated. The buffers are never given a size of zero,
+        # as this is not allowed for memory views.
+        size_send = pairmax(1, N_fields*N_send_round_tot)
+        buffer_mv = get_buffer(size_send, 'send')
+        if not cython.compiled:
+            sendbuf = sendbuf_mv = asarray(buffer_mv).view(C2np['particle_float'])
+        else:
+            sendbuf = cast(cython.address(buffer_mv[0]), 'particle_float*')
+            sendbuf_mv = cast(sendbuf, 'particle_float[:size_send]')
+        size_recv = pairmax(1, N_fields*N_recv_round_tot)
+        buffer_mv = get_buffer(size_recv, 'exchange_recv')
+        if not cython.compiled:
+            recvbuf = recvbuf_mv = asarray(buffer_mv).view(C2np['particle_float'])
+        else:
+            recvbuf = cast(cython.address(buffer_mv[0]), 'particle_float*')
+            recvbuf_mv = cast(recvbuf, 'particle_float[:size_recv]')
+        # Pack the particles to be send. The data destined for process
+        # j occupies a contiguous part of the send buffer, within which
+        # each field occupies a contiguous block.
+        offset = 0
+        for j in range(nprocs):
+            i_start = (N_send[j]*r)//N_rounds
+            N_send_j = (N_send[j]*(r + 1))//N_rounds - i_start
+            sendcounts[j] = N_fields*N_send_j
+            senddispls[j] = offset
+            indices_send_j = indices_send[j]
+            for field in range(6):
+                field_data = exchange_fields[field]
+                for i in range(N_send_j):
+                    sendbuf[offset + i] = field_data[indices_send_j[i_start + i]]
+                offset += N_send_j
+            if N_rungs > 1:
+                for i in range(N_send_j):
+                    sendbuf[offset + i] = rung[indices_send_j[i_start + i]]
+                offset += N_send_j
+        offset = 0
+        for j in range(nprocs):
+            N_recv_j = (N_recv[j]*(r + 1))//N_rounds - (N_recv[j]*r)//N_rounds
+            recvcounts[j] = N_fields*N_recv_j
+            recvdispls[j] = offset
+            offset += recvcounts[j]
+        # Exchange the particles of this round between all processes
+        Alltoallv(
+            [sendbuf_mv, (sendcounts, senddispls), particle_float_typecode],
+            [recvbuf_mv, (recvcounts, recvdispls), particle_float_typecode],
+        )
+        # Unpack the received particles, appending them to the local data
+        offset = 0
+        for j in range(nprocs):
+            N_recv_j = (N_recv[j]*(r + 1))//N_rounds - (N_recv[j]*r)//N_rounds
+            for field in range(6):
+                field_data = exchange_fields[field]
+                for i in range(N_recv_j):
+                    field_data[index_recv_j + i] = recvbuf[offset + i]
+                offset += N_recv_j
+            if N_rungs > 1:
+                for i in range(N_recv_j):
+                    rung[index_recv_j + i] = cast(recvbuf[offset + i], 'char')
+                offset += N_recv_j
+            index_recv_j += N_recv_j
+    # Mark the holes in the data by setting posx[hole] = -1
+    for j in range(nprocs):
+        indices_send_j = indices_send[j]
+        for k in range(N_send[j]):
             posx[indices_send_j[k]] = -1
     # Move particle data to fill holes
     k_start = 0
@@ -307,19 +357,23 @@ def exchange(component, reset_buffers=False):
                 momx[k] = momx[i]
                 momy[k] = momy[i]
                 momz[k] = momz[i]
+                rung[k] = rung[i]
                 k_start = k + 1
                 holes_filled += 1
                 break
             # All holes have been filled
             if holes_filled == N_send_tot:
                 break
-    # Update N_local
+    # Update N_local and release memory left unused
+    # by the particles which have been sent away.
     component.N_local = N_needed - N_send_tot
+    component.shrink()
     # If reset_buffers is True, reset the global indices_send and
-    # sendbuf to their basic forms. This buffer will then be rebuild in
-    # future calls.
+    # the packing buffers to their basic forms. These buffers will then
+    # be rebuild in future calls.
     if reset_buffers:
-        resize_buffer(1, buffer_name)
+        resize_buffer(1, 'send')
+        resize_buffer(1, 'exchange_recv')
         for j in range(nprocs):
             indices_send[j] = realloc(indices_send[j], 1*sizeof('Py_ssize_t'))
             indices_send_sizes[j] = 1
@@ -331,24 +385,6 @@ def exchange(component, reset_buffers=False):
 @cython.header(# Arguments
                domain_grid='double[:, :, ::1]',
                mode=str,
-               # Locals
-               i='int',
-               index_recv_end_i='Py_ssize_t',
-               index_recv_end_j='Py_ssize_t',
-               index_recv_end_k='Py_ssize_t',
-               index_recv_start_i='Py_ssize_t',
-               index_recv_start_j='Py_ssize_t',
-               index_recv_start_k='Py_ssize_t',
-               index_send_end_i='Py_ssize_t',
-               index_send_end_j='Py_ssize_t',
-               index_send_end_k='Py_ssize_t',
-               index_send_start_i='Py_ssize_t',
-               index_send_start_j='Py_ssize_t',
-               index_send_start_k='Py_ssize_t',
-               j='int',
-               k='int',
-               operation=str,
-               reverse='bint',
                )
 def communicate_domain(domain_grid, mode=''):
     """This function can operate in two different modes,
@@ -400,7 +436,201 @@ def communicate_domain(domain_grid, mode=''):
     In the above, shape is the shape of the local grid.
     That is, the total grid has
     (shape[0] + 5)*(shape[2] + 5)*(shape[2] + 5) elements.
+
+    All 26 non-bulk parts are communicated simultaneously, using
+    persistent MPI requests over packed buffers which are set up once
+    per grid shape and mode, see get_domain_halo_plan. To overlap the
+    communication with computation, call communicate_domain_start and
+    communicate_domain_finish separately instead of this function.
     """
+    communicate_domain_finish(communicate_domain_start(domain_grid, mode))
+
+# Function for communicating boundary values of several domain grids
+# between processes, as described in communicate_domain. The boundary
+# values of all grids of the same shape are packed together, so that
+# only a single set of (26) messages is needed for all of them.
+@cython.header(# Arguments
+               domain_grids=list,
+               mode=str,
+               # Locals
+               domain_grid='double[:, :, ::1]',
+               domain_grids_shape=list,
+               domain_grids_shapes=object,  # OrderedDict
+               plan=dict,
+               plans=list,
+               shape=tuple,
+               )
+def communicate_domains(domain_grids, mode=''):
+    # Group the grids by shape
+    domain_grids_shapes = collections.OrderedDict()
+    for domain_grid in domain_grids:
+        shape = asarray(domain_grid).shape
+        domain_grids_shapes.setdefault(shape, []).append(domain_grid)
+    # Start the communication of all groups before completing any
+    plans = [communicate_domains_start(domain_grids_shape, mode)
+             for domain_grids_shape in domain_grids_shapes.values()]
+    for plan in plans:
+        communicate_domain_finish(plan)
+
+# Function which starts the non-blocking communication of the boundary
+# values of a domain grid, as described in communicate_domain.
+@cython.header(# Arguments
+               domain_grid='double[:, :, ::1]',
+               mode=str,
+               returns=dict,
+               )
+def communicate_domain_start(domain_grid, mode=''):
+    """The returned plan must be passed to communicate_domain_finish,
+    which completes the communication. The values to be sent are copied
+    out of the domain grid before this function returns. Between the two
+    calls, the domain grid may thus be freely read and written, except
+    for the parts receiving data (the pseudo and ghost points in 'populate'
+    mode, the boundary points of the local bulk in 'add contributions'
+    mode), which are only updated by communicate_domain_finish.
+    Several communications (of different grids) may be in flight at
+    the same time.
+    """
+    return communicate_domains_start([domain_grid], mode)
+
+# Function which starts the non-blocking communication of the boundary
+# values of several domain grids of the same shape, packed together
+# into a single set of messages. The returned plan must be passed to
+# communicate_domain_finish. See communicate_domain_start.
+@cython.header(# Arguments
+               domain_grids=list,
+               mode=str,
+               # Locals
+               N_grids='Py_ssize_t',
+               bounds='Py_ssize_t[:, ::1]',
+               domain_grid='double[:, :, ::1]',
+               g='Py_ssize_t',
+               i='Py_ssize_t',
+               index='Py_ssize_t',
+               j='Py_ssize_t',
+               k='Py_ssize_t',
+               offsets='Py_ssize_t[::1]',
+               part='int',
+               plan=dict,
+               sendbuf='double[::1]',
+               shape=tuple,
+               returns=dict,
+               )
+def communicate_domains_start(domain_grids, mode=''):
+    N_grids = len(domain_grids)
+    shape = asarray(domain_grids[0]).shape
+    for domain_grid in domain_grids:
+        if asarray(domain_grid).shape != shape:
+            abort(
+                f'communicate_domains_start was called with domain grids '
+                f'of different shapes {shape} and {asarray(domain_grid).shape}'
+            )
+    plan = get_domain_halo_plan(shape, mode, N_grids)
+    bounds  = plan['bounds']
+    offsets = plan['offsets']
+    sendbuf = plan['sendbuf']
+    # Pack the 26 parts to be sent into the contiguous send buffer.
+    # Each part of all grids is stored contiguously, one grid after
+    # the other.
+    for part in range(26):
+        index = N_grids*offsets[part]
+        for g in range(N_grids):
+            domain_grid = domain_grids[g]
+            for         i in range(bounds[part, 0], bounds[part, 1]):
+                for     j in range(bounds[part, 2], bounds[part, 3]):
+                    for k in range(bounds[part, 4], bounds[part, 5]):
+                        sendbuf[index] = domain_grid[i, j, k]
+                        index += 1
+    # Post all receives and sends at once
+    plan['grids'] = domain_grids
+    Startall(plan['requests'])
+    return plan
+
+# Function which completes the communication started by
+# communicate_domain_start or communicate_domains_start.
+@cython.header(# Arguments
+               plan=dict,
+               # Locals
+               N_grids='Py_ssize_t',
+               adding='bint',
+               bounds='Py_ssize_t[:, ::1]',
+               domain_grid='double[:, :, ::1]',
+               domain_grids=list,
+               g='Py_ssize_t',
+               i='Py_ssize_t',
+               index='Py_ssize_t',
+               j='Py_ssize_t',
+               k='Py_ssize_t',
+               offsets='Py_ssize_t[::1]',
+               part='int',
+               recvbuf='double[::1]',
+               returns='void',
+               )
+def communicate_domain_finish(plan):
+    if plan['grids'] is None:
+        abort('communicate_domain_finish was called with a plan not in use')
+    Waitall(plan['requests'])
+    domain_grids = plan['grids']
+    plan['grids'] = None
+    N_grids = len(domain_grids)
+    bounds  = plan['bounds']
+    offsets = plan['offsets']
+    recvbuf = plan['recvbuf']
+    adding  = (plan['operation'] == '+=')
+    # Unpack the 26 received parts from the contiguous receive buffer,
+    # either replacing or adding to the existing values.
+    for part in range(26):
+        index = N_grids*offsets[part]
+        for g in range(N_grids):
+            domain_grid = domain_grids[g]
+            for         i in range(bounds[part, 6], bounds[part, 7]):
+                for     j in range(bounds[part, 8], bounds[part, 9]):
+                    for k in range(bounds[part, 10], bounds[part, 11]):
+                        with unswitch(5):
+                            if adding:
+                                domain_grid[i, j, k] += recvbuf[index]
+                            else:
+                                domain_grid[i, j, k] = recvbuf[index]
+                        index += 1
+
+# Function returning a plan for communicating the boundary values of
+# N_grids domain grids of the given shape in the given mode, as
+# described in communicate_domain. A plan holds the index bounds of
+# the 26 non-bulk parts to send and receive, packed send and receive
+# buffers and persistent MPI requests over these buffers. Plans are
+# reused across calls. Plans currently in use (between
+# communicate_domain(s)_start and communicate_domain_finish) are
+# skipped, so that several communications may be in flight at the
+# same time.
+@cython.header(# Arguments
+               shape=tuple,
+               mode=str,
+               N_grids='Py_ssize_t',
+               # Locals
+               bounds='Py_ssize_t[:, ::1]',
+               dests=list,
+               dim='int',
+               direction='int',
+               i='int',
+               j='int',
+               k='int',
+               key=tuple,
+               offsets='Py_ssize_t[::1]',
+               operation=str,
+               part='int',
+               plan=dict,
+               recv_end='Py_ssize_t',
+               recv_start='Py_ssize_t',
+               recvbuf=object,  # np.ndarray
+               requests=list,
+               reverse='bint',
+               send_end='Py_ssize_t',
+               send_start='Py_ssize_t',
+               sendbuf=object,  # np.ndarray
+               size='Py_ssize_t',
+               sources=list,
+               returns=dict,
+               )
+def get_domain_halo_plan(shape, mode, N_grids=1):
     # Dependent on the mode, set the operation to be performed on the
     # received data, and the direction of communication.
     if mode == 'add contributions':
@@ -414,81 +644,98 @@ def communicate_domain(domain_grid, mode=''):
               'Call with mode=\'add contributions\' or mode=\'populate\'.')
     else:
         abort('Mode "{}" not implemented'.format(mode))
+    # Look up an existing plan not currently in use
+    key = (shape, mode, N_grids)
+    for plan in domain_halo_plans.get(key, []):
+        if plan['grids'] is None:
+            return plan
+    # Construct new plan. The comments describe the case of
+    # mode == 'add contributions'.
+    bounds = empty((26, 12), dtype=C2np['Py_ssize_t'])
+    offsets = zeros(27, dtype=C2np['Py_ssize_t'])
+    dests   = []
+    sources = []
+    part = 0
     for i in range(-1, 2):
-        if i == -1:
-            # Send left, receive right
-            index_send_start_i = 0
-            index_send_end_i   = 2
-            index_recv_start_i = ℤ[domain_grid.shape[0]] - 5
-            index_recv_end_i   = ℤ[domain_grid.shape[0] - 3]
-        elif i == 0:
-            # Do not send to or receive from this direction.
-            # Include the entire i-dimension of the local bulk.
-            index_send_start_i = 2
-            index_send_end_i   = ℤ[domain_grid.shape[0] - 3]
-            index_recv_start_i = 2
-            index_recv_end_i   = ℤ[domain_grid.shape[0] - 3]
-        else:  # i == -1
-            # Send right, receive left
-            index_send_start_i = ℤ[domain_grid.shape[0] - 3]
-            index_send_end_i   = ℤ[domain_grid.shape[0]]
-            index_recv_start_i = 2
-            index_recv_end_i   = 5
         for j in range(-1, 2):
-            if j == -1:
-                # Send backward, receive forward
-                index_send_start_j = 0
-                index_send_end_j   = 2
-                index_recv_start_j = ℤ[domain_grid.shape[1] - 5]
-                index_recv_end_j   = ℤ[domain_grid.shape[1] - 3]
-            elif j == 0:
-                # Do not send to or receive from this direction.
-                # Include the entire j-dimension of the local bulk.
-                index_send_start_j = 2
-                index_send_end_j   = ℤ[domain_grid.shape[1] - 3]
-                index_recv_start_j = 2
-                index_recv_end_j   = ℤ[domain_grid.shape[1] - 3]
-            else:  # j == -1
-                # Send forward, receive backward
-                index_send_start_j = ℤ[domain_grid.shape[1] - 3]
-                index_send_end_j   = ℤ[domain_grid.shape[1]]
-                index_recv_start_j = 2
-                index_recv_end_j   = 5
             for k in range(-1, 2):
                 # Do not communicate the local bulk
                 if i == j == k == 0:
                     continue
-                if k == -1:
-                    # Send downward, receive upward
-                    index_send_start_k = 0
-                    index_send_end_k   = 2
-                    index_recv_start_k = ℤ[domain_grid.shape[2] - 5]
-                    index_recv_end_k   = ℤ[domain_grid.shape[2] - 3]
-                elif k == 0:
-                    # Do not send to or receive from this direction.
-                    # Include the entire k-dimension of the local bulk.
-                    index_send_start_k = 2
-                    index_send_end_k   = ℤ[domain_grid.shape[2] - 3]
-                    index_recv_start_k = 2
-                    index_recv_end_k   = ℤ[domain_grid.shape[2] - 3]
-                else:  # k == -1
-                    # Send upward, receive downward
-                    index_send_start_k = ℤ[domain_grid.shape[2] - 3]
-                    index_send_end_k   = ℤ[domain_grid.shape[2]]
-                    index_recv_start_k = 2
-                    index_recv_end_k   = 5
-                # Communicate this part
-                smart_mpi(domain_grid[index_send_start_i:index_send_end_i,
-                                      index_send_start_j:index_send_end_j,
-                                      index_send_start_k:index_send_end_k],
-                          domain_grid[index_recv_start_i:index_recv_end_i,
-                                      index_recv_start_j:index_recv_end_j,
-                                      index_recv_start_k:index_recv_end_k],
-                          dest  =rank_neighboring_domain(+i, +j, +k),
-                          source=rank_neighboring_domain(-i, -j, -k),
-                          reverse=reverse,
-                          mpifun='Sendrecv',
-                          operation=operation)
+                size = 1
+                for dim in range(3):
+                    direction = (i, j, k)[dim]
+                    if direction == -1:
+                        # Send left/backward/downward,
+                        # receive right/forward/upward.
+                        send_start = 0
+                        send_end   = 2
+                        recv_start = shape[dim] - 5
+                        recv_end   = shape[dim] - 3
+                    elif direction == 0:
+                        # Do not send to or receive from this direction.
+                        # Include the entire dimension of the local bulk.
+                        send_start = 2
+                        send_end   = shape[dim] - 3
+                        recv_start = 2
+                        recv_end   = shape[dim] - 3
+                    else:  # direction == +1
+                        # Send right/forward/upward,
+                        # receive left/backward/downward.
+                        send_start = shape[dim] - 3
+                        send_end   = shape[dim]
+                        recv_start = 2
+                        recv_end   = 5
+                    # When populating, the roles of the send and receive
+                    # parts are swapped.
+                    if reverse:
+                        send_start, send_end, recv_start, recv_end = (
+                            recv_start, recv_end, send_start, send_end,
+                        )
+                    bounds[part, 2*dim    ] = send_start
+                    bounds[part, 2*dim + 1] = send_end
+                    bounds[part, 2*dim + 6] = recv_start
+                    bounds[part, 2*dim + 7] = recv_end
+                    size *= send_end - send_start
+                offsets[part + 1] = offsets[part] + size
+                # When populating, the direction of
+                # communication is reversed.
+                if reverse:
+                    dests  .append(rank_neighboring_domain(-i, -j, -k))
+                    sources.append(rank_neighboring_domain(+i, +j, +k))
+                else:
+                    dests  .append(rank_neighboring_domain(+i, +j, +k))
+                    sources.append(rank_neighboring_domain(-i, -j, -k))
+                part += 1
+    # Allocate packed buffers and set up persistent requests over them.
+    # Each message contains a given part of all N_grids grids.
+    # Each part is tagged by its index, so that several parts
+    # communicated between the same pair of processes are kept apart.
+    sendbuf = empty(N_grids*offsets[26], dtype=C2np['double'])
+    recvbuf = empty(N_grids*offsets[26], dtype=C2np['double'])
+    requests = []
+    for part in range(26):
+        requests.append(Recv_init(recvbuf[N_grids*offsets[part]:N_grids*offsets[part + 1]],
+                                  source=sources[part], tag=domain_halo_tag + part))
+        requests.append(Send_init(sendbuf[N_grids*offsets[part]:N_grids*offsets[part + 1]],
+                                  dest=dests[part], tag=domain_halo_tag + part))
+    plan = {
+        'bounds'   : bounds,
+        'offsets'  : offsets,
+        'sendbuf'  : sendbuf,
+        'recvbuf'  : recvbuf,
+        'requests' : requests,
+        'operation': operation,
+        'grids'    : None,
+    }
+    domain_halo_plans.setdefault(key, []).append(plan)
+    return plan
+# Communication plans for domain grids, and the tag offset used for
+# the communication of domain grid boundaries, keeping these apart from
+# the tags of other non-blocking messages.
+cython.declare(domain_halo_plans=dict, domain_halo_tag='int')
+domain_halo_plans = {}
+domain_halo_tag = 3
 
 # Function for cutting out domains as rectangular boxes in the best
 # possible way. The return value is an array of 3 elements; the number
@@ -572,11 +819,261 @@ def cutout_domains(n, basecall=True):
                returns='int',
                )
 def which_domain(x, y, z):
-    x_index = int(x/domain_size_x)
-    y_index = int(y/domain_size_y)
-    z_index = int(z/domain_size_z)
+    # For uniform domains the indices can be computed directly
+    if domains_uniform[0]:
+        x_index = int(x/domain_size_x)
+        y_index = int(y/domain_size_y)
+        z_index = int(z/domain_size_z)
+        return domain_layout[x_index, y_index, z_index]
+    # For non-uniform domains we scan through the hierarchical domain
+    # boundaries, first along x, then along y within the found x slab
+    # and finally along z within the found column.
+    x_index = 0
+    while x_index < ℤ[domain_subdivisions[0] - 1] and x >= domain_bounds_x[x_index + 1]:
+        x_index += 1
+    y_index = 0
+    while y_index < ℤ[domain_subdivisions[1] - 1] and y >= domain_bounds_y[x_index, y_index + 1]:
+        y_index += 1
+    z_index = 0
+    while (z_index < ℤ[domain_subdivisions[2] - 1]
+        and z >= domain_bounds_z[x_index, y_index, z_index + 1]):
+        z_index += 1
     return domain_layout[x_index, y_index, z_index]
 
+# Function returning the box (start and size along each dimension)
+# of the domain governed by the process with the given rank.
+@cython.header(# Arguments
+               rank_other='int',
+               # Locals
+               i='int',
+               j='int',
+               k='int',
+               returns=tuple,
+               )
+def domain_box(rank_other):
+    i = rank_other//ℤ[domain_subdivisions[1]*domain_subdivisions[2]]
+    j = (rank_other//domain_subdivisions[2])%domain_subdivisions[1]
+    k = rank_other%domain_subdivisions[2]
+    return (
+        domain_bounds_x[i],
+        domain_bounds_y[i, j],
+        domain_bounds_z[i, j, k],
+        domain_bounds_x[i + 1] - domain_bounds_x[i],
+        domain_bounds_y[i, j + 1] - domain_bounds_y[i, j],
+        domain_bounds_z[i, j, k + 1] - domain_bounds_z[i, j, k],
+    )
+
+# Function which places the boundaries between n domains along a
+# single dimension, so that each domain receives an equal share of the
+# weight histogrammed in hist. Within a histogram bin, the weight is
+# taken to be uniformly distributed. No domain is allowed to become
+# thinner than a single bin.
+@cython.header(# Arguments
+               hist='double[::1]',
+               n='int',
+               bounds='double[::1]',
+               # Locals
+               bin_width='double',
+               cumulative='double',
+               m='int',
+               target='double',
+               ℓ='Py_ssize_t',
+               returns='void',
+               )
+def place_domain_bounds(hist, n, bounds):
+    bin_width = boxsize/hist.shape[0]
+    bounds[0] = 0
+    bounds[n] = boxsize
+    # Without any weight present, resort to uniform domains
+    cumulative = 0
+    for ℓ in range(hist.shape[0]):
+        cumulative += hist[ℓ]
+    if cumulative == 0:
+        for m in range(1, n):
+            bounds[m] = m*ℝ[boxsize/n]
+        return
+    # Place each boundary at the m'th n-quantile of the weight
+    m = 1
+    target = cumulative/n
+    cumulative = 0
+    for ℓ in range(hist.shape[0]):
+        while m < n and cumulative + hist[ℓ] >= m*target:
+            bounds[m] = (ℓ + (m*target - cumulative)/hist[ℓ])*bin_width
+            m += 1
+        cumulative += hist[ℓ]
+    for m in range(m, n):
+        bounds[m] = boxsize
+    # Enforce the minimum domain width,
+    # first from the left and then from the right.
+    for m in range(1, n):
+        bounds[m] = pairmax(bounds[m], bounds[m - 1] + bin_width)
+    for m in range(n - 1, 0, -1):
+        bounds[m] = pairmin(bounds[m], bounds[m + 1] - bin_width)
+
+# Function which redistributes the domains of the processes so that
+# each gets an equal share of the work. The work of a particle is
+# either constant or, if a positive (measured) cost of the local
+# particles is given, the local cost divided between the local
+# particles. The domains are arranged as hierarchical cuboids; the box
+# is first split into slabs along x, each slab is then split into
+# columns along y and each column is finally split along z, each
+# split placed according to the weighted particle distribution.
+# Call with uniform=True to return to the uniform decomposition.
+@cython.pheader(# Arguments
+                components=list,
+                cost='double',
+                uniform='bint',
+                # Locals
+                N_local='Py_ssize_t',
+                N_local_tot='Py_ssize_t',
+                bounds_x='double[::1]',
+                bounds_y='double[:, ::1]',
+                bounds_z='double[:, :, ::1]',
+                component='Component',
+                hist_x='double[::1]',
+                hist_y='double[:, ::1]',
+                hist_z='double[:, :, ::1]',
+                i='Py_ssize_t',
+                imbalance_after='double',
+                imbalance_before='double',
+                posx='particle_float*',
+                posy='particle_float*',
+                posz='particle_float*',
+                weight='double',
+                work='double[::1]',
+                work_local='double',
+                x='double',
+                x_index='int',
+                y='double',
+                y_index='int',
+                z='double',
+                z_index='int',
+                ℓ='Py_ssize_t',
+                )
+def rebalance_domains(components, cost=0, uniform=False):
+    # No need to rebalance when running serially
+    if nprocs == 1:
+        return
+    # Only particles are subject to the domain decomposition
+    components = [component for component in components
+        if component.representation == 'particles']
+    # Return to uniform domains if requested
+    if uniform:
+        if domains_uniform[0]:
+            return
+        masterprint('Resetting domain decomposition to uniform ...')
+        for x_index in range(domain_subdivisions[0] + 1):
+            domain_bounds_x[x_index] = x_index*domain_size_x
+        for x_index in range(domain_subdivisions[0]):
+            for y_index in range(domain_subdivisions[1] + 1):
+                domain_bounds_y[x_index, y_index] = y_index*domain_size_y
+            for y_index in range(domain_subdivisions[1]):
+                for z_index in range(domain_subdivisions[2] + 1):
+                    domain_bounds_z[x_index, y_index, z_index] = z_index*domain_size_z
+        domains_uniform[0] = True
+        for component in components:
+            exchange(component)
+        masterprint('done')
+        return
+    masterprint('Rebalancing domain decomposition ...')
+    # Determine the work associated with each local particle
+    N_local_tot = 0
+    for component in components:
+        N_local_tot += component.N_local
+    weight = 1
+    if allreduce(cost, op=MPI.MAX) > 0:
+        # Processes with no measured cost fall back to a weight of 1
+        if cost > 0 and N_local_tot > 0:
+            weight = cost/N_local_tot
+    # Measure the current imbalance as the maximum work
+    # relative to the mean work.
+    work_local = weight*N_local_tot
+    imbalance_before = allreduce(work_local, op=MPI.MAX)/(
+        allreduce(work_local, op=MPI.SUM)/nprocs + machine_ϵ)
+    # Histogram the weights along x and place the x boundaries
+    hist_x = zeros(domain_histogram_size, dtype=C2np['double'])
+    for component in components:
+        N_local = component.N_local
+        posx = component.posx
+        for i in range(N_local):
+            ℓ = int(posx[i]*ℝ[domain_histogram_size/boxsize])
+            hist_x[pairmin(ℓ, ℤ[domain_histogram_size - 1])] += weight
+    Allreduce(MPI.IN_PLACE, hist_x)
+    bounds_x = empty(domain_subdivisions[0] + 1, dtype=C2np['double'])
+    place_domain_bounds(hist_x, domain_subdivisions[0], bounds_x)
+    # Histogram the weights along y within each x slab
+    # and place the y boundaries.
+    hist_y = zeros((domain_subdivisions[0], domain_histogram_size), dtype=C2np['double'])
+    for component in components:
+        N_local = component.N_local
+        posx = component.posx
+        posy = component.posy
+        for i in range(N_local):
+            x = posx[i]
+            x_index = 0
+            while x_index < ℤ[domain_subdivisions[0] - 1] and x >= bounds_x[x_index + 1]:
+                x_index += 1
+            ℓ = int(posy[i]*ℝ[domain_histogram_size/boxsize])
+            hist_y[x_index, pairmin(ℓ, ℤ[domain_histogram_size - 1])] += weight
+    Allreduce(MPI.IN_PLACE, hist_y)
+    bounds_y = empty((domain_subdivisions[0], domain_subdivisions[1] + 1), dtype=C2np['double'])
+    for x_index in range(domain_subdivisions[0]):
+        place_domain_bounds(hist_y[x_index], domain_subdivisions[1], bounds_y[x_index])
+    # Histogram the weights along z within each column
+    # and place the z boundaries.
+    hist_z = zeros((domain_subdivisions[0], domain_subdivisions[1], domain_histogram_size),
+        dtype=C2np['double'])
+    for component in components:
+        N_local = component.N_local
+        posx = component.posx
+        posy = component.posy
+        posz = component.posz
+        for i in range(N_local):
+            x = posx[i]
+            x_index = 0
+            while x_index < ℤ[domain_subdivisions[0] - 1] and x >= bounds_x[x_index + 1]:
+                x_index += 1
+            y = posy[i]
+            y_index = 0
+            while y_index < ℤ[domain_subdivisions[1] - 1] and y >= bounds_y[x_index, y_index + 1]:
+                y_index += 1
+            ℓ = int(posz[i]*ℝ[domain_histogram_size/boxsize])
+            hist_z[x_index, y_index, pairmin(ℓ, ℤ[domain_histogram_size - 1])] += weight
+    Allreduce(MPI.IN_PLACE, hist_z)
+    bounds_z = empty(
+        (domain_subdivisions[0], domain_subdivisions[1], domain_subdivisions[2] + 1),
+        dtype=C2np['double'],
+    )
+    for x_index in range(domain_subdivisions[0]):
+        for y_index in range(domain_subdivisions[1]):
+            place_domain_bounds(hist_z[x_index, y_index], domain_subdivisions[2],
+                bounds_z[x_index, y_index])
+    # Install the new domain boundaries. As these are stored in arrays,
+    # they are updated in place so that all modules see the change.
+    domain_bounds_x[:] = bounds_x
+    domain_bounds_y[...] = bounds_y
+    domain_bounds_z[...] = bounds_z
+    domains_uniform[0] = False
+    # Measure the predicted imbalance of the new decomposition
+    work = zeros(nprocs, dtype=C2np['double'])
+    for component in components:
+        N_local = component.N_local
+        posx = component.posx
+        posy = component.posy
+        posz = component.posz
+        for i in range(N_local):
+            work[which_domain(posx[i], posy[i], posz[i])] += weight
+    Allreduce(MPI.IN_PLACE, work)
+    imbalance_after = max(work)/(sum(work)/nprocs + machine_ϵ)
+    # Move the particles to their new domains
+    for component in components:
+        exchange(component)
+    masterprint('done')
+    masterprint(
+        f'Load imbalance (max/mean work): {imbalance_before:.3f} before, '
+        f'{imbalance_after:.3f} after rebalancing'
+    )
+
 # This function computes the ranks of the processes governing the
 # domain which is located i domains to the right, j domains forward and
 # k domains up, relative to the local domain.
@@ -602,11 +1099,16 @@ def rank_neighboring_domain(i, j, k):
                component_recv='Component',
                # Locals
                dim='int',
+               i='Py_ssize_t',
                operation=str,
-               mom_dim_recv='double[::1]',
-               mom_dim_send='double[::1]',
-               pos_dim_recv='double[::1]',
-               pos_dim_send='double[::1]',
+               mom_dim='particle_float*',
+               mom_dim_recv=object,  # particle_float[::1]
+               mom_dim_send=object,  # particle_float[::1]
+               pos_dim='particle_float*',
+               pos_dim_recv=object,  # particle_float[::1]
+               pos_dim_send=object,  # particle_float[::1]
+               Δ_dim_recv='double[::1]',
+               Δ_dim_send='double[::1]',
                returns='Component',
                )
 def sendrecv_component(component_send, variables, dest, source, component_recv=None):
@@ -629,7 +1131,6 @@ def sendrecv_component(component_send, variables, dest, source, component_recv=N
     - 'pos' (posx, posy and posz for particles)
     - 'mom' (momx, momy and momz for particles)
     """
-    global component_buffer
     if component_send.representation != 'particles':  # !!! Generalize to fluids also
         abort('The sendrecv_component function is only implemented for particle components')
     # Determine the mode of operation
@@ -643,60 +1144,220 @@ def sendrecv_component(component_send, variables, dest, source, component_recv=N
         # really the local process.
         if dest == rank == source:
             return component_send
-        # We cannot simply import Component from the species module,
-        # as this would create an import loop. Instead, the first time
-        # the component_buffer is needed, we grab the type of the passed
-        # component_send (Component) and instantiate such an instance.
-        if component_buffer is None:
-            component_buffer = type(component_send)('', 'dark matter particles', 1)
-            component_buffer.name = 'buffer'
-        # Adjust important meta data on the buffer component
-        component_buffer.name           = component_send.name
-        component_buffer.species        = component_send.species
-        component_buffer.representation = component_send.representation
-        if component_send.representation == 'particles':
-            component_buffer.N                = component_send.N
-            component_buffer.mass             = component_send.mass
-            component_buffer.softening_length = component_send.softening_length
-        elif component_send.representation == 'fluid':
-            ...
-        # Enlarge the data arrays of the component_buffer if necessary
-        component_buffer.N_local = sendrecv(component_send.N_local, dest=dest, source=source)
-        if component_buffer.N_allocated < component_buffer.N_local:
-            component_buffer.resize(component_buffer.N_local)
-        # Use component_buffer as component_recv
-        component_recv = component_buffer
-    # Do the communication
+        # Use the component buffer as component_recv
+        component_recv = get_component_buffer(
+            component_send, sendrecv(component_send.N_local, dest=dest, source=source),
+        )
+    # Do the communication. The particle data may be stored in single
+    # precision while the Δ buffers are always in double precision.
+    # In communicate mode, the particle data is received directly into
+    # component_recv. When applying buffers, the Δ buffers are received
+    # into a separate buffer and then added to the particle data.
     if 'pos' in variables:
         for dim in range(3):
             with unswitch:
                 if operation == '=':
                     pos_dim_send = component_send.pos_mv[dim][:component_send.N_local]
+                    pos_dim_recv = component_recv.pos_mv[dim][:component_recv.N_local]
+                    smart_mpi(pos_dim_send, pos_dim_recv, dest=dest,
+                                                          source=source,
+                                                          mpifun='Sendrecv',
+                              )
                 else:
-                    pos_dim_send = component_send.Δpos_mv[dim][:component_send.N_local]
-            pos_dim_recv = component_recv.pos_mv[dim][:component_recv.N_local]
-            smart_mpi(pos_dim_send, pos_dim_recv, dest=dest,
-                                                  source=source,
-                                                  mpifun='Sendrecv',
-                                                  operation=operation,
-                      )
+                    Δ_dim_send = component_send.Δpos_mv[dim][:component_send.N_local]
+                    Δ_dim_recv = smart_mpi(Δ_dim_send, dest=dest,
+                                                       source=source,
+                                                       mpifun='Sendrecv',
+                                           )
+                    pos_dim = component_recv.pos[dim]
+                    for i in range(Δ_dim_recv.shape[0]):
+                        pos_dim[i] += Δ_dim_recv[i]
     if 'mom' in variables:
         for dim in range(3):
             with unswitch:
                 if operation == '=':
                     mom_dim_send = component_send.mom_mv[dim][:component_send.N_local]
+                    mom_dim_recv = component_recv.mom_mv[dim][:component_recv.N_local]
+                    smart_mpi(mom_dim_send, mom_dim_recv, dest=dest,
+                                                          source=source,
+                                                          mpifun='Sendrecv',
+                              )
                 else:
-                    mom_dim_send = component_send.Δmom_mv[dim][:component_send.N_local]
-            mom_dim_recv = component_recv.mom_mv[dim][:component_recv.N_local]
-            smart_mpi(mom_dim_send, mom_dim_recv, dest=dest,
-                                                  source=source,
-                                                  mpifun='Sendrecv',
-                                                  operation=operation,
-                      )
+                    Δ_dim_send = component_send.Δmom_mv[dim][:component_send.N_local]
+                    Δ_dim_recv = smart_mpi(Δ_dim_send, dest=dest,
+                                                       source=source,
+                                                       mpifun='Sendrecv',
+                                           )
+                    mom_dim = component_recv.mom[dim]
+                    for i in range(Δ_dim_recv.shape[0]):
+                        mom_dim[i] += Δ_dim_recv[i]
     return component_recv
-# Declare the buffer component used by sendrecv_component
-cython.declare(component_buffer='Component')
-component_buffer = None
+
+# Function returning a buffer component with the meta data of the
+# given component and room for N_local particles. Several buffer
+# components are available, distinguished by buffer_name.
+@cython.header(# Arguments
+               component='Component',
+               N_local='Py_ssize_t',
+               buffer_name=object,  # Any hashable object
+               # Locals
+               component_buffer='Component',
+               returns='Component',
+               )
+def get_component_buffer(component, N_local, buffer_name=0):
+    # We cannot simply import Component from the species module,
+    # as this would create an import loop. Instead, the first time
+    # a component buffer is needed, we grab the type of the passed
+    # component (Component) and instantiate such an instance.
+    component_buffer = component_buffers.get(buffer_name)
+    if component_buffer is None:
+        component_buffer = type(component)('', 'dark matter particles', 1)
+        component_buffers[buffer_name] = component_buffer
+    # Adjust important meta data on the buffer component
+    component_buffer.name           = component.name
+    component_buffer.species        = component.species
+    component_buffer.representation = component.representation
+    if component.representation == 'particles':
+        component_buffer.N                = component.N
+        component_buffer.mass             = component.mass
+        component_buffer.softening_length = component.softening_length
+    elif component.representation == 'fluid':
+        ...
+    # Enlarge the data arrays of the component buffer if necessary
+    component_buffer.N_local = N_local
+    component_buffer.grow(N_local)
+    return component_buffer
+# Declare the buffer components used by get_component_buffer
+cython.declare(component_buffers=dict)
+component_buffers = {}
+
+# Function which communicates local component data without blocking
+@cython.header(# Arguments
+               component_send='Component',
+               variables=list,  # list of str's
+               dest='int',
+               source='int',
+               N_recv='Py_ssize_t',
+               buffer_name=object,  # Any hashable object
+               # Locals
+               component_recv='Component',
+               data_recv=list,
+               data_send=list,
+               dim='int',
+               requests=list,
+               variable=str,
+               returns=tuple,
+               )
+def isendrecv_component(component_send, variables, dest, source, N_recv, buffer_name=0):
+    """This is the non-blocking counterpart to sendrecv_component in
+    communicate mode. The data of component_send is sent to dest, while
+    data from source is received into the component buffer with the
+    given buffer_name. As the amount of incoming data is not
+    communicated, this must be passed as N_recv.
+    Returned are the buffer component and a list of MPI requests.
+    The received data must not be used, nor may the sent data be
+    altered, before all of these requests are completed
+    (e.g. using Waitall).
+    """
+    if component_send.representation != 'particles':  # !!! Generalize to fluids also
+        abort('The isendrecv_component function is only implemented for particle components')
+    # No communication is needed if the destination and source is
+    # really the local process.
+    if dest == rank == source:
+        return component_send, []
+    component_recv = get_component_buffer(component_send, N_recv, buffer_name)
+    # Post all receives and sends. No message is posted for empty data,
+    # which the communicating processes agree upon.
+    requests = []
+    for variable in variables:
+        if variable == 'pos':
+            data_send = component_send.pos_mv
+            data_recv = component_recv.pos_mv
+        elif variable == 'mom':
+            data_send = component_send.mom_mv
+            data_recv = component_recv.mom_mv
+        else:
+            abort(f'isendrecv_component does not know the variable "{variable}"')
+        for dim in range(3):
+            if N_recv > 0:
+                requests.append(Irecv(data_recv[dim][:N_recv], source=source,
+                                                               tag=dependent_tag))
+            if component_send.N_local > 0:
+                requests.append(Isend(data_send[dim][:component_send.N_local], dest=dest,
+                                                                               tag=dependent_tag))
+    return component_recv, requests
+
+# Function which communicates the Δ buffers of
+# a component without blocking.
+@cython.header(# Arguments
+               component_send='Component',
+               variables=list,  # list of str's
+               dest='int',
+               source='int',
+               N_recv='Py_ssize_t',
+               # Locals
+               data_send=list,
+               dim='int',
+               requests=list,
+               variable=str,
+               returns=list,
+               )
+def isendrecv_Δ(component_send, variables, dest, source, N_recv):
+    """The Δ buffers of component_send are sent to dest, while Δ
+    buffers from source are received into global buffers. Once all of
+    the returned MPI requests are completed, the received Δ buffers
+    can be applied to the local component using add_received_Δ.
+    Until then, the Δ buffers of component_send must not be altered,
+    and this function must not be called again.
+    """
+    requests = []
+    for variable in variables:
+        if variable == 'pos':
+            data_send = component_send.Δpos_mv
+        elif variable == 'mom':
+            data_send = component_send.Δmom_mv
+        else:
+            abort(f'isendrecv_Δ does not know the variable "{variable}"')
+        for dim in range(3):
+            if N_recv > 0:
+                requests.append(Irecv(get_buffer(N_recv, ('Δ', variable, dim)), source=source,
+                                                                                tag=Δ_tag))
+            if component_send.N_local > 0:
+                requests.append(Isend(data_send[dim][:component_send.N_local], dest=dest,
+                                                                               tag=Δ_tag))
+    return requests
+
+# Function which adds the Δ buffers received by isendrecv_Δ
+# to the data of the given component.
+@cython.header(# Arguments
+               component='Component',
+               variables=list,  # list of str's
+               N_recv='Py_ssize_t',
+               # Locals
+               data='particle_float*',
+               dim='int',
+               i='Py_ssize_t',
+               variable=str,
+               Δ_dim='double[::1]',
+               returns='void',
+               )
+def add_received_Δ(component, variables, N_recv):
+    if N_recv == 0:
+        return
+    for variable in variables:
+        for dim in range(3):
+            if variable == 'pos':
+                data = component.pos[dim]
+            else:
+                data = component.mom[dim]
+            Δ_dim = get_buffer(N_recv, ('Δ', variable, dim))
+            for i in range(N_recv):
+                data[i] += Δ_dim[i]
+# Tags used for the non-blocking communication of component data
+# and Δ buffers, keeping these two kinds of messages apart.
+cython.declare(dependent_tag='int', Δ_tag='int')
+dependent_tag = 1
+Δ_tag = 2
 
 # Very general function for different MPI communications
 @cython.pheader(# Arguments
@@ -1052,6 +1713,7 @@ def smart_mpi(block_send=(), block_recv=(), dest=-1, source=-1, root=master_rank
                 shape=tuple,
                 size='Py_ssize_t',
                 size_given='bint',
+                stats=list,
                 returns=object,  # multi-dimensional array of doubles
                 )
 def get_buffer(size_or_shape=-1, buffer_name=0, nullify=False):
@@ -1065,8 +1727,12 @@ def get_buffer(size_or_shape=-1, buffer_name=0, nullify=False):
     A buffer with the given name does not have to exist beforehand.
     A given buffer will be reallocated (enlarged) if necessary.
     If nullify is True, all elements of the buffer will be set to 0.
+    The memory of buffers not requested for a while may be released
+    by release_buffers, after which the buffer will be reallocated
+    upon the next request. As with enlargements, previously returned
+    arrays over a buffer must thus not be used across time steps.
     """
-    global buffers
+    global buffers, buffers_size, buffers_size_peak
     # Get shape and size from argument
     if size_or_shape == -1:
         size_given = False
@@ -1080,18 +1746,15 @@ def get_buffer(size_or_shape=-1, buffer_name=0, nullify=False):
         size = 1
         shape = (1, )
     # Fetch or create the buffer
-    if buffer_name in buffers_mv:
+    index = buffer_indices.get(buffer_name, -1)
+    if index != -1:
         # This buffer already exists
-        index = 0
-        for key in buffers_mv:
-            if key == buffer_name:
-                break
-            index += 1
         buffer = buffers[index]
         buffer_mv = buffers_mv[buffer_name]
         if size > buffer_mv.shape[0]:
             # Enlarge this buffer
             resize_buffer(size, buffer_name)
+            buffer_stats[buffer_name][2] += 1
             buffer = buffers[index]
             buffer_mv = buffers_mv[buffer_name]
         elif not size_given:
@@ -1106,6 +1769,16 @@ def get_buffer(size_or_shape=-1, buffer_name=0, nullify=False):
         buffers[N_buffers - 1] = buffer
         buffer_mv = cast(buffer, 'double[:size]')
         buffers_mv[buffer_name] = buffer_mv
+        buffer_indices[buffer_name] = N_buffers - 1
+        buffer_stats[buffer_name] = [0, 0, 0, 0]
+        buffers_size += size
+        buffers_size_peak = pairmax(buffers_size_peak, buffers_size)
+    # Record the usage of this buffer
+    stats = buffer_stats[buffer_name]
+    stats[0] += 1
+    if size > stats[1]:
+        stats[1] = size
+    stats[3] = buffer_step
     # Nullify the buffer, if required
     if nullify:
         for i in range(size):
@@ -1122,22 +1795,104 @@ def get_buffer(size_or_shape=-1, buffer_name=0, nullify=False):
                index='Py_ssize_t',
                )
 def resize_buffer(size, buffer_name):
-    if buffer_name not in buffers_mv:
+    global buffers_size, buffers_size_peak
+    index = buffer_indices.get(buffer_name, -1)
+    if index == -1:
         abort('Cannot resize buffer "{}" as it does not exist'.format(buffer_name))
-    index = 0
-    for key in buffers_mv:
-        if key == buffer_name:
-            break
-        index += 1
+    buffers_size += size - buffers_mv[buffer_name].shape[0]
+    buffers_size_peak = pairmax(buffers_size_peak, buffers_size)
     buffer = buffers[index]
     buffer = realloc(buffer, size*sizeof('double'))
     buffers[index] = buffer
     buffer_mv = cast(buffer, 'double[:size]')
     buffers_mv[buffer_name] = buffer_mv
-# Initialize buffers
+# Function returning the number of elements currently allocated
+# for the buffer with the given name, or 0 if no such buffer exists.
+# As buffers may be released by release_buffers, this can be used to
+# check whether a buffer still holds the data previously stored in it.
+@cython.header(# Arguments
+               buffer_name=object,  # Any hashable object
+               returns='Py_ssize_t',
+               )
+def get_buffer_size(buffer_name):
+    if buffer_name not in buffers_mv:
+        return 0
+    return buffers_mv[buffer_name].shape[0]
+
+# Function which should be called once per time step. Buffers which
+# have not been requested for buffer_release_period calls will have
+# their memory released (shrunk to a single element).
+@cython.header(# Locals
+               buffer_name=object,  # Any hashable object
+               stats=list,
+               returns='void',
+               )
+def release_buffers():
+    global buffer_step
+    buffer_step += 1
+    if buffer_release_period == 0:
+        return
+    for buffer_name, stats in buffer_stats.items():
+        if buffer_step - stats[3] < buffer_release_period:
+            continue
+        if buffers_mv[buffer_name].shape[0] == 1:
+            continue
+        resize_buffer(1, buffer_name)
+# Function which prints out the current and peak memory allocated for
+# buffers on each process, as well as statistics about the largest
+# buffers on the master process.
+@cython.pheader(# Arguments
+                N_largest='int',
+                # Locals
+                buffer_name=object,  # Any hashable object
+                buffer_names=list,
+                bytes_per_element='Py_ssize_t',
+                index='Py_ssize_t',
+                memory_info=tuple,
+                memory_infos=list,
+                order=object,  # np.ndarray
+                other_rank='int',
+                stats=list,
+                )
+def report_buffer_memory(N_largest=5):
+    bytes_per_element = np.dtype(C2np['double']).itemsize
+    memory_infos = gather((buffers_size, buffers_size_peak, len(buffers_mv)))
+    if not master:
+        return
+    masterprint('Buffer memory (current, peak, buffers):')
+    for other_rank, memory_info in enumerate(memory_infos):
+        masterprint(
+            f'    Process {other_rank}: '
+            f'{significant_figures(memory_info[0]*bytes_per_element/2**20, 4, fmt="unicode")} MB, '
+            f'{significant_figures(memory_info[1]*bytes_per_element/2**20, 4, fmt="unicode")} MB, '
+            f'{memory_info[2]}'
+        )
+    # List the buffers with the largest requested sizes
+    buffer_names = list(buffer_stats)
+    order = np.argsort([buffer_stats[buffer_name][1] for buffer_name in buffer_names])[::-1]
+    masterprint('Largest buffers on the master process (peak size, requests, enlargements):')
+    for index in order[:N_largest]:
+        buffer_name = buffer_names[index]
+        stats = buffer_stats[buffer_name]
+        masterprint(
+            f'    {buffer_name!r}: '
+            f'{significant_figures(stats[1]*bytes_per_element/2**20, 4, fmt="unicode")} MB, '
+            f'{stats[0]}, {stats[2]}'
+        )
+# Initialize buffers. Besides the buffers themselves, the index of each
+# buffer into buffers is stored in buffer_indices. For each buffer,
+# buffer_stats stores the number of requests, the largest requested
+# size, the number of enlargements and the buffer_step at which the
+# buffer was last requested. The total number of elements currently
+# allocated for buffers and the peak value hereof are stored as well.
 cython.declare(buffers='double**',
                buffer='double*',
+               buffer_indices=dict,
                buffer_mv='double[::1]',
+               buffer_stats=dict,
+               buffer_step='Py_ssize_t',
+               buffers_size='Py_ssize_t',
+               buffers_size_peak='Py_ssize_t',
                buffers_mv=object,  # OrderedDict
                )
 buffers = malloc(1*sizeof('double*'))
@@ -1146,6 +1901,11 @@ buffers[0] = buffer
 buffer_mv = cast(buffer, 'double[:1]')
 buffers_mv = collections.OrderedDict()
 buffers_mv[0] = buffer_mv
+buffer_indices = {0: 0}
+buffer_stats = {0: [0, 1, 0, 0]}
+buffer_step = 0
+buffers_size = 1
+buffers_size_peak = buffers_size
 
 # Cutout domains at import time
 cython.declare(domain_subdivisions='int[::1]',
@@ -1186,6 +1946,40 @@ domain_end_x = domain_start_x + domain_size_x
 domain_end_y = domain_start_x + domain_size_x
 domain_end_z = domain_start_x + domain_size_x
 
+# The boundaries of all domains. Initially these describe the uniform
+# domains above, though the particle domains (those used by
+# which_domain) may later be adjusted by rebalance_domains. The
+# domain_start_*, domain_end_* and domain_size_* variables above always
+# describe the uniform domains, as used by all mesh-based methods.
+# The x boundaries are shared by all domains, the y boundaries are
+# specific to each x slab and the z boundaries are specific to each
+# column. All are mutated in place only.
+cython.declare(domain_bounds_x='double[::1]',
+               domain_bounds_y='double[:, ::1]',
+               domain_bounds_z='double[:, :, ::1]',
+               domain_histogram_size='Py_ssize_t',
+               domains_uniform='int[::1]',
+               )
+domain_bounds_x = asarray(
+    [x_index*domain_size_x for x_index in range(domain_subdivisions[0] + 1)],
+    dtype=C2np['double'],
+)
+domain_bounds_y = asarray(
+    [[y_index*domain_size_y for y_index in range(domain_subdivisions[1] + 1)]
+        for x_index in range(domain_subdivisions[0])],
+    dtype=C2np['double'],
+)
+domain_bounds_z = asarray(
+    [[[z_index*domain_size_z for z_index in range(domain_subdivisions[2] + 1)]
+        for y_index in range(domain_subdivisions[1])]
+        for x_index in range(domain_subdivisions[0])],
+    dtype=C2np['double'],
+)
+# Flag specifying whether the domains are currently uniform
+domains_uniform = ones(1, dtype=C2np['int'])
+# Number of bins used for the histograms when rebalancing the domains
+domain_histogram_size = pairmax(1024, 4*nprocs)
+
 # Initialize variables used in the exchange function
 cython.declare(N_send='Py_ssize_t[::1]',
                indices_send='Py_ssize_t**',
@@ -1201,3 +1995,9 @@ for j in range(nprocs):
     indices_send[j] = malloc(1*sizeof('Py_ssize_t'))
 # The size of the allocated indices_send[:] memory
 indices_send_sizes = ones(nprocs, dtype=C2np['Py_ssize_t'])
+# Pointers to the particle data fields (posx, posy, posz, momx, momy,
+# momz) of the component being exchanged.
+cython.declare(exchange_fields='particle_float**', particle_float_typecode=str)
+exchange_fields = malloc(6*sizeof('particle_float*'))
+# The MPI type code of the particle data
+particle_float_typecode = np.dtype(C2np['particle_float']).char
@@ -26,6 +26,7 @@ from commons import *
 
 # Cython imports
 cimport('from mesh import CIC_vectorgrid2coordinates, tabulate_vectorfield')
+cimport('from mesh import lagrange_weights, tricubic_vectorgrid2coordinates')
 
 
 
@@ -127,10 +128,6 @@ def summation(x, y, z):
                # Locals
                dim='int',
                force='double*',
-               grid='double[:, :, :, ::1]',
-               isnegative_x='bint',
-               isnegative_y='bint',
-               isnegative_z='bint',
                returns='double*',
                )
 def ewald(x, y, z):
@@ -144,7 +141,39 @@ def ewald(x, y, z):
     arising on the first particle due to all periodic images of the
     second particle, except for the nearest one.
     """
-    grid = get_grid()
+    ewald_lookup(get_grid(), x, y, z, ewald_forces, 0)
+    force = vector
+    for dim in range(3):
+        force[dim] = ewald_forces[0, dim]
+    return force
+# Buffer used for storing the Ewald corrections, with a separate row
+# for each thread.
+cython.declare(ewald_forces='double[:, ::1]')
+ewald_forces = empty((num_threads, 3), dtype=C2np['double'])
+
+# Function doing the actual look up of the Ewald correction
+@cython.nogil
+@cython.header(# Arguments
+               grid='double[:, :, :, ::1]',
+               x='double',
+               y='double',
+               z='double',
+               forces='double[:, ::1]',
+               thread='int',
+               # Locals
+               dim='int',
+               isnegative_x='bint',
+               isnegative_y='bint',
+               isnegative_z='bint',
+               returns='void',
+               )
+def ewald_lookup(grid, x, y, z, forces, thread):
+    """This function does the same as ewald(), but requires the Ewald
+    grid (as returned by get_grid()) to be passed and stores the
+    correction in forces[thread, :]. It does not need the GIL and can
+    thus be called from within a parallel (prange) loop, as long as
+    each thread uses its own row of forces.
+    """
     # Only the positive octant of the box is tabulated. Flip the sign of
     # the coordinates so that they reside inside this octant.
     if x > 0:
@@ -162,29 +191,170 @@ def ewald(x, y, z):
     else:
         z *= -1
         isnegative_z = True
-    # Look up Ewald force and do a CIC interpolation. Since the
-    # coordinates are to the nearest image, they must be scaled by
-    # 2/boxsize to reside in the range 0 <= x, y, z < 1.
-    force = CIC_vectorgrid2coordinates(grid, x*ℝ[2/boxsize],
-                                             y*ℝ[2/boxsize],
-                                             z*ℝ[2/boxsize],
-                                       )
+    # Look up Ewald force and do a CIC or tricubic interpolation.
+    # Since the coordinates are to the nearest image, they must be
+    # scaled by 2/boxsize to reside in the range 0 <= x, y, z < 1.
+    if ewald_interp_order == 1:
+        CIC_vectorgrid2coordinates(grid, x*ℝ[2/boxsize],
+                                         y*ℝ[2/boxsize],
+                                         z*ℝ[2/boxsize],
+                                   forces, thread)
+    else:
+        tricubic_vectorgrid2coordinates(grid, x*ℝ[2/boxsize],
+                                              y*ℝ[2/boxsize],
+                                              z*ℝ[2/boxsize],
+                                        forces, thread)
     # Put the sign back in for negative input
     if isnegative_x:
-        force[0] *= -1
+        forces[thread, 0] *= -1
     if isnegative_y:
-        force[1] *= -1
+        forces[thread, 1] *= -1
     if isnegative_z:
-        force[2] *= -1
+        forces[thread, 2] *= -1
     # The tabulated force is for a unit box. Do rescaling
     for dim in range(3):
-        force[dim] *= ℝ[1/boxsize**2]
-    return force
+        forces[thread, dim] *= ℝ[1/(boxsize*boxsize)]
+
+# Function computing the Ewald corrections for a whole block of
+# separation vectors (x[thread, i], y[thread, i], z[thread, i]), i < n,
+# storing the corrections in forcex[thread, i], forcey[thread, i]
+# and forcez[thread, i].
+@cython.nogil
+@cython.header(# Arguments
+               grid='double[:, :, :, ::1]',
+               x='double[:, ::1]',
+               y='double[:, ::1]',
+               z='double[:, ::1]',
+               forcex='double[:, ::1]',
+               forcey='double[:, ::1]',
+               forcez='double[:, ::1]',
+               n='Py_ssize_t',
+               thread='int',
+               # Locals
+               W='double',
+               Wx='double',
+               Wxy='double',
+               a='int',
+               b='int',
+               c='int',
+               forcex_i='double',
+               forcey_i='double',
+               forcez_i='double',
+               i='Py_ssize_t',
+               n_points='int',
+               scale='double',
+               sign_x='double',
+               sign_y='double',
+               sign_z='double',
+               x_i='double',
+               x_lower='Py_ssize_t',
+               y_i='double',
+               y_lower='Py_ssize_t',
+               z_i='double',
+               z_lower='Py_ssize_t',
+               returns='void',
+               )
+def ewald_lookup_block(grid, x, y, z, forcex, forcey, forcez, n, thread):
+    """This function is equivalent to calling ewald_lookup() on each of
+    the n separation vectors in turn, but carries out the lookups of
+    the entire block in a single loop, with the octant folding, the
+    interpolation and the rescaling all done in place for each
+    separation. The same requirements on the coordinates as for
+    ewald() apply. The function may be called from within a parallel
+    (prange) loop, as long as each thread uses its own rows of the
+    separation and correction buffers.
+    """
+    # The number of grid points along each dimension used for the
+    # interpolation and the factor scaling the normalized coordinates
+    # to grid units. For tricubic interpolation, the grid is padded
+    # with ghost points at both ends.
+    if ewald_interp_order == 1:
+        n_points = 2
+        scale = grid.shape[0] - 1
+    else:
+        n_points = 4
+        scale = grid.shape[0] - 3
+    for i in range(n):
+        # Only the positive octant of the box is tabulated. Flip the
+        # sign of the coordinates so that they reside inside this
+        # octant, remembering the signs for the corrections.
+        x_i = x[thread, i]
+        y_i = y[thread, i]
+        z_i = z[thread, i]
+        sign_x = 1
+        sign_y = 1
+        sign_z = 1
+        if x_i < 0:
+            x_i = -x_i
+            sign_x = -1
+        if y_i < 0:
+            y_i = -y_i
+            sign_y = -1
+        if z_i < 0:
+            z_i = -z_i
+            sign_z = -1
+        # Since the coordinates are to the nearest image, they are
+        # scaled by 2/boxsize to reside in the range 0 <= x, y, z < 1.
+        # Inputs slightly larger than 1 due to numerical errors are
+        # corrected to 1 - ϵ.
+        x_i = x_i*ℝ[2/boxsize]
+        y_i = y_i*ℝ[2/boxsize]
+        z_i = z_i*ℝ[2/boxsize]
+        if x_i >= 1:
+            x_i = ℝ[1 - machine_ϵ]
+        if y_i >= 1:
+            y_i = ℝ[1 - machine_ϵ]
+        if z_i >= 1:
+            z_i = ℝ[1 - machine_ϵ]
+        x_i = x_i*scale
+        y_i = y_i*scale
+        z_i = z_i*scale
+        x_lower = int(x_i)
+        y_lower = int(y_i)
+        z_lower = int(z_i)
+        # The interpolation weights along each dimension.
+        # Due to the ghost layer of the tricubic grid, the 4 points
+        # used for the interpolation start at the lower indices in
+        # both cases.
+        with unswitch:
+            if ewald_interp_order == 1:
+                ewald_block_weights[thread, 0, 1] = x_i - x_lower
+                ewald_block_weights[thread, 1, 1] = y_i - y_lower
+                ewald_block_weights[thread, 2, 1] = z_i - z_lower
+                ewald_block_weights[thread, 0, 0] = 1 - ewald_block_weights[thread, 0, 1]
+                ewald_block_weights[thread, 1, 0] = 1 - ewald_block_weights[thread, 1, 1]
+                ewald_block_weights[thread, 2, 0] = 1 - ewald_block_weights[thread, 2, 1]
+            else:
+                lagrange_weights(x_i - x_lower, ewald_block_weights, thread, 0)
+                lagrange_weights(y_i - y_lower, ewald_block_weights, thread, 1)
+                lagrange_weights(z_i - z_lower, ewald_block_weights, thread, 2)
+        # Interpolate the tabulated correction
+        forcex_i = 0
+        forcey_i = 0
+        forcez_i = 0
+        for a in range(n_points):
+            Wx = ewald_block_weights[thread, 0, a]
+            for b in range(n_points):
+                Wxy = Wx*ewald_block_weights[thread, 1, b]
+                for c in range(n_points):
+                    W = Wxy*ewald_block_weights[thread, 2, c]
+                    forcex_i = forcex_i + grid[x_lower + a, y_lower + b, z_lower + c, 0]*W
+                    forcey_i = forcey_i + grid[x_lower + a, y_lower + b, z_lower + c, 1]*W
+                    forcez_i = forcez_i + grid[x_lower + a, y_lower + b, z_lower + c, 2]*W
+        # Put the signs back in and rescale from the unit box
+        forcex[thread, i] = forcex_i*sign_x*ℝ[1/(boxsize*boxsize)]
+        forcey[thread, i] = forcey_i*sign_y*ℝ[1/(boxsize*boxsize)]
+        forcez[thread, i] = forcez_i*sign_z*ℝ[1/(boxsize*boxsize)]
+# Buffer for the interpolation weights used by the above function,
+# with separate weights for each thread and dimension.
+cython.declare(ewald_block_weights='double[:, :, ::1]')
+ewald_block_weights = empty((num_threads, 3, 4), dtype=C2np['double'])
 
 # Function for loading the Ewald grid from disk.
 # The result is stored as the global variable 'grid',
 # which will be fetched when called repeatedly.
 @cython.header(found_on_disk='bint',
+               grid_padded=object,  # np.ndarray
                shape=tuple,
                returns='double[:, :, :, ::1]',
                )
@@ -194,8 +364,9 @@ def get_grid():
     if grid.shape[0] != 1:
         return grid
     # Let the master process read in the Ewald grid from disk,
-    # if it exists.
-    shape = (ewald_gridsize, )*3 + (3, )
+    # if it exists. For tricubic interpolation, an additional
+    # grid point is needed beyond the upper end.
+    shape = (ewald_gridsize + (ewald_interp_order == 3), )*3 + (3, )
     found_on_disk = False
     if master:
         if os.path.isfile(filename):
@@ -214,17 +385,36 @@ def get_grid():
         # No tabulated Ewald grid found. Compute it. The factor 0.5
         # ensures that only the first octant of the box is tabulated.
         grid = tabulate()
+    # For tricubic interpolation, pad the grid with ghost points
+    # below the origin. As the Ewald correction is odd in each
+    # coordinate, these are obtained by mirroring the grid, flipping
+    # the sign of the vector component along the mirrored dimension.
+    if ewald_interp_order == 3:
+        grid_padded = np.empty((ewald_gridsize + 2, )*3 + (3, ), dtype=C2np['double'])
+        grid_padded[1:, 1:, 1:, :] = grid
+        grid_padded[0, :, :, :] = grid_padded[2, :, :, :]
+        grid_padded[0, :, :, 0] *= -1
+        grid_padded[:, 0, :, :] = grid_padded[:, 2, :, :]
+        grid_padded[:, 0, :, 1] *= -1
+        grid_padded[:, :, 0, :] = grid_padded[:, :, 2, :]
+        grid_padded[:, :, 0, 2] *= -1
+        grid = grid_padded
     return grid
 cython.declare(grid='double[:, :, :, ::1]', filename=str)
 grid = np.empty((1, 1, 1, 1), dtype=C2np['double'])
-filename = f'{paths["reusables_dir"]}/ewald/ewald_gridsize={ewald_gridsize}.hdf5'
+if ewald_interp_order == 1:
+    filename = f'{paths["reusables_dir"]}/ewald/ewald_gridsize={ewald_gridsize}.hdf5'
+else:
+    filename = (f'{paths["reusables_dir"]}/ewald/'
+                f'ewald_gridsize={ewald_gridsize}_order={ewald_interp_order}.hdf5')
 
 # Function for tabulation of the Ewald grid
 @cython.pheader(returns='double[:, :, :, ::1]')
 def tabulate():
     global grid
     masterprint('Tabulating Ewald grid of linear size {} ...'.format(ewald_gridsize))
-    grid = tabulate_vectorfield(ewald_gridsize, summation, 0.5/(ewald_gridsize - 1), filename)
+    grid = tabulate_vectorfield(ewald_gridsize + (ewald_interp_order == 3),
+                                summation, 0.5/(ewald_gridsize - 1), filename)
     masterprint('done')
     return grid
 
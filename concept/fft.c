@@ -30,7 +30,9 @@ https://github.com/jmd-dk/concept/
 /* This file defines the functions fftw_setup and fftw_clean, which
 together with fftw_execute (included in fftw3-mpi.h) constitutes the
 necessary functions for using FFTW to do parallel, real, 3D in-place
-transforms through Cython.
+transforms through Cython. Additionally, the functions fftw_plan_1d
+and fftw_execute_1d are defined, used for carrying out the local,
+multithreaded 1D transforms of pencil decomposed grids.
 */
 
 /* Note on indexing.
@@ -76,6 +78,24 @@ struct fftw_return_struct{
     fftw_plan plan_forward;
     fftw_plan plan_backward;
 };
+// This function converts an FFTW planning-rigor to the
+// corresponding integer flag.
+int fftw_rigor_flag(char* fftw_wisdom_rigor){
+    int rigor_flag = FFTW_ESTIMATE;
+    if (strcmp(fftw_wisdom_rigor, "estimate") == 0){
+        rigor_flag = FFTW_ESTIMATE;
+    }
+    else if (strcmp(fftw_wisdom_rigor, "measure") == 0){
+        rigor_flag = FFTW_MEASURE;
+    }
+    else if (strcmp(fftw_wisdom_rigor, "patient") == 0){
+        rigor_flag = FFTW_PATIENT;
+    }
+    else if (strcmp(fftw_wisdom_rigor, "exhaustive") == 0){
+        rigor_flag = FFTW_EXHAUSTIVE;
+    }
+    return rigor_flag;
+}
 // This function initializes fftw_mpi, allocates a grid,
 // desides the local lengths and starting indices and
 // creates forwards and backwards plans.
@@ -84,7 +104,8 @@ struct fftw_return_struct fftw_setup(ptrdiff_t gridsize_i,
                                      ptrdiff_t gridsize_k,
                                      char* fftw_wisdom_rigor,
                                      bool fftw_wisdom_reuse,
-                                     char* wisdom_filename){
+                                     char* wisdom_filename,
+                                     int nthreads){
     // Arguments to this function:
     // - Linear gridsize of dimension 1.
     // - Linear gridsize of dimension 2.
@@ -93,6 +114,8 @@ struct fftw_return_struct fftw_setup(ptrdiff_t gridsize_i,
     //   of the wisdom. In order of patience:
     //   "estimate", "measure", "patient", "exhaustive".
     // - Flag specifying whether or not to use pre-existing FFTW wisdom.
+    // - Filename of the wisdom file.
+    // - Number of (OpenMP) threads to use within each process.
 
     // Size of last dimension with padding
     ptrdiff_t gridsize_padding = 2*(gridsize_k/2 + 1);
@@ -101,7 +124,13 @@ struct fftw_return_struct fftw_setup(ptrdiff_t gridsize_i,
     // called, as MPI is already running via MPI4Py).
     // Note that this function may be called multiple times in one MPI
     // session without errors; only the first call will have any effect.
+    // The threads must be initialized before fftw_mpi_init
+    // is called. As for fftw_mpi_init, only the first call to
+    // fftw_init_threads has any effect.
+    fftw_init_threads();
     fftw_mpi_init();
+    // All plans created hereafter will use nthreads threads
+    fftw_plan_with_nthreads(nthreads);
 
     // Process identification
     int rank, nprocs;
@@ -135,19 +164,7 @@ struct fftw_return_struct fftw_setup(ptrdiff_t gridsize_i,
     }
 
     // Convert fftw_wisdom_rigor to integer flag
-    int rigor_flag = FFTW_ESTIMATE;
-    if (strcmp(fftw_wisdom_rigor, "estimate") == 0){
-        rigor_flag = FFTW_ESTIMATE;
-    }
-    else if (strcmp(fftw_wisdom_rigor, "measure") == 0){
-        rigor_flag = FFTW_MEASURE;
-    }
-    else if (strcmp(fftw_wisdom_rigor, "patient") == 0){
-        rigor_flag = FFTW_PATIENT;
-    }
-    else if (strcmp(fftw_wisdom_rigor, "exhaustive") == 0){
-        rigor_flag = FFTW_EXHAUSTIVE;
-    }
+    int rigor_flag = fftw_rigor_flag(fftw_wisdom_rigor);
 
     // Create the two plans
     fftw_plan plan_forward  = fftw_mpi_plan_dft_r2c_3d(gridsize_i,
@@ -182,10 +199,108 @@ struct fftw_return_struct fftw_setup(ptrdiff_t gridsize_i,
     return fftw_struct;
 }
 
+// This function creates a plan for carrying out many local 1D
+// transforms of length n along the middle dimension of a contiguous
+// 3D array of shape (howmany_outer, n, howmany_inner). For real
+// arrays, the real-to-complex ("r2c") and complex-to-real ("c2r")
+// transforms change the length of the middle dimension from n to
+// n/2 + 1 and vice versa, measured in complex numbers. The plan is
+// created on temporary arrays and with the FFTW_UNALIGNED flag,
+// so that any existing data is left untouched and so that the plan
+// may be executed on arbitrary arrays of the given shape through
+// fftw_execute_1d.
+fftw_plan fftw_plan_1d(char* kind,
+                       ptrdiff_t howmany_outer,
+                       ptrdiff_t n,
+                       ptrdiff_t howmany_inner,
+                       bool inplace,
+                       char* fftw_wisdom_rigor,
+                       int nthreads){
+    // Arguments to this function:
+    // - Kind of transform, one of
+    //   "r2c", "c2r", "forward", "backward".
+    // - Number of transforms along the first dimension.
+    // - Length of the transforms.
+    // - Number of transforms along the last dimension.
+    // - Flag specifying whether the transforms are in-place.
+    //   Only complex-to-complex transforms may be in-place.
+    // - FFTW planning-rigor.
+    // - Number of (OpenMP) threads to use within each process.
+
+    // The plan will use nthreads threads
+    fftw_init_threads();
+    fftw_plan_with_nthreads(nthreads);
+
+    // The length of the middle dimension of the input and output
+    // arrays, in units of their respective element types.
+    bool r2c = (strcmp(kind, "r2c") == 0);
+    bool c2r = (strcmp(kind, "c2r") == 0);
+    ptrdiff_t n_in  = (c2r ? n/2 + 1 : n);
+    ptrdiff_t n_out = (r2c ? n/2 + 1 : n);
+
+    // The transform dimension and the two dimensions
+    // over which to loop, given as (size, input stride, output stride).
+    fftw_iodim64 dims[1] = {{n, howmany_inner, howmany_inner}};
+    fftw_iodim64 howmany_dims[2] = {
+        {howmany_outer, n_in*howmany_inner, n_out*howmany_inner},
+        {howmany_inner, 1,                  1                  },
+    };
+
+    // Allocate temporary arrays on which to plan
+    size_t size_in  = howmany_outer*n_in *howmany_inner;
+    size_t size_out = howmany_outer*n_out*howmany_inner;
+    double* in  = (r2c ? fftw_alloc_real(size_in) : (double*) fftw_alloc_complex(size_in));
+    double* out = in;
+    if (!inplace){
+        out = (c2r ? fftw_alloc_real(size_out) : (double*) fftw_alloc_complex(size_out));
+    }
+
+    // Create the plan
+    int flags = fftw_rigor_flag(fftw_wisdom_rigor) | FFTW_UNALIGNED;
+    fftw_plan plan;
+    if (r2c){
+        plan = fftw_plan_guru64_dft_r2c(1, dims, 2, howmany_dims,
+                                        in, (fftw_complex*) out, flags);
+    }
+    else if (c2r){
+        plan = fftw_plan_guru64_dft_c2r(1, dims, 2, howmany_dims,
+                                        (fftw_complex*) in, out, flags);
+    }
+    else{
+        plan = fftw_plan_guru64_dft(1, dims, 2, howmany_dims,
+                                    (fftw_complex*) in, (fftw_complex*) out,
+                                    (strcmp(kind, "forward") == 0 ? FFTW_FORWARD : FFTW_BACKWARD),
+                                    flags);
+    }
+
+    // Cleanup
+    fftw_free(in);
+    if (!inplace){
+        fftw_free(out);
+    }
+    return plan;
+}
+
+// This function executes a plan as created by fftw_plan_1d on the
+// given arrays, which must have the shapes and the in-placeness
+// of those used for the planning.
+void fftw_execute_1d(fftw_plan plan, char* kind, double* in, double* out){
+    if (strcmp(kind, "r2c") == 0){
+        fftw_execute_dft_r2c(plan, in, (fftw_complex*) out);
+    }
+    else if (strcmp(kind, "c2r") == 0){
+        fftw_execute_dft_c2r(plan, (fftw_complex*) in, out);
+    }
+    else{
+        fftw_execute_dft(plan, (fftw_complex*) in, (fftw_complex*) out);
+    }
+}
+
 // Call this function when all FFT work is done
 void fftw_clean(double* grid, fftw_plan plan_forward, fftw_plan plan_backward){
     fftw_free(grid);
     fftw_destroy_plan(plan_forward);
     fftw_destroy_plan(plan_backward);
     fftw_mpi_cleanup();
+    fftw_cleanup_threads();
 }
@@ -24,11 +24,15 @@
 # In the .pyx file, Cython declared variables will also get cimported.
 from commons import *
 
+# OpenMP parallelization
+from cython.parallel import prange, threadid
+
 # Cython imports
 cimport('from communication import communicate_domain')
 cimport('from communication import domain_size_x , domain_size_y , domain_size_z' )
 cimport('from communication import domain_start_x, domain_start_y, domain_start_z')
-cimport('from ewald import ewald')
+cimport('from communication import domain_box, domain_subdivisions, smart_mpi')
+cimport('from ewald import ewald, ewald_lookup_block, get_grid')
 cimport('from mesh import CIC_grid2grid, CIC_scalargrid2coordinates')
 
 
@@ -54,24 +58,21 @@ cimport('from mesh import CIC_grid2grid, CIC_scalargrid2coordinates')
                j_start='Py_ssize_t',
                mass_1='double',
                mass_2='double',
-               momx_1='double*',
-               momx_2='double*',
-               momy_1='double*',
-               momy_2='double*',
-               momz_1='double*',
-               momz_2='double*',
+               momx_1='particle_float*',
+               momx_2='particle_float*',
+               momy_1='particle_float*',
+               momy_2='particle_float*',
+               momz_1='particle_float*',
+               momz_2='particle_float*',
                only_short_range='bint',
                periodic='bint',
-               posx_1='double*',
-               posx_2='double*',
-               posy_1='double*',
-               posy_2='double*',
-               posz_1='double*',
-               posz_2='double*',
-               r='double',
-               r_scaled='double',
+               posx_1='particle_float*',
+               posx_2='particle_float*',
+               posy_1='particle_float*',
+               posy_2='particle_float*',
+               posz_1='particle_float*',
+               posz_2='particle_float*',
                r3='double',
-               shortrange_fac='double',
                softening_1='double',
                softening_2='double',
                x_ji='double',
@@ -94,6 +95,15 @@ def gravity_pairwise(component_1, component_2, rank_2, ᔑdt, local, mutual, ext
     # Extract extra arguments
     only_short_range = extra_args.get('only_short_range', False)
     periodic         = extra_args.get('periodic',         True)
+    # The short-range force only acts between nearby particles,
+    # which are found using cell lists.
+    if only_short_range:
+        gravity_pairwise_shortrange(component_1, component_2, ᔑdt, local, mutual)
+        return
+    # Use the cache-blocked kernel unless it has been switched off
+    if pp_tile_size > 0:
+        gravity_pairwise_tiled(component_1, component_2, ᔑdt, local, mutual, periodic)
+        return
     # Extract variables from the first (the local) component
     N_1 = component_1.N_local
     mass_1 = component_1.mass
@@ -134,33 +144,11 @@ def gravity_pairwise(component_1, component_2, rank_2, ᔑdt, local, mutual, ext
             x_ji = xi - posx_2[j]
             y_ji = yi - posy_2[j]
             z_ji = zi - posz_2[j]
-            # Evaluate the gravitational force in one of three ways:
-            # Just the short range force, the total force with Ewald
-            # corrections or the total force without Ewald corrections.
+            # Evaluate the gravitational force in one of two ways:
+            # The total force with Ewald corrections or the total force
+            # without Ewald corrections.
             with unswitch:
-                if only_short_range:
-                    # Translate coordinates so they
-                    # correspond to the nearest image.
-                    if x_ji > ℝ[0.5*boxsize]:
-                        x_ji -= boxsize
-                    elif x_ji < ℝ[-0.5*boxsize]:
-                        x_ji += boxsize
-                    if y_ji > ℝ[0.5*boxsize]:
-                        y_ji -= boxsize
-                    elif y_ji < ℝ[-0.5*boxsize]:
-                        y_ji += boxsize
-                    if z_ji > ℝ[0.5*boxsize]:
-                        z_ji -= boxsize
-                    elif z_ji < ℝ[-0.5*boxsize]:
-                        z_ji += boxsize
-                    r = sqrt(x_ji**2 + y_ji**2 + z_ji**2 + ℝ[(0.5*(softening_1 + softening_2))**2])
-                    r_scaled = r*ℝ[1/p3m_scale_phys]
-                    shortrange_fac = (  r_scaled*ℝ[1/sqrt(π)]*exp(-0.25*r_scaled**2)
-                                      + erfc(0.5*r_scaled))
-                    forcex_ij = x_ji*ℝ[-shortrange_fac/r**3]
-                    forcey_ij = y_ji*ℝ[-shortrange_fac/r**3]
-                    forcez_ij = z_ji*ℝ[-shortrange_fac/r**3]
-                elif periodic:
+                if periodic:
                     # Translate coordinates so they
                     # correspond to the nearest image.
                     if x_ji > ℝ[0.5*boxsize]:
@@ -220,6 +208,636 @@ def gravity_pairwise(component_1, component_2, rank_2, ᔑdt, local, mutual, ext
                     Δmomy_2[j] -= Δmomy_ij
                     Δmomz_2[j] -= Δmomz_ij
 
+# Function implementing pairwise gravity using a cache-blocked kernel.
+# The particles of component_2 are processed in tiles of pp_tile_size
+# particles, copied into small contiguous buffers. For each particle i
+# of component_1, the force from all particles of the tile is
+# accumulated in local variables and added to momx_1[i] once per tile,
+# while the (opposite) forces on the tile particles are accumulated in
+# the tile buffers and written back once per tile.
+# The loop over particles i is shared between num_threads threads, each
+# of which accumulate the tile forces in their own row of the tile
+# force buffers. These rows are summed up at the end of each tile.
+@cython.header(# Arguments
+               component_1='Component',
+               component_2='Component',
+               ᔑdt=dict,
+               local='bint',
+               mutual='bint',
+               periodic='bint',
+               # Locals
+               N_1='Py_ssize_t',
+               N_2='Py_ssize_t',
+               ewald_grid='double[:, :, :, ::1]',
+               forcex_i='double',
+               forcex_ij='double',
+               forcey_i='double',
+               forcey_ij='double',
+               forcez_i='double',
+               forcez_ij='double',
+               i='Py_ssize_t',
+               i_end='Py_ssize_t',
+               j='Py_ssize_t',
+               jj='Py_ssize_t',
+               jj_start='Py_ssize_t',
+               mass_1='double',
+               mass_2='double',
+               momx_1='particle_float*',
+               momx_2='particle_float*',
+               momy_1='particle_float*',
+               momy_2='particle_float*',
+               momz_1='particle_float*',
+               momz_2='particle_float*',
+               posx_1='particle_float*',
+               posx_2='particle_float*',
+               posy_1='particle_float*',
+               posy_2='particle_float*',
+               posz_1='particle_float*',
+               posz_2='particle_float*',
+               r2='double',
+               r3_inv='double',
+               softening2='double',
+               thread='int',
+               tile_N='Py_ssize_t',
+               tile_start='Py_ssize_t',
+               x_ji='double',
+               xi='double',
+               y_ji='double',
+               yi='double',
+               z_ji='double',
+               zi='double',
+               Δmom_fac='double',
+               Δmomx_2='double*',
+               Δmomy_2='double*',
+               Δmomz_2='double*',
+               returns='void',
+               )
+def gravity_pairwise_tiled(component_1, component_2, ᔑdt, local, mutual, periodic):
+    # Extract variables from the first (the local) component
+    N_1 = component_1.N_local
+    mass_1 = component_1.mass
+    posx_1 = component_1.posx
+    posy_1 = component_1.posy
+    posz_1 = component_1.posz
+    momx_1 = component_1.momx
+    momy_1 = component_1.momy
+    momz_1 = component_1.momz
+    # Extract variables from the second (the external) component
+    N_2 = component_2.N_local
+    mass_2 = component_2.mass
+    posx_2 = component_2.posx
+    posy_2 = component_2.posy
+    posz_2 = component_2.posz
+    momx_2 = component_2.momx
+    momy_2 = component_2.momy
+    momz_2 = component_2.momz
+    Δmomx_2 = component_2.Δmomx
+    Δmomy_2 = component_2.Δmomy
+    Δmomz_2 = component_2.Δmomz
+    softening2 = (0.5*(component_1.softening_length + component_2.softening_length))**2
+    # Factor converting forces to momentum changes
+    Δmom_fac = G_Newton*mass_1*mass_2*ᔑdt['a**(-1)']
+    # The Ewald grid needs to be fetched before entering the parallel
+    # region, as this may require the GIL.
+    if periodic:
+        ewald_grid = get_grid()
+    # Loop over tiles of component_2
+    for tile_start in range(0, N_2, pp_tile_size):
+        tile_N = N_2 - tile_start
+        if tile_N > pp_tile_size:
+            tile_N = pp_tile_size
+        # Copy the positions of the tile particles into the
+        # contiguous tile buffers and nullify the tile forces
+        # of all threads.
+        for jj in range(tile_N):
+            j = tile_start + jj
+            tile_posx[jj] = posx_2[j]
+            tile_posy[jj] = posy_2[j]
+            tile_posz[jj] = posz_2[j]
+            for thread in range(num_threads):
+                tile_forcex[thread, jj] = 0
+                tile_forcey[thread, jj] = 0
+                tile_forcez[thread, jj] = 0
+        # If the interaction is completely local, only pairs with
+        # j > i should be considered, so only particles i preceding
+        # the last particle of the tile take part.
+        with unswitch:
+            if local:
+                i_end = tile_start + tile_N - 1
+            else:
+                i_end = N_1
+        # Note that in-place operators on variables are avoided
+        # within this parallel loop, as Cython would otherwise
+        # treat these variables as reduction variables. Likewise,
+        # integer powers are written out as products, as the
+        # temporary variables introduced by pyxpp for these are not
+        # typed in the first pass of Cython, which then needs the GIL.
+        for i in prange(i_end, nogil=True, num_threads=num_threads, schedule='guided'):
+            thread = threadid()
+            xi = posx_1[i]
+            yi = posy_1[i]
+            zi = posz_1[i]
+            with unswitch:
+                if local:
+                    jj_start = i + 1 - tile_start
+                    if jj_start < 0:
+                        jj_start = 0
+                else:
+                    jj_start = 0
+            # For periodic interactions, compute the nearest-image
+            # separations to all particles in the tile, followed by a
+            # block lookup of the Ewald corrections of the entire tile.
+            with unswitch:
+                if periodic:
+                    for jj in range(jj_start, tile_N):
+                        x_ji = xi - tile_posx[jj]
+                        y_ji = yi - tile_posy[jj]
+                        z_ji = zi - tile_posz[jj]
+                        if x_ji > ℝ[0.5*boxsize]:
+                            x_ji = x_ji - boxsize
+                        elif x_ji < ℝ[-0.5*boxsize]:
+                            x_ji = x_ji + boxsize
+                        if y_ji > ℝ[0.5*boxsize]:
+                            y_ji = y_ji - boxsize
+                        elif y_ji < ℝ[-0.5*boxsize]:
+                            y_ji = y_ji + boxsize
+                        if z_ji > ℝ[0.5*boxsize]:
+                            z_ji = z_ji - boxsize
+                        elif z_ji < ℝ[-0.5*boxsize]:
+                            z_ji = z_ji + boxsize
+                        tile_x[thread, jj - jj_start] = x_ji
+                        tile_y[thread, jj - jj_start] = y_ji
+                        tile_z[thread, jj - jj_start] = z_ji
+                    ewald_lookup_block(ewald_grid, tile_x, tile_y, tile_z,
+                        tile_ewaldx, tile_ewaldy, tile_ewaldz, tile_N - jj_start, thread)
+            forcex_i = 0
+            forcey_i = 0
+            forcez_i = 0
+            for jj in range(jj_start, tile_N):
+                # Evaluate the gravitational force in one of two ways:
+                # The total force with Ewald corrections or the total
+                # force without Ewald corrections.
+                with unswitch:
+                    if periodic:
+                        # The force from the particle's nearest image
+                        # together with the Ewald correction force
+                        # for all other images.
+                        x_ji = tile_x[thread, jj - jj_start]
+                        y_ji = tile_y[thread, jj - jj_start]
+                        z_ji = tile_z[thread, jj - jj_start]
+                        r2 = x_ji*x_ji + y_ji*y_ji + z_ji*z_ji + softening2
+                        r3_inv = 1/(r2*sqrt(r2))
+                        forcex_ij = tile_ewaldx[thread, jj - jj_start] - x_ji*r3_inv
+                        forcey_ij = tile_ewaldy[thread, jj - jj_start] - y_ji*r3_inv
+                        forcez_ij = tile_ewaldz[thread, jj - jj_start] - z_ji*r3_inv
+                    else:
+                        # The force from the actual particle,
+                        # without periodic images.
+                        x_ji = xi - tile_posx[jj]
+                        y_ji = yi - tile_posy[jj]
+                        z_ji = zi - tile_posz[jj]
+                        r2 = x_ji*x_ji + y_ji*y_ji + z_ji*z_ji + softening2
+                        r3_inv = 1/(r2*sqrt(r2))
+                        forcex_ij = -x_ji*r3_inv
+                        forcey_ij = -y_ji*r3_inv
+                        forcez_ij = -z_ji*r3_inv
+                # Accumulate the force on particle i
+                # and the opposite force on particle j.
+                forcex_i = forcex_i + forcex_ij
+                forcey_i = forcey_i + forcey_ij
+                forcez_i = forcez_i + forcez_ij
+                tile_forcex[thread, jj] -= forcex_ij
+                tile_forcey[thread, jj] -= forcey_ij
+                tile_forcez[thread, jj] -= forcez_ij
+            # Apply momentum change to particle i of component_1
+            # (the local component).
+            momx_1[i] += forcex_i*Δmom_fac
+            momy_1[i] += forcey_i*Δmom_fac
+            momz_1[i] += forcez_i*Δmom_fac
+        # Sum up the tile forces from all threads into the first row
+        for thread in range(1, num_threads):
+            for jj in range(tile_N):
+                tile_forcex[0, jj] += tile_forcex[thread, jj]
+                tile_forcey[0, jj] += tile_forcey[thread, jj]
+                tile_forcez[0, jj] += tile_forcez[thread, jj]
+        # Apply or save the momentum change of the tile particles
+        # of component_2 (the external component).
+        with unswitch:
+            if local:
+                for jj in range(tile_N):
+                    j = tile_start + jj
+                    momx_2[j] += tile_forcex[0, jj]*Δmom_fac
+                    momy_2[j] += tile_forcey[0, jj]*Δmom_fac
+                    momz_2[j] += tile_forcez[0, jj]*Δmom_fac
+            elif mutual:
+                for jj in range(tile_N):
+                    j = tile_start + jj
+                    Δmomx_2[j] += tile_forcex[0, jj]*Δmom_fac
+                    Δmomy_2[j] += tile_forcey[0, jj]*Δmom_fac
+                    Δmomz_2[j] += tile_forcez[0, jj]*Δmom_fac
+# Contiguous buffers holding the positions of the particles
+# within a tile, used by the cache-blocked kernel.
+cython.declare(tile_posx='double[::1]',
+               tile_posy='double[::1]',
+               tile_posz='double[::1]',
+               )
+tile_posx = empty(np.max([1, pp_tile_size]), dtype=C2np['double'])
+tile_posy = empty(np.max([1, pp_tile_size]), dtype=C2np['double'])
+tile_posz = empty(np.max([1, pp_tile_size]), dtype=C2np['double'])
+# Contiguous buffers holding the forces on the particles within a tile,
+# the nearest-image separations and the Ewald corrections,
+# with a separate row for each thread.
+cython.declare(tile_forcex='double[:, ::1]',
+               tile_forcey='double[:, ::1]',
+               tile_forcez='double[:, ::1]',
+               tile_x='double[:, ::1]',
+               tile_y='double[:, ::1]',
+               tile_z='double[:, ::1]',
+               tile_ewaldx='double[:, ::1]',
+               tile_ewaldy='double[:, ::1]',
+               tile_ewaldz='double[:, ::1]',
+               )
+tile_forcex = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_forcey = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_forcez = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_x      = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_y      = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_z      = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_ewaldx = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_ewaldy = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+tile_ewaldz = empty((num_threads, np.max([1, pp_tile_size])), dtype=C2np['double'])
+
+# Function implementing the short-range part of the pairwise P³M
+# gravity, using cell lists to find nearby particles.
+@cython.header(# Arguments
+               component_1='Component',
+               component_2='Component',
+               ᔑdt=dict,
+               local='bint',
+               mutual='bint',
+               # Locals
+               N_1='Py_ssize_t',
+               N_2='Py_ssize_t',
+               cell_x='Py_ssize_t',
+               cell_y='Py_ssize_t',
+               cell_z='Py_ssize_t',
+               forcex_ij='double',
+               forcey_ij='double',
+               forcez_ij='double',
+               i='Py_ssize_t',
+               ii='Py_ssize_t',
+               ii_end='Py_ssize_t',
+               ii_start='Py_ssize_t',
+               j='Py_ssize_t',
+               jj='Py_ssize_t',
+               jj_end='Py_ssize_t',
+               jj_start='Py_ssize_t',
+               key='Py_ssize_t',
+               keys_1='Py_ssize_t[::1]',
+               keys_2='Py_ssize_t[::1]',
+               mass_1='double',
+               mass_2='double',
+               momx_1='particle_float*',
+               momx_2='particle_float*',
+               momy_1='particle_float*',
+               momy_2='particle_float*',
+               momz_1='particle_float*',
+               momz_2='particle_float*',
+               offset_count='Py_ssize_t',
+               offset_start='Py_ssize_t',
+               offset_x='Py_ssize_t',
+               offset_y='Py_ssize_t',
+               offset_z='Py_ssize_t',
+               order_1='Py_ssize_t[::1]',
+               order_2='Py_ssize_t[::1]',
+               posx_1='particle_float*',
+               posx_2='particle_float*',
+               posy_1='particle_float*',
+               posy_2='particle_float*',
+               posz_1='particle_float*',
+               posz_2='particle_float*',
+               r2='double',
+               shortrange_fac='double',
+               softening2='double',
+               x_ji='double',
+               xi='double',
+               y_ji='double',
+               yi='double',
+               z_ji='double',
+               zi='double',
+               Δmomx_2='double*',
+               Δmomx_ij='double',
+               Δmomy_2='double*',
+               Δmomy_ij='double',
+               Δmomz_2='double*',
+               Δmomz_ij='double',
+               returns='void',
+               )
+def gravity_pairwise_shortrange(component_1, component_2, ᔑdt, local, mutual):
+    """The box is divided into cells with a width of at least
+    p3m_cutoff_phys, and the particles of both components are sorted
+    according to the cell in which they reside. Only particles within
+    the same or neighbouring cells are then paired, and only pairs
+    closer than p3m_cutoff_phys interact. The work thus scales as the
+    number of particles times the number of neighbours within
+    the cutoff.
+    """
+    # Extract variables from the first (the local) component
+    N_1 = component_1.N_local
+    mass_1 = component_1.mass
+    posx_1 = component_1.posx
+    posy_1 = component_1.posy
+    posz_1 = component_1.posz
+    momx_1 = component_1.momx
+    momy_1 = component_1.momy
+    momz_1 = component_1.momz
+    # Extract variables from the second (the external) component
+    N_2 = component_2.N_local
+    mass_2 = component_2.mass
+    posx_2 = component_2.posx
+    posy_2 = component_2.posy
+    posz_2 = component_2.posz
+    momx_2 = component_2.momx
+    momy_2 = component_2.momy
+    momz_2 = component_2.momz
+    Δmomx_2 = component_2.Δmomx
+    Δmomy_2 = component_2.Δmomy
+    Δmomz_2 = component_2.Δmomz
+    softening2 = (0.5*(component_1.softening_length + component_2.softening_length))**2
+    if N_1 == 0 or N_2 == 0:
+        return
+    # Make sure that the short-range force table is tabulated
+    if p3m_table_order:
+        get_shortrange_table()
+    # Sort the particles of both components into cells
+    keys_1, order_1 = sort_into_cells(posx_1, posy_1, posz_1, N_1)
+    if local:
+        keys_2, order_2 = keys_1, order_1
+    else:
+        keys_2, order_2 = sort_into_cells(posx_2, posy_2, posz_2, N_2)
+    # The neighbouring cells along each dimension are given by
+    # offsets in the range [offset_start, offset_start + offset_count).
+    # For fewer than 3 cells, the offsets are reduced so that no
+    # cell is visited more than once.
+    if ℤ[shortrange_cells] >= 3:
+        offset_start, offset_count = -1, 3
+    else:
+        offset_start, offset_count = 0, ℤ[shortrange_cells]
+    # Loop over all occupied cells of component_1
+    ii_start = 0
+    while ii_start < N_1:
+        # Find the range of (sorted) particles within this cell
+        key = keys_1[ii_start]
+        ii_end = ii_start + 1
+        while ii_end < N_1 and keys_1[ii_end] == key:
+            ii_end += 1
+        cell_x = key//ℤ[shortrange_cells**2]
+        cell_y = (key//ℤ[shortrange_cells])%ℤ[shortrange_cells]
+        cell_z = key%ℤ[shortrange_cells]
+        # Loop over this and all neighbouring cells
+        for offset_x in range(offset_start, offset_start + offset_count):
+            for offset_y in range(offset_start, offset_start + offset_count):
+                for offset_z in range(offset_start, offset_start + offset_count):
+                    # Find the range of (sorted) particles of
+                    # component_2 within the neighbouring cell.
+                    key = (
+                        (
+                              mod(cell_x + offset_x, ℤ[shortrange_cells])*ℤ[shortrange_cells]
+                            + mod(cell_y + offset_y, ℤ[shortrange_cells])
+                        )*ℤ[shortrange_cells]
+                        + mod(cell_z + offset_z, ℤ[shortrange_cells])
+                    )
+                    jj_start = bisect_keys(keys_2, N_2, key)
+                    jj_end = bisect_keys(keys_2, N_2, key + 1)
+                    # Loop over all pairs of particles
+                    # between the two cells.
+                    for ii in range(ii_start, ii_end):
+                        i = order_1[ii]
+                        xi = posx_1[i]
+                        yi = posy_1[i]
+                        zi = posz_1[i]
+                        for jj in range(jj_start, jj_end):
+                            j = order_2[jj]
+                            # If the interaction is completely local,
+                            # make sure not to double count.
+                            with unswitch:
+                                if local:
+                                    if j <= i:
+                                        continue
+                            # "Vector" from particle j to particle i
+                            x_ji = xi - posx_2[j]
+                            y_ji = yi - posy_2[j]
+                            z_ji = zi - posz_2[j]
+                            # Translate coordinates so they
+                            # correspond to the nearest image.
+                            if x_ji > ℝ[0.5*boxsize]:
+                                x_ji -= boxsize
+                            elif x_ji < ℝ[-0.5*boxsize]:
+                                x_ji += boxsize
+                            if y_ji > ℝ[0.5*boxsize]:
+                                y_ji -= boxsize
+                            elif y_ji < ℝ[-0.5*boxsize]:
+                                y_ji += boxsize
+                            if z_ji > ℝ[0.5*boxsize]:
+                                z_ji -= boxsize
+                            elif z_ji < ℝ[-0.5*boxsize]:
+                                z_ji += boxsize
+                            # Only pairs within the cutoff interact
+                            r2 = x_ji**2 + y_ji**2 + z_ji**2
+                            if r2 > ℝ[p3m_cutoff_phys**2]:
+                                continue
+                            # The short-range force
+                            r2 += softening2
+                            shortrange_fac = shortrange_factor(r2)
+                            forcex_ij = x_ji*ℝ[-shortrange_fac/(r2*sqrt(r2))]
+                            forcey_ij = y_ji*ℝ[-shortrange_fac/(r2*sqrt(r2))]
+                            forcez_ij = z_ji*ℝ[-shortrange_fac/(r2*sqrt(r2))]
+                            # Convert force on particle i from particle
+                            # j to momentum change of partcicle i due
+                            # to particle j.
+                            Δmomx_ij = forcex_ij*ℝ[G_Newton*mass_1*mass_2*ᔑdt['a**(-1)']]
+                            Δmomy_ij = forcey_ij*ℝ[G_Newton*mass_1*mass_2*ᔑdt['a**(-1)']]
+                            Δmomz_ij = forcez_ij*ℝ[G_Newton*mass_1*mass_2*ᔑdt['a**(-1)']]
+                            # Apply momentum change to particle i
+                            # of component_1 (the local component).
+                            momx_1[i] += Δmomx_ij
+                            momy_1[i] += Δmomy_ij
+                            momz_1[i] += Δmomz_ij
+                            # Apply or save the momentum change of
+                            # particle j of component_2
+                            # (the external component).
+                            with unswitch:
+                                if local:
+                                    momx_2[j] -= Δmomx_ij
+                                    momy_2[j] -= Δmomy_ij
+                                    momz_2[j] -= Δmomz_ij
+                                elif mutual:
+                                    Δmomx_2[j] -= Δmomx_ij
+                                    Δmomy_2[j] -= Δmomy_ij
+                                    Δmomz_2[j] -= Δmomz_ij
+        ii_start = ii_end
+
+# Function which sorts particles into the cells used for the
+# short-range force. Returned are the sorted cell keys
+# (linear cell indices) and the particle indices in sorted order.
+@cython.header(# Arguments
+               posx='particle_float*',
+               posy='particle_float*',
+               posz='particle_float*',
+               N='Py_ssize_t',
+               # Locals
+               cell_x='Py_ssize_t',
+               cell_y='Py_ssize_t',
+               cell_z='Py_ssize_t',
+               i='Py_ssize_t',
+               keys='Py_ssize_t[::1]',
+               order='Py_ssize_t[::1]',
+               returns=tuple,
+               )
+def sort_into_cells(posx, posy, posz, N):
+    keys = empty(N, dtype=C2np['Py_ssize_t'])
+    for i in range(N):
+        cell_x = int(posx[i]*ℝ[shortrange_cells/boxsize])
+        cell_y = int(posy[i]*ℝ[shortrange_cells/boxsize])
+        cell_z = int(posz[i]*ℝ[shortrange_cells/boxsize])
+        # Guard against particles exactly at the upper boundary
+        if cell_x == ℤ[shortrange_cells]:
+            cell_x -= 1
+        if cell_y == ℤ[shortrange_cells]:
+            cell_y -= 1
+        if cell_z == ℤ[shortrange_cells]:
+            cell_z -= 1
+        keys[i] = (cell_x*ℤ[shortrange_cells] + cell_y)*ℤ[shortrange_cells] + cell_z
+    order = asarray(np.argsort(keys, kind='mergesort'), dtype=C2np['Py_ssize_t'])
+    keys = asarray(keys)[order]
+    return keys, order
+
+# Function returning the first index into the sorted keys
+# with a value not less than the given key.
+@cython.header(# Arguments
+               keys='Py_ssize_t[::1]',
+               N='Py_ssize_t',
+               key='Py_ssize_t',
+               # Locals
+               index_lower='Py_ssize_t',
+               index_middle='Py_ssize_t',
+               index_upper='Py_ssize_t',
+               returns='Py_ssize_t',
+               )
+def bisect_keys(keys, N, key):
+    index_lower = 0
+    index_upper = N
+    while index_lower < index_upper:
+        index_middle = (index_lower + index_upper)//2
+        if keys[index_middle] < key:
+            index_lower = index_middle + 1
+        else:
+            index_upper = index_middle
+    return index_lower
+# Number of cells along each dimension used for the short-range force.
+# The cells must be at least as wide as the short-range cutoff.
+cython.declare(shortrange_cells='Py_ssize_t')
+shortrange_cells = int(np.max([1, boxsize//p3m_cutoff_phys]))
+
+# Function returning the factor by which the short-range P³M force
+# is reduced relative to the full Newtonian force, as a function of
+# the squared (softened) distance r2. Unless p3m_table_order is 0,
+# the factor is interpolated from a table in r², saving the costly
+# evaluations of exp() and erfc() within the pair loop.
+@cython.header(# Arguments
+               r2='double',
+               # Locals
+               index='Py_ssize_t',
+               t='double',
+               x='double',
+               returns='double',
+               )
+def shortrange_factor(r2):
+    x = r2*ℝ[1/shortrange_table_spacing]
+    # Evaluate the factor exactly if no table is used or if r2 lies
+    # beyond the tabulated interval (which only happens for pairs
+    # with softening lengths comparable to the cutoff).
+    if p3m_table_order == 0 or x >= ℝ[p3m_table_size - 1]:
+        return shortrange_factor_exact(r2)
+    index = int(x)
+    t = x - index
+    # The table is offset by one due to the leading ghost point
+    if p3m_table_order == 1:
+        return shortrange_table[index + 1] + t*(shortrange_table[index + 2] - shortrange_table[index + 1])
+    # Cubic Lagrange interpolation through the four nearest points
+    return (  shortrange_table[index    ]*(-t*(t - 1)*(t - 2)*ℝ[1/6])
+            + shortrange_table[index + 1]*((t + 1)*(t - 1)*(t - 2)*0.5)
+            + shortrange_table[index + 2]*(-(t + 1)*t*(t - 2)*0.5)
+            + shortrange_table[index + 3]*((t + 1)*t*(t - 1)*ℝ[1/6])
+            )
+
+# Function computing the short-range P³M force factor exactly
+@cython.header(# Arguments
+               r2='double',
+               # Locals
+               r_scaled='double',
+               returns='double',
+               )
+def shortrange_factor_exact(r2):
+    r_scaled = sqrt(r2)*ℝ[1/p3m_scale_phys]
+    return r_scaled*ℝ[1/sqrt(π)]*exp(-0.25*r_scaled**2) + erfc(0.5*r_scaled)
+
+# Function for tabulating the short-range P³M force factor.
+# The result is stored as the global variable 'shortrange_table',
+# which will be fetched when called repeatedly. The table is thus
+# shared between all components and time steps.
+@cython.header(# Locals
+               error='double',
+               error_max='double',
+               i='Py_ssize_t',
+               table='double[::1]',
+               returns='double[::1]',
+               )
+def get_shortrange_table():
+    global shortrange_table
+    # If the table already exist in memory, return it
+    if shortrange_table.shape[0] != 1:
+        return shortrange_table
+    masterprint(f'Tabulating short-range gravitational force of size {p3m_table_size} ...')
+    # The table covers r² in [0, 2*p3m_cutoff_phys²], with one
+    # ghost point in front and two at the back, needed for the cubic
+    # interpolation. As the factor is a function of |r|, the leading
+    # ghost point is taken to be the value at r² = Δr².
+    table = empty(p3m_table_size + 3, dtype=C2np['double'])
+    for i in range(-1, p3m_table_size + 2):
+        table[i + 1] = shortrange_factor_exact(abs(i)*shortrange_table_spacing)
+    shortrange_table = table
+    # Measure the maximum absolute interpolation error
+    # at the midpoints between the tabulated points.
+    error_max = 0
+    for i in range(p3m_table_size - 1):
+        error = abs(
+              shortrange_factor((i + 0.5)*shortrange_table_spacing)
+            - shortrange_factor_exact((i + 0.5)*shortrange_table_spacing)
+        )
+        if error > error_max:
+            error_max = error
+    masterprint('done')
+    if error_max > shortrange_table_tolerance:
+        masterwarn(
+            f'The maximum error of the tabulated short-range force is {error_max:.2e}, '
+            f'exceeding the tolerance of {shortrange_table_tolerance:.0e}. '
+            f'Consider increasing p3m_table_size or p3m_table_order.'
+        )
+    return shortrange_table
+# The spacing in r² between the points of the short-range force table,
+# the table itself and the maximally allowed interpolation error
+# (relative to the unreduced Newtonian force) before a warning is
+# emitted. The default table (cubic, 2¹⁴ points) is accurate to a few
+# times 10⁻⁷, with the error dominated by the region of small r.
+cython.declare(shortrange_table_spacing='double',
+               shortrange_table='double[::1]',
+               shortrange_table_tolerance='double',
+               )
+shortrange_table_spacing = 2*p3m_cutoff_phys**2/(np.max([2, p3m_table_size]) - 1)
+shortrange_table = empty(1, dtype=C2np['double'])
+shortrange_table_tolerance = 1e-5
+
 # Function implementing the gravitational potential (in Fouier space).
 # Here k2 = k² is the squared magnitude of the wave vector,
 # in physical units.
@@ -230,6 +848,15 @@ def gravity_pairwise(component_1, component_2, rank_2, ᔑdt, local, mutual, ext
 def gravity_potential(k2):
     return ℝ[-4*π*G_Newton]/k2
 
+# Function implementing the long-range part of the gravitational
+# potential (in Fourier space) used by the P³M method.
+@cython.header(
+    k2='double',
+    returns='double',
+)
+def gravity_longrange_potential(k2):
+    return ℝ[-4*π*G_Newton]/k2*exp(-k2*ℝ[p3m_scale_phys**2])
+
 # Function that applies the differentiated gravitational potential
 # to a component.
 @cython.header(# Arguments
@@ -241,10 +868,10 @@ def gravity_potential(k2):
                J_dim='FluidScalar',
                fac='double',
                i='Py_ssize_t',
-               mom_dim='double*',
-               posx='double*',
-               posy='double*',
-               posz='double*',
+               mom_dim='particle_float*',
+               posx='particle_float*',
+               posy='particle_float*',
+               posz='particle_float*',
                x='double',
                y='double',
                z='double',
@@ -260,8 +887,10 @@ def apply_gravity_potential(component, ᔑdt, gradφ_dim, dim):
         posy    = component.posy
         posz    = component.posz
         mom_dim = component.mom[dim]
-        # Update the dim momentum component of particle i
-        for i in range(component.N_local):
+        # Update the dim momentum component of particle i.
+        # The particles are independent, so this is done in parallel
+        # by num_threads threads.
+        for i in prange(component.N_local, nogil=True, num_threads=num_threads):
             # The coordinates of the i'th particle,
             # transformed so that 0 <= x, y, z < 1.
             x = (posx[i] - domain_start_x)/domain_size_x
@@ -299,3 +928,803 @@ def apply_gravity_potential(component, ᔑdt, gradφ_dim, dim):
                       )
         # Communicate the pseudo and ghost points of J_dim
         communicate_domain(J_dim.grid_mv, mode='populate')
+
+# Class implementing an octree over a set of point masses,
+# used by the Barnes-Hut tree methods.
+@cython.cclass
+class Octree:
+    """The points (particles or pseudo-particles) are stored in flat
+    arrays, sorted so that the points within any node occupy the
+    contiguous range [node_start, node_end). Nodes are created in
+    breadth-first order, meaning that the children of a node are
+    likewise contiguous in memory, starting at node_child_start and
+    numbering node_child_count. Leaves have node_child_count == 0.
+    """
+    # Initialization method
+    @cython.header(# Arguments
+                   softening_length='double',
+                   )
+    def __init__(self, softening_length=0):
+        # The triple quoted string below serves as the type declaration
+        # for the data attributes of the Octree type.
+        # It will get picked up by the pyxpp script
+        # and indluded in the .pxd file.
+        """
+        double softening_length
+        Py_ssize_t N
+        Py_ssize_t N_allocated
+        Py_ssize_t N_nodes
+        Py_ssize_t N_nodes_allocated
+        Py_ssize_t N_exported
+        Py_ssize_t depth
+        double[::1] posx
+        double[::1] posy
+        double[::1] posz
+        double[::1] mass
+        Py_ssize_t[::1] indices
+        double[::1] posx_tmp
+        double[::1] posy_tmp
+        double[::1] posz_tmp
+        double[::1] mass_tmp
+        Py_ssize_t[::1] indices_tmp
+        Py_ssize_t[::1] octants
+        Py_ssize_t[::1] octant_counts
+        Py_ssize_t[::1] node_start
+        Py_ssize_t[::1] node_end
+        Py_ssize_t[::1] node_child_start
+        Py_ssize_t[::1] node_child_count
+        double[::1] node_centerx
+        double[::1] node_centery
+        double[::1] node_centerz
+        double[::1] node_width
+        double[::1] node_mass
+        double[::1] node_comx
+        double[::1] node_comy
+        double[::1] node_comz
+        double[::1] node_open2
+        double[::1] exported
+        Py_ssize_t[::1] stack
+        """
+        self.softening_length = softening_length
+        self.N = 0
+        self.N_allocated = 0
+        self.N_nodes = 0
+        self.N_nodes_allocated = 0
+        self.N_exported = 0
+        self.depth = 0
+        self.octant_counts = zeros(8, dtype=C2np['Py_ssize_t'])
+        self.exported = empty(4, dtype=C2np['double'])
+        self.stack = empty(8, dtype=C2np['Py_ssize_t'])
+        self.node_start       = zeros(1, dtype=C2np['Py_ssize_t'])
+        self.node_end         = zeros(1, dtype=C2np['Py_ssize_t'])
+        self.node_child_start = zeros(1, dtype=C2np['Py_ssize_t'])
+        self.node_child_count = zeros(1, dtype=C2np['Py_ssize_t'])
+        self.node_centerx     = zeros(1, dtype=C2np['double'])
+        self.node_centery     = zeros(1, dtype=C2np['double'])
+        self.node_centerz     = zeros(1, dtype=C2np['double'])
+        self.node_width       = zeros(1, dtype=C2np['double'])
+        self.resize(1)
+        self.resize_nodes(1)
+
+    # Method for enlarging the point arrays.
+    # Existing point data is not preserved.
+    @cython.header(# Arguments
+                   size='Py_ssize_t',
+                   )
+    def resize(self, size):
+        if size <= self.N_allocated:
+            return
+        self.N_allocated = size
+        self.posx        = empty(size, dtype=C2np['double'])
+        self.posy        = empty(size, dtype=C2np['double'])
+        self.posz        = empty(size, dtype=C2np['double'])
+        self.mass        = empty(size, dtype=C2np['double'])
+        self.indices     = empty(size, dtype=C2np['Py_ssize_t'])
+        self.posx_tmp    = empty(size, dtype=C2np['double'])
+        self.posy_tmp    = empty(size, dtype=C2np['double'])
+        self.posz_tmp    = empty(size, dtype=C2np['double'])
+        self.mass_tmp    = empty(size, dtype=C2np['double'])
+        self.indices_tmp = empty(size, dtype=C2np['Py_ssize_t'])
+        self.octants     = empty(size, dtype=C2np['Py_ssize_t'])
+
+    # Method for enlarging the node arrays,
+    # preserving the nodes already present.
+    @cython.header(# Arguments
+                   size='Py_ssize_t',
+                   )
+    def resize_nodes(self, size):
+        if size <= self.N_nodes_allocated:
+            return
+        self.N_nodes_allocated = size
+        # The new elements of np.resize() are filled with repeated
+        # copies of the existing data, which is fine as these will be
+        # overwritten anyway.
+        self.node_start       = np.resize(self.node_start      , size)
+        self.node_end         = np.resize(self.node_end        , size)
+        self.node_child_start = np.resize(self.node_child_start, size)
+        self.node_child_count = np.resize(self.node_child_count, size)
+        self.node_centerx     = np.resize(self.node_centerx    , size)
+        self.node_centery     = np.resize(self.node_centery    , size)
+        self.node_centerz     = np.resize(self.node_centerz    , size)
+        self.node_width       = np.resize(self.node_width      , size)
+        # The remaining node data is computed after the tree structure
+        # is in place and so does not need to be preserved.
+        self.node_mass  = empty(size, dtype=C2np['double'])
+        self.node_comx  = empty(size, dtype=C2np['double'])
+        self.node_comy  = empty(size, dtype=C2np['double'])
+        self.node_comz  = empty(size, dtype=C2np['double'])
+        self.node_open2 = empty(size, dtype=C2np['double'])
+
+    # Method for populating the tree with the particles of a component
+    @cython.header(# Arguments
+                   component='Component',
+                   # Locals
+                   i='Py_ssize_t',
+                   mass='double[::1]',
+                   posx='particle_float*',
+                   posx_tree='double[::1]',
+                   posy='particle_float*',
+                   posy_tree='double[::1]',
+                   posz='particle_float*',
+                   posz_tree='double[::1]',
+                   indices='Py_ssize_t[::1]',
+                   )
+    def populate(self, component):
+        if component.representation != 'particles':
+            abort('Only particle components can be placed in an Octree')
+        self.softening_length = component.softening_length
+        self.N = component.N_local
+        self.resize(self.N)
+        posx = component.posx
+        posy = component.posy
+        posz = component.posz
+        posx_tree = self.posx
+        posy_tree = self.posy
+        posz_tree = self.posz
+        mass      = self.mass
+        indices   = self.indices
+        for i in range(self.N):
+            posx_tree[i] = posx[i]
+            posy_tree[i] = posy[i]
+            posz_tree[i] = posz[i]
+            mass[i] = ℝ[component.mass]
+            indices[i] = i
+        self.build()
+
+    # Method for populating the tree with points stored in a flat
+    # buffer as (x, y, z, mass) quadruples, as produced by the
+    # export method.
+    @cython.header(# Arguments
+                   data='double[::1]',
+                   softening_length='double',
+                   # Locals
+                   i='Py_ssize_t',
+                   mass='double[::1]',
+                   posx='double[::1]',
+                   posy='double[::1]',
+                   posz='double[::1]',
+                   indices='Py_ssize_t[::1]',
+                   )
+    def populate_from_buffer(self, data, softening_length):
+        self.softening_length = softening_length
+        self.N = data.shape[0]//4
+        self.resize(self.N)
+        posx    = self.posx
+        posy    = self.posy
+        posz    = self.posz
+        mass    = self.mass
+        indices = self.indices
+        for i in range(self.N):
+            posx[i] = data[4*i    ]
+            posy[i] = data[4*i + 1]
+            posz[i] = data[4*i + 2]
+            mass[i] = data[4*i + 3]
+            indices[i] = -1
+        self.build()
+
+    # Method for building the tree structure over the points
+    @cython.header(# Locals
+                   N_nodes='Py_ssize_t',
+                   child='Py_ssize_t',
+                   child_end='Py_ssize_t',
+                   count='Py_ssize_t',
+                   δ2='double',
+                   end='Py_ssize_t',
+                   i='Py_ssize_t',
+                   indices='Py_ssize_t[::1]',
+                   indices_tmp='Py_ssize_t[::1]',
+                   mass='double[::1]',
+                   mass_n='double',
+                   mass_tmp='double[::1]',
+                   n='Py_ssize_t',
+                   node_centerx='double[::1]',
+                   node_centery='double[::1]',
+                   node_centerz='double[::1]',
+                   node_width='double[::1]',
+                   octant='Py_ssize_t',
+                   octant_counts='Py_ssize_t[::1]',
+                   octants='Py_ssize_t[::1]',
+                   offset='Py_ssize_t',
+                   posx='double[::1]',
+                   posx_max='double',
+                   posx_min='double',
+                   posx_tmp='double[::1]',
+                   posy='double[::1]',
+                   posy_max='double',
+                   posy_min='double',
+                   posy_tmp='double[::1]',
+                   posz='double[::1]',
+                   posz_max='double',
+                   posz_min='double',
+                   posz_tmp='double[::1]',
+                   start='Py_ssize_t',
+                   width='double',
+                   x='double',
+                   y='double',
+                   z='double',
+                   )
+    def build(self):
+        self.N_nodes = 0
+        if self.N == 0:
+            return
+        posx = self.posx
+        posy = self.posy
+        posz = self.posz
+        # The root node is the smallest cube containing all points
+        posx_min = posy_min = posz_min = +ထ
+        posx_max = posy_max = posz_max = -ထ
+        for i in range(self.N):
+            x = posx[i]
+            y = posy[i]
+            z = posz[i]
+            if x < posx_min:
+                posx_min = x
+            if x > posx_max:
+                posx_max = x
+            if y < posy_min:
+                posy_min = y
+            if y > posy_max:
+                posy_max = y
+            if z < posz_min:
+                posz_min = z
+            if z > posz_max:
+                posz_max = z
+        width = pairmax(posx_max - posx_min, posy_max - posy_min)
+        width = pairmax(width, posz_max - posz_min)
+        width = pairmax(width, ℝ[tree_width_min])
+        self.node_start[0] = 0
+        self.node_end[0] = self.N
+        self.node_centerx[0] = 0.5*(posx_min + posx_max)
+        self.node_centery[0] = 0.5*(posy_min + posy_max)
+        self.node_centerz[0] = 0.5*(posz_min + posz_max)
+        self.node_width[0] = width
+        N_nodes = 1
+        # Split nodes in breadth-first order. Nodes with few points
+        # become leaves, as do nodes so small that any further
+        # splitting is pointless (this guards against
+        # infinite subdivision of coincident points).
+        octants = self.octants
+        octant_counts = self.octant_counts
+        n = 0
+        while n < N_nodes:
+            start = self.node_start[n]
+            end = self.node_end[n]
+            if end - start <= tree_leaf_size or self.node_width[n] < ℝ[2*tree_width_min]:
+                self.node_child_count[n] = 0
+                n += 1
+                continue
+            # Make room for (up to) 8 children
+            if N_nodes + 8 > self.N_nodes_allocated:
+                self.N_nodes = N_nodes
+                self.resize_nodes(2*self.N_nodes_allocated + 8)
+            node_centerx = self.node_centerx
+            node_centery = self.node_centery
+            node_centerz = self.node_centerz
+            node_width   = self.node_width
+            # Count the points in each octant
+            for octant in range(8):
+                octant_counts[octant] = 0
+            for i in range(start, end):
+                octant = (
+                      (posx[i] >= node_centerx[n])
+                    + (posy[i] >= node_centery[n])*2
+                    + (posz[i] >= node_centerz[n])*4
+                )
+                octants[i] = octant
+                octant_counts[octant] += 1
+            # Create the non-empty children
+            self.node_child_start[n] = N_nodes
+            offset = start
+            for octant in range(8):
+                count = octant_counts[octant]
+                if count == 0:
+                    continue
+                self.node_start[N_nodes] = offset
+                self.node_end[N_nodes] = offset + count
+                node_width[N_nodes] = 0.5*node_width[n]
+                node_centerx[N_nodes] = node_centerx[n] + ((octant & 1) - 0.5)*0.5*node_width[n]
+                node_centery[N_nodes] = node_centery[n] + ((octant & 2)//2 - 0.5)*0.5*node_width[n]
+                node_centerz[N_nodes] = node_centerz[n] + ((octant & 4)//4 - 0.5)*0.5*node_width[n]
+                # The octant counts are reused as running
+                # insertion offsets below.
+                octant_counts[octant] = offset
+                offset += count
+                N_nodes += 1
+            self.node_child_count[n] = N_nodes - self.node_child_start[n]
+            # Sort the points of this node according to octant
+            posx_tmp    = self.posx_tmp
+            posy_tmp    = self.posy_tmp
+            posz_tmp    = self.posz_tmp
+            mass_tmp    = self.mass_tmp
+            indices_tmp = self.indices_tmp
+            mass        = self.mass
+            indices     = self.indices
+            for i in range(start, end):
+                offset = octant_counts[octants[i]]
+                octant_counts[octants[i]] += 1
+                posx_tmp[offset]    = posx[i]
+                posy_tmp[offset]    = posy[i]
+                posz_tmp[offset]    = posz[i]
+                mass_tmp[offset]    = mass[i]
+                indices_tmp[offset] = indices[i]
+            for i in range(start, end):
+                posx[i]    = posx_tmp[i]
+                posy[i]    = posy_tmp[i]
+                posz[i]    = posz_tmp[i]
+                mass[i]    = mass_tmp[i]
+                indices[i] = indices_tmp[i]
+            n += 1
+        self.N_nodes = N_nodes
+        # As nodes are created breadth-first, the last node is among
+        # the deepest ones. Record the depth of the tree, which sets
+        # the maximum stack size needed when walking it.
+        self.depth = int(round(log2(self.node_width[0]/self.node_width[N_nodes - 1])))
+        if self.stack.shape[0] < 7*self.depth + 8:
+            self.stack = empty(7*self.depth + 8, dtype=C2np['Py_ssize_t'])
+        # Compute node masses and centres of mass from the bottom up.
+        # As children always have larger indices than their parents,
+        # a backwards pass through the nodes suffices.
+        mass = self.mass
+        for n in range(N_nodes - 1, -1, -1):
+            mass_n = x = y = z = 0
+            if self.node_child_count[n] == 0:
+                for i in range(self.node_start[n], self.node_end[n]):
+                    mass_n += mass[i]
+                    x += mass[i]*posx[i]
+                    y += mass[i]*posy[i]
+                    z += mass[i]*posz[i]
+            else:
+                child_end = self.node_child_start[n] + self.node_child_count[n]
+                for child in range(self.node_child_start[n], child_end):
+                    mass_n += self.node_mass[child]
+                    x += self.node_mass[child]*self.node_comx[child]
+                    y += self.node_mass[child]*self.node_comy[child]
+                    z += self.node_mass[child]*self.node_comz[child]
+            self.node_mass[n] = mass_n
+            self.node_comx[n] = x/mass_n
+            self.node_comy[n] = y/mass_n
+            self.node_comz[n] = z/mass_n
+            # A node may be used as a whole (rather than being opened)
+            # for targets whose squared distance to its centre of mass
+            # exceeds node_open2. Besides the usual width/θ criterion,
+            # the offset δ between the centre of mass and the geometric
+            # centre is added, guarding against the case of a target
+            # inside of a node whose mass is concentrated in a corner.
+            # In periodic space, nodes wider than half the box are
+            # always opened, as their extent is then ambiguous.
+            if self.node_width[n] > ℝ[0.5*boxsize]:
+                self.node_open2[n] = ထ
+            else:
+                δ2 = (  (self.node_comx[n] - self.node_centerx[n])**2
+                      + (self.node_comy[n] - self.node_centery[n])**2
+                      + (self.node_comz[n] - self.node_centerz[n])**2)
+                self.node_open2[n] = (self.node_width[n]*ℝ[1/tree_opening_angle] + sqrt(δ2))**2
+
+    # Method for exporting the part of the tree needed for computing
+    # forces within a given (remote) box. Nodes which are sufficiently
+    # far away from every point of the box are exported as single
+    # pseudo-particles, while other nodes are opened. The exported
+    # points are returned as (x, y, z, mass) quadruples in a flat
+    # buffer. This is the so-called locally essential tree.
+    @cython.header(# Arguments
+                   box_start_x='double',
+                   box_start_y='double',
+                   box_start_z='double',
+                   box_size_x='double',
+                   box_size_y='double',
+                   box_size_z='double',
+                   periodic='bint',
+                   only_short_range='bint',
+                   # Locals
+                   N_exported='Py_ssize_t',
+                   child='Py_ssize_t',
+                   count='Py_ssize_t',
+                   exported='double[::1]',
+                   i='Py_ssize_t',
+                   n='Py_ssize_t',
+                   r2='double',
+                   stack='Py_ssize_t[::1]',
+                   stack_size='Py_ssize_t',
+                   width='double',
+                   returns='double[::1]',
+                   )
+    def export(self, box_start_x, box_start_y, box_start_z, box_size_x, box_size_y, box_size_z,
+               periodic, only_short_range=False):
+        N_exported = 0
+        if self.N_nodes == 0:
+            return self.exported[:0]
+        stack = self.stack
+        stack[0] = 0
+        stack_size = 1
+        while stack_size > 0:
+            stack_size -= 1
+            n = stack[stack_size]
+            with unswitch:
+                if only_short_range:
+                    # Nodes lying entirely beyond the short-range
+                    # cutoff from every point of the box are not needed.
+                    # The distance between the node and the box is
+                    # found as the distance from the geometric centre
+                    # of the node to the box, expanded by half the
+                    # node width in every direction.
+                    width = self.node_width[n]
+                    r2 = (
+                          distance2interval(self.node_centerx[n], box_start_x - 0.5*width,
+                                            box_size_x + width, periodic)**2
+                        + distance2interval(self.node_centery[n], box_start_y - 0.5*width,
+                                            box_size_y + width, periodic)**2
+                        + distance2interval(self.node_centerz[n], box_start_z - 0.5*width,
+                                            box_size_z + width, periodic)**2
+                    )
+                    if r2 > ℝ[p3m_cutoff_phys**2]:
+                        continue
+            # Squared distance from the centre of mass of the node
+            # to the nearest point of the box.
+            r2 = (  distance2interval(self.node_comx[n], box_start_x, box_size_x, periodic)**2
+                  + distance2interval(self.node_comy[n], box_start_y, box_size_y, periodic)**2
+                  + distance2interval(self.node_comz[n], box_start_z, box_size_z, periodic)**2)
+            # Make room for all points of the node,
+            # should it be a leaf.
+            count = self.node_end[n] - self.node_start[n]
+            if 4*(N_exported + count) > self.exported.shape[0]:
+                self.exported = np.resize(self.exported, 2*self.exported.shape[0] + 4*count)
+            exported = self.exported
+            if r2 > self.node_open2[n]:
+                # Export the entire node as a pseudo-particle
+                exported[4*N_exported    ] = self.node_comx[n]
+                exported[4*N_exported + 1] = self.node_comy[n]
+                exported[4*N_exported + 2] = self.node_comz[n]
+                exported[4*N_exported + 3] = self.node_mass[n]
+                N_exported += 1
+            elif self.node_child_count[n] == 0:
+                # Export the points of the leaf
+                for i in range(self.node_start[n], self.node_end[n]):
+                    exported[4*N_exported    ] = self.posx[i]
+                    exported[4*N_exported + 1] = self.posy[i]
+                    exported[4*N_exported + 2] = self.posz[i]
+                    exported[4*N_exported + 3] = self.mass[i]
+                    N_exported += 1
+            else:
+                # Open the node
+                for child in range(self.node_child_start[n],
+                                   self.node_child_start[n] + self.node_child_count[n]):
+                    stack[stack_size] = child
+                    stack_size += 1
+        self.N_exported = N_exported
+        return self.exported[:4*N_exported]
+
+# Function returning the distance from a coordinate to an interval
+# [start, start + size], taking periodicity into account if requested.
+@cython.header(# Arguments
+               x='double',
+               start='double',
+               size='double',
+               periodic='bint',
+               # Locals
+               dist='double',
+               returns='double',
+               )
+def distance2interval(x, start, size, periodic):
+    if periodic:
+        dist = mod(x - start, boxsize)
+        if dist <= size:
+            return 0
+        return pairmin(dist - size, boxsize - dist)
+    if x < start:
+        return start - x
+    if x > start + size:
+        return x - (start + size)
+    return 0
+
+# Function implementing Barnes-Hut gravity by walking an Octree
+@cython.header(# Arguments
+               component='Component',
+               tree='Octree',
+               ᔑdt=dict,
+               local='bint',
+               periodic='bint',
+               only_short_range='bint',
+               # Locals
+               child='Py_ssize_t',
+               ewald_correction='bint',
+               force_ij='double*',
+               forcex='double',
+               forcey='double',
+               forcez='double',
+               i='Py_ssize_t',
+               indices='Py_ssize_t[::1]',
+               j='Py_ssize_t',
+               mass='double[::1]',
+               mass_j='double',
+               mass_r3='double',
+               momx='particle_float*',
+               momy='particle_float*',
+               momz='particle_float*',
+               n='Py_ssize_t',
+               node_child_count='Py_ssize_t[::1]',
+               node_centerx='double[::1]',
+               node_centery='double[::1]',
+               node_centerz='double[::1]',
+               node_child_start='Py_ssize_t[::1]',
+               node_comx='double[::1]',
+               node_comy='double[::1]',
+               node_comz='double[::1]',
+               node_end='Py_ssize_t[::1]',
+               node_mass='double[::1]',
+               node_open2='double[::1]',
+               node_start='Py_ssize_t[::1]',
+               node_width='double[::1]',
+               posx='particle_float*',
+               posx_tree='double[::1]',
+               posy='particle_float*',
+               posy_tree='double[::1]',
+               posz='particle_float*',
+               posz_tree='double[::1]',
+               r2='double',
+               softening2='double',
+               stack='Py_ssize_t[::1]',
+               stack_size='Py_ssize_t',
+               width='double',
+               x_ji='double',
+               xi='double',
+               y_ji='double',
+               yi='double',
+               z_ji='double',
+               zi='double',
+               returns='void',
+               )
+def gravity_tree_walk(component, tree, ᔑdt, local, periodic, only_short_range=False):
+    """The momenta of the particles of the passed component are updated
+    due to the gravity from the points in the tree. If local is True,
+    the tree is built over the component itself, in which case
+    self-interactions are skipped. With periodic True, the nearest image
+    of each node/particle is used, with the contribution from all other
+    images added through the Ewald correction. With only_short_range
+    True, only the short-range part of the force (as used by P³M) is
+    computed, in which case no Ewald correction is applied and nodes
+    lying entirely beyond the short-range cutoff are never visited.
+    """
+    if component.representation != 'particles':
+        abort('gravity_tree_walk is only implemented for particle components')
+    if tree.N_nodes == 0:
+        return
+    # Extract variables from the component
+    posx = component.posx
+    posy = component.posy
+    posz = component.posz
+    momx = component.momx
+    momy = component.momy
+    momz = component.momz
+    softening2 = (0.5*(component.softening_length + tree.softening_length))**2
+    # Extract variables from the tree
+    posx_tree        = tree.posx
+    posy_tree        = tree.posy
+    posz_tree        = tree.posz
+    mass             = tree.mass
+    indices          = tree.indices
+    node_start       = tree.node_start
+    node_end         = tree.node_end
+    node_child_start = tree.node_child_start
+    node_child_count = tree.node_child_count
+    node_mass        = tree.node_mass
+    node_comx        = tree.node_comx
+    node_comy        = tree.node_comy
+    node_comz        = tree.node_comz
+    node_open2       = tree.node_open2
+    node_centerx     = tree.node_centerx
+    node_centery     = tree.node_centery
+    node_centerz     = tree.node_centerz
+    node_width       = tree.node_width
+    stack            = tree.stack
+    # The images beyond the nearest one are taken into account
+    # through the Ewald correction, though only for the full force.
+    ewald_correction = periodic and not only_short_range
+    # Walk the tree once for each particle
+    for i in range(component.N_local):
+        xi = posx[i]
+        yi = posy[i]
+        zi = posz[i]
+        forcex = forcey = forcez = 0
+        stack[0] = 0
+        stack_size = 1
+        while stack_size > 0:
+            stack_size -= 1
+            n = stack[stack_size]
+            # The only_short_range checks below are deliberately not
+            # unswitched, as each unswitched condition doubles the
+            # amount of generated code for this loop.
+            if only_short_range:
+                # Skip the node if it lies entirely beyond the
+                # short-range cutoff, as seen from particle i.
+                width = node_width[n]
+                r2 = (
+                      distance2interval(xi, node_centerx[n] - 0.5*width, width, periodic)**2
+                    + distance2interval(yi, node_centery[n] - 0.5*width, width, periodic)**2
+                    + distance2interval(zi, node_centerz[n] - 0.5*width, width, periodic)**2
+                )
+                if r2 > ℝ[p3m_cutoff_phys**2]:
+                    continue
+            # "Vector" from the centre of mass of node n to particle i
+            x_ji = xi - node_comx[n]
+            y_ji = yi - node_comy[n]
+            z_ji = zi - node_comz[n]
+            with unswitch:
+                if periodic:
+                    # Translate coordinates so they
+                    # correspond to the nearest image.
+                    if x_ji > ℝ[0.5*boxsize]:
+                        x_ji -= boxsize
+                    elif x_ji < ℝ[-0.5*boxsize]:
+                        x_ji += boxsize
+                    if y_ji > ℝ[0.5*boxsize]:
+                        y_ji -= boxsize
+                    elif y_ji < ℝ[-0.5*boxsize]:
+                        y_ji += boxsize
+                    if z_ji > ℝ[0.5*boxsize]:
+                        z_ji -= boxsize
+                    elif z_ji < ℝ[-0.5*boxsize]:
+                        z_ji += boxsize
+            r2 = x_ji**2 + y_ji**2 + z_ji**2
+            if r2 > node_open2[n]:
+                # The node is sufficiently far away to be used as a
+                # whole. Add the force from its total mass.
+                mass_j = node_mass[n]
+                if only_short_range:
+                    if r2 > ℝ[p3m_cutoff_phys**2]:
+                        continue
+                    r2 += softening2
+                    mass_r3 = mass_j*shortrange_factor(r2)/(r2*sqrt(r2))
+                else:
+                    mass_r3 = mass_j/(r2 + softening2)**1.5
+                forcex -= x_ji*mass_r3
+                forcey -= y_ji*mass_r3
+                forcez -= z_ji*mass_r3
+                with unswitch:
+                    if ewald_correction:
+                        force_ij = ewald(x_ji, y_ji, z_ji)
+                        forcex += force_ij[0]*mass_j
+                        forcey += force_ij[1]*mass_j
+                        forcez += force_ij[2]*mass_j
+            elif node_child_count[n] == 0:
+                # Leaf node too close to be used as a whole.
+                # Add the forces from each of its points directly.
+                for j in range(node_start[n], node_end[n]):
+                    with unswitch:
+                        if local:
+                            if indices[j] == i:
+                                continue
+                    x_ji = xi - posx_tree[j]
+                    y_ji = yi - posy_tree[j]
+                    z_ji = zi - posz_tree[j]
+                    with unswitch:
+                        if periodic:
+                            if x_ji > ℝ[0.5*boxsize]:
+                                x_ji -= boxsize
+                            elif x_ji < ℝ[-0.5*boxsize]:
+                                x_ji += boxsize
+                            if y_ji > ℝ[0.5*boxsize]:
+                                y_ji -= boxsize
+                            elif y_ji < ℝ[-0.5*boxsize]:
+                                y_ji += boxsize
+                            if z_ji > ℝ[0.5*boxsize]:
+                                z_ji -= boxsize
+                            elif z_ji < ℝ[-0.5*boxsize]:
+                                z_ji += boxsize
+                    mass_j = mass[j]
+                    r2 = x_ji**2 + y_ji**2 + z_ji**2
+                    if only_short_range:
+                        if r2 > ℝ[p3m_cutoff_phys**2]:
+                            continue
+                        r2 += softening2
+                        mass_r3 = mass_j*shortrange_factor(r2)/(r2*sqrt(r2))
+                    else:
+                        mass_r3 = mass_j/(r2 + softening2)**1.5
+                    forcex -= x_ji*mass_r3
+                    forcey -= y_ji*mass_r3
+                    forcez -= z_ji*mass_r3
+                    with unswitch:
+                        if ewald_correction:
+                            force_ij = ewald(x_ji, y_ji, z_ji)
+                            forcex += force_ij[0]*mass_j
+                            forcey += force_ij[1]*mass_j
+                            forcez += force_ij[2]*mass_j
+            else:
+                # Open the node
+                for child in range(node_child_start[n], node_child_start[n] + node_child_count[n]):
+                    stack[stack_size] = child
+                    stack_size += 1
+        # Convert the force on particle i to a momentum change
+        momx[i] += forcex*ℝ[G_Newton*component.mass*ᔑdt['a**(-1)']]
+        momy[i] += forcey*ℝ[G_Newton*component.mass*ᔑdt['a**(-1)']]
+        momz[i] += forcez*ℝ[G_Newton*component.mass*ᔑdt['a**(-1)']]
+
+# Function implementing Barnes-Hut tree gravity
+@cython.header(# Arguments
+               receivers=list,
+               suppliers=list,
+               ᔑdt=dict,
+               periodic='bint',
+               only_short_range='bint',
+               # Locals
+               component_1='Component',
+               box=tuple,
+               component_2='Component',
+               exported='double[::1]',
+               i='Py_ssize_t',
+               imported='double[::1]',
+               rank_recv='int',
+               rank_send='int',
+               returns='void',
+               )
+def gravity_tree(receivers, suppliers, ᔑdt, periodic, only_short_range=False):
+    """Each process builds an Octree over its local particles of
+    each gravitating component. This local tree is walked by the local
+    particles of all receiver components. For each other process, the
+    part of the local tree needed to compute forces within the domain
+    of that process (the locally essential tree) is then exported.
+    Distant nodes are sent as single pseudo-particles, so that far less
+    than the full component needs to be communicated. The imported
+    points are themselves placed in a tree which is then walked by the
+    local particles. No momentum updates are sent back, as the
+    tree forces are not symmetric.
+    With only_short_range True, only the short-range part of the force
+    is computed, as needed by the TreePM method. Only nodes within the
+    short-range cutoff of the domain of the receiving process are then
+    exported, so that little communication is needed.
+    """
+    # Make sure that the short-range force table is tabulated
+    if only_short_range and p3m_table_order:
+        get_shortrange_table()
+    for component_2 in receivers + suppliers:
+        if component_2.representation != 'particles':
+            abort('The tree methods are only implemented for particle components')
+        # Build and walk the local tree
+        tree_local.populate(component_2)
+        for component_1 in receivers:
+            gravity_tree_walk(component_1, tree_local, ᔑdt, component_1 is component_2, periodic,
+                              only_short_range)
+        # Exchange the locally essential trees
+        # with all other processes.
+        for i in range(1, nprocs):
+            rank_send = mod(rank + i, nprocs)
+            rank_recv = mod(rank - i, nprocs)
+            box = domain_box(rank_send)
+            exported = tree_local.export(
+                box[0], box[1], box[2], box[3], box[4], box[5],
+                periodic, only_short_range,
+            )
+            imported = smart_mpi(exported, dest=rank_send, source=rank_recv, mpifun='sendrecv')
+            tree_extrl.populate_from_buffer(imported, component_2.softening_length)
+            for component_1 in receivers:
+                gravity_tree_walk(component_1, tree_extrl, ᔑdt, False, periodic,
+                                  only_short_range)
+# Trees used by the gravity_tree function, holding the local
+# particles and the points received from other processes.
+cython.declare(tree_local='Octree', tree_extrl='Octree')
+tree_local = Octree()
+tree_extrl = Octree()
+# Nodes with no more than this number of points become leaves
+cython.declare(tree_leaf_size='Py_ssize_t', tree_width_min='double')
+tree_leaf_size = 8
+# Nodes narrower than this are never split further
+tree_width_min = 1e-6*boxsize
@@ -40,17 +40,17 @@ pxd('ctypedef bint (*func_b_ddd)(double, double, double)')
 # Function for direct summation of gravitational forces between
 # particles in two domains (possibly the same).
 @cython.header(# Arguments
-               posx_i='double*',
-               posy_i='double*',
-               posz_i='double*',
-               momx_i='double*',
-               momy_i='double*',
-               momz_i='double*',
+               posx_i='particle_float*',
+               posy_i='particle_float*',
+               posz_i='particle_float*',
+               momx_i='particle_float*',
+               momy_i='particle_float*',
+               momz_i='particle_float*',
                mass_i='double',
                N_local_i='Py_ssize_t',
-               posx_j='double*',
-               posy_j='double*',
-               posz_j='double*',
+               posx_j='particle_float*',
+               posy_j='particle_float*',
+               posz_j='particle_float*',
                Δmomx_j='double*',
                Δmomy_j='double*',
                Δmomz_j='double*',
@@ -233,15 +233,15 @@ def direct_summation(posx_i, posy_i, posz_i, momx_i, momy_i, momz_i,
                 i='Py_ssize_t',
                 j='int',
                 mass='double',
-                momx_local='double*',
-                momy_local='double*',
-                momz_local='double*',
-                posx_local='double*',
-                posx_local_mv='double[::1]',
-                posy_local='double*',
-                posy_local_mv='double[::1]',
-                posz_local='double*',
-                posz_local_mv='double[::1]',
+                momx_local='particle_float*',
+                momy_local='particle_float*',
+                momz_local='particle_float*',
+                posx_local='particle_float*',
+                posx_local_mv=object,  # particle_float[::1]
+                posy_local='particle_float*',
+                posy_local_mv=object,  # particle_float[::1]
+                posz_local='particle_float*',
+                posz_local_mv=object,  # particle_float[::1]
                 softening2='double',
                 )
 def pp(component, ᔑdt):
@@ -288,12 +288,12 @@ def pp(component, ᔑdt):
     N_extrn_max = N_extrns[rank]
     # Enlarges the buffers if necessary
     if posx_extrn_mv.shape[0] < N_extrn_max:
-        posx_extrn = realloc(posx_extrn, N_extrn_max*sizeof('double'))
-        posy_extrn = realloc(posy_extrn, N_extrn_max*sizeof('double'))
-        posz_extrn = realloc(posz_extrn, N_extrn_max*sizeof('double'))
-        posx_extrn_mv = cast(posx_extrn, 'double[:N_extrn_max]')
-        posy_extrn_mv = cast(posy_extrn, 'double[:N_extrn_max]')
-        posz_extrn_mv = cast(posz_extrn, 'double[:N_extrn_max]')
+        posx_extrn = realloc(posx_extrn, N_extrn_max*sizeof('particle_float'))
+        posy_extrn = realloc(posy_extrn, N_extrn_max*sizeof('particle_float'))
+        posz_extrn = realloc(posz_extrn, N_extrn_max*sizeof('particle_float'))
+        posx_extrn_mv = cast(posx_extrn, 'particle_float[:N_extrn_max]')
+        posy_extrn_mv = cast(posy_extrn, 'particle_float[:N_extrn_max]')
+        posz_extrn_mv = cast(posz_extrn, 'particle_float[:N_extrn_max]')
         Δmomx_extrn = realloc(Δmomx_extrn, N_extrn_max*sizeof('double'))
         Δmomy_extrn = realloc(Δmomy_extrn, N_extrn_max*sizeof('double'))
         Δmomz_extrn = realloc(Δmomz_extrn, N_extrn_max*sizeof('double'))
@@ -378,11 +378,11 @@ def pp(component, ᔑdt):
                # Locals
                J_dim='FluidScalar',
                i='Py_ssize_t',
-               mom_dim='double*',
+               mom_dim='particle_float*',
                pm_fac='double',
-               posx='double*',
-               posy='double*',
-               posz='double*',
+               posx='particle_float*',
+               posy='particle_float*',
+               posz='particle_float*',
                x='double',
                y='double',
                z='double',
@@ -815,14 +815,14 @@ def in_boundary_leftbackwarddown(posx_local_i, posy_local_i, posz_local_i):
                in_boundary2=func_b_ddd,
                j='Py_ssize_t',
                mass='double',
-               momx_local='double*',
-               momy_local='double*',
-               momz_local='double*',
-               posx_local='double*',
+               momx_local='particle_float*',
+               momy_local='particle_float*',
+               momz_local='particle_float*',
+               posx_local='particle_float*',
                posx_local_i='double',
-               posy_local='double*',
+               posy_local='particle_float*',
                posy_local_i='double',
-               posz_local='double*',
+               posz_local='particle_float*',
                posz_local_i='double',
                rank_send='int',
                rank_recv='int',
@@ -974,29 +974,29 @@ def p3m(component, ᔑdt):
                     indices_boundary_mv = cast(indices_boundary,
                                                'Py_ssize_t[:(N_boundary1 + Δmemory)]')
                     posx_local_boundary = realloc(posx_local_boundary,
-                                                  (N_boundary1 + Δmemory)*sizeof('double'))
+                                                  (N_boundary1 + Δmemory)*sizeof('particle_float'))
                     posx_local_boundary_mv = cast(posx_local_boundary,
-                                                  'double[:(N_boundary1 + Δmemory)]')
+                                                  'particle_float[:(N_boundary1 + Δmemory)]')
                     posy_local_boundary = realloc(posy_local_boundary,
-                                                  (N_boundary1 + Δmemory)*sizeof('double'))
+                                                  (N_boundary1 + Δmemory)*sizeof('particle_float'))
                     posy_local_boundary_mv = cast(posy_local_boundary,
-                                                  'double[:(N_boundary1 + Δmemory)]')
+                                                  'particle_float[:(N_boundary1 + Δmemory)]')
                     posz_local_boundary = realloc(posz_local_boundary,
-                                                  (N_boundary1 + Δmemory)*sizeof('double'))
+                                                  (N_boundary1 + Δmemory)*sizeof('particle_float'))
                     posz_local_boundary_mv = cast(posz_local_boundary,
-                                                  'double[:(N_boundary1 + Δmemory)]')
+                                                  'particle_float[:(N_boundary1 + Δmemory)]')
                     Δmomx_local_boundary = realloc(Δmomx_local_boundary,
-                                                   (N_boundary1 + Δmemory)*sizeof('double'))
+                                                   (N_boundary1 + Δmemory)*sizeof('particle_float'))
                     Δmomx_local_boundary_mv = cast(Δmomx_local_boundary,
-                                                   'double[:(N_boundary1 + Δmemory)]')
+                                                   'particle_float[:(N_boundary1 + Δmemory)]')
                     Δmomy_local_boundary = realloc(Δmomy_local_boundary,
-                                                   (N_boundary1 + Δmemory)*sizeof('double'))
+                                                   (N_boundary1 + Δmemory)*sizeof('particle_float'))
                     Δmomy_local_boundary_mv = cast(Δmomy_local_boundary,
-                                                   'double[:(N_boundary1 + Δmemory)]')
+                                                   'particle_float[:(N_boundary1 + Δmemory)]')
                     Δmomz_local_boundary = realloc(Δmomz_local_boundary,
-                                                   (N_boundary1 + Δmemory)*sizeof('double'))
+                                                   (N_boundary1 + Δmemory)*sizeof('particle_float'))
                     Δmomz_local_boundary_mv = cast(Δmomz_local_boundary,
-                                                   'double[:(N_boundary1 + Δmemory)]')
+                                                   'particle_float[:(N_boundary1 + Δmemory)]')
             # Check if particle should be sent to the right
             if in_boundary2(posx_local_i, posy_local_i, posz_local_i):
                 # Particle i should be send
@@ -1025,12 +1025,12 @@ def p3m(component, ᔑdt):
         N_extrn = sendrecv(N_boundary2, dest=rank_send, source=rank_recv)
         # Enlarge the receive buffers if needed
         if posx_extrn_mv.shape[0] < N_extrn:
-            posx_extrn = realloc(posx_extrn, N_extrn*sizeof('double'))
-            posy_extrn = realloc(posy_extrn, N_extrn*sizeof('double'))
-            posz_extrn = realloc(posz_extrn, N_extrn*sizeof('double'))
-            posx_extrn_mv = cast(posx_extrn, 'double[:N_extrn]')
-            posy_extrn_mv = cast(posy_extrn, 'double[:N_extrn]')
-            posz_extrn_mv = cast(posz_extrn, 'double[:N_extrn]')
+            posx_extrn = realloc(posx_extrn, N_extrn*sizeof('particle_float'))
+            posy_extrn = realloc(posy_extrn, N_extrn*sizeof('particle_float'))
+            posz_extrn = realloc(posz_extrn, N_extrn*sizeof('particle_float'))
+            posx_extrn_mv = cast(posx_extrn, 'particle_float[:N_extrn]')
+            posy_extrn_mv = cast(posy_extrn, 'particle_float[:N_extrn]')
+            posz_extrn_mv = cast(posz_extrn, 'particle_float[:N_extrn]')
             Δmomx_extrn = realloc(Δmomx_extrn, N_extrn*sizeof('double'))
             Δmomy_extrn = realloc(Δmomy_extrn, N_extrn*sizeof('double'))
             Δmomz_extrn = realloc(Δmomz_extrn, N_extrn*sizeof('double'))
@@ -1105,44 +1105,44 @@ cython.declare(boundary_ranks_recv='int[::1]',
                indices_send='Py_ssize_t*',
                indices_send_mv='Py_ssize_t[::1]',
                neighbors=dict,
-               posx_extrn='double*',
-               posx_extrn_mv='double[::1]',
-               posx_local_boundary='double*',
-               posx_local_boundary_mv='double[::1]',
-               posy_extrn='double*',
-               posy_extrn_mv='double[::1]',
-               posy_local_boundary='double*',
-               posy_local_boundary_mv='double[::1]',
-               posz_extrn='double*',
-               posz_extrn_mv='double[::1]',
-               posz_local_boundary='double*',
-               posz_local_boundary_mv='double[::1]',
+               posx_extrn='particle_float*',
+               posx_extrn_mv=object,  # particle_float[::1]
+               posx_local_boundary='particle_float*',
+               posx_local_boundary_mv=object,  # particle_float[::1]
+               posy_extrn='particle_float*',
+               posy_extrn_mv=object,  # particle_float[::1]
+               posy_local_boundary='particle_float*',
+               posy_local_boundary_mv=object,  # particle_float[::1]
+               posz_extrn='particle_float*',
+               posz_extrn_mv=object,  # particle_float[::1]
+               posz_local_boundary='particle_float*',
+               posz_local_boundary_mv=object,  # particle_float[::1]
                Δmomx_extrn='double*',
                Δmomx_extrn_mv='double[::1]',
                Δmomx_local='double*',
-               Δmomx_local_boundary='double*',
-               Δmomx_local_boundary_mv='double[::1]',
+               Δmomx_local_boundary='particle_float*',
+               Δmomx_local_boundary_mv=object,  # particle_float[::1]
                Δmomx_local_mv='double[::1]',
                Δmomy_extrn='double*',
                Δmomy_extrn_mv='double[::1]',
                Δmomy_local='double*',
-               Δmomy_local_boundary='double*',
-               Δmomy_local_boundary_mv='double[::1]',
+               Δmomy_local_boundary='particle_float*',
+               Δmomy_local_boundary_mv=object,  # particle_float[::1]
                Δmomy_local_mv='double[::1]',
                Δmomz_extrn='double*',
                Δmomz_extrn_mv='double[::1]',
                Δmomz_local='double*',
-               Δmomz_local_boundary='double*',
-               Δmomz_local_boundary_mv='double[::1]',
+               Δmomz_local_boundary='particle_float*',
+               Δmomz_local_boundary_mv=object,  # particle_float[::1]
                Δmomz_local_mv='double[::1]',
                )
 # For storing positions of particles received from external domains
-posx_extrn = malloc(1*sizeof('double'))
-posy_extrn = malloc(1*sizeof('double'))
-posz_extrn = malloc(1*sizeof('double'))
-posx_extrn_mv = cast(posx_extrn, 'double[:1]')
-posy_extrn_mv = cast(posy_extrn, 'double[:1]')
-posz_extrn_mv = cast(posz_extrn, 'double[:1]')
+posx_extrn = malloc(1*sizeof('particle_float'))
+posy_extrn = malloc(1*sizeof('particle_float'))
+posz_extrn = malloc(1*sizeof('particle_float'))
+posx_extrn_mv = cast(posx_extrn, 'particle_float[:1]')
+posy_extrn_mv = cast(posy_extrn, 'particle_float[:1]')
+posz_extrn_mv = cast(posz_extrn, 'particle_float[:1]')
 # For storing momentum changes
 Δmomx_local = malloc(1*sizeof('double'))
 Δmomy_local = malloc(1*sizeof('double'))
@@ -1165,18 +1165,18 @@ indices_boundary = malloc(1*sizeof('Py_ssize_t'))
 indices_boundary_mv = cast(indices_send, 'Py_ssize_t[:1]')
 # For storing a copy of those local particles
 # that consitutes the short-range domain boundaries.
-posx_local_boundary = malloc(1*sizeof('double'))
-posy_local_boundary = malloc(1*sizeof('double'))
-posz_local_boundary = malloc(1*sizeof('double'))
-posx_local_boundary_mv = cast(posx_local_boundary, 'double[:1]')
-posy_local_boundary_mv = cast(posy_local_boundary, 'double[:1]')
-posz_local_boundary_mv = cast(posz_local_boundary, 'double[:1]')
-Δmomx_local_boundary = malloc(1*sizeof('double'))
-Δmomy_local_boundary = malloc(1*sizeof('double'))
-Δmomz_local_boundary = malloc(1*sizeof('double'))
-Δmomx_local_boundary_mv = cast(Δmomx_local_boundary, 'double[:1]')
-Δmomy_local_boundary_mv = cast(Δmomy_local_boundary, 'double[:1]')
-Δmomz_local_boundary_mv = cast(Δmomz_local_boundary, 'double[:1]')
+posx_local_boundary = malloc(1*sizeof('particle_float'))
+posy_local_boundary = malloc(1*sizeof('particle_float'))
+posz_local_boundary = malloc(1*sizeof('particle_float'))
+posx_local_boundary_mv = cast(posx_local_boundary, 'particle_float[:1]')
+posy_local_boundary_mv = cast(posy_local_boundary, 'particle_float[:1]')
+posz_local_boundary_mv = cast(posz_local_boundary, 'particle_float[:1]')
+Δmomx_local_boundary = malloc(1*sizeof('particle_float'))
+Δmomy_local_boundary = malloc(1*sizeof('particle_float'))
+Δmomz_local_boundary = malloc(1*sizeof('particle_float'))
+Δmomx_local_boundary_mv = cast(Δmomx_local_boundary, 'particle_float[:1]')
+Δmomy_local_boundary_mv = cast(Δmomy_local_boundary, 'particle_float[:1]')
+Δmomz_local_boundary_mv = cast(Δmomz_local_boundary, 'particle_float[:1]')
 # Save the neighboring ranks in a particular order,
 # for use in the P3M algorithm
 boundary_ranks_send = np.array([rank_neighboring_domain(+1,  0,  0),
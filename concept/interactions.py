@@ -25,13 +25,12 @@
 from commons import *
 
 # Cython imports
-cimport('from communication import sendrecv_component')
-cimport('from mesh import CIC_components2φ, diff_domain, domain_decompose, fft, slab_decompose')
-cimport('from mesh import CIC_components2φ_general')
+cimport('from communication import add_received_Δ, domain_box, get_buffer, get_buffer_size')
+cimport('from communication import isendrecv_component, isendrecv_Δ')
+cimport('from mesh import CIC_components2φ, diff_domain, fft_backward, fft_forward')
+cimport('from mesh import CIC_components2φ_general, diff_fourier, fourier_grid_start')
 # Import interactions defined in other modules
 cimport('from gravity import *')
-# DELETE WHEN DONE with gravity_old.py !!!
-cimport('from gravity_old import build_φ, p3m, pm, pp')
 
 # Function pointer types used in this module
 pxd("""
@@ -56,25 +55,46 @@ ctypedef void   (*func_apply_potential)(Component, dict, double[:, :, ::1], int)
               affected=list,   # list of str's
               deterministic='bint',
               extra_args=dict,
+              interaction_range='double',
               # Locals
               N_domain_pairs='Py_ssize_t',
+              N_locals='Py_ssize_t[::1]',
+              N_pairings='Py_ssize_t',
+              N_recv='Py_ssize_t',
+              N_send='Py_ssize_t',
+              N_Δ_recv='Py_ssize_t',
               assisted='bint',
+              b='Py_ssize_t',
               components=list,
+              components_2_extrl=list,
               component_1='Component',
               component_2_extrl='Component',
               component_2_local='Component',
+              component_2_send='Component',
               i='Py_ssize_t',
               index_component_1='Py_ssize_t',
               index_component_2='Py_ssize_t',
+              interaction_time_start='double',
+              k='Py_ssize_t',
               local='bint',
               mutual='bint',
               only_supply='bint',
+              pairing_info=list,
+              pairing_mutual=list,
+              pairings=list,
               rank_send='int',
               rank_recv='int',
+              recv_needed='bint',
+              requests=list,
+              requests_dependent=list,
+              requests_Δ=list,
+              requests_Δ_recv=list,
+              send_needed='bint',
               synchronous='bint',
+              Δ_pending='bint',
               )
 def domain_domain(receivers, suppliers, ᔑdt, interaction, interaction_name,
-                  dependent, affected, deterministic, extra_args={}):
+                  dependent, affected, deterministic, extra_args={}, interaction_range=ထ):
     """This function takes care of pairings between all components
     and between all domains. The component-pairings include:
     - Receivers with themselves (interactions between
@@ -91,7 +111,25 @@ def domain_domain(receivers, suppliers, ᔑdt, interaction, interaction_name,
     If affected is an empty list, this is not really an interaction.
     In this case, every domain will both send and receive from every
     other domain.
+
+    For interactions of finite range, the interaction_range should be
+    specified. Only domains separated by less than this distance will
+    then be paired. Pairings with no domains within range anywhere
+    are skipped altogether, while for the remaining pairings an empty
+    component is communicated in place of component_2 whenever the
+    receiving domain is out of range.
+
+    All communication is non-blocking, with the communication of each
+    pairing overlapping the computation of the neighbouring pairings.
+    The dependent and affected variables must therefore be disjoint.
     """
+    global interaction_cost
+    # The dependent variables of the local components are sent
+    # without blocking while the affected variables are updated,
+    # and so these must not overlap.
+    if set(dependent) & set(affected):
+        abort(f'domain_domain was called with dependent variables {dependent} '
+              f'overlapping the affected variables {affected}')
     # List of all particles participating in this interaction
     components = receivers + suppliers
     # Determine whether this "interaction" have any direct effect
@@ -131,50 +169,82 @@ def domain_domain(receivers, suppliers, ᔑdt, interaction, interaction_name,
             # - Extrl component_2 <- rank - i
             # On each process, the local component_1 and the external
             # (received) component_2 then interact.
+            # Pairings which do not place any domain within the range
+            # of the interaction are skipped. As this is the same for
+            # all processes, the communication remains synchronized.
             N_domain_pairs = ℤ[1 + nprocs//2] if assisted else nprocs
-            for i in range(N_domain_pairs):
-                # Process ranks to send to and receive from
-                rank_send = mod(rank + i, nprocs)
-                rank_recv = mod(rank - i, nprocs)
-                # Determine whther component_2 should be updated due to
-                # its interaction with component_1. This is usually the
-                # case. The exceptions are
-                # - component_2 is a supplier and not a receiver.
-                #   When this is the case, only_supply is True.
-                # - component_2 is really the same as component_1
-                #   and this is a local interaction, meaning that
-                #   both rank_send and rank_recv is really just the
-                #   local rank. In this case, the supplied interaction
-                #   function should also update the data of component_2
-                #   (not the buffers). This special case is flagged
-                #   by the 'local' variable being True.
-                # - component_2 is really the same as component_1
-                #   and rank_send == rank_recv (but different from the
-                #   local rank). In this case, the external updates to
-                #   component_2 should not be send back and applied, as
-                #   these updates are already done locally on the other
-                #   process. This special case is flagged by the
-                #   'synchronous' variable being True. The exception
-                #   (to this exception) is when the interaction is non-
-                #   deterministic, in which case this (supposedly
-                #   identical) interaction must not be computed by both
-                #   processes synchronously, as they may produce
-                #   different results.
-                local = False
-                if index_component_1 == index_component_2 and rank_send == rank == rank_recv:
-                    local = True
-                synchronous = False
-                if not local and index_component_1 == index_component_2 and rank_send == rank_recv:
-                    synchronous = True
-                mutual = True
-                if only_supply or local or (synchronous and deterministic) or not assisted:
-                    mutual = False
-                # Communicate the dependent variables
-                # (e.g. pos for gravity) of component_2.
-                component_2_extrl = sendrecv_component(component_2_local,
-                                                       dependent, dest=rank_send,
-                                                                  source=rank_recv,
-                                                       )
+            pairings = [i for i in range(N_domain_pairs)
+                        if domain_pairing_within_range(i, interaction_range)]
+            N_pairings = len(pairings)
+            # The number of local particles of component_2 on all
+            # processes, so that the data of component_2 can be
+            # received without first communicating its size.
+            N_locals = asarray(allgather(component_2_local.N_local), dtype=C2np['Py_ssize_t'])
+            # The communication is pipelined, so that the dependent
+            # variables of the next pairing are in flight while the
+            # current pairing is being computed, while the affected
+            # variables of the current pairing are sent back while the
+            # next pairing is being computed. The external component_2
+            # of a pairing is kept in one of three buffer components,
+            # used in rotation. Three are needed as the buffer of a
+            # pairing is still being sent back while the data of the
+            # next pairing is being computed upon and the data of the
+            # pairing after that is being received.
+            components_2_extrl = [None]*3
+            pairing_info       = [None]*3
+            pairing_mutual     = [False]*3
+            requests_dependent = [[], [], []]
+            requests_Δ         = [[], [], []]
+            Δ_pending = False
+            for k in range(-1, N_pairings):
+                # Begin communicating the dependent variables
+                # (e.g. pos for gravity) of component_2
+                # for the next pairing.
+                if k + 1 < N_pairings:
+                    b = (k + 1)%3
+                    # The buffer component of the next pairing was last
+                    # used three pairings ago. Make sure that its
+                    # affected variable buffers have been fully sent
+                    # back, and nullify them, leaving the buffer with
+                    # no leftover junk.
+                    Waitall(requests_Δ[b])
+                    if pairing_mutual[b]:
+                        component_2_extrl = components_2_extrl[b]
+                        component_2_extrl.nullify_Δ(affected)
+                    (rank_send, rank_recv, local, synchronous, mutual,
+                        send_needed, recv_needed) = domain_pairing(
+                            pairings[k + 1], index_component_1 == index_component_2,
+                            only_supply, assisted, deterministic, interaction_range)
+                    # If the domain we send to is not within range of
+                    # the local domain, an empty component is sent in
+                    # place of component_2. Likewise, nothing is
+                    # received from an out-of-range domain.
+                    component_2_send = component_2_local
+                    if not send_needed:
+                        component_2_send = get_empty_component(component_2_local)
+                    N_recv = N_locals[rank_recv] if recv_needed else 0
+                    component_2_extrl, requests = isendrecv_component(
+                        component_2_send, dependent, rank_send, rank_recv, N_recv,
+                        buffer_name=('domain_domain', b),
+                    )
+                    # Store the information about the next pairing
+                    components_2_extrl[b] = component_2_extrl
+                    requests_dependent[b] = requests
+                    requests_Δ[b] = []
+                    pairing_info[b] = (rank_send, rank_recv, local, synchronous,
+                                       recv_needed, component_2_send.N_local)
+                    pairing_mutual[b] = mutual
+                if k == -1:
+                    continue
+                # Retrieve the current pairing
+                b = k%3
+                component_2_extrl = components_2_extrl[b]
+                mutual = pairing_mutual[b]
+                (rank_send, rank_recv, local, synchronous,
+                    recv_needed, N_send) = pairing_info[b]
+                # Wait for the dependent variables of
+                # the current pairing to arrive.
+                Waitall(requests_dependent[b])
                 # Let the local component_1 interaction with the
                 # external component_2. This will update the affected
                 # variables (e.g. mom for gravity) of the local
@@ -185,29 +255,227 @@ def domain_domain(receivers, suppliers, ᔑdt, interaction, interaction_name,
                 # and also non-deterministic, perform the interaction
                 # only on one of the two processes. The process with
                 # the lower rank is chosen for the job.
-                if (    not synchronous
+                # The time spent computing the interaction is recorded,
+                # excluding any time spent waiting on communication.
+                if recv_needed and (
+                       not synchronous
                     or (    synchronous and     deterministic)
                     or (    synchronous and not deterministic and rank < rank_send)
                     ):
+                    interaction_time_start = time()
                     interaction(component_1, component_2_extrl,
                                 rank_recv, ᔑdt, local, mutual, extra_args)
+                    interaction_cost += time() - interaction_time_start
+                # Add the affected variable buffers received from the
+                # previous pairing to the affected variables (e.g. mom
+                # for gravity) of the local component_2. This has to
+                # be done before the buffers are reused below.
+                if Δ_pending:
+                    Waitall(requests_Δ_recv)
+                    add_received_Δ(component_2_local, affected, N_Δ_recv)
+                    Δ_pending = False
                 if mutual:
-                    # Send the populated buffers back to the process
-                    # from which the external component_2 came.
-                    # Add the received values in the buffers to the
-                    # affected variables (e.g. mom for gravity) of
-                    # the local component_2.
-                    sendrecv_component(component_2_extrl,
-                                       affected,
-                                       dest=rank_recv,
-                                       source=rank_send,
-                                       component_recv=component_2_local,
-                                       )
-                    # Nullify the Δ buffers of the external component_2,
-                    # leaving this with no leftover junk.
+                    # Begin sending the populated buffers back to the
+                    # process from which the external component_2 came,
+                    # while receiving the buffers of the local
+                    # component_2 from the process it was sent to.
+                    requests = isendrecv_Δ(component_2_extrl, affected,
+                                           rank_recv, rank_send, N_send)
+                    requests_Δ[b] = requests
+                    requests_Δ_recv = requests
+                    N_Δ_recv = N_send
+                    Δ_pending = True
+            # Apply the received buffers of the last pairing and wait
+            # for all sends to complete. Then nullify the buffers of
+            # the external component_2, leaving these with no
+            # leftover junk.
+            if Δ_pending:
+                Waitall(requests_Δ_recv)
+                add_received_Δ(component_2_local, affected, N_Δ_recv)
+            for b in range(3):
+                Waitall(requests_Δ[b])
+                if pairing_mutual[b]:
+                    component_2_extrl = components_2_extrl[b]
                     component_2_extrl.nullify_Δ(affected)
             masterprint('done')
 
+# The wall time spent by the local process computing interactions
+# between its domain and the (local or received) external domains,
+# excluding communication. This measures the local work,
+# independently of how long the process has to wait for others.
+cython.declare(interaction_cost='double')
+interaction_cost = 0
+
+# Function returning the interaction cost recorded since the last call
+@cython.header(# Locals
+               cost='double',
+               returns='double',
+               )
+def pop_interaction_cost():
+    global interaction_cost
+    cost = interaction_cost
+    interaction_cost = 0
+    return cost
+
+# Function which determines the ranks and nature of the i'th pairing
+# of domain_domain, as seen from the local process.
+@cython.header(# Arguments
+               i='Py_ssize_t',
+               same_component='bint',
+               only_supply='bint',
+               assisted='bint',
+               deterministic='bint',
+               interaction_range='double',
+               # Locals
+               local='bint',
+               mutual='bint',
+               rank_recv='int',
+               rank_send='int',
+               recv_needed='bint',
+               send_needed='bint',
+               synchronous='bint',
+               returns=tuple,
+               )
+def domain_pairing(i, same_component, only_supply, assisted, deterministic, interaction_range):
+    # Process ranks to send to and receive from
+    rank_send = mod(rank + i, nprocs)
+    rank_recv = mod(rank - i, nprocs)
+    # Determine whther component_2 should be updated due to
+    # its interaction with component_1. This is usually the
+    # case. The exceptions are
+    # - component_2 is a supplier and not a receiver.
+    #   When this is the case, only_supply is True.
+    # - component_2 is really the same as component_1
+    #   and this is a local interaction, meaning that
+    #   both rank_send and rank_recv is really just the
+    #   local rank. In this case, the supplied interaction
+    #   function should also update the data of component_2
+    #   (not the buffers). This special case is flagged
+    #   by the 'local' variable being True.
+    # - component_2 is really the same as component_1
+    #   and rank_send == rank_recv (but different from the
+    #   local rank). In this case, the external updates to
+    #   component_2 should not be send back and applied, as
+    #   these updates are already done locally on the other
+    #   process. This special case is flagged by the
+    #   'synchronous' variable being True. The exception
+    #   (to this exception) is when the interaction is non-
+    #   deterministic, in which case this (supposedly
+    #   identical) interaction must not be computed by both
+    #   processes synchronously, as they may produce
+    #   different results.
+    local = False
+    if same_component and rank_send == rank == rank_recv:
+        local = True
+    synchronous = False
+    if not local and same_component and rank_send == rank_recv:
+        synchronous = True
+    mutual = True
+    if only_supply or local or (synchronous and deterministic) or not assisted:
+        mutual = False
+    # Determine whether the domains we send to and receive
+    # from are within range of the local domain. As this
+    # relation is symmetric, it is known to both the sending
+    # and the receiving process.
+    send_needed = domains_within_range(rank, rank_send, interaction_range)
+    recv_needed = domains_within_range(rank, rank_recv, interaction_range)
+    return rank_send, rank_recv, local, synchronous, mutual, send_needed, recv_needed
+
+# Function which determines whether any two points within the domains
+# of the two given processes are closer than interaction_range,
+# taking the periodicity of the box into account. Note that
+# finite-range interactions are all mesh-based and thus always carried
+# out with the domain decomposition being uniform, which is why the
+# results of domain_pairing_within_range may be cached.
+@cython.header(# Arguments
+               rank_1='int',
+               rank_2='int',
+               interaction_range='double',
+               # Locals
+               box_1=tuple,
+               box_2=tuple,
+               dim='int',
+               distance2='double',
+               gap='double',
+               gap_backward='double',
+               gap_forward='double',
+               size_1='double',
+               size_2='double',
+               start_1='double',
+               start_2='double',
+               returns='bint',
+               )
+def domains_within_range(rank_1, rank_2, interaction_range):
+    if interaction_range == ထ or rank_1 == rank_2:
+        return True
+    box_1 = domain_box(rank_1)
+    box_2 = domain_box(rank_2)
+    distance2 = 0
+    for dim in range(3):
+        # The gaps from the end of one domain to the start of the
+        # other, going both ways around the periodic box.
+        start_1, size_1 = box_1[dim], box_1[3 + dim]
+        start_2, size_2 = box_2[dim], box_2[3 + dim]
+        gap_forward  = mod(start_2 - start_1 - size_1, boxsize)
+        gap_backward = mod(start_1 - start_2 - size_2, boxsize)
+        # If the two gaps and the two domains together wrap around the
+        # box more than once, the domains overlap along this dimension.
+        # Otherwise the shortest gap separates them.
+        if gap_forward + gap_backward + size_1 + size_2 > ℝ[1.5*boxsize]:
+            gap = 0
+        else:
+            gap = pairmin(gap_forward, gap_backward)
+        distance2 += gap*gap
+    return distance2 < interaction_range*interaction_range
+
+# Function which determines whether the i'th pairing of domain_domain
+# places any domain within interaction_range of its partner.
+# The result is the same on all processes.
+@cython.header(# Arguments
+               i='Py_ssize_t',
+               interaction_range='double',
+               # Locals
+               key=tuple,
+               other_rank='int',
+               within_range='bint',
+               returns='bint',
+               )
+def domain_pairing_within_range(i, interaction_range):
+    if interaction_range == ထ or i == 0:
+        return True
+    key = (i, interaction_range)
+    if key in domain_pairings_within_range:
+        within_range = domain_pairings_within_range[key]
+    else:
+        within_range = any([domains_within_range(other_rank, mod(other_rank + i, nprocs),
+                                                 interaction_range)
+                            for other_rank in range(nprocs)])
+        domain_pairings_within_range[key] = within_range
+    return within_range
+cython.declare(domain_pairings_within_range=dict)
+domain_pairings_within_range = {}
+
+# Function returning an empty (particle) component
+# with the meta data of the given component.
+@cython.header(# Arguments
+               component='Component',
+               returns='Component',
+               )
+def get_empty_component(component):
+    global component_empty
+    if component_empty is None:
+        component_empty = type(component)('', 'dark matter particles', 1)
+    component_empty.name             = component.name
+    component_empty.species          = component.species
+    component_empty.representation   = component.representation
+    component_empty.N                = component.N
+    component_empty.mass             = component.mass
+    component_empty.softening_length = component.softening_length
+    component_empty.N_local          = 0
+    return component_empty
+cython.declare(component_empty='Component')
+component_empty = None
+
 # Generic function implementing particle-mesh interactions
 @cython.header(# Arguments
                receivers=list,
@@ -252,7 +520,7 @@ def particle_mesh(receivers, suppliers, ᔑdt, potential, potential_name,
     components = receivers + suppliers
     masterprint('Constructing the {} due to {} ...'
                 .format(potential_name, ', '.join([component.name for component in components])))
-    φ = construct_potential(components, dependent, potential)
+    φ = construct_potential(components, dependent, potential, potential_name)
     masterprint('done')
     # For each dimension, differentiate φ and apply the force to
     # all receiver components.
@@ -276,27 +544,14 @@ def particle_mesh(receivers, suppliers, ᔑdt, potential, potential_name,
                components=list,
                quantities=list,
                potential=func_potential,
+               potential_name=str,
                # Locals
-               double_deconv='double',
-               fft_normalization_factor='double',
-               i='Py_ssize_t',
-               j='Py_ssize_t',
-               j_global='Py_ssize_t',
-               k='Py_ssize_t',
-               ki='Py_ssize_t',
-               kj='Py_ssize_t',
-               kj2='Py_ssize_t',
-               kk='Py_ssize_t',
-               k2='Py_ssize_t',
+               greens='double[:, :, ::1]',
                slab='double[:, :, ::1]',
-               slab_jik='double*',
-               reciprocal_sqrt_deconv_ij='double',
-               reciprocal_sqrt_deconv_ijk='double',
-               reciprocal_sqrt_deconv_j='double',
                φ='double[:, :, ::1]',
                returns='double[:, :, ::1]',
                )
-def construct_potential(components, quantities, potential):
+def construct_potential(components, quantities, potential, potential_name):
     """This function populate the φ grid (including pseudo points and
     ghost layers) with a real-space potential corresponding to the
     Fourier-space potential function given, due to all the components.
@@ -319,23 +574,101 @@ def construct_potential(components, quantities, potential):
                   ('ϱ', a**(-3*w_eff - 1))],
     potential = lambda k2: -4*π*G_Newton/k2
     (note: it is not allowed to actually pass a lambda function,
-    in compiled mode anyway).
+    in compiled mode anyway). The potential_name is used to identify
+    the tabulated Green's function of the potential,
+    see get_greens_function.
     """
     # CIC interpolate the particles/fluid elements onto the slabs
     φ = CIC_components2φ(components, quantities)
-    slab = slab_decompose(φ, prepare_fft=True)
-    # Do forward Fourier transform on the slabs
-    # containing the density field.
-    fft(slab, 'forward')
+    # Do forward Fourier transform of the density field,
+    # decomposing it into slabs or pencils.
+    slab = fft_forward(φ)
+    # Multiply by the Green's function, converting the grid values to
+    # actual potential values (in Fourier space). This includes two
+    # deconvolutions, one for each CIC interpolation (the component
+    # assignment and the upcoming force interpolation).
+    greens = get_greens_function(slab, potential, potential_name, 2)
+    apply_greens_function(slab, greens)
+    # Fourier transform the slabs back to coordinate space, storing
+    # the potential values in φ. This also populates pseudo and
+    # ghost points.
+    fft_backward(slab, φ)
+    # Return the potential grid (though this is a global and is often
+    # imported directly into other modules).
+    return φ
+
+# Function returning the Green's function of the given potential,
+# tabulated over the local part of Fourier space grids shaped like the
+# passed slab (as returned by fft_forward). Each value is the
+# potential(k2) factor multiplied by n_deconv full CIC deconvolutions
+# and the normalization needed after a forward and a backward Fourier
+# transformation. The value at |k| = 0 is set to zero. For a long-range
+# potential (P³M, TreePM), the Gaussian long-range filter is part of
+# the potential function and so is included as well. If potential_name
+# is empty, only the deconvolutions are tabulated, without potential
+# and normalization. As the result depends on the grid only through
+# φ_gridsize and the decomposition, it is computed once and cached
+# under the potential_name, sparing the evaluation of the potential
+# and the sinc functions at every mode at every time step. The cached
+# Green's functions are stored in buffers, so that the memory of
+# Green's functions no longer in use is released by release_buffers
+# (see the buffer_release_period parameter), after which they will be
+# tabulated anew if needed again.
+@cython.header(# Arguments
+               slab='double[:, :, ::1]',
+               potential=func_potential,
+               potential_name=str,
+               n_deconv='int',
+               # Locals
+               deconv_ijk='double',
+               fft_normalization_factor='double',
+               greens='double[:, :, ::1]',
+               greens_jik='double',
+               i='Py_ssize_t',
+               include_potential='bint',
+               j='Py_ssize_t',
+               j_global='Py_ssize_t',
+               j_start='Py_ssize_t',
+               k='Py_ssize_t',
+               key=tuple,
+               ki='Py_ssize_t',
+               kj='Py_ssize_t',
+               kj2='Py_ssize_t',
+               kk='Py_ssize_t',
+               kk_start='Py_ssize_t',
+               k2='Py_ssize_t',
+               reciprocal_sqrt_deconv_ij='double',
+               reciprocal_sqrt_deconv_ijk='double',
+               reciprocal_sqrt_deconv_j='double',
+               shape=tuple,
+               tabulated='bint',
+               ℓ='int',
+               returns='double[:, :, ::1]',
+               )
+def get_greens_function(slab, potential, potential_name, n_deconv):
+    key = ('greens', potential_name, n_deconv, slab.shape[0], slab.shape[2])
+    shape = (slab.shape[0], slab.shape[1], slab.shape[2]//2)
+    # The Green's function is stored in a buffer named by the key.
+    # A previously tabulated Green's function can be reused as long as
+    # its buffer has not been released since.
+    tabulated = (
+        key in greens_functions and get_buffer_size(key) >= np.prod(shape)
+    )
+    greens = get_buffer(shape, key)
+    if tabulated:
+        return greens
+    include_potential = bool(potential_name)
+    # The global j and k indices of the first local element
+    j_start, kk_start = fourier_grid_start(φ_gridsize)
     # Multiplicative factor needed after a forward and a backward
     # Fourier transformation.
     fft_normalization_factor = float(φ_gridsize)**(-3)
     # Loop through the local j-dimension
-    for j in range(ℤ[slab.shape[0]]):
+    for j in range(ℤ[greens.shape[0]]):
         # The j-component of the wave vector (grid units).
         # Since the slabs are distributed along the j-dimension,
         # an offset must be used.
-        j_global = ℤ[slab.shape[0]*rank] + j
+        j_global = j_start + j
         if j_global > ℤ[φ_gridsize//2]:
             kj = j_global - φ_gridsize
         else:
@@ -353,57 +686,62 @@ def construct_potential(components, quantities, potential):
             # Reciprocal square root of the product of the i-
             # and the j-component of the deconvolution.
             reciprocal_sqrt_deconv_ij = sinc(ki*ℝ[π/φ_gridsize])*reciprocal_sqrt_deconv_j
-            # Loop through the complete, padded k-dimension
-            # in steps of 2 (one complex number at a time).
-            for k in range(0, ℤ[slab.shape[2]], 2):
-                # The k-component of the wave vector (grid units)
-                kk = k//2
+            # Loop through the local k-dimension
+            # (one complex number at a time).
+            for k in range(ℤ[greens.shape[2]]):
+                # The k-component of the wave vector (grid units).
+                # With pencil decomposition, the k-dimension is
+                # distributed as well.
+                kk = kk_start + k
                 # The squared magnitude of the wave vector (grid units)
                 k2 = ℤ[ki**2 + kj2] + kk**2
-                # Pointer to the [j, i, k]'th element of the slab.
-                # The complex number is then given as
-                # Re = slab_jik[0], Im = slab_jik[1].
-                slab_jik = cython.address(slab[j, i, k:])
                 # Enforce the vanishing of the potential at |k| = 0.
                 # The real-space mean value of the potential will then
                 # be zero, as it should for a peculiar potential.
                 if k2 == 0:
-                    slab_jik[0] = 0  # Real part
-                    slab_jik[1] = 0  # Imag part
+                    greens[j, i, k] = 0
                     continue
                 # Reciprocal square root of the product of
                 # all components of the deconvolution.
                 reciprocal_sqrt_deconv_ijk = reciprocal_sqrt_deconv_ij*sinc(kk*ℝ[π/φ_gridsize])
-                # A full deconvolution is now
-                # 1/reciprocal_sqrt_deconv_ijk**2.
-                # We need however two such full deconvolutions, one for
-                # each CIC interpolation (the component assignment and
-                # the upcoming force interpolation).
-                double_deconv = 1/reciprocal_sqrt_deconv_ijk**4
+                # The total factor for a complete deconvolution
+                deconv_ijk = 1/reciprocal_sqrt_deconv_ijk**2
+                greens_jik = 1
+                for ℓ in range(n_deconv):
+                    greens_jik *= deconv_ijk
                 # Get the factor from the potential function at this k².
                 # The physical squared length of the wave vector is
                 # given by (2π/boxsize*|k|)².
-                potential_factor = potential(ℝ[(2*π/boxsize)**2]*k2)
-                # Transform the grid in the following ways:
-                # - Multiply by potential_factor, converting the grid
-                #   values to actual potential values
-                #   (in Fourier space).
-                # - Multiply by double_deconv, taking care of the
-                #   deconvolution needed due to the
-                #   two CIC-interpolations.
-                # - Multiply by fft_normalization_factor, needed to
-                #   normalize the grid values after a forwards and a
-                #   backwards Fourier transformation.
-                slab_jik[0] *= ℝ[potential_factor*double_deconv*fft_normalization_factor]
-                slab_jik[1] *= ℝ[potential_factor*double_deconv*fft_normalization_factor]
-    # Fourier transform the slabs back to coordinate space.
-    # Now the slabs store potential values.
-    fft(slab, 'backward')
-    # Communicate the potential stored in the slabs to φ
-    domain_decompose(slab, φ)  # This also populates pseudo and ghost points
-    # Return the potential grid (though this is a global and is often
-    # imported directly into other modules).
-    return φ
+                with unswitch(3):
+                    if include_potential:
+                        greens_jik *= ℝ[fft_normalization_factor]*potential(
+                            ℝ[(2*π/boxsize)**2]*k2
+                        )
+                greens[j, i, k] = greens_jik
+    greens_functions.add(key)
+    return greens
+# Set of keys of the tabulated Green's functions
+cython.declare(greens_functions=set)
+greens_functions = set()
+
+# Function multiplying each complex element of a Fourier space grid
+# (as returned by fft_forward) by the corresponding real element of
+# a Green's function (as returned by get_greens_function).
+@cython.header(# Arguments
+               slab='double[:, :, ::1]',
+               greens='double[:, :, ::1]',
+               # Locals
+               greens_ptr='double*',
+               index='Py_ssize_t',
+               slab_ptr='double*',
+               returns='void',
+               )
+def apply_greens_function(slab, greens):
+    slab_ptr   = cython.address(slab  [:, :, :])
+    greens_ptr = cython.address(greens[:, :, :])
+    for index in range(ℤ[greens.shape[0]*greens.shape[1]*greens.shape[2]]):
+        slab_ptr[2*index    ] *= greens_ptr[index]  # Real part
+        slab_ptr[2*index + 1] *= greens_ptr[index]  # Imag part
 
 # Generic function implementing particle-mesh interactions
 # for both particle and fluid componenets.
@@ -422,6 +760,8 @@ def construct_potential(components, quantities, potential):
                gradφ_dim='double[:, :, ::1]',
                h='double',
                representation=str,
+               slab='double[:, :, ::1]',
+               slab_dict=dict,
                φ='double[:, :, ::1]',
                φ_dict=dict,
                )
@@ -457,14 +797,43 @@ def particle_mesh_general(receivers, suppliers, ᔑdt, potential, potential_name
     The grids are then Fourier transformed back to real space and
     differentiated along each dimension to get the force. This force is
     passed to the apply_potential function for each receiver and
-    each dimension.
+    each dimension. If φ_fourier_differentiation is enabled, the
+    differentiation is instead carried out (exactly) in Fourier space,
+    with each force component being Fourier transformed back to real
+    space separately.
     """
     # Build the two potentials due to all particles and fluid components
     components = receivers + suppliers
     masterprint('Constructing the {} due to {} ...'
                 .format(potential_name, ', '.join([component.name for component in components])))
-    φ_dict = construct_potential_general(receivers, suppliers, dependent, potential)
+    if φ_fourier_differentiation:
+        slab_dict = construct_potential_general(
+            receivers, suppliers, dependent, potential, potential_name, fourier_space=True,
+        )
+    else:
+        φ_dict = construct_potential_general(
+            receivers, suppliers, dependent, potential, potential_name,
+        )
     masterprint('done')
+    if φ_fourier_differentiation:
+        # For each dimension, differentiate the potentials in Fourier
+        # space and apply the force to all receiver components.
+        for representation, slab in slab_dict.items():
+            for dim in range(3):
+                masterprint(f'Differentiating the ({representation}) {potential_name} along the '
+                            f'{"xyz"[dim]}-direction in Fourier space and applying it ...'
+                            )
+                # Do the differentiation of φ
+                gradφ_dim = diff_fourier(slab, dim)
+                # Apply force to all the receivers
+                for component in receivers:
+                    if component.representation != representation:
+                        continue
+                    masterprint(f'Applying to {component.name} ...')
+                    apply_potential(component, ᔑdt, gradφ_dim, dim)
+                    masterprint('done')
+                masterprint('done')
+        return
     # For each dimension, differentiate the potentials
     # and apply the force to all receiver components.
     h = boxsize/φ_gridsize  # Physical grid spacing of φ
@@ -491,44 +860,32 @@ def particle_mesh_general(receivers, suppliers, ᔑdt, potential, potential_name
                suppliers=list,
                quantities=list,
                potential=func_potential,
+               potential_name=str,
+               fourier_space='bint',
                # Locals
                any_fluid='bint',
                any_fluid_receivers='bint',
                any_particles='bint',
                any_particles_receivers='bint',
                components=list,
-               deconv_factor='double',
-               deconv_ijk='double',
-               fft_normalization_factor='double',
-               i='Py_ssize_t',
-               j='Py_ssize_t',
-               j_global='Py_ssize_t',
-               kj='Py_ssize_t',
-               kj2='Py_ssize_t',
-               k='Py_ssize_t',
-               ki='Py_ssize_t',
-               kk='Py_ssize_t',
-               k2='Py_ssize_t',
-               potential_factor='double',
+               deconv='double[:, :, ::1]',
+               deconv_ptr='double*',
+               greens='double[:, :, ::1]',
+               index='Py_ssize_t',
                receiver_representations=list,
-               reciprocal_sqrt_deconv_ij='double',
-               reciprocal_sqrt_deconv_ijk='double',
-               reciprocal_sqrt_deconv_j='double',
                representation=str,
-               representation_counter='int',
                slab='double[:, :, ::1]',
                slab_dict=dict,
                slab_fluid='double[:, :, ::1]',
-               slab_fluid_jik='double*',
-               slab_jik='double*',
-               slab_ordereddict=object,  # OrderedDict
+               slab_fluid_ptr='double*',
                slab_particles='double[:, :, ::1]',
-               slab_particles_jik='double*',
+               slab_particles_ptr='double*',
                φ='double[:, :, ::1]',
                φ_dict=dict,
                returns=dict,
                )
-def construct_potential_general(receivers, suppliers, quantities, potential):
+def construct_potential_general(receivers, suppliers, quantities, potential, potential_name,
+                                fourier_space=False):
     """This function populate two grids (including pseudo points and
     ghost layers) with a real-space potential corresponding to the
     Fourier-space potential function given, due to all the components.
@@ -562,7 +919,13 @@ def construct_potential_general(receivers, suppliers, quantities, potential):
                   ('ϱ', a**(-3*w_eff - 1))],
     potential = lambda k2: -4*π*G_Newton/k2
     (note that it is not actally allowed to pass an untyped lambda
-    function in compiled mode).
+    function in compiled mode). The potential_name is used to identify
+    the tabulated Green's function of the potential,
+    see get_greens_function.
+
+    If fourier_space is True, the final backward Fourier transformation
+    is skipped and a dictionary mapping representations to the Fourier
+    space potential grids (as returned by fft_forward) is returned.
     """
     # CIC interpolate the particles/fluid elements onto the grids.
     # The φ_dict will be a dictionary mapping representations
@@ -573,145 +936,54 @@ def construct_potential_general(receivers, suppliers, quantities, potential):
     # Flags specifying whether any fluid/particle components are present
     any_particles = ('particles' in φ_dict)
     any_fluid     = ('fluid'     in φ_dict)
-    # Slab decompose the grids
-    slab_dict = {representation: slab_decompose(φ, f'φ_{representation}_slab', prepare_fft=True)
+    # Do a forward Fourier transform of the grids,
+    # decomposing them into slabs or pencils.
+    slab_dict = {representation: fft_forward(φ, f'φ_{representation}_slab')
                  for representation, φ in φ_dict.items()}
-    # In the case of both particle and fluid components being present,
-    # it is important that the particle slabs are handled after the
-    # fluid slabs, as the deconvolution factor is only computed for
-    # particle components and this is needed after combining the fluid
-    # and particle slabs.
-    slab_ordereddict = collections.OrderedDict()
-    if any_fluid:
-        slab_fluid = slab_dict['fluid']
-        slab_ordereddict['fluid'] = slab_fluid
-    if any_particles:
+    # For each grid, multiply by the Green's function, converting the
+    # grid values to actual potential values (in Fourier space) and
+    # carrying out the deconvolutions. A deconvolution of the particle
+    # potential is needed due to the interpolation from the particle
+    # positions to the grid. For particle components we will need to do
+    # a second deconvolution due to the interpolation from the grid back
+    # to the particles. We carry out this second deconvolution now if we
+    # only have particle components. If both particle and fluid
+    # components are present, this second deconvolution will take
+    # place later. Do not apply any deconvolution to fluids.
+    for representation, slab in slab_dict.items():
+        if representation == 'particles':
+            greens = get_greens_function(
+                slab, potential, potential_name, (1 if any_fluid else 2),
+            )
+        else:
+            greens = get_greens_function(slab, potential, potential_name, 0)
+        apply_greens_function(slab, greens)
+    # If only particle components or only fluid components exist, the
+    # slabs now store the final potential in Fourier space. However, if
+    # both particle and fluid components exist, the two sets of slabs
+    # should be combined to form total potentials.
+    if any_particles and any_fluid:
         slab_particles = slab_dict['particles']
-        slab_ordereddict['particles'] = slab_particles
-    # Do a forward in-place Fourier transform of the slabs
-    for slab in slab_dict.values():
-        fft(slab, 'forward')
-    # Multiplicative factor needed after a forward and a backward
-    # Fourier transformation.
-    fft_normalization_factor = float(φ_gridsize)**(-3)
-    # For each grid, multiply by the potential and deconvolution
-    # factors. Do fluid slabs fist, then particle slabs.
-    for representation_counter, (representation, slab) in enumerate(slab_ordereddict.items()):
-        # Begin loop over slabs. As the first and second dimensions
-        # are transposed due to the FFT, start with the j-dimension.
-        for j in range(ℤ[slab.shape[0]]):
-            # The j-component of the wave vector (grid units).
-            # Since the slabs are distributed along the j-dimension,
-            # an offset must be used.
-            j_global = ℤ[slab.shape[0]*rank] + j
-            if j_global > ℤ[φ_gridsize//2]:
-                kj = j_global - φ_gridsize
-            else:
-                kj = j_global
-            kj2 = kj**2
-            # Reciprocal square root of the j-component of the deconvolution
-            with unswitch(1):
-                if 𝔹[representation == 'particles']:
-                    reciprocal_sqrt_deconv_j = sinc(kj*ℝ[π/φ_gridsize])
-            # Loop through the complete i-dimension
-            for i in range(φ_gridsize):
-                # The i-component of the wave vector (grid units)
-                if i > ℤ[φ_gridsize//2]:
-                    ki = i - φ_gridsize
-                else:
-                    ki = i
-                # Reciprocal square root of the product of the i-
-                # and the j-component of the deconvolution.
-                with unswitch(2):
-                    if 𝔹[representation == 'particles']:
-                        reciprocal_sqrt_deconv_ij = (sinc(ki*ℝ[π/φ_gridsize])
-                                                     *reciprocal_sqrt_deconv_j)
-                # Loop through the complete, padded k-dimension
-                # in steps of 2 (one complex number at a time).
-                for k in range(0, ℤ[slab.shape[2]], 2):
-                    # The k-component of the wave vector (grid units)
-                    kk = k//2
-                    # The squared magnitude of the wave vector (grid units)
-                    k2 = ℤ[ki**2 + kj2] + kk**2
-                    # Pointer to the [j, i, k]'th element of the slab.
-                    # The complex number is then given as
-                    # Re = slab_jik[0], Im = slab_jik[1].
-                    slab_jik = cython.address(slab[j, i, k:])
-                    # Enforce the vanishing of the potential at |k| = 0.
-                    # The real-space mean value of the potential will
-                    # then be zero, as it should for a
-                    # peculiar potential.
-                    if k2 == 0:
-                        slab_jik[0] = 0  # Real part
-                        slab_jik[1] = 0  # Imag part
-                        continue
-                    # Get the factor from the potential function at
-                    # this k². The physical squared length of the wave
-                    # vector is given by (2π/boxsize*|k|)².
-                    potential_factor = potential(ℝ[(2*π/boxsize)**2]*k2)
-                    # The final deconvolution factor
-                    with unswitch(3):
-                        if 𝔹[representation == 'particles']:
-                            # Reciprocal square root of the product of
-                            # all components of the deconvolution.
-                            reciprocal_sqrt_deconv_ijk = (reciprocal_sqrt_deconv_ij
-                                                          *sinc(kk*ℝ[π/φ_gridsize]))
-                            # The total factor
-                            # for a complete deconvolution.
-                            deconv_ijk = 1/reciprocal_sqrt_deconv_ijk**2
-                            # A deconvolution of the particle potential
-                            # is needed due to the interpolation from
-                            # the particle positions to the grid.
-                            deconv_factor = deconv_ijk
-                            # For particle components we will need to do
-                            # a second deconvolutions due to the
-                            # interpolation from the grid back to the
-                            # particles. We carry out this second
-                            # deconvolution now if we only have particle
-                            # components. If both particle and fluid
-                            # components are present, this second
-                            # deconvolution will take place later.
-                            with unswitch(4):
-                                if not any_fluid:
-                                    deconv_factor *= deconv_ijk
-                        elif 𝔹[representation == 'fluid']:
-                            # Do not apply any deconvolution to fluids
-                            deconv_factor = 1
-                    # Transform this complex grid point
-                    slab_jik[0] *= ℝ[potential_factor*deconv_factor  # Real part
-                                     *fft_normalization_factor]
-                    slab_jik[1] *= ℝ[potential_factor*deconv_factor  # Imag part
-                                     *fft_normalization_factor]
-                    # If only particle components or only fluid
-                    # components exist, the slabs now store the final
-                    # potential in Fourier space. However, if both
-                    # particle and fluid components exist, the two sets
-                    # of slabs should be combined to form total
-                    # potentials. We know that both representations
-                    # exist and that we are done handling both (at this
-                    # gridpoint) if representation_counter == 1.
-                    with unswitch(3):
-                        if representation_counter == 1:
-                            # Pointers to this element for both slabs.
-                            # As we are looping over the particle slab,
-                            # we may reuse the pointer above.
-                            slab_particles_jik = slab_jik
-                            slab_fluid_jik     = cython.address(slab_fluid[j, i, k:])
-                            # Add the particle potential values
-                            # to the fluid potential.
-                            slab_fluid_jik[0] += slab_particles_jik[0]  # Real part
-                            slab_fluid_jik[1] += slab_particles_jik[1]  # Imag part
-                            # Now the fluid slabs store the total
-                            # potential, with the particle part
-                            # deconvolved once due to the interpolation
-                            # of the particles to the grid. The particle
-                            # slabs should now be a copy of what is
-                            # stored in the fluid slabs, but with an
-                            # additional deconvolution, accounting for
-                            # the upcoming interpolation from the grid
-                            # back to the particles.
-                            slab_particles_jik[0] = deconv_ijk*slab_fluid_jik[0]  # Real part
-                            slab_particles_jik[1] = deconv_ijk*slab_fluid_jik[1]  # Imag part
+        slab_fluid     = slab_dict['fluid']
+        slab_particles_ptr = cython.address(slab_particles[:, :, :])
+        slab_fluid_ptr     = cython.address(slab_fluid    [:, :, :])
+        # Tabulated single deconvolution, without any potential
+        deconv = get_greens_function(slab_particles, potential, '', 1)
+        deconv_ptr = cython.address(deconv[:, :, :])
+        for index in range(ℤ[deconv.shape[0]*deconv.shape[1]*deconv.shape[2]]):
+            # Add the particle potential values
+            # to the fluid potential.
+            slab_fluid_ptr[2*index    ] += slab_particles_ptr[2*index    ]  # Real part
+            slab_fluid_ptr[2*index + 1] += slab_particles_ptr[2*index + 1]  # Imag part
+            # Now the fluid slabs store the total potential, with the
+            # particle part deconvolved once due to the interpolation
+            # of the particles to the grid. The particle slabs should
+            # now be a copy of what is stored in the fluid slabs, but
+            # with an additional deconvolution, accounting for the
+            # upcoming interpolation from the grid back to
+            # the particles.
+            slab_particles_ptr[2*index    ] = deconv_ptr[index]*slab_fluid_ptr[2*index    ]
+            slab_particles_ptr[2*index + 1] = deconv_ptr[index]*slab_fluid_ptr[2*index + 1]
     # In the general case of both particles and fluids taking part in
     # the creation of the potential, slab_dict now contains slab-
     # decomposed potential grids in Fourier space, one for particles and
@@ -736,12 +1008,13 @@ def construct_potential_general(receivers, suppliers, quantities, potential):
             'as it appears that neither particles nor fluids should receive the force '
             'due to the potential'
         )
-    # Fourier transform the slabs back to coordinate space
-    for slab in slab_dict.values():
-        fft(slab, 'backward')
-    # Domain-decompose the slabs
+    # Return the potential grids in Fourier space if requested
+    if fourier_space:
+        return slab_dict
+    # Fourier transform the slabs back to coordinate space,
+    # storing the results in the domain grids.
     for φ, slab in zip(φ_dict.values(), slab_dict.values()):
-        domain_decompose(slab, φ)  # Also populates pseudos and ghost
+        fft_backward(slab, φ)  # Also populates pseudos and ghost
     # Return the potential grids
     return φ_dict
 
@@ -763,12 +1036,12 @@ def construct_potential_general(receivers, suppliers, quantities, potential):
                neighbour_distances2='double[::1]',
                neighbour_indices='Py_ssize_t[::1]',
                neighbour_ranks='int[::1]',
-               posx_1='double*',
-               posx_2='double*',
-               posy_1='double*',
-               posy_2='double*',
-               posz_1='double*',
-               posz_2='double*',
+               posx_1='particle_float*',
+               posx_2='particle_float*',
+               posy_1='particle_float*',
+               posy_2='particle_float*',
+               posz_1='particle_float*',
+               posz_2='particle_float*',
                r2='double',
                r2_min='double',
                selected=dict,
@@ -891,11 +1164,6 @@ def find_nearest_neighbour(components, selected):
                 i='Py_ssize_t',
                 Δt='double',
                 φ_Vcell='double',
-                # DELETE BELOW WHEN DONE WITH gravity_old.py !!!
-                dim='int',
-                gradφ_dim='double[:, :, ::1]',
-                h='double',
-                φ='double[:, :, ::1]',
                 )
 def gravity(method, receivers, suppliers, ᔑdt):
     # Regardless of the method, it may happen that some fluid components
@@ -929,6 +1197,20 @@ def gravity(method, receivers, suppliers, ᔑdt):
                                   'only_short_range': False,
                                   },
                       )
+    elif method == 'treenonperiodic':
+        # The non-periodic Barnes-Hut tree method
+        masterprint('Gravitationally (tree (non-periodic)) accelerating {} ...'
+                    .format(', '.join([component.name for component in receivers]))
+                    )
+        gravity_tree(receivers, suppliers, ᔑdt, periodic=False)
+        masterprint('done')
+    elif method == 'tree':
+        # The Barnes-Hut tree method with Ewald-periodicity
+        masterprint('Gravitationally (tree) accelerating {} ...'
+                    .format(', '.join([component.name for component in receivers]))
+                    )
+        gravity_tree(receivers, suppliers, ᔑdt, periodic=True)
+        masterprint('done')
     elif method == 'pm':
         # The particle-mesh method.
         # The gravitational potential is given by the Poisson equation
@@ -947,39 +1229,58 @@ def gravity(method, receivers, suppliers, ᔑdt):
                      ]
         particle_mesh_general(receivers, suppliers, ᔑdt, gravity_potential, 'gravitational potential (PM)',
                               dependent, apply_gravity_potential)
-    elif method == 'p3m':
-        # List of all particles participating in this interaction
-        components = receivers + suppliers
-        # The particle-particle-mesh method.
-        # So far, this method is only implemented between particles
-        # in a single component.
-        if len(components) != 1:
-            abort('The P³M method can only be used with a single gravitating component')
-        component = components[0]
-        # So far, this method is only implemented for
-        # particle components, not fluids.
-        if component.representation != 'particles':
-            abort('The P³M method can only be used with particle components')
-        # Construct the long-range gravitational potential from all
-        # components which interacts gravitationally.
-        φ = build_φ(components, ᔑdt, only_long_range=True)
-        # For each dimension, differentiate φ and apply the force to
-        # all receiver components.
-        h = boxsize/φ_gridsize  # Physical grid spacing of φ
-        for dim in range(3):
-            # Do the differentiation of φ
-            gradφ_dim = diff_domain(φ, dim, h, order=4)
-            # Apply long-range P³M force to all the receivers
-            for component in receivers:
-                masterprint('Applying gravitational (P³M, long-range) forces along the {}-direction to {} ...'
-                            .format('xyz'[dim], component.name)
-                            )
-                pm(component, ᔑdt, gradφ_dim, dim)
-                masterprint('done')
-        # Now apply the short-range gravitational forces
-        masterprint('Gravitationally (P³M, short-range) accelerating {} ...'.format(component.name))
-        p3m(component, ᔑdt)
-        masterprint('done')
+    elif method in ('p3m', 'treepm'):
+        # The particle-particle-mesh method and the tree-particle-mesh
+        # method. The two share the long-range part of the force,
+        # while the short-range part is computed by direct summation
+        # over nearby particle pairs and by walking trees,
+        # respectively. So far, these methods are only implemented for
+        # particle receivers, though fluid components may act
+        # as suppliers.
+        for component in receivers:
+            if component.representation != 'particles':
+                abort('The {} method can only be used with particle components'
+                      .format({'p3m': 'P³M', 'treepm': 'TreePM'}[method]))
+        # The long-range part of the gravitational force is computed
+        # as for the PM method, but using the long-range potential.
+        φ_Vcell = ℝ[(boxsize/φ_gridsize)**3]
+        Δt = ᔑdt['1']
+        dependent = [# Particle components
+                     ('particles', [ℝ[ᔑdt['a**(-1)']/(Δt*φ_Vcell)]*component.mass
+                                    for component in components]),
+                     # Fluid components
+                     ('ϱ', [ᔑdt['a**(-3*w_eff-1)', component]*ℝ[1/Δt]
+                            for component in components]),
+                     ]
+        particle_mesh_general(receivers, suppliers, ᔑdt, gravity_longrange_potential,
+                              'gravitational long-range potential ({})'
+                              .format({'p3m': 'P³M', 'treepm': 'TreePM'}[method]),
+                              dependent, apply_gravity_potential)
+        # The short-range part of the gravitational force is computed
+        # between particles only.
+        suppliers = [component for component in suppliers
+                     if component.representation == 'particles']
+        if method == 'p3m':
+            # Only domains within the short-range cutoff
+            # of each other are paired.
+            domain_domain(receivers, suppliers, ᔑdt, gravity_pairwise,
+                          'gravitation (P³M, short-range)',
+                          dependent=['pos'], affected=['mom'], deterministic=True,
+                          extra_args={'only_short_range': True},
+                          interaction_range=p3m_cutoff_phys,
+                          )
+        else:
+            # Each process walks trees over its own particles and
+            # over the parts of the trees of other processes which
+            # lie within the short-range cutoff of its domain.
+            # Nodes far away are used as a whole, keeping the cost
+            # per particle roughly logarithmic even for
+            # strongly clustered particles.
+            masterprint('Gravitationally (TreePM, short-range) accelerating {} ...'
+                        .format(', '.join([component.name for component in receivers]))
+                        )
+            gravity_tree(receivers, suppliers, ᔑdt, periodic=True, only_short_range=True)
+            masterprint('done')
     elif master:
         abort('gravity was called with the "{}" method'.format(method))
 
@@ -1061,10 +1362,13 @@ Interaction = collections.namedtuple('Interaction', ('force',
 # alphanumeric, lowercase characters.
 cython.declare(forces_implemented_ordered=list)
 forces_implemented_ordered = [
-    ('gravity', 'ppnonperiodic'),
-    ('gravity', 'pp'           ),
-    ('gravity', 'p3m'          ),
-    ('gravity', 'pm'           ),
+    ('gravity', 'ppnonperiodic'  ),
+    ('gravity', 'pp'             ),
+    ('gravity', 'treenonperiodic'),
+    ('gravity', 'tree'           ),
+    ('gravity', 'p3m'            ),
+    ('gravity', 'treepm'         ),
+    ('gravity', 'pm'             ),
 ]
 # Non-ordered version of forces_implemented_ordered, implemented as a
 # (default) dict mapping forces to list of methods.
@@ -2221,7 +2221,7 @@ def get_default_k_parameters(gridsize):
     k2='Py_ssize_t',
     k2_max='Py_ssize_t',
     mass='double',
-    momⁱ='double*',
+    momⁱ='particle_float*',
     multi_index=object,  # tuple or str
     n_s='double',
     nyquist='Py_ssize_t',
@@ -2229,7 +2229,7 @@ def get_default_k_parameters(gridsize):
     options_linear=dict,
     option_val=object,  # str or bool
     pariclevar_name=str,
-    posⁱ='double*',
+    posⁱ='particle_float*',
     pos_gridpoint='double',
     processed_specific_multi_index=object,  # tuple or str
     slab='double[:, :, ::1]',
@@ -27,6 +27,7 @@ from commons import *
 # Cython imports
 import interactions
 cimport('from analysis import debug, measure, powerspec')
+cimport('from communication import rebalance_domains, release_buffers, report_buffer_memory')
 cimport('from graphics import render2D, render3D')
 cimport('from integration import cosmic_time,          '
         '                        expand,               '
@@ -35,9 +36,9 @@ cimport('from integration import cosmic_time,          '
         '                        scale_factor,         '
         '                        scalefactor_integral, '
         )
-cimport('from interactions import find_interactions')
-cimport('from snapshot import get_initial_conditions, save')
-cimport('from species import Component, get_representation')
+cimport('from interactions import find_interactions, pop_interaction_cost')
+cimport('from snapshot import get_initial_conditions, save, wait_for_output')
+cimport('from species import Component, get_representation, report_particle_memory')
 cimport('from utilities import delegate')
 
 
@@ -54,6 +55,7 @@ cimport('from utilities import delegate')
                go2dump='bint',
                index='int',
                integrand=object,  # str or tuple
+               m='Py_ssize_t',
                t_dump='double',
                )
 def scalefactor_integrals(step, Δt):
@@ -91,6 +93,15 @@ def scalefactor_integrals(step, Δt):
     # Do the scalefactor integrals
     for integrand in ᔑdt_steps:
         ᔑdt_steps[integrand][index] = scalefactor_integral(integrand, universals.t, 0.5*Δt)
+    # When using block time steps, also do the scalefactor integrals
+    # over each of the rung_fine fine intervals into which
+    # the half step is divided.
+    if N_rungs > 1:
+        for integrand in ᔑdt_rungs:
+            for m in range(rung_fine):
+                ᔑdt_rungs[integrand][index, m] = scalefactor_integral(
+                    integrand, universals.t + m*ℝ[0.5/rung_fine]*Δt, ℝ[0.5/rung_fine]*Δt,
+                )
 
 # Function which dump all types of output. The return value signifies
 # whether or not something has been dumped.
@@ -106,6 +117,7 @@ def scalefactor_integrals(step, Δt):
                 do_dump='bint',
                 dumped=set,
                 filename=str,
+                filename_tmp=str,
                 remaining_output_times=dict,
                 output_kind=str,
                 output_time=tuple,
@@ -117,7 +129,7 @@ def scalefactor_integrals(step, Δt):
                 )
 def dump(components, output_filenames, final_render3D, op=None,
          do_autosave=False, Δt=-1, Δt_begin=-1):
-    global i_dump, dumps, next_dump
+    global autosave_pending, i_dump, dumps, next_dump
     # Set keeping track of what is being dumped.
     # This will be the return value of this function.
     dumped = set()
@@ -128,11 +140,21 @@ def dump(components, output_filenames, final_render3D, op=None,
                )
     if not do_dump and not do_autosave:
         return dumped
+    # Finalize any previous autosave
+    finalize_autosave()
     # Synchronize drift and kick operations before dumping
     if op == 'drift':
         drift(components, 'first half')
     elif op == 'kick':
         kick(components, 'second half')
+    # The mesh-based outputs require the uniform domain decomposition
+    for time_val, time_param in zip((universals.a, universals.t), ('a', 't')):
+        if (   time_val in render2D_times[time_param]
+            or time_val in powerspec_times[time_param]
+            or time_val in render3D_times[time_param]
+        ):
+            rebalance_domains(components, uniform=True)
+            break
     # Dump render2D
     for time_val, time_param in zip((universals.a, universals.t), ('a', 't')):
         if time_val in render2D_times[time_param]:
@@ -169,11 +191,24 @@ def dump(components, output_filenames, final_render3D, op=None,
     if do_autosave:
         dumped.add('autosave')
         masterprint('Autosaving ...')
-        # Save parameter file corresponding to the snapshot
+        # Autosave either as a standard snapshot
+        # or as a rank-local checkpoint.
+        filename = autosave_checkpoint_filename if autosave_checkpoint else autosave_filename
+        # Save standard snapshot or checkpoint. Include all components
+        # regardless of the snapshot_select user parameter. The
+        # snapshot is saved under a temporary name, as the snapshot
+        # may be written asynchronously and as the previous autosave
+        # should survive should we crash while writing the new one.
+        filename_tmp = '{}.tmp{}'.format(*os.path.splitext(filename))
+        save(components, filename_tmp,
+            snapshot_type=('checkpoint' if autosave_checkpoint else 'standard'),
+            save_all_components=True)
+        # Construct the content of the parameter file corresponding
+        # to the snapshot now, while the time variables still hold
+        # their values at the time of the autosave.
+        param_lines = []
         if master:
-            masterprint(f'Writing parameter file "{autosave_params_filename}" ...')
             with disable_numpy_summarization():
-                param_lines = []
                 # Header
                 param_lines += [f'# This parameter file is the result '
                                 f'of an autosave of job {jobid},',
@@ -187,7 +222,7 @@ def dump(components, output_filenames, final_render3D, op=None,
                 param_lines += ['']*2
                 # IC snapshot
                 param_lines += [f'# The autosaved snapshot file was saved to',
-                                f'initial_conditions = "{autosave_filename}"',
+                                f'initial_conditions = "{filename}"',
                                 ]
                 # Present time
                 param_lines += [f'# The autosave happened at time',
@@ -214,23 +249,12 @@ def dump(components, output_filenames, final_render3D, op=None,
                 param_lines += [f'# Remaining output times',
                                 f'output_times = {remaining_output_times}',
                                 ]
-            # Write to parameter file
-            with open(autosave_params_filename, 'w', encoding='utf-8') as autosave_params_file:
-                print('\n'.join(param_lines), file=autosave_params_file)
-            masterprint('done')
-        # Save standard snapshot. Include all components regardless
-        # of the snapshot_select user parameter.
-        save(components, autosave_filename, snapshot_type='standard', save_all_components=True)
-        # If this simulation run was started from an autosave snapshot
-        # with a different name from the one just saved, remove this
-        # now superfluous autosave snapshot.
-        if master:
-            if (    isinstance(initial_conditions, str)
-                and re.search('^autosave_\d+\.hdf5$', os.path.basename(initial_conditions))
-                and os.path.abspath(initial_conditions) != os.path.abspath(autosave_filename)
-                and os.path.isfile(initial_conditions)
-                ):
-                os.remove(initial_conditions)
+        # The snapshot may still be written in the background.
+        # Moving it into place, writing the parameter file and
+        # removing the previous autosave is postponed until the
+        # snapshot is completely written, which is awaited
+        # at the beginning of the next dump.
+        autosave_pending = (filename_tmp, filename, param_lines)
         masterprint('done')
     # Increment dump time if anything other than
     # an autosave has been dumped.
@@ -239,17 +263,85 @@ def dump(components, output_filenames, final_render3D, op=None,
         if i_dump < len(dumps):
             next_dump = dumps[i_dump]
         else:
-            # Last output have been dumped. Remove autosave files.
+            # Last output have been dumped. Remove autosave files,
+            # once these are no longer being written.
+            finalize_autosave()
             if master:
-                for filename in (autosave_filename, autosave_params_filename):
-                    if os.path.isfile(filename):
-                        os.remove(filename)
+                for filename in (
+                    autosave_filename, autosave_checkpoint_filename, autosave_params_filename,
+                ):
+                    remove_autosave(filename)
     return dumped
-cython.declare(autosave_filename=str,
+cython.declare(autosave_checkpoint_filename=str,
+               autosave_filename=str,
                autosave_params_filename=str,
                )
-autosave_filename        = f'{autosave_dir}/autosave_{jobid}.hdf5'
-autosave_params_filename = f'{paths["params_dir"]}/autosave_{jobid}.params'
+autosave_filename            = f'{autosave_dir}/autosave_{jobid}.hdf5'
+autosave_checkpoint_filename = f'{autosave_dir}/autosave_{jobid}.checkpoint'
+autosave_params_filename     = f'{paths["params_dir"]}/autosave_{jobid}.params'
+
+# Function which finalizes a pending autosave once its snapshot has
+# been completely written to disk. The snapshot is moved from its
+# temporary name into place, after which the corresponding parameter
+# file is written and the previous autosave removed.
+@cython.header(# Locals
+               filename=str,
+               filename_tmp=str,
+               param_lines=list,
+               )
+def finalize_autosave():
+    global autosave_pending
+    # Wait for the snapshot to be completely written to disk,
+    # which also takes care of any other asynchronous output.
+    wait_for_output()
+    if autosave_pending is None:
+        return
+    filename_tmp, filename, param_lines = autosave_pending
+    autosave_pending = None
+    # Move the snapshot into place. For checkpoints,
+    # each process moves its own file.
+    if autosave_checkpoint:
+        os.replace(f'{filename_tmp}.{rank}', f'{filename}.{rank}')
+    elif master:
+        os.replace(filename_tmp, filename)
+    Barrier()
+    # Write the parameter file corresponding to the snapshot,
+    # now that this snapshot is complete.
+    if master:
+        masterprint(f'Writing parameter file "{autosave_params_filename}" ...')
+        with open(autosave_params_filename, 'w', encoding='utf-8') as autosave_params_file:
+            print('\n'.join(param_lines), file=autosave_params_file)
+        masterprint('done')
+    # If this simulation run was started from an autosave snapshot
+    # with a different name from the one just saved, remove this
+    # now superfluous autosave snapshot.
+    if master:
+        if (    isinstance(initial_conditions, str)
+            and re.search('^autosave_\d+\.(hdf5|checkpoint)$',
+                          os.path.basename(initial_conditions))
+            and os.path.abspath(initial_conditions) != os.path.abspath(filename)
+            ):
+            remove_autosave(initial_conditions)
+# The autosave awaiting finalization, if any, as a tuple of the
+# temporary and final snapshot filename and the lines of the
+# parameter file.
+cython.declare(autosave_pending=object)
+autosave_pending = None
+
+# Function for removing an autosave file. For checkpoints,
+# the files of all processes are removed.
+@cython.header(# Arguments
+               filename=str,
+               # Locals
+               i='Py_ssize_t',
+               )
+def remove_autosave(filename):
+    if os.path.isfile(filename):
+        os.remove(filename)
+    i = 0
+    while os.path.isfile(f'{filename}.{i}'):
+        os.remove(f'{filename}.{i}')
+        i += 1
 
 @cython.header(# Locals
                integrand=object,  # str or tuple
@@ -261,6 +353,8 @@ def nullify_ᔑdt_steps():
     for integrand in ᔑdt_steps:
         for index in range(2):
             ᔑdt_steps[integrand][index] = 0
+    for integrand in ᔑdt_rungs:
+        ᔑdt_rungs[integrand][...] = 0
 
 # Function which kick all of the components.
 # Here a 'kick' means all interactions together with other source terms
@@ -281,6 +375,20 @@ def nullify_ᔑdt_steps():
     ᔑdt=dict,
 )
 def kick(components, step):
+    # With block time steps, the particles are kicked according to
+    # their individual rungs. The 'first half' and 'whole' kicks take
+    # place at the beginning of the base time step, while the
+    # 'second half' kick takes place at the end.
+    if N_rungs > 1:
+        if step == 'first half':
+            kick_rungs(components, 0, closing=False, opening=True)
+        elif step == 'whole':
+            kick_rungs(components, 0, closing=True, opening=True)
+        elif step == 'second half':
+            kick_rungs(components, 2*rung_fine, closing=True, opening=False)
+        elif master:
+            abort(f'The value "{step}" was given for the step')
+        return
     # Construct the local dict ᔑdt,
     # based on which type of step is to be performed.
     ᔑdt = {}
@@ -327,6 +435,20 @@ def kick(components, step):
     component='Component',
 )
 def drift(components, step):
+    # With block time steps, the drift is carried out in substeps
+    # of the finest rung, with the active particles kicked in between.
+    # A drift over the first half only is always followed by a
+    # synchronization of all particles.
+    if N_rungs > 1:
+        if step == 'first half':
+            drift_rungs(components, 0, rung_fine, sync=True)
+        elif step == 'second half':
+            drift_rungs(components, rung_fine, 2*rung_fine, sync=False)
+        elif step == 'whole':
+            drift_rungs(components, 0, 2*rung_fine, sync=False)
+        elif master:
+            abort(f'The value "{step}" was given for the step')
+        return
     # Construct the local dict ᔑdt,
     # based on which type of step is to be performed.
     ᔑdt = {}
@@ -345,6 +467,375 @@ def drift(components, step):
     for component in components:
         component.drift(ᔑdt, a_next)
 
+# Function returning the sum of the scalefactor integrals over the
+# fine intervals f_start ≤ f < f_stop, with f = 0 the beginning of
+# the current base time step. Negative f refer to the second half of
+# the previous base time step.
+@cython.header(# Arguments
+               integrand=object,  # str or tuple
+               f_start='Py_ssize_t',
+               f_stop='Py_ssize_t',
+               # Locals
+               f='Py_ssize_t',
+               integrals='double[:, ::1]',
+               ᔑdt_sum='double',
+               returns='double',
+               )
+def sum_ᔑdt_rungs(integrand, f_start, f_stop):
+    integrals = ᔑdt_rungs[integrand]
+    ᔑdt_sum = 0
+    for f in range(f_start, f_stop):
+        if f < 0:
+            ᔑdt_sum += integrals[1, f + rung_fine]
+        elif f < rung_fine:
+            ᔑdt_sum += integrals[0, f]
+        else:
+            ᔑdt_sum += integrals[1, f - rung_fine]
+    return ᔑdt_sum
+
+# Function which kicks the active particles of all components when
+# using block time steps. Each base time step Δt is divided into
+# 2*rung_fine fine intervals, with particles on rung r having a time
+# step of Δt/2**r, corresponding to 2**(N_rungs - r) fine intervals.
+# At the fine interval boundary f, particles on rungs with time steps
+# dividing f are active. Forces are computed for these only,
+# with all other particles acting as suppliers. The active particles
+# then receive the closing half kick of their previous time step
+# and/or the opening half kick of their next time step, the rung of
+# which is assigned based on the acceleration.
+@cython.header(
+    # Arguments
+    components=list,
+    f='Py_ssize_t',
+    closing='bint',
+    opening='bint',
+    # Locals
+    K2='double',
+    Kx='double',
+    Ky='double',
+    Kz='double',
+    N_active='Py_ssize_t',
+    N_active_tot='Py_ssize_t',
+    N_fine='double',
+    N_tot='Py_ssize_t',
+    component='Component',
+    component_active='Component',
+    component_inactive='Component',
+    components_active=list,
+    components_inactive=list,
+    force=str,
+    i='Py_ssize_t',
+    indices='Py_ssize_t[::1]',
+    indices_active=list,
+    indices_inactive=list,
+    integrand=object,  # str or tuple
+    interactions_list=list,
+    k='Py_ssize_t',
+    N_actives=object,  # np.ndarray
+    mask=object,  # np.ndarray
+    method=str,
+    mom2='double',
+    momx='particle_float*',
+    momx_active='particle_float*',
+    momy='particle_float*',
+    momy_active='particle_float*',
+    momz='particle_float*',
+    momz_active='particle_float*',
+    receivers=list,
+    r='int',
+    rung='char*',
+    rung_min='int',
+    rung_new='int',
+    suppliers=list,
+    softening_length='double',
+    Δt_fine='double',
+    Δt_i='double',
+    Δmomx_active='double*',
+    Δmomy_active='double*',
+    Δmomz_active='double*',
+    ᔑdt_closing='double[::1]',
+    ᔑdt_opening='double[::1]',
+    ᔑdt_unit=dict,
+)
+def kick_rungs(components, f, closing, opening):
+    # Particles on rung r are active if f is a multiple of their time
+    # step in fine intervals. As time steps shrink with increasing r,
+    # all particles on rungs r ≥ rung_min are thus active.
+    # This is also the lowest rung to which active particles may be
+    # assigned, as their next time step has to be aligned with f.
+    for rung_min in range(N_rungs):
+        if f%2**(N_rungs - rung_min) == 0:
+            break
+    # The closing and opening half kick integrals for each rung
+    ᔑdt_closing = zeros(N_rungs, dtype=C2np['double'])
+    ᔑdt_opening = zeros(N_rungs, dtype=C2np['double'])
+    for r in range(rung_min, N_rungs):
+        if closing:
+            ᔑdt_closing[r] = sum_ᔑdt_rungs('a**(-1)', f - 2**(N_rungs - r - 1), f)
+        if opening:
+            ᔑdt_opening[r] = sum_ᔑdt_rungs('a**(-1)', f, f + 2**(N_rungs - r - 1))
+    # The duration of a fine interval
+    Δt_fine = ᔑdt_rungs['1'][0, 0]
+    if Δt_fine == 0:
+        Δt_fine = ᔑdt_rungs['1'][1, 0]
+    # Find the active particles of each component,
+    # together with the global number of active particles.
+    indices_active = []
+    indices_inactive = []
+    N_actives = zeros(len(components), dtype=C2np['Py_ssize_t'])
+    for k, component in enumerate(components):
+        if component.representation != 'particles':
+            abort('Block time steps are only implemented for particle components')
+        mask = asarray(component.rung_mv[:component.N_local]) >= rung_min
+        indices = asarray(np.nonzero(mask)[0], dtype=C2np['Py_ssize_t'])
+        indices_active.append(indices)
+        indices_inactive.append(asarray(np.nonzero(~mask)[0], dtype=C2np['Py_ssize_t']))
+        N_actives[k] = indices.shape[0]
+    N_actives = allreduce(N_actives, op=MPI.SUM)
+    N_active_tot = 0
+    N_tot = 0
+    for k, component in enumerate(components):
+        N_active_tot += N_actives[k]
+        N_tot += component.N
+    # With no active particles anywhere,
+    # no interactions and no kicks are needed.
+    if N_active_tot == 0:
+        return
+    masterprint(
+        f'Kicking {N_active_tot} of {N_tot} particles '
+        f'(rungs {rung_min}–{N_rungs - 1}) ...'
+    )
+    # Split each component into an active and an inactive part,
+    # stored in persistent rung components. The momenta and the Δmom
+    # buffers of the active parts are nullified. The momentum updates
+    # corresponding to unit time integrals are accumulated in the
+    # Δmom buffers once the interactions have been applied.
+    components_active = []
+    components_inactive = []
+    for k, component in enumerate(components):
+        component_active = get_rung_component(
+            component, indices_active[k], N_actives[k], 'active')
+        component_inactive = get_rung_component(
+            component, indices_inactive[k], component.N - N_actives[k], 'inactive')
+        components_active.append(component_active)
+        components_inactive.append(component_inactive)
+    # Unit time integrals for all integrands
+    ᔑdt_unit = {}
+    for integrand in ᔑdt_steps:
+        if isinstance(integrand, str):
+            ᔑdt_unit[integrand] = 1
+        else:
+            for component in components_active + components_inactive:
+                ᔑdt_unit[integrand[0], component] = 1
+    # Invoke each interaction sequentially, with the active parts as
+    # receivers and the inactive parts as suppliers. The interactions
+    # apply their momentum updates to the (particle_float) momenta of
+    # the active parts. After each interaction, these are moved to the
+    # (double) Δmom buffers, so that the updates from the different
+    # interactions are summed up in double precision, as is the case
+    # for regular time steps where each update is applied to
+    # the momenta separately.
+    interactions_list = find_interactions(components_active)
+    for force, method, receivers, suppliers in interactions_list:
+        suppliers = suppliers + [
+            component_inactive
+            for component_active, component_inactive in zip(components_active, components_inactive)
+            if component_active in receivers + suppliers
+        ]
+        getattr(interactions, force)(method, receivers, suppliers, ᔑdt_unit)
+        for component_active in components_active:
+            momx_active = component_active.momx
+            momy_active = component_active.momy
+            momz_active = component_active.momz
+            Δmomx_active = component_active.Δmomx
+            Δmomy_active = component_active.Δmomy
+            Δmomz_active = component_active.Δmomz
+            for k in range(component_active.N_local):
+                Δmomx_active[k] += momx_active[k]
+                Δmomy_active[k] += momy_active[k]
+                Δmomz_active[k] += momz_active[k]
+                momx_active[k] = 0
+                momy_active[k] = 0
+                momz_active[k] = 0
+    # Apply the momentum updates according to the rungs,
+    # assigning new rungs to the active particles.
+    for component, component_active, indices in zip(
+        components, components_active, indices_active,
+    ):
+        momx = component.momx
+        momy = component.momy
+        momz = component.momz
+        rung = component.rung
+        Δmomx_active = component_active.Δmomx
+        Δmomy_active = component_active.Δmomy
+        Δmomz_active = component_active.Δmomz
+        softening_length = component.softening_length
+        if softening_length == 0:
+            softening_length = boxsize/φ_gridsize
+        N_active = indices.shape[0]
+        for k in range(N_active):
+            i = indices[k]
+            Kx = Δmomx_active[k]
+            Ky = Δmomy_active[k]
+            Kz = Δmomz_active[k]
+            # The closing half kick, using the previous rung
+            r = rung[i]
+            momx[i] += Kx*ᔑdt_closing[r]
+            momy[i] += Ky*ᔑdt_closing[r]
+            momz[i] += Kz*ᔑdt_closing[r]
+            # The new rung, with the time step given by the
+            # criterion Δt_i = √(2ηε/|g|) with g the physical
+            # acceleration, here written in terms of
+            # K = dmom/dt*a, the force in unit time integrals.
+            # Additionally, the particle should not travel more than
+            # a fraction of the softening length within its time step,
+            # corresponding to the Courant condition of reduce_Δt.
+            K2 = Kx**2 + Ky**2 + Kz**2
+            mom2 = momx[i]**2 + momy[i]**2 + momz[i]**2
+            rung_new = rung_min
+            if K2 > 0 or mom2 > 0:
+                Δt_i = ထ
+                if K2 > 0:
+                    Δt_i = sqrt(ℝ[2*rung_accuracy*universals.a**3*softening_length*component.mass]
+                                /sqrt(K2))
+                if mom2 > 0:
+                    Δt_i = pairmin(Δt_i, ℝ[0.2/sqrt(3)*softening_length
+                        *universals.a**2*component.mass]/sqrt(mom2))
+                N_fine = Δt_i/Δt_fine
+                if N_fine < 2:
+                    rung_new = ℤ[N_rungs - 1]
+                else:
+                    rung_new = N_rungs - int(log2(N_fine))
+            if rung_new < rung_min:
+                rung_new = rung_min
+            elif rung_new > ℤ[N_rungs - 1]:
+                rung_new = ℤ[N_rungs - 1]
+            rung[i] = rung_new
+            # The opening half kick, using the new rung
+            momx[i] += Kx*ᔑdt_opening[rung_new]
+            momy[i] += Ky*ᔑdt_opening[rung_new]
+            momz[i] += Kz*ᔑdt_opening[rung_new]
+    masterprint('done')
+
+# Function which drifts all components from the fine interval
+# boundary f_start to f_end (see kick_rungs) in substeps of the finest
+# rung, kicking the active particles in between. If sync is True, the
+# active particles at f_end receive their closing half kick,
+# synchronizing all particles.
+@cython.header(
+    # Arguments
+    components=list,
+    f_start='Py_ssize_t',
+    f_end='Py_ssize_t',
+    sync='bint',
+    # Locals
+    component='Component',
+    f='Py_ssize_t',
+    integrand=object,  # str or tuple
+    ᔑdt=dict,
+)
+def drift_rungs(components, f_start, f_end, sync):
+    for f in range(f_start, f_end, 2):
+        ᔑdt = {}
+        for integrand in ᔑdt_rungs:
+            ᔑdt[integrand] = sum_ᔑdt_rungs(integrand, f, f + 2)
+        for component in components:
+            component.drift(ᔑdt)
+        if f + 2 < f_end:
+            kick_rungs(components, f + 2, closing=True, opening=True)
+        elif sync:
+            kick_rungs(components, f + 2, closing=True, opening=False)
+
+# Function returning a persistent component holding copies of the
+# particles with the given (local) indices, with N being the global
+# number of such particles. Separate rung components are kept for each
+# component and kind ('active' or 'inactive'), and their memory is
+# reused between calls. The momenta and the Δmom buffers of the
+# active particles are nullified.
+@cython.header(
+    # Arguments
+    component='Component',
+    indices='Py_ssize_t[::1]',
+    N='Py_ssize_t',
+    kind=str,
+    # Locals
+    N_local='Py_ssize_t',
+    component_rung='Component',
+    i='Py_ssize_t',
+    k='Py_ssize_t',
+    key=tuple,
+    momx='particle_float*',
+    momx_rung='particle_float*',
+    momy='particle_float*',
+    momy_rung='particle_float*',
+    momz='particle_float*',
+    momz_rung='particle_float*',
+    posx='particle_float*',
+    posx_rung='particle_float*',
+    posy='particle_float*',
+    posy_rung='particle_float*',
+    posz='particle_float*',
+    posz_rung='particle_float*',
+    Δmomx_rung='double*',
+    Δmomy_rung='double*',
+    Δmomz_rung='double*',
+    returns='Component',
+)
+def get_rung_component(component, indices, N, kind):
+    key = (component.name, kind)
+    component_rung = rung_components.get(key)
+    if component_rung is None:
+        component_rung = Component('', component.species, 1,
+            mass=component.mass,
+            forces=component.forces,
+            softening_length=component.softening_length,
+        )
+        component_rung.name = component.name
+        rung_components[key] = component_rung
+    # Populate the rung component with the particles,
+    # enlarging its data arrays if necessary.
+    N_local = indices.shape[0]
+    component_rung.N = N
+    component_rung.N_local = N_local
+    component_rung.mass = component.mass
+    component_rung.grow(N_local)
+    posx = component.posx
+    posy = component.posy
+    posz = component.posz
+    momx = component.momx
+    momy = component.momy
+    momz = component.momz
+    posx_rung = component_rung.posx
+    posy_rung = component_rung.posy
+    posz_rung = component_rung.posz
+    momx_rung = component_rung.momx
+    momy_rung = component_rung.momy
+    momz_rung = component_rung.momz
+    Δmomx_rung = component_rung.Δmomx
+    Δmomy_rung = component_rung.Δmomy
+    Δmomz_rung = component_rung.Δmomz
+    for k in range(N_local):
+        i = indices[k]
+        posx_rung[k] = posx[i]
+        posy_rung[k] = posy[i]
+        posz_rung[k] = posz[i]
+        with unswitch:
+            if kind == 'active':
+                momx_rung[k] = 0
+                momy_rung[k] = 0
+                momz_rung[k] = 0
+                Δmomx_rung[k] = 0
+                Δmomy_rung[k] = 0
+                Δmomz_rung[k] = 0
+            else:
+                momx_rung[k] = momx[i]
+                momy_rung[k] = momy[i]
+                momz_rung[k] = momz[i]
+    return component_rung
+# Declare the persistent rung components used by get_rung_component
+cython.declare(rung_components=dict)
+rung_components = {}
+
 # Function containing the main time loop of CO𝘕CEPT
 @cython.header(# Locals
                autosave_time='double',
@@ -354,9 +845,15 @@ def drift(components, step):
                dumped=set,
                do_autosave='bint',
                final_render3D=tuple,
+               force=str,
                integrand=str,
+               interaction_cost='double',
                key=object,  # str or tuple
+               method=str,
                output_filenames=dict,
+               rebalance='bint',
+               receivers=list,
+               suppliers=list,
                timespan='double',
                Δt='double',
                Δt_begin='double',
@@ -365,7 +862,7 @@ def drift(components, step):
                Δt_period='Py_ssize_t',
                )
 def timeloop():
-    global ᔑdt_steps, i_dump, next_dump
+    global ᔑdt_steps, ᔑdt_rungs, i_dump, next_dump
     # Do nothing if no dump times exist
     if not (  [nr for val in output_times['a'].values() for nr in val]
             + [nr for val in output_times['t'].values() for nr in val]):
@@ -438,6 +935,32 @@ def timeloop():
             ]
         )
     }
+    # With block time steps, arrays which will store the integrals
+    # over each of the rung_fine fine intervals of both half steps.
+    if N_rungs > 1:
+        for component in components:
+            if component.representation != 'particles':
+                abort('Block time steps (N_rungs > 1) are only implemented for particle components')
+        ᔑdt_rungs = {
+            key: zeros((2, rung_fine), dtype=C2np['double'])
+            for key in ('1', 'a**(-1)', 'a**(-2)')
+        }
+    # Dynamic rebalancing of the domain decomposition is only possible
+    # when all interactions are carried out without the use of meshes,
+    # as these require uniform domains.
+    rebalance = (domain_rebalance_period > 0 and nprocs > 1)
+    if rebalance:
+        for component in components:
+            if component.representation != 'particles':
+                rebalance = False
+        for force, method, receivers, suppliers in find_interactions(components):
+            if method not in ('pp', 'ppnonperiodic', 'tree', 'treenonperiodic'):
+                rebalance = False
+        if not rebalance:
+            masterwarn(
+                'Domain rebalancing has been disabled, as it is only implemented '
+                'for particle components interacting without the use of meshes'
+            )
     # Record what time it is, for use with autosaving
     autosave_time = time()
     # The main time loop
@@ -448,6 +971,22 @@ def timeloop():
         Δt, bottleneck = reduce_Δt(components, Δt, Δt_begin, timespan)
         # Print out message at beginning of each time step
         print_timestep_heading(universals.time_step, Δt, bottleneck, components)
+        # Periodically rebalance the domain decomposition according to
+        # either the particle distribution or the measured cost
+        # of the interactions since the previous rebalancing.
+        if rebalance and universals.time_step%domain_rebalance_period == 0:
+            interaction_cost = pop_interaction_cost()
+            rebalance_domains(
+                components, interaction_cost if domain_rebalance_weight == 'cost' else 0,
+            )
+        # Release the memory of buffers which have not been in use
+        # for buffer_release_period time steps.
+        release_buffers()
+        # Periodically sort the particles along a space-filling curve,
+        # improving the memory locality of the interactions.
+        if particle_reorder_period > 0 and universals.time_step%particle_reorder_period == 0:
+            for component in components:
+                component.sort_particles()
         # Analyze and print out debugging information, if required
         if enable_debugging:
             debug(components)
@@ -518,6 +1057,9 @@ def timeloop():
             continue
     # All dumps completed; end of main time loop
     print_timestep_heading(universals.time_step, Δt, bottleneck, components, end=True)
+    # Report on the memory used for particle data and buffers
+    report_particle_memory(components)
+    report_buffer_memory()
 
 # Function which prints out basic information
 # about the current time step.
@@ -611,9 +1153,9 @@ heading_ljust = 0
                method=str,
                mom2_i='double',
                mom2_max='double',
-               momx='double*',
-               momy='double*',
-               momz='double*',
+               momx='particle_float*',
+               momy='particle_float*',
+               momz='particle_float*',
                resolutions=list,
                v_max='double',
                w='double',
@@ -746,7 +1288,7 @@ def reduce_Δt(components, Δt, Δt_begin, timespan, worry=True):
                 if force == 'gravity':
                     if method == 'pm':
                         resolutions.append(φ_gridsize)
-                    elif method in ('pp', 'p3m'):
+                    elif method in ('pp', 'p3m', 'tree', 'treenonperiodic', 'treepm'):
                         resolutions.append(boxsize/component.softening_length)
             Δx_max = boxsize/np.max(resolutions)
             # Find maximum speed of particles
@@ -831,6 +1373,11 @@ def reduce_Δt(components, Δt, Δt_begin, timespan, worry=True):
             v_max = machine_ϵ
         # The 3D Courant condition
         Δt_courant_component = fac_courant*Δx_max/(sqrt(3)*v_max)
+        # With block time steps, the Courant condition for particles is
+        # applied individually when assigning rungs. The base time step
+        # then only needs to satisfy it for the finest rung.
+        if N_rungs > 1 and component.representation == 'particles':
+            Δt_courant_component *= 2**(N_rungs - 1)
         # The component with the lowest value of the maximally allowed
         # time step size determines the global maximally allowed
         # time step size.
@@ -1005,10 +1552,16 @@ def prepare_output_times():
 
 # Declare global variables used in above functions
 cython.declare(ᔑdt_steps=dict,
+               ᔑdt_rungs=dict,
+               rung_fine='Py_ssize_t',
                i_dump='Py_ssize_t',
                dumps=list,
                next_dump=list,
                )
+# With block time steps, each half of a base time step is divided
+# into rung_fine fine intervals, half the time step of the finest rung.
+ᔑdt_rungs = {}
+rung_fine = 2**(N_rungs - 1)
 if 'special' in special_params:
     # Instead of running a simulation, run some utility
     # as defined by the special_params dict.
@@ -1016,6 +1569,9 @@ if 'special' in special_params:
 else:
     # Run the time loop
     timeloop()
+    # Wait for any asynchronous output to complete,
+    # finalizing any pending autosave.
+    finalize_autosave()
     # Simulation done
     universals.any_warnings = allreduce(universals.any_warnings, op=MPI.LOR)
     if universals.any_warnings:
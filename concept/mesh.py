@@ -24,8 +24,13 @@
 # In the .pyx file, Cython declared variables will also get cimported.
 from commons import *
 
+# OpenMP parallelization
+from cython.parallel import prange
+
 # Cython imports
 cimport('from communication import communicate_domain,                             '
+        '                          communicate_domain_finish,                      '
+        '                          communicate_domain_start,                       '
         '                          domain_layout_local_indices,                    '
         '                          domain_size_x,  domain_size_y,  domain_size_z,  '
         '                          domain_start_x, domain_start_y, domain_start_z, '
@@ -63,10 +68,20 @@ cdef extern from "fft.c":
                                   char*     rigor,
                                   bint      fftw_wisdom_reuse,
                                   char*     wisdom_filename,
+                                  int       nthreads,
                                   )
     void fftw_execute(fftw_plan plan)
     void fftw_clean(double* grid, fftw_plan plan_forward,
                                   fftw_plan plan_backward)
+    fftw_plan fftw_plan_1d(char*     kind,
+                           ptrdiff_t howmany_outer,
+                           ptrdiff_t n,
+                           ptrdiff_t howmany_inner,
+                           bint      inplace,
+                           char*     rigor,
+                           int       nthreads,
+                           )
+    void fftw_execute_1d(fftw_plan plan, char* kind, double* grid_in, double* grid_out)
 """)
 
 
@@ -171,6 +186,7 @@ def tabulate_vectorfield(gridsize, func, factor, filename=''):
 
 # Function for doing lookup in a grid with scalar values and
 # CIC-interpolating to specified coordinates.
+@cython.nogil
 @cython.header(# Argument
                grid='double[:, :, :]',
                x='double',
@@ -240,11 +256,14 @@ def CIC_scalargrid2coordinates(grid, x, y, z):
 
 # Function for doing lookup in a grid with vector values and
 # CIC-interpolating to specified coordinates
+@cython.nogil
 @cython.header(# Argument
                grid='double[:, :, :, :]',
                x='double',
                y='double',
                z='double',
+               vectors='double[:, ::1]',
+               thread='int',
                # Locals
                Wxl='double',
                Wxu='double',
@@ -259,9 +278,9 @@ def CIC_scalargrid2coordinates(grid, x, y, z):
                y_upper='Py_ssize_t',
                z_lower='Py_ssize_t',
                z_upper='Py_ssize_t',
-               returns='double*',
+               returns='void',
                )
-def CIC_vectorgrid2coordinates(grid, x, y, z):
+def CIC_vectorgrid2coordinates(grid, x, y, z, vectors, thread):
     """This function looks up tabulated vectors in a grid and
     interpolates to (x, y, z) via the cloud in cell (CIC) method.
     Input arguments must be normalized so that 0 <= x, y, z < 1.
@@ -269,6 +288,9 @@ def CIC_vectorgrid2coordinates(grid, x, y, z):
     It is assumed that the grid is nonperiodic (that is, the first and
     the last gridpoint in any dimension are physical distinct and that
     the grid has closed ends).
+    The interpolated vector is stored in vectors[thread, :]. As each
+    thread writes to its own row only, this function may be called
+    from within a parallel (prange) loop.
     """
     # Correct for extreme values in the passed coordinates.
     # This is to catch inputs which are slighly larger than 1 due to
@@ -301,7 +323,7 @@ def CIC_vectorgrid2coordinates(grid, x, y, z):
     Wzu = z - z_lower  # = 1 - (z_upper - z)
     # Assign the weighted grid values to the vector components
     for dim in range(3):
-        vector[dim] = (  grid[x_lower, y_lower, z_lower, dim]*ℝ[Wxl*Wyl]*Wzl
+        vectors[thread, dim] = (  grid[x_lower, y_lower, z_lower, dim]*ℝ[Wxl*Wyl]*Wzl
                        + grid[x_lower, y_lower, z_upper, dim]*ℝ[Wxl*Wyl]*Wzu
                        + grid[x_lower, y_upper, z_lower, dim]*ℝ[Wxl*Wyu]*Wzl
                        + grid[x_lower, y_upper, z_upper, dim]*ℝ[Wxl*Wyu]*Wzu
@@ -309,7 +331,102 @@ def CIC_vectorgrid2coordinates(grid, x, y, z):
                        + grid[x_upper, y_lower, z_upper, dim]*ℝ[Wxu*Wyl]*Wzu
                        + grid[x_upper, y_upper, z_lower, dim]*ℝ[Wxu*Wyu]*Wzl
                        + grid[x_upper, y_upper, z_upper, dim]*ℝ[Wxu*Wyu]*Wzu)
-    return vector
+
+# Function for doing lookup in a grid with vector values and
+# tricubically interpolating to specified coordinates
+@cython.nogil
+@cython.header(# Argument
+               grid='double[:, :, :, :]',
+               x='double',
+               y='double',
+               z='double',
+               vectors='double[:, ::1]',
+               thread='int',
+               # Locals
+               Wx='double',
+               Wxy='double',
+               dim='int',
+               i='int',
+               j='int',
+               k='int',
+               x_lower='Py_ssize_t',
+               y_lower='Py_ssize_t',
+               z_lower='Py_ssize_t',
+               returns='void',
+               )
+def tricubic_vectorgrid2coordinates(grid, x, y, z, vectors, thread):
+    """This function looks up tabulated vectors in a grid and
+    interpolates to (x, y, z) using tricubic (Lagrange) interpolation
+    through the 4×4×4 nearest grid points.
+    Input arguments must be normalized so that 0 <= x, y, z < 1.
+    If x, y or z is exactly equal to 1, they will be corrected to 1 - ϵ.
+    As with CIC_vectorgrid2coordinates, the grid is assumed to be
+    nonperiodic. Additionally, the grid must be padded with a single
+    layer of ghost points at both ends of every dimension, so that
+    the physical points 0 and 1 correspond to the grid indices 1 and
+    grid.shape[dim] - 2.
+    As for CIC_vectorgrid2coordinates, the interpolated vector is
+    stored in vectors[thread, :].
+    """
+    # Correct for extreme values in the passed coordinates.
+    # This is to catch inputs which are slighly larger than 1 due to
+    # numerical errors.
+    if x >= 1:
+        x = ℝ[1 - machine_ϵ]
+    if y >= 1:
+        y = ℝ[1 - machine_ϵ]
+    if z >= 1:
+        z = ℝ[1 - machine_ϵ]
+    # Scale the coordinates so that 0 <= x, y, z < (gridsize - 1),
+    # with gridsize the number of physical (non-ghost) points.
+    x *= grid.shape[0] - 3
+    y *= grid.shape[1] - 3
+    z *= grid.shape[2] - 3
+    # Indices of the physical grid points just below (x, y, z).
+    # Due to the ghost layer, the 4 points used for the
+    # interpolation then start at these indices in the padded grid.
+    x_lower = int(x)
+    y_lower = int(y)
+    z_lower = int(z)
+    # The cubic Lagrange weights along each dimension
+    lagrange_weights(x - x_lower, tricubic_weights, thread, 0)
+    lagrange_weights(y - y_lower, tricubic_weights, thread, 1)
+    lagrange_weights(z - z_lower, tricubic_weights, thread, 2)
+    # Assign the weighted grid values to the vector components
+    for dim in range(3):
+        vectors[thread, dim] = 0
+    for i in range(4):
+        Wx = tricubic_weights[thread, 0, i]
+        for j in range(4):
+            Wxy = Wx*tricubic_weights[thread, 1, j]
+            for k in range(4):
+                for dim in range(3):
+                    vectors[thread, dim] += (
+                        grid[x_lower + i, y_lower + j, z_lower + k, dim]
+                        *Wxy*tricubic_weights[thread, 2, k]
+                    )
+# Buffer for the interpolation weights used by the above function,
+# with separate weights for each thread and dimension.
+cython.declare(tricubic_weights='double[:, :, ::1]')
+tricubic_weights = empty((num_threads, 3, 4), dtype=C2np['double'])
+
+# Function computing the four weights of cubic Lagrange interpolation
+# between the two middle points of four equidistant points,
+# given the fractional distance t from the second point.
+# The weights are stored in weights[thread, dim, :].
+@cython.nogil
+@cython.header(# Arguments
+               t='double',
+               weights='double[:, :, ::1]',
+               thread='int',
+               dim='int',
+               returns='void',
+               )
+def lagrange_weights(t, weights, thread, dim):
+    weights[thread, dim, 0] = -t*(t - 1)*(t - 2)*ℝ[1/6]
+    weights[thread, dim, 1] = (t + 1)*(t - 1)*(t - 2)*0.5
+    weights[thread, dim, 2] = -(t + 1)*t*(t - 2)*0.5
+    weights[thread, dim, 3] = (t + 1)*t*(t - 1)*ℝ[1/6]
 
 # Function which interpolates one grid onto another grid,
 # optionally multiplying the interpolated values by a factor.
@@ -505,6 +622,7 @@ def CIC_grid2grid(gridA, gridB, fac=1, fac_grid=None, fac2=1, fac_grid2=None):
                 Wzl='double',
                 Wxu='double',
                 Wyu='double',
+                N_local='Py_ssize_t',
                 Wzu='double',
                 amount='double',
                 component='Component',
@@ -516,14 +634,24 @@ def CIC_grid2grid(gridA, gridB, fac=1, fac_grid=None, fac2=1, fac_grid2=None):
                 i='Py_ssize_t',
                 interpolations='int',
                 j='Py_ssize_t',
-                particle_quantity='double*',
-                posx='double*',
-                posy='double*',
-                posz='double*',
+                k='Py_ssize_t',
+                k_begin='Py_ssize_t',
+                k_end='Py_ssize_t',
+                particle_quantity='particle_float*',
+                plane_begin='Py_ssize_t',
+                plane_end='Py_ssize_t',
+                posx='particle_float*',
+                posy='particle_float*',
+                posz='particle_float*',
                 quantities_implemented=tuple,
                 quantity=str,
                 shape=tuple,
+                sort_particles='bint',
+                thread='int',
+                use_quantity='bint',
                 x='double',
+                x_begin='int',
+                x_end='int',
                 x_lower='int',
                 x_upper='int',
                 y='double',
@@ -594,9 +722,21 @@ def CIC_components2domain_grid(component_or_components, domain_grid, quantities,
     interpolations = 0
     for i, component in enumerate(components):
         if not only_fluid_components and component.representation == 'particles':
+            N_local = component.N_local
             posx = component.posx
             posy = component.posy
             posz = component.posz
+            # The particles are interpolated in parallel by
+            # num_threads threads. To avoid race conditions,
+            # the domain grid is divided into slabs along the
+            # x-dimension, one for each thread, with each thread only
+            # assigning to the grid points within its own slab. So that
+            # each thread only needs to visit the particles touching
+            # its slab, the particle indices are first sorted by their
+            # lower x grid index using a counting sort.
+            sort_particles = (num_threads > 1)
+            if sort_particles:
+                sort_particles_by_plane(posx, N_local, shape[0])
             # Interpolate each particle quantity
             for quantity, factors in quantities:
                 # Grab the quantity to be interpolated
@@ -619,55 +759,86 @@ def CIC_components2domain_grid(component_or_components, domain_grid, quantities,
                 interpolations += 1
                 factor = factors[i]
                 # For quantity == 'particles', each particle should
-                # contribute with an amount equal to factor
-                # (for quantity != 'particles', this will be overwritten
-                # in the loop below).
-                amount = factor
-                # Interpolate each particle
-                for j in range(component.N_local):
-                    # Get the amount this particle contribute
-                    # to the interpolated grid.
-                    with unswitch(1):
-                        if quantity != 'particles':
+                # contribute with an amount equal to factor.
+                use_quantity = (quantity != 'particles')
+                for thread in prange(num_threads, nogil=True, num_threads=num_threads):
+                    x_begin = thread*ℤ[shape[0] + 1]//num_threads
+                    x_end = (thread + 1)*ℤ[shape[0] + 1]//num_threads
+                    # The sorted particles touching the slab of this
+                    # thread are those with a lower x grid index
+                    # within [x_begin - 1, x_end).
+                    with unswitch:
+                        if sort_particles:
+                            plane_begin = x_begin - 1
+                            if plane_begin < 0:
+                                plane_begin = 0
+                            plane_end = x_end
+                            if plane_end > ℤ[shape[0]]:
+                                plane_end = ℤ[shape[0]]
+                            if plane_end < plane_begin:
+                                plane_end = plane_begin
+                            k_begin = cic_plane_offsets[plane_begin]
+                            k_end = cic_plane_offsets[plane_end]
+                        else:
+                            k_begin = 0
+                            k_end = N_local
+                    # Interpolate each particle
+                    for k in range(k_begin, k_end):
+                        with unswitch:
+                            if sort_particles:
+                                j = cic_particle_order[k]
+                            else:
+                                j = k
+                        # Get, translate and scale the x coordinate so
+                        # that 0 <= x < shape[0].
+                        x = (posx[j] - domain_start_x)*ℝ[shape[0]/domain_size_x]
+                        # Correct for coordinates which are
+                        # exactly at an upper domain boundary.
+                        if x >= ℝ[shape[0]]:
+                            x = ℝ[shape[0]*(1 - machine_ϵ)]
+                        x_lower = int(x)
+                        x_upper = x_lower + 1
+                        # Get the amount this particle contribute
+                        # to the interpolated grid.
+                        if use_quantity:
                             amount = factor*particle_quantity[j]
-                    # Get, translate and scale the coordinates so that
-                    # 0 <= j < shape[j] for j in (x, y, z).
-                    x = (posx[j] - domain_start_x)*ℝ[shape[0]/domain_size_x]
-                    y = (posy[j] - domain_start_y)*ℝ[shape[1]/domain_size_y]
-                    z = (posz[j] - domain_start_z)*ℝ[shape[2]/domain_size_z]
-                    # Correct for coordinates which are
-                    # exactly at an upper domain boundary.
-                    if x >= ℝ[shape[0]]:
-                        x = ℝ[shape[0]*(1 - machine_ϵ)]
-                    if y >= ℝ[shape[1]]:
-                        y = ℝ[shape[1]*(1 - machine_ϵ)]
-                    if z >= ℝ[shape[2]]:
-                        z = ℝ[shape[2]*(1 - machine_ϵ)]
-                    # Indices of the 8 vertices (6 faces)
-                    # of the grid surrounding (x, y, z).
-                    x_lower = int(x)
-                    y_lower = int(y)
-                    z_lower = int(z)
-                    x_upper = x_lower + 1
-                    y_upper = y_lower + 1
-                    z_upper = z_lower + 1
-                    # The linear weights according to the
-                    # CIC rule W = 1 - |dist| if |dist| < 1.
-                    Wxl = x_upper - x  # = 1 - (x - x_lower)
-                    Wyl = y_upper - y  # = 1 - (y - y_lower)
-                    Wzl = z_upper - z  # = 1 - (z - z_lower)
-                    Wxu = x - x_lower  # = 1 - (x_upper - x)
-                    Wyu = y - y_lower  # = 1 - (y_upper - y)
-                    Wzu = z - z_lower  # = 1 - (z_upper - z)
-                    # Assign the weights to the grid points
-                    domain_grid_noghosts[x_lower, y_lower, z_lower] += ℝ[amount*Wxl*Wyl]*Wzl
-                    domain_grid_noghosts[x_lower, y_lower, z_upper] += ℝ[amount*Wxl*Wyl]*Wzu
-                    domain_grid_noghosts[x_lower, y_upper, z_lower] += ℝ[amount*Wxl*Wyu]*Wzl
-                    domain_grid_noghosts[x_lower, y_upper, z_upper] += ℝ[amount*Wxl*Wyu]*Wzu
-                    domain_grid_noghosts[x_upper, y_lower, z_lower] += ℝ[amount*Wxu*Wyl]*Wzl
-                    domain_grid_noghosts[x_upper, y_lower, z_upper] += ℝ[amount*Wxu*Wyl]*Wzu
-                    domain_grid_noghosts[x_upper, y_upper, z_lower] += ℝ[amount*Wxu*Wyu]*Wzl
-                    domain_grid_noghosts[x_upper, y_upper, z_upper] += ℝ[amount*Wxu*Wyu]*Wzu
+                        else:
+                            amount = factor
+                        # Get, translate and scale the remaining
+                        # coordinates so that 0 <= y < shape[1]
+                        # and 0 <= z < shape[2].
+                        y = (posy[j] - domain_start_y)*ℝ[shape[1]/domain_size_y]
+                        z = (posz[j] - domain_start_z)*ℝ[shape[2]/domain_size_z]
+                        if y >= ℝ[shape[1]]:
+                            y = ℝ[shape[1]*(1 - machine_ϵ)]
+                        if z >= ℝ[shape[2]]:
+                            z = ℝ[shape[2]*(1 - machine_ϵ)]
+                        # Indices of the remaining vertices (faces)
+                        # of the grid surrounding (x, y, z).
+                        y_lower = int(y)
+                        z_lower = int(z)
+                        y_upper = y_lower + 1
+                        z_upper = z_lower + 1
+                        # The linear weights according to the
+                        # CIC rule W = 1 - |dist| if |dist| < 1.
+                        Wxl = x_upper - x  # = 1 - (x - x_lower)
+                        Wyl = y_upper - y  # = 1 - (y - y_lower)
+                        Wzl = z_upper - z  # = 1 - (z - z_lower)
+                        Wxu = x - x_lower  # = 1 - (x_upper - x)
+                        Wyu = y - y_lower  # = 1 - (y_upper - y)
+                        Wzu = z - z_lower  # = 1 - (z_upper - z)
+                        # Assign the weights to the grid points
+                        # within the slab of this thread.
+                        if x_lower >= x_begin:
+                            domain_grid_noghosts[x_lower, y_lower, z_lower] += ℝ[amount*Wxl*Wyl]*Wzl
+                            domain_grid_noghosts[x_lower, y_lower, z_upper] += ℝ[amount*Wxl*Wyl]*Wzu
+                            domain_grid_noghosts[x_lower, y_upper, z_lower] += ℝ[amount*Wxl*Wyu]*Wzl
+                            domain_grid_noghosts[x_lower, y_upper, z_upper] += ℝ[amount*Wxl*Wyu]*Wzu
+                        if x_upper < x_end:
+                            domain_grid_noghosts[x_upper, y_lower, z_lower] += ℝ[amount*Wxu*Wyl]*Wzl
+                            domain_grid_noghosts[x_upper, y_lower, z_upper] += ℝ[amount*Wxu*Wyl]*Wzu
+                            domain_grid_noghosts[x_upper, y_upper, z_lower] += ℝ[amount*Wxu*Wyu]*Wzl
+                            domain_grid_noghosts[x_upper, y_upper, z_upper] += ℝ[amount*Wxu*Wyu]*Wzu
         elif not only_particle_components and component.representation == 'fluid':
             # Interpolate each fluid quantity
             for quantity, factors in quantities:
@@ -728,6 +899,72 @@ def CIC_components2domain_grid(component_or_components, domain_grid, quantities,
                            'as this quantity is not implemented.'
                            .format(quantity))
 
+
+# Function which sorts the indices of the N_local particles with
+# x coordinates posx by their lower x grid index, with the domain
+# divided into n_planes grid cells along the x-dimension, as used by
+# CIC_components2domain_grid. A counting sort is used, leaving the
+# sorted particle indices in cic_particle_order, with the particles
+# having lower x grid index p found at
+# cic_particle_order[cic_plane_offsets[p]:cic_plane_offsets[p + 1]].
+@cython.header(# Arguments
+               posx='particle_float*',
+               N_local='Py_ssize_t',
+               n_planes='Py_ssize_t',
+               # Locals
+               j='Py_ssize_t',
+               p='Py_ssize_t',
+               x='double',
+               x_lower='Py_ssize_t',
+               returns='void',
+               )
+def sort_particles_by_plane(posx, N_local, n_planes):
+    global cic_particle_order, cic_particle_planes, cic_particles_size
+    global cic_plane_offsets, cic_planes_size
+    # Enlarge the sorting buffers if necessary
+    if N_local > cic_particles_size:
+        cic_particles_size = N_local
+        cic_particle_order = realloc(cic_particle_order, cic_particles_size*sizeof('Py_ssize_t'))
+        cic_particle_planes = realloc(cic_particle_planes, cic_particles_size*sizeof('Py_ssize_t'))
+    if n_planes + 1 > cic_planes_size:
+        cic_planes_size = n_planes + 1
+        cic_plane_offsets = realloc(cic_plane_offsets, cic_planes_size*sizeof('Py_ssize_t'))
+    # Count the number of particles within each plane,
+    # storing the count of plane p at index p + 1.
+    for p in range(n_planes + 1):
+        cic_plane_offsets[p] = 0
+    for j in range(N_local):
+        x = (posx[j] - domain_start_x)*(n_planes/domain_size_x)
+        if x >= n_planes:
+            x = n_planes*(1 - machine_ϵ)
+        x_lower = int(x)
+        cic_particle_planes[j] = x_lower
+        cic_plane_offsets[x_lower + 1] += 1
+    # Convert the counts to offsets
+    for p in range(n_planes):
+        cic_plane_offsets[p + 1] += cic_plane_offsets[p]
+    # Place the particle indices. This shifts each offset
+    # to that of the next plane, which is then undone.
+    for j in range(N_local):
+        x_lower = cic_particle_planes[j]
+        cic_particle_order[cic_plane_offsets[x_lower]] = j
+        cic_plane_offsets[x_lower] += 1
+    for p in range(n_planes, 0, -1):
+        cic_plane_offsets[p] = cic_plane_offsets[p - 1]
+    cic_plane_offsets[0] = 0
+# Buffers used by sort_particles_by_plane
+cython.declare(cic_particle_order='Py_ssize_t*',
+               cic_particle_planes='Py_ssize_t*',
+               cic_particles_size='Py_ssize_t',
+               cic_plane_offsets='Py_ssize_t*',
+               cic_planes_size='Py_ssize_t',
+               )
+cic_particles_size = 1
+cic_particle_order = malloc(cic_particles_size*sizeof('Py_ssize_t'))
+cic_particle_planes = malloc(cic_particles_size*sizeof('Py_ssize_t'))
+cic_planes_size = 1
+cic_plane_offsets = malloc(cic_planes_size*sizeof('Py_ssize_t'))
+
 # Function for CIC-interpolating particles of a particle component
 # to fluid grids.
 @cython.header(# Argument
@@ -757,16 +994,16 @@ def CIC_components2domain_grid(component_or_components, domain_grid, quantities,
                j='Py_ssize_t',
                k='Py_ssize_t',
                mass='double',
-               momx='double*',
+               momx='particle_float*',
                momx_i='double',
-               momy='double*',
+               momy='particle_float*',
                momy_i='double',
-               momz='double*',
+               momz='particle_float*',
                momz_i='double',
                original_representation=str,
-               posx='double*',
-               posy='double*',
-               posz='double*',
+               posx='particle_float*',
+               posy='particle_float*',
+               posz='particle_float*',
                shape=tuple,
                x='double',
                x_lower='int',
@@ -1084,21 +1321,26 @@ def CIC_components2φ_general(component_or_components, quantities, add_particles
     else:
         return φ_dict
 # Check that φ_gridsize fulfills the requirements for FFT.
-# If not, the reason why will be stored in φ_illegal.
+# If not, the reason why will be stored in φ_illegal. The φ grid is
+# always distributed uniformly over the domains, and so φ_gridsize must
+# be divisible by the domain decomposition. Only the slab decomposition
+# further requires φ_gridsize to be divisible by the number of
+# processes, while the pencil decomposition distributes any φ_gridsize
+# over the processes as evenly as possible.
 cython.declare(φ_illegal=str)
 φ_illegal = ''
-if φ_gridsize%nprocs != 0:
-    φ_illegal = f'A φ_gridsize = {φ_gridsize} cannot be evenly divided by {nprocs} processes.'
-else:
-    if (   φ_gridsize%domain_subdivisions[0] != 0
-        or φ_gridsize%domain_subdivisions[1] != 0
-        or φ_gridsize%domain_subdivisions[2] != 0
-        ):
-        φ_illegal = (f'As φ_gridsize = {φ_gridsize}, the global φ grid have a shape of'
-                     f'({φ_gridsize}, {φ_gridsize}, {φ_gridsize}), which cannot be divided '
-                     f'according to the domain decomposition ({domain_subdivisions[0]}, '
-                     f'{domain_subdivisions[1]}, {domain_subdivisions[2]}).'
-                     )
+if (   φ_gridsize%domain_subdivisions[0] != 0
+    or φ_gridsize%domain_subdivisions[1] != 0
+    or φ_gridsize%domain_subdivisions[2] != 0
+    ):
+    φ_illegal = (f'As φ_gridsize = {φ_gridsize}, the global φ grid have a shape of '
+                 f'({φ_gridsize}, {φ_gridsize}, {φ_gridsize}), which cannot be divided '
+                 f'according to the domain decomposition ({domain_subdivisions[0]}, '
+                 f'{domain_subdivisions[1]}, {domain_subdivisions[2]}).'
+                 )
+elif fft_decomposition == 'slab' and φ_gridsize%nprocs != 0:
+    φ_illegal = (f'A φ_gridsize = {φ_gridsize} cannot be evenly divided by {nprocs} processes. '
+                 f'Consider using fft_decomposition = \'pencil\'.')
 if φ_gridsize%2 != 0:
     masterwarn(f'As φ_gridsize = {φ_gridsize} is odd, some operations may not function correctly.')
 # The shape of the domain φ grid, including pseudo and ghost points
@@ -1540,6 +1782,7 @@ def get_fftw_slab(gridsize, buffer_name=0, nullify=False):
                                  bytes(rigor_final, encoding='ascii'),
                                  reuse,
                                  bytes(wisdom_filename, encoding='ascii'),
+                                 num_threads,
                                  )
         if not reuse and not wisdom_acquired.get((gridsize, nprocs, rigor_final)):
             masterprint('done')
@@ -1654,7 +1897,8 @@ def get_wisdom_filename(gridsize, rigor):
     # in use for the current job). It is important to include the
     # MPI layout, as reusing FFTW wisdom across different nodes or even
     # CPUs within the same node may not be optimal due to e.g.
-    # ethernet connection.
+    # ethernet connection. Likewise, the plans depend on the number
+    # of threads used by each process.
     mpi_layout = []
     for other_node in range(nnodes):
         other_node_name = node_numbers2names[other_node]
@@ -1665,6 +1909,7 @@ def get_wisdom_filename(gridsize, rigor):
         rigor,
         fftw_version,
         mpi_layout,
+        num_threads,
     )).encode()).hexdigest()
     # The full path to the wisdom file
     wisdom_filename = '/'.join([
@@ -1799,6 +2044,527 @@ def free_fftw_slab(gridsize, buffer_name):
     # segmentation fault. As this should not ever happen, we leave
     # these as is.
 
+# Function which Fourier transforms a domain decomposed grid, returning
+# the (unnormalized) Fourier space grid. The decomposition of the
+# returned grid depends on the fft_decomposition user parameter, but
+# in either case its layout is [j, i, k] (the first two dimensions
+# transposed), with complex numbers stored as pairs of doubles along
+# the last dimension. Use fourier_grid_start to find the global
+# indices of the first local element. With slab decomposition, the
+# returned grid is the FFTW slab of the given name. With pencil
+# decomposition it is a buffer of the given name, distributed along
+# both the j and the k dimension.
+@cython.pheader(# Arguments
+                domain_grid='double[:, :, ::1]',
+                buffer_name=object,  # int or str
+                # Locals
+                box_y=tuple,
+                box_z=tuple,
+                fourier_grid='double[:, :, ::1]',
+                gridsize='Py_ssize_t',
+                layout=dict,
+                pencil_real='double[:, :, ::1]',
+                pencil_x='double[:, :, ::1]',
+                pencil_y='double[:, :, ::1]',
+                size_i='Py_ssize_t',
+                size_j='Py_ssize_t',
+                size_j_z='Py_ssize_t',
+                size_k='Py_ssize_t',
+                size_k_complex='Py_ssize_t',
+                returns='double[:, :, ::1]',
+                )
+def fft_forward(domain_grid, buffer_name=0):
+    if fft_decomposition == 'slab':
+        fourier_grid = slab_decompose(domain_grid, buffer_name, prepare_fft=True)
+        fft(fourier_grid, 'forward')
+        return fourier_grid
+    # Pencil decomposition. All pencils are stored in buffers, reused
+    # between calls. The 1D transforms are carried out in place
+    # whenever the data type of the pencils does not change.
+    gridsize = (domain_grid.shape[0] - 2*2 - 1)*domain_subdivisions[0]
+    layout = get_pencil_layout(gridsize)
+    box_y = layout['y'][rank]
+    box_z = layout['z'][rank]
+    size_i = box_y[0][1] - box_y[0][0]
+    size_j = layout['real'][rank][1][1] - layout['real'][rank][1][0]
+    size_j_z = box_z[1][1] - box_z[1][0]
+    size_k = box_y[2][1] - box_y[2][0]
+    size_k_complex = gridsize//2 + 1
+    # Communicate the domain grid to real space pencils,
+    # distributed along the i and the j dimension.
+    pencil_real = get_buffer((size_i, size_j, gridsize), 'pencil_real')
+    redistribute_boxes(
+        asarray(domain_grid)[2:(domain_grid.shape[0] - 2 - 1),
+                             2:(domain_grid.shape[1] - 2 - 1),
+                             2:(domain_grid.shape[2] - 2 - 1)],
+        asarray(pencil_real),
+        layout['domain'], layout['real'],
+    )
+    # Transform along k, the only dimension which is fully local
+    pencil_x = get_buffer((size_i, size_j, 2*size_k_complex), 'pencil_x')
+    fft_pencils(pencil_real, pencil_x, size_i*size_j, gridsize, 1, 'r2c')
+    # Transpose the pencils so that j becomes fully local and transform
+    pencil_y = get_buffer((size_i, gridsize, 2*size_k), 'pencil_y')
+    redistribute_boxes(
+        asarray(pencil_x).view('complex128'), asarray(pencil_y).view('complex128'),
+        layout['x'], layout['y'],
+    )
+    fft_pencils(pencil_y, pencil_y, size_i, gridsize, size_k, 'forward')
+    # Transpose the pencils so that i becomes fully local and transform.
+    # The pencils are stored directly in the [j, i, k] layout of the
+    # Fourier space grid, with complex numbers represented by pairs
+    # of doubles.
+    fourier_grid = get_buffer((size_j_z, gridsize, 2*size_k), buffer_name)
+    redistribute_boxes(
+        asarray(pencil_y).view('complex128'),
+        asarray(fourier_grid).view('complex128').transpose([1, 0, 2]),
+        layout['y'], layout['z'],
+    )
+    fft_pencils(fourier_grid, fourier_grid, size_j_z, gridsize, size_k, 'forward')
+    return fourier_grid
+
+# Function which Fourier transforms a Fourier space grid as returned by
+# fft_forward back to real space, storing the result in the passed
+# domain grid (including its pseudo points and ghost layers). As with
+# FFTW, the transform is unnormalized. Also as with FFTW, the passed
+# Fourier space grid is overwritten.
+@cython.pheader(# Arguments
+                fourier_grid='double[:, :, ::1]',
+                domain_grid='double[:, :, ::1]',
+                # Locals
+                box_y=tuple,
+                gridsize='Py_ssize_t',
+                layout=dict,
+                pencil_real='double[:, :, ::1]',
+                pencil_x='double[:, :, ::1]',
+                pencil_y='double[:, :, ::1]',
+                size_i='Py_ssize_t',
+                size_j='Py_ssize_t',
+                size_k='Py_ssize_t',
+                size_k_complex='Py_ssize_t',
+                )
+def fft_backward(fourier_grid, domain_grid):
+    if fft_decomposition == 'slab':
+        fft(fourier_grid, 'backward')
+        domain_decompose(fourier_grid, domain_grid)
+        return
+    # Pencil decomposition. Undo the steps of fft_forward.
+    gridsize = fourier_grid.shape[1]
+    layout = get_pencil_layout(gridsize)
+    box_y = layout['y'][rank]
+    size_i = box_y[0][1] - box_y[0][0]
+    size_j = layout['real'][rank][1][1] - layout['real'][rank][1][0]
+    size_k = box_y[2][1] - box_y[2][0]
+    size_k_complex = gridsize//2 + 1
+    fft_pencils(fourier_grid, fourier_grid, fourier_grid.shape[0], gridsize, size_k, 'backward')
+    pencil_y = get_buffer((size_i, gridsize, 2*size_k), 'pencil_y')
+    redistribute_boxes(
+        asarray(fourier_grid).view('complex128').transpose([1, 0, 2]),
+        asarray(pencil_y).view('complex128'),
+        layout['z'], layout['y'],
+    )
+    fft_pencils(pencil_y, pencil_y, size_i, gridsize, size_k, 'backward')
+    pencil_x = get_buffer((size_i, size_j, 2*size_k_complex), 'pencil_x')
+    redistribute_boxes(
+        asarray(pencil_y).view('complex128'), asarray(pencil_x).view('complex128'),
+        layout['y'], layout['x'],
+    )
+    pencil_real = get_buffer((size_i, size_j, gridsize), 'pencil_real')
+    fft_pencils(pencil_x, pencil_real, size_i*size_j, gridsize, 1, 'c2r')
+    # Communicate the real space pencils to the domain grid
+    # and populate its pseudo points and ghost layers.
+    redistribute_boxes(
+        asarray(pencil_real),
+        asarray(domain_grid)[2:(domain_grid.shape[0] - 2 - 1),
+                             2:(domain_grid.shape[1] - 2 - 1),
+                             2:(domain_grid.shape[2] - 2 - 1)],
+        layout['real'], layout['domain'],
+    )
+    communicate_domain(domain_grid, mode='populate')
+
+# Function carrying out many local 1D Fourier transforms of length n
+# along the middle dimension of grid_in, the data of which is viewed as
+# having a shape of (howmany_outer, n, howmany_inner). The result is
+# stored in grid_out, which may be grid_in itself for complex-to-complex
+# transforms. All grids contain doubles, with complex numbers stored
+# as pairs of doubles. The kind of transform is one of
+#   'r2c':      Real to complex, forward. The length of the middle
+#               dimension of grid_out is n//2 + 1 complex numbers.
+#   'c2r':      Complex to real, backward. The length of the middle
+#               dimension of grid_in is n//2 + 1 complex numbers.
+#               The content of grid_in is destroyed.
+#   'forward':  Complex to complex, forward.
+#   'backward': Complex to complex, backward.
+# As with FFTW, the transforms are unnormalized. In compiled mode the
+# transforms are carried out by FFTW using num_threads threads, with
+# the plans kept around for later use. In pure Python mode, NumPy
+# is used.
+@cython.header(# Arguments
+               grid_in='double[:, :, ::1]',
+               grid_out='double[:, :, ::1]',
+               howmany_outer='Py_ssize_t',
+               n='Py_ssize_t',
+               howmany_inner='Py_ssize_t',
+               kind=str,
+               # Locals
+               arr_in=object,  # np.ndarray
+               arr_out=object,  # np.ndarray
+               fftw_plans_1d_index='Py_ssize_t',
+               inplace='bint',
+               key=tuple,
+               n_in='Py_ssize_t',
+               n_out='Py_ssize_t',
+               returns='void',
+               )
+def fft_pencils(grid_in, grid_out, howmany_outer, n, howmany_inner, kind):
+    global fftw_plans_1d, fftw_plans_1d_size
+    if not cython.compiled:
+        n_in  = (n//2 + 1 if kind == 'c2r' else n)
+        n_out = (n//2 + 1 if kind == 'r2c' else n)
+        arr_in  = asarray(grid_in)
+        arr_out = asarray(grid_out)
+        if kind != 'r2c':
+            arr_in = arr_in.view('complex128')
+        if kind != 'c2r':
+            arr_out = arr_out.view('complex128')
+        arr_in  = arr_in .reshape((howmany_outer, n_in , howmany_inner))
+        arr_out = arr_out.reshape((howmany_outer, n_out, howmany_inner))
+        # NumPy normalizes the backward transforms
+        if kind == 'r2c':
+            arr_out[...] = np.fft.rfft(arr_in, axis=1)
+        elif kind == 'c2r':
+            arr_out[...] = np.fft.irfft(arr_in, n=n, axis=1)*n
+        elif kind == 'forward':
+            arr_out[...] = np.fft.fft(arr_in, axis=1)
+        else:
+            arr_out[...] = np.fft.ifft(arr_in, axis=1)*n
+        return
+    # Fetch or create the FFTW plan
+    inplace = (cython.address(grid_in[0, 0, 0]) == cython.address(grid_out[0, 0, 0]))
+    key = (kind, howmany_outer, n, howmany_inner, inplace)
+    fftw_plans_1d_index = fftw_plans_1d_mapping.get(key, -1)
+    if fftw_plans_1d_index == -1:
+        # The plans are created on temporary arrays by fftw_plan_1d,
+        # and so any planning-rigor may be used without destroying
+        # the data in grid_in. No wisdom is saved to disk.
+        fftw_plans_1d_index = fftw_plans_1d_size
+        fftw_plans_1d_size += 1
+        fftw_plans_1d = realloc(fftw_plans_1d, fftw_plans_1d_size*sizeof('fftw_plan'))
+        fftw_plans_1d[fftw_plans_1d_index] = fftw_plan_1d(
+            bytes(kind, encoding='ascii'),
+            howmany_outer, n, howmany_inner, inplace,
+            bytes(fftw_wisdom_rigor, encoding='ascii'),
+            num_threads,
+        )
+        fftw_plans_1d_mapping[key] = fftw_plans_1d_index
+    # Carry out the transforms
+    fftw_execute_1d(
+        fftw_plans_1d[fftw_plans_1d_index],
+        bytes(kind, encoding='ascii'),
+        cython.address(grid_in[0, 0, 0]),
+        cython.address(grid_out[0, 0, 0]),
+    )
+# Array of FFTW plans for the 1D transforms of pencils, together
+# with a dict mapping (kind, howmany_outer, n, howmany_inner, inplace)
+# to the index of the corresponding plan.
+cython.declare(fftw_plans_1d='fftw_plan*',
+               fftw_plans_1d_size='Py_ssize_t',
+               fftw_plans_1d_mapping=dict,
+               )
+fftw_plans_1d_size = 0
+fftw_plans_1d = malloc(fftw_plans_1d_size*sizeof('fftw_plan'))
+fftw_plans_1d_mapping = {}
+
+# Function returning the global (j, k) indices of the first local
+# element of Fourier space grids as returned by fft_forward. The k
+# index counts complex numbers, i.e. pairs of doubles. Fourier space
+# grids always contain the complete i dimension.
+@cython.pheader(# Arguments
+                gridsize='Py_ssize_t',
+                # Locals
+                layout=dict,
+                returns=tuple,
+                )
+def fourier_grid_start(gridsize):
+    if fft_decomposition == 'slab':
+        return (gridsize//nprocs*rank, 0)
+    layout = get_pencil_layout(gridsize)
+    return (layout['z'][rank][1][0], layout['z'][rank][2][0])
+
+# Function returning a Fourier space grid of the given gridsize,
+# decomposed in the same way as those returned by fft_forward and
+# ready for being passed to fft_backward.
+@cython.pheader(# Arguments
+                gridsize='Py_ssize_t',
+                buffer_name=object,  # int or str
+                # Locals
+                box=tuple,
+                returns='double[:, :, ::1]',
+                )
+def get_fourier_grid(gridsize, buffer_name=0):
+    if fft_decomposition == 'slab':
+        return get_fftw_slab(gridsize, buffer_name)
+    box = get_pencil_layout(gridsize)['z'][rank]
+    return get_buffer(
+        (box[1][1] - box[1][0], gridsize, 2*(box[2][1] - box[2][0])), buffer_name,
+    )
+
+# Function for differentiating a Fourier space grid (as returned by
+# fft_forward) along the given dimension. The result is transformed
+# back to real space and stored in a domain grid (including pseudo
+# points and ghost layers), which is returned. Differentiation in
+# Fourier space is exact (spectral) and replaces the finite
+# differencing of diff_domain. As for diff_domain, the grid is taken
+# to have a physical extent of boxsize.
+@cython.pheader(# Arguments
+                fourier_grid='double[:, :, ::1]',
+                dim='int',
+                buffer_name=object,  # int or str
+                # Locals
+                domain_grid='double[:, :, ::1]',
+                fourier_grid_diff='double[:, :, ::1]',
+                gridsize='Py_ssize_t',
+                i='Py_ssize_t',
+                j='Py_ssize_t',
+                j_global='Py_ssize_t',
+                j_start='Py_ssize_t',
+                k='Py_ssize_t',
+                k_dim='Py_ssize_t',
+                ki='Py_ssize_t',
+                kj='Py_ssize_t',
+                kk='Py_ssize_t',
+                kk_start='Py_ssize_t',
+                factor='double',
+                fourier_diff_jik='double*',
+                fourier_jik='double*',
+                returns='double[:, :, ::1]',
+                )
+def diff_fourier(fourier_grid, dim, buffer_name=0):
+    gridsize = fourier_grid.shape[1]
+    fourier_grid_diff = get_fourier_grid(gridsize, 'diff_fourier')
+    j_start, kk_start = fourier_grid_start(gridsize)
+    for j in range(ℤ[fourier_grid.shape[0]]):
+        # The j-component of the wave vector (grid units)
+        j_global = j_start + j
+        if j_global > ℤ[gridsize//2]:
+            kj = j_global - gridsize
+        else:
+            kj = j_global
+        for i in range(gridsize):
+            # The i-component of the wave vector (grid units)
+            if i > ℤ[gridsize//2]:
+                ki = i - gridsize
+            else:
+                ki = i
+            for k in range(0, ℤ[fourier_grid.shape[2]], 2):
+                # The k-component of the wave vector (grid units)
+                kk = kk_start + k//2
+                # The component of the wave vector
+                # along the differentiation dimension.
+                with unswitch(3):
+                    if dim == 0:
+                        k_dim = ki
+                    elif dim == 1:
+                        k_dim = kj
+                    else:
+                        k_dim = kk
+                # The Nyquist mode has no well-defined derivative
+                if k_dim == ℤ[gridsize//2]:
+                    k_dim = 0
+                # Multiply by i*k_dim, converted to physical units
+                factor = k_dim*ℝ[2*π/boxsize]
+                fourier_jik = cython.address(fourier_grid[j, i, k:])
+                fourier_diff_jik = cython.address(fourier_grid_diff[j, i, k:])
+                fourier_diff_jik[0] = -factor*fourier_jik[1]  # Real part
+                fourier_diff_jik[1] = +factor*fourier_jik[0]  # Imag part
+    # Transform back to real space, storing the result in a domain grid
+    domain_grid = get_buffer(
+        tuple([gridsize//domain_subdivisions[dim] + 1 + 2*2 for dim in range(3)]), buffer_name,
+    )
+    fft_backward(fourier_grid_diff, domain_grid)
+    return domain_grid
+
+# Function returning the pencil decomposition of a grid of the given
+# gridsize. The processes are arranged in a 2D grid of n_rows×n_cols,
+# with the process of rank r situated at row r//n_cols and
+# column r%n_cols. The returned dict maps the stage of the
+# decomposition to a list of global index boxes ((i_start, i_end),
+# (j_start, j_end), (k_start, k_end)), one for each process:
+#   'domain': The (uniform) domain decomposition.
+#   'real':   Real space pencils, local along k.
+#   'x':      As 'real' but with k counting complex numbers, after the
+#             real-to-complex transform along k.
+#   'y':      Pencils local along j.
+#   'z':      Pencils local along i.
+# In contrast to the slab decomposition, gridsize need not be divisible
+# by the number of processes.
+@cython.pheader(# Arguments
+                gridsize='Py_ssize_t',
+                # Locals
+                col='int',
+                domain_layout_indices=tuple,
+                domain_size=tuple,
+                layout=dict,
+                n_cols='int',
+                n_rows='int',
+                other_rank='int',
+                ranges_i=list,
+                ranges_j_col=list,
+                ranges_j_row=list,
+                ranges_k_col=list,
+                row='int',
+                size_k_complex='Py_ssize_t',
+                returns=dict,
+                )
+def get_pencil_layout(gridsize):
+    layout = pencil_layouts.get(gridsize)
+    if layout:
+        return layout
+    # Arrange the processes in a grid as square as possible
+    n_rows = int(sqrt(nprocs))
+    while nprocs%n_rows != 0:
+        n_rows -= 1
+    n_cols = nprocs//n_rows
+    size_k_complex = gridsize//2 + 1
+    if n_rows > gridsize or n_cols > size_k_complex:
+        abort(f'Cannot distribute a grid of gridsize {gridsize} as pencils '
+              f'over a {n_rows}×{n_cols} process grid')
+    # Split each dimension into nearly equal parts
+    ranges_i     = [((row*gridsize)//n_rows, ((row + 1)*gridsize)//n_rows)
+                    for row in range(n_rows)]
+    ranges_j_row = ranges_i
+    ranges_j_col = [((col*gridsize)//n_cols, ((col + 1)*gridsize)//n_cols)
+                    for col in range(n_cols)]
+    ranges_k_col = [((col*size_k_complex)//n_cols, ((col + 1)*size_k_complex)//n_cols)
+                    for col in range(n_cols)]
+    domain_size = tuple([gridsize//domain_subdivisions[dim] for dim in range(3)])
+    layout = {'domain': [], 'real': [], 'x': [], 'y': [], 'z': []}
+    for other_rank in range(nprocs):
+        row, col = other_rank//n_cols, other_rank%n_cols
+        domain_layout_indices = np.unravel_index(other_rank, domain_subdivisions)
+        layout['domain'].append(tuple([
+            (domain_layout_indices[dim]*domain_size[dim],
+                (domain_layout_indices[dim] + 1)*domain_size[dim])
+            for dim in range(3)
+        ]))
+        layout['real'].append((ranges_i[row], ranges_j_col[col], (0, gridsize)))
+        layout['x'   ].append((ranges_i[row], ranges_j_col[col], (0, size_k_complex)))
+        layout['y'   ].append((ranges_i[row], (0, gridsize), ranges_k_col[col]))
+        layout['z'   ].append(((0, gridsize), ranges_j_row[row], ranges_k_col[col]))
+    pencil_layouts[gridsize] = layout
+    return layout
+# Cache storing the results of the get_pencil_layout function
+cython.declare(pencil_layouts=dict)
+pencil_layouts = {}
+
+# Function which redistributes a 3D array between processes.
+# The local array arr covers the global index box boxes_from[rank],
+# while the array arr_to, into which the result is stored, covers the
+# box boxes_to[rank]. All boxes are given as
+# ((i_start, i_end), (j_start, j_end), (k_start, k_end)).
+# Both arrays may be non-contiguous views. All data is communicated
+# using a single Alltoallv, in which processes with no overlapping
+# boxes take no part. The data is packed into and unpacked from
+# buffers reused between calls.
+@cython.pheader(# Arguments
+                arr=object,  # np.ndarray
+                arr_to=object,  # np.ndarray
+                boxes_from=list,
+                boxes_to=list,
+                # Locals
+                box_from=tuple,
+                box_to=tuple,
+                element_size='Py_ssize_t',
+                overlap=tuple,
+                other_rank='int',
+                recvbuf=object,  # np.ndarray
+                recvcounts=object,  # np.ndarray
+                recvdispls=object,  # np.ndarray
+                sendbuf=object,  # np.ndarray
+                sendcounts=object,  # np.ndarray
+                senddispls=object,  # np.ndarray
+                size_recv='Py_ssize_t',
+                size_send='Py_ssize_t',
+                )
+def redistribute_boxes(arr, arr_to, boxes_from, boxes_to):
+    box_from = boxes_from[rank]
+    box_to   = boxes_to  [rank]
+    # Count the number of elements to send to and receive from
+    # each process.
+    sendcounts = zeros(nprocs, dtype=C2np['int'])
+    senddispls = zeros(nprocs, dtype=C2np['int'])
+    recvcounts = zeros(nprocs, dtype=C2np['int'])
+    recvdispls = zeros(nprocs, dtype=C2np['int'])
+    size_send = 0
+    size_recv = 0
+    for other_rank in range(nprocs):
+        overlap = box_overlap(box_from, boxes_to[other_rank], box_from)
+        if overlap:
+            senddispls[other_rank] = size_send
+            sendcounts[other_rank] = arr[overlap].size
+            size_send += sendcounts[other_rank]
+        overlap = box_overlap(boxes_from[other_rank], box_to, box_to)
+        if overlap:
+            recvdispls[other_rank] = size_recv
+            recvcounts[other_rank] = arr_to[overlap].size
+            size_recv += recvcounts[other_rank]
+    # Grab buffers for the packed data. As these contain doubles,
+    # their memory is reinterpreted as holding the data type
+    # of the arrays, which may be complex.
+    element_size = arr.itemsize//np.dtype(C2np['double']).itemsize
+    sendbuf = asarray(
+        get_buffer(pairmax(1, element_size*size_send), 'redistribute_send')
+    )[:element_size*size_send].view(arr.dtype)
+    recvbuf = asarray(
+        get_buffer(pairmax(1, element_size*size_recv), 'redistribute_recv')
+    )[:element_size*size_recv].view(arr.dtype)
+    # Pack the parts of the local array needed by other processes
+    for other_rank in range(nprocs):
+        if sendcounts[other_rank] == 0:
+            continue
+        overlap = box_overlap(box_from, boxes_to[other_rank], box_from)
+        sendbuf[
+            senddispls[other_rank]:senddispls[other_rank] + sendcounts[other_rank]
+        ].reshape(arr[overlap].shape)[...] = arr[overlap]
+    Alltoallv([sendbuf, (sendcounts, senddispls)], [recvbuf, (recvcounts, recvdispls)])
+    # Unpack the received parts into the new array
+    for other_rank in range(nprocs):
+        if recvcounts[other_rank] == 0:
+            continue
+        overlap = box_overlap(boxes_from[other_rank], box_to, box_to)
+        arr_to[overlap] = recvbuf[
+            recvdispls[other_rank]:recvdispls[other_rank] + recvcounts[other_rank]
+        ].reshape(arr_to[overlap].shape)
+
+# Helper function for redistribute_boxes, returning the overlap of two
+# global index boxes as a tuple of slices relative to the origin of the
+# reference box. If the boxes do not overlap, an empty tuple
+# is returned.
+@cython.header(# Arguments
+               box_1=tuple,
+               box_2=tuple,
+               box_ref=tuple,
+               # Locals
+               dim='int',
+               end='Py_ssize_t',
+               slices=list,
+               start='Py_ssize_t',
+               returns=tuple,
+               )
+def box_overlap(box_1, box_2, box_ref):
+    slices = []
+    for dim in range(3):
+        start = box_1[dim][0]
+        if box_2[dim][0] > start:
+            start = box_2[dim][0]
+        end = box_1[dim][1]
+        if box_2[dim][1] < end:
+            end = box_2[dim][1]
+        if start >= end:
+            return ()
+        slices.append(slice(start - box_ref[dim][0], end - box_ref[dim][0]))
+    return tuple(slices)
+
 # Function for checking that the slabs satisfy the required symmetry
 # of a Fourier transformed real field.
 @cython.pheader(# Arguments
@@ -1919,11 +2685,15 @@ def slabs_check_symmetry(slab, rel_tol=1e-9, abs_tol=machine_ϵ):
                 direction=str,
                 noghosts='bint',
                 # Locals
+                N_boxes='int',
+                box='int',
+                box_bounds='Py_ssize_t[:, ::1]',
                 buffer='double[:, :, ::1]',
                 buffer_name=object,  # int or str
                 i='Py_ssize_t',
                 j='Py_ssize_t',
                 k='Py_ssize_t',
+                plan=dict,
                 shape=tuple,
                 value='double',
                 returns='double[:, :, ::1]',
@@ -1977,90 +2747,166 @@ def diff_domain(grid, dim, h=1, buffer_or_buffer_name=0,
         buffer = get_buffer(shape, buffer_name, nullify=True)
     else:
         buffer = buffer_or_buffer_name
-    # Do the differentiation and add the results to the buffer
-    for         i in range(2, ℤ[grid.shape[0] - 2]):
-        for     j in range(2, ℤ[grid.shape[1] - 2]):
-            for k in range(2, ℤ[grid.shape[2] - 2]):
-                with unswitch:
-                    # Differentiate along x
-                    if dim == 0 and order == 1 and direction == 'forward':
-                        value = ℝ[1/h]*(+ grid[ℤ[i + 1], j, k]
-                                        - grid[  i     , j, k]
-                                        )
-                    elif dim == 0 and order == 1 and direction == 'backward':
-                        value = ℝ[1/h]*(+ grid[  i     , j, k]
-                                        - grid[ℤ[i - 1], j, k]
-                                        )
-                    elif dim == 0 and order == 2:
-                        value = ℝ[1/(2*h)]*(+ grid[ℤ[i + 1], j, k]
+    # Do the differentiation and add the results to the buffer.
+    # If the buffer contains ghost points, these have to be populated
+    # with copies of their corresponding actual points by communication.
+    # To overlap this communication with the differentiation, the
+    # boundary shell of the buffer (which is what gets communicated)
+    # is differentiated first, after which the communication is started
+    # and the interior is differentiated. The grid points to
+    # differentiate are split into boxes, the index bounds of which
+    # are stored in box_bounds. Without ghost points, a single box
+    # covers all points. With ghost points, the boundary shell is
+    # covered by six non-overlapping boxes (two slabs along each
+    # dimension), followed by the interior box.
+    box_bounds = diff_domain_box_bounds
+    if noghosts:
+        N_boxes = 1
+        diff_domain_set_box(box_bounds, 0, grid, 0, 3, 0, 3, 0, 3)
+    else:
+        N_boxes = 7
+        diff_domain_set_box(box_bounds, 0, grid, 0, 1, 0, 3, 0, 3)
+        diff_domain_set_box(box_bounds, 1, grid, 2, 3, 0, 3, 0, 3)
+        diff_domain_set_box(box_bounds, 2, grid, 1, 2, 0, 1, 0, 3)
+        diff_domain_set_box(box_bounds, 3, grid, 1, 2, 2, 3, 0, 3)
+        diff_domain_set_box(box_bounds, 4, grid, 1, 2, 1, 2, 0, 1)
+        diff_domain_set_box(box_bounds, 5, grid, 1, 2, 1, 2, 2, 3)
+        diff_domain_set_box(box_bounds, 6, grid, 1, 2, 1, 2, 1, 2)
+    for box in range(N_boxes):
+        if box == 6:
+            plan = communicate_domain_start(buffer, mode='populate')
+        for i in range(box_bounds[box, 0], box_bounds[box, 1]):
+            for j in range(box_bounds[box, 2], box_bounds[box, 3]):
+                for k in range(box_bounds[box, 4], box_bounds[box, 5]):
+                    with unswitch(3):
+                        # Differentiate along x
+                        if dim == 0 and order == 1 and direction == 'forward':
+                            value = ℝ[1/h]*(+ grid[ℤ[i + 1], j, k]
+                                            - grid[  i     , j, k]
+                                            )
+                        elif dim == 0 and order == 1 and direction == 'backward':
+                            value = ℝ[1/h]*(+ grid[  i     , j, k]
                                             - grid[ℤ[i - 1], j, k]
                                             )
-                    elif dim == 0 and order == 4:
-                        value = (+ ℝ[2/(3*h)] *(+ grid[ℤ[i + 1], j, k]
+                        elif dim == 0 and order == 2:
+                            value = ℝ[1/(2*h)]*(+ grid[ℤ[i + 1], j, k]
                                                 - grid[ℤ[i - 1], j, k]
                                                 )
-                                 - ℝ[1/(12*h)]*(+ grid[ℤ[i + 2], j, k]
-                                                - grid[ℤ[i - 2], j, k]
-                                                )
-                                 )
-                    # Differentiate along y
-                    elif dim == 1 and order == 1 and direction == 'forward':
-                        value = ℝ[1/h]*(+ grid[i, ℤ[j + 1], k]
-                                        - grid[i,   j     , k]
-                                        )
-                    elif dim == 1 and order == 1 and direction == 'backward':
-                        value = ℝ[1/h]*(+ grid[i,   j     , k]
-                                        - grid[i, ℤ[j - 1], k]
-                                        )
-                    elif dim == 1 and order == 2:
-                        value = ℝ[1/(2*h)]*(+ grid[i, ℤ[j + 1], k]
+                        elif dim == 0 and order == 4:
+                            value = (+ ℝ[2/(3*h)] *(+ grid[ℤ[i + 1], j, k]
+                                                    - grid[ℤ[i - 1], j, k]
+                                                    )
+                                     - ℝ[1/(12*h)]*(+ grid[ℤ[i + 2], j, k]
+                                                    - grid[ℤ[i - 2], j, k]
+                                                    )
+                                     )
+                        # Differentiate along y
+                        elif dim == 1 and order == 1 and direction == 'forward':
+                            value = ℝ[1/h]*(+ grid[i, ℤ[j + 1], k]
+                                            - grid[i,   j     , k]
+                                            )
+                        elif dim == 1 and order == 1 and direction == 'backward':
+                            value = ℝ[1/h]*(+ grid[i,   j     , k]
                                             - grid[i, ℤ[j - 1], k]
                                             )
-                    elif dim == 1 and order == 4:
-                        value = (+ ℝ[2/(3*h)] *(+ grid[i, ℤ[j + 1], k]
+                        elif dim == 1 and order == 2:
+                            value = ℝ[1/(2*h)]*(+ grid[i, ℤ[j + 1], k]
                                                 - grid[i, ℤ[j - 1], k]
                                                 )
-                                 - ℝ[1/(12*h)]*(+ grid[i, ℤ[j + 2], k]
-                                                - grid[i, ℤ[j - 2], k]
-                                                )
-                                 )
-                    # Differentiate along z
-                    elif dim == 2 and order == 1 and direction == 'forward':
-                        value = ℝ[1/h]*(+ grid[i, j, k + 1]
-                                        - grid[i, j, k    ]
-                                        )
-                    elif dim == 2 and order == 1 and direction == 'backward':
-                        value = ℝ[1/h]*(+ grid[i, j, k    ]
-                                        - grid[i, j, k - 1]
-                                        )
-                    elif dim == 2 and order == 2:
-                        value = ℝ[1/(2*h)]*(+ grid[i, j, k + 1]
+                        elif dim == 1 and order == 4:
+                            value = (+ ℝ[2/(3*h)] *(+ grid[i, ℤ[j + 1], k]
+                                                    - grid[i, ℤ[j - 1], k]
+                                                    )
+                                     - ℝ[1/(12*h)]*(+ grid[i, ℤ[j + 2], k]
+                                                    - grid[i, ℤ[j - 2], k]
+                                                    )
+                                     )
+                        # Differentiate along z
+                        elif dim == 2 and order == 1 and direction == 'forward':
+                            value = ℝ[1/h]*(+ grid[i, j, k + 1]
+                                            - grid[i, j, k    ]
+                                            )
+                        elif dim == 2 and order == 1 and direction == 'backward':
+                            value = ℝ[1/h]*(+ grid[i, j, k    ]
                                             - grid[i, j, k - 1]
                                             )
-                    elif dim == 2 and order == 4:
-                        value = (+ ℝ[2/(3*h)] *(+ grid[i, j, k + 1]
+                        elif dim == 2 and order == 2:
+                            value = ℝ[1/(2*h)]*(+ grid[i, j, k + 1]
                                                 - grid[i, j, k - 1]
                                                 )
-                                 - ℝ[1/(12*h)]*(+ grid[i, j, k + 2]
-                                                - grid[i, j, k - 2]
-                                                )
-                                 )
-                    else:
-                        abort('Domain differentiation with dim = {}, order = {} '
-                              'and direction = {} is not implemented'
-                              .format(dim, order, direction)
-                              )
-                        value = 0  # Just to please the compiler
-                # Update the buffer with the result
-                # of the differentiation.
-                with unswitch:
-                    if noghosts:
-                        buffer[ℤ[i - 2], ℤ[j - 2], k - 2] += value
-                    else:
-                        buffer[i, j, k] += value
-    # If the buffer contains ghost points, these have not themselves
-    # been replaced with differentiated values. Now populate these
-    # ghost points with copies of their corresponding actual points.
+                        elif dim == 2 and order == 4:
+                            value = (+ ℝ[2/(3*h)] *(+ grid[i, j, k + 1]
+                                                    - grid[i, j, k - 1]
+                                                    )
+                                     - ℝ[1/(12*h)]*(+ grid[i, j, k + 2]
+                                                    - grid[i, j, k - 2]
+                                                    )
+                                     )
+                        else:
+                            abort('Domain differentiation with dim = {}, order = {} '
+                                  'and direction = {} is not implemented'
+                                  .format(dim, order, direction)
+                                  )
+                            value = 0  # Just to please the compiler
+                    # Update the buffer with the result
+                    # of the differentiation.
+                    with unswitch(3):
+                        if noghosts:
+                            buffer[ℤ[i - 2], ℤ[j - 2], k - 2] += value
+                        else:
+                            buffer[i, j, k] += value
+    # Complete the population of the ghost points
     if not noghosts:
-        communicate_domain(buffer, mode='populate')
+        communicate_domain_finish(plan)
     return buffer
+# Array storing the index bounds of the boxes of grid points
+# differentiated by diff_domain, one row
+# (i_start, i_end, j_start, j_end, k_start, k_end) for each box.
+cython.declare(diff_domain_box_bounds='Py_ssize_t[:, ::1]')
+diff_domain_box_bounds = empty((7, 6), dtype=C2np['Py_ssize_t'])
+
+# Helper function for diff_domain, setting the index bounds of the
+# given box. Along each dimension, the grid points to differentiate
+# are divided by four bounds, indexed 0 through 3, with the boundary
+# shell between bounds 0 and 1 and between bounds 2 and 3, and the
+# interior between bounds 1 and 2. The box extends from bound
+# index_start to bound index_end along each dimension.
+@cython.header(# Arguments
+               box_bounds='Py_ssize_t[:, ::1]',
+               box='int',
+               grid='double[:, :, ::1]',
+               i_start='int',
+               i_end='int',
+               j_start='int',
+               j_end='int',
+               k_start='int',
+               k_end='int',
+               # Locals
+               bounds='Py_ssize_t[::1]',
+               dim='int',
+               size='Py_ssize_t',
+               returns='void',
+               )
+def diff_domain_set_box(box_bounds, box, grid, i_start, i_end, j_start, j_end, k_start, k_end):
+    bounds = diff_domain_bounds
+    for dim in range(3):
+        # The bounds along this dimension. The boundary shell consists
+        # of the three outermost layers of differentiated grid points
+        # (all but the two outermost layers of ghost points) on either
+        # side. For small grids, the interior is empty.
+        size = grid.shape[dim]
+        bounds[0] = 2
+        bounds[1] = pairmin(5, size - 2)
+        bounds[2] = pairmax(size - 5, bounds[1])
+        bounds[3] = size - 2
+        if dim == 0:
+            box_bounds[box, 0] = bounds[i_start]
+            box_bounds[box, 1] = bounds[i_end]
+        elif dim == 1:
+            box_bounds[box, 2] = bounds[j_start]
+            box_bounds[box, 3] = bounds[j_end]
+        else:
+            box_bounds[box, 4] = bounds[k_start]
+            box_bounds[box, 5] = bounds[k_end]
+cython.declare(diff_domain_bounds='Py_ssize_t[::1]')
+diff_domain_bounds = empty(4, dtype=C2np['Py_ssize_t'])
@@ -35,7 +35,8 @@ all arguments being filenames except the optional --no-optimization:
   classes from module0.pyx, module1.pyx, ..., together with globally
   defined types.
 - module.pyx commons.py .types.pyx
-  Created module.pxd, the cython header for module.pyx.
+  Created module.pxd, the cython header for module.pyx. Functions
+  decorated with @cython.nogil are declared nogil.
 
 In the first case where a .pyx file is created from a .py file,
 the following changes happens to the source code (in the .pyx file):
@@ -2462,6 +2463,15 @@ def make_pxd(filename, no_optimization):
                 # Do not add declarations of pure Python functions
                 if purepy_func:
                     continue
+                # Find out whether the function is
+                # decorated with @cython.nogil.
+                nogil = False
+                for dec_line in reversed(code[:i]):
+                    if not dec_line or dec_line[0] not in '@ #)':
+                        break
+                    if dec_line.startswith('@cython.nogil'):
+                        nogil = True
+                        break
                 # Find function name and args
                 open_paren = line.index('(')
                 function_name = line[3:open_paren].strip()
@@ -2616,7 +2626,10 @@ def make_pxd(filename, no_optimization):
                     s += arg + ', '
                 if len(s) > 1 and s[-2:] == ', ':
                     s = s[:-2]
-                s += ')\n'
+                s += ')'
+                if nogil:
+                    s += ' nogil'
+                s += '\n'
                 pxd_lines.append(' '*indent + s)
     # Remove all triple quotes with no indentation
     code_notriplequotes = []
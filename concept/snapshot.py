@@ -26,16 +26,21 @@ from commons import *
 
 # Cython imports
 cimport('from communication import partition,                   '
+        '                          domain_bounds_x,             '
+        '                          domain_bounds_y,             '
+        '                          domain_bounds_z,             '
         '                          domain_layout_local_indices, '
         '                          domain_subdivisions,         '
+        '                          domains_uniform,             '
         '                          exchange,                    '
         '                          smart_mpi,                   '
         )
 cimport('from mesh import domain_decompose, get_fftw_slab, slab_decompose')
-cimport('from species import Component, FluidScalar, get_representation, update_species_present')
+cimport('from species import Component, FluidScalar, communicate_components_fluid_grids, '
+        'get_representation, update_species_present')
 
 # Pure Python imports
-import struct
+import pickle, struct, threading
 
 
 
@@ -91,6 +96,8 @@ class StandardSnapshot:
                    filename=str,
                    # Locals
                    component='Component',
+                   dataset_options=dict,
+                   dtype=object,
                    end_local='Py_ssize_t',
                    fluidscalar='FluidScalar',
                    indices=object,  # int or tuple
@@ -135,20 +142,35 @@ class StandardSnapshot:
                     start_local = int(np.sum(smart_mpi(component.N_local,
                                                        mpifun='allgather')[:rank]))
                     end_local = start_local + component.N_local
-                    # Save particle data
+                    # Save particle data, using the same precision
+                    # as that of the particle storage, unless single
+                    # precision is explicitly requested.
                     shape = (component.N, )
-                    posx_h5 = component_h5.create_dataset('posx', shape, dtype=C2np['double'])
-                    posy_h5 = component_h5.create_dataset('posy', shape, dtype=C2np['double'])
-                    posz_h5 = component_h5.create_dataset('posz', shape, dtype=C2np['double'])
-                    momx_h5 = component_h5.create_dataset('momx', shape, dtype=C2np['double'])
-                    momy_h5 = component_h5.create_dataset('momy', shape, dtype=C2np['double'])
-                    momz_h5 = component_h5.create_dataset('momz', shape, dtype=C2np['double'])
-                    posx_h5[start_local:end_local] = component.posx_mv[:component.N_local]
-                    posy_h5[start_local:end_local] = component.posy_mv[:component.N_local]
-                    posz_h5[start_local:end_local] = component.posz_mv[:component.N_local]
-                    momx_h5[start_local:end_local] = component.momx_mv[:component.N_local]
-                    momy_h5[start_local:end_local] = component.momy_mv[:component.N_local]
-                    momz_h5[start_local:end_local] = component.momz_mv[:component.N_local]
+                    dtype = C2np['float' if snapshot_single_precision else 'particle_float']
+                    dataset_options = get_dataset_options(shape, dtype)
+                    posx_h5 = component_h5.create_dataset('posx', shape, dtype=dtype,
+                                                          **dataset_options)
+                    posy_h5 = component_h5.create_dataset('posy', shape, dtype=dtype,
+                                                          **dataset_options)
+                    posz_h5 = component_h5.create_dataset('posz', shape, dtype=dtype,
+                                                          **dataset_options)
+                    momx_h5 = component_h5.create_dataset('momx', shape, dtype=dtype,
+                                                          **dataset_options)
+                    momy_h5 = component_h5.create_dataset('momy', shape, dtype=dtype,
+                                                          **dataset_options)
+                    momz_h5 = component_h5.create_dataset('momz', shape, dtype=dtype,
+                                                          **dataset_options)
+                    write_dataset(posx_h5, start_local, component.posx_mv[:component.N_local])
+                    write_dataset(posy_h5, start_local, component.posy_mv[:component.N_local])
+                    write_dataset(posz_h5, start_local, component.posz_mv[:component.N_local])
+                    write_dataset(momx_h5, start_local, component.momx_mv[:component.N_local])
+                    write_dataset(momy_h5, start_local, component.momy_mv[:component.N_local])
+                    write_dataset(momz_h5, start_local, component.momz_mv[:component.N_local])
+                    # Save the number of particles written by each
+                    # process together with the bounding box of these,
+                    # allowing for later loading of subregions
+                    # without reading in all particles.
+                    save_particle_domains(component, component_h5)
                     # Done saving this particle component
                     hdf5_file.flush()
                     Barrier()
@@ -169,6 +191,7 @@ class StandardSnapshot:
                     # these groups, named "fluidscalar_multi_index",
                     # with multi_index (0, ), (1, ), ..., (0, 0), ...
                     shape = (component.gridsize, )*3
+                    dataset_options = get_dataset_options(shape, C2np['double'])
                     for index, fluidvar in enumerate(
                         component.fluidvars[:component.boltzmann_order]
                     ):
@@ -178,7 +201,8 @@ class StandardSnapshot:
                             fluidscalar_h5 = fluidvar_h5.create_dataset('fluidscalar_{}'
                                                                         .format(multi_index),
                                                                         shape,
-                                                                        dtype=C2np['double'])
+                                                                        dtype=C2np['double'],
+                                                                        **dataset_options)
                             # The global fluid scalar grid is of course
                             # stored contiguously on disk. Generally
                             # though, a single process does not store a
@@ -190,9 +214,8 @@ class StandardSnapshot:
                             slab = slab_decompose(fluidscalar.grid_mv)
                             slab_start = slab.shape[0]*rank
                             slab_end = slab_start + slab.shape[0]
-                            fluidscalar_h5[slab_start:slab_end, :, :] = slab[:,
-                                                                             :,
-                                                                             :component.gridsize]
+                            write_dataset(fluidscalar_h5, slab_start,
+                                          slab[:, :, :component.gridsize])
                     # Create additional names (hard links) for the fluid
                     # groups and data sets. The names from
                     # component.fluid_names will be used, except for
@@ -226,6 +249,10 @@ class StandardSnapshot:
                 elif master:
                     abort('Does not know how to save component "{}" with representation "{}"'
                           .format(component.name, component.representation))
+        # With asynchronous output, the staged data is now written
+        # in the background, the file structure being complete.
+        if snapshot_async:
+            start_async_output(filename)
         # Done saving the snapshot
         masterprint('done')
         # Return the filename of the saved file
@@ -235,6 +262,9 @@ class StandardSnapshot:
     @cython.pheader(# Argument
                     filename=str,
                     only_params='bint',
+                    component_names=object,  # Container of str's or None
+                    subsample='double',
+                    subregion=object,  # Container of 6 floats or None
                     # Locals
                     N='Py_ssize_t',
                     N_local='Py_ssize_t',
@@ -250,14 +280,14 @@ class StandardSnapshot:
                     i='Py_ssize_t',
                     index='Py_ssize_t',
                     mass='double',
-                    momx='double*',
-                    momy='double*',
-                    momz='double*',
+                    momx='particle_float*',
+                    momy='particle_float*',
+                    momz='particle_float*',
                     multi_index=tuple,
                     name=str,
-                    posx='double*',
-                    posy='double*',
-                    posz='double*',
+                    posx='particle_float*',
+                    posy='particle_float*',
+                    posz='particle_float*',
                     representation=str,
                     size='Py_ssize_t',
                     slab='double[:, :, ::1]',
@@ -273,7 +303,21 @@ class StandardSnapshot:
                     unit_ϱ='double',
                     units_fluidvars='double[::1]',
                     )
-    def load(self, filename, only_params=False):
+    def load(self, filename, only_params=False,
+             component_names=None, subsample=1, subregion=None):
+        """If component_names is given, only the components with these
+        names are loaded. Only a fraction subsample of the particles
+        of each particle component will be read in, with the particle
+        mass and momenta scaled up accordingly, so that the velocities
+        are retained. The subsample must lie in the interval ]0, 1].
+        If a subregion
+        (x_min, x_max, y_min, y_max, z_min, z_max) is given, only
+        particles within this region will be read in. Where
+        available, the particle domains stored in the snapshot are used
+        to avoid reading in particles far outside the subregion.
+        Fluid components are always read in fully.
+        """
+        check_subsample(subsample)
         if only_params:
             masterprint('Loading parameters of snapshot "{}" ...'.format(filename))
         else:
@@ -295,6 +339,8 @@ class StandardSnapshot:
             self.params['Ωb'     ] = hdf5_file.attrs[unicode('Ωb')]
             # Load component data
             for name, component_h5 in hdf5_file['components'].items():
+                if component_names is not None and name not in component_names:
+                    continue
                 species = component_h5.attrs['species']
                 representation = get_representation(species)
                 if representation == 'particles':
@@ -315,40 +361,55 @@ class StandardSnapshot:
                     momx_h5 = component_h5['momx']
                     momy_h5 = component_h5['momy']
                     momz_h5 = component_h5['momz']
-                    # Compute a fair distribution of
-                    # particle data to the processes.
-                    start_local, N_local = partition(N)
-                    end_local = start_local + N_local
-                    # Make sure that the particle data arrays
-                    # have the correct size.
-                    component.N_local = N_local
-                    component.resize(N_local)
-                    posx = component.posx
-                    posy = component.posy
-                    posz = component.posz
-                    momx = component.momx
-                    momy = component.momy
-                    momz = component.momz
-                    # Read particle data directly into
-                    # the particle data arrays.
-                    posx_h5.read_direct(asarray(component.posx_mv),
-                                        source_sel=np.s_[start_local:end_local],
-                                        dest_sel=np.s_[:N_local])
-                    posy_h5.read_direct(asarray(component.posy_mv),
-                                        source_sel=np.s_[start_local:end_local],
-                                        dest_sel=np.s_[:N_local])
-                    posz_h5.read_direct(asarray(component.posz_mv),
-                                        source_sel=np.s_[start_local:end_local],
-                                        dest_sel=np.s_[:N_local])
-                    momx_h5.read_direct(asarray(component.momx_mv),
-                                        source_sel=np.s_[start_local:end_local],
-                                        dest_sel=np.s_[:N_local])
-                    momy_h5.read_direct(asarray(component.momy_mv),
-                                        source_sel=np.s_[start_local:end_local],
-                                        dest_sel=np.s_[:N_local])
-                    momz_h5.read_direct(asarray(component.momz_mv),
-                                        source_sel=np.s_[start_local:end_local],
-                                        dest_sel=np.s_[:N_local])
+                    # Read in only parts of the particles if requested
+                    if subsample != 1 or subregion is not None:
+                        read_particles_partial(component, component_h5, subsample,
+                            None if subregion is None
+                                 else tuple([x/snapshot_unit_length for x in subregion]))
+                        N_local = component.N_local
+                        posx = component.posx
+                        posy = component.posy
+                        posz = component.posz
+                        momx = component.momx
+                        momy = component.momy
+                        momz = component.momz
+                    else:
+                        # Compute a fair distribution of
+                        # particle data to the processes.
+                        start_local, N_local = partition(N)
+                        end_local = start_local + N_local
+                        # Make sure that the particle data arrays
+                        # have the correct size.
+                        component.N_local = N_local
+                        component.resize(N_local)
+                        posx = component.posx
+                        posy = component.posy
+                        posz = component.posz
+                        momx = component.momx
+                        momy = component.momy
+                        momz = component.momz
+                        # Read particle data directly into
+                        # the particle data arrays. Any conversion from
+                        # the on-disk precision as well as decompression
+                        # is handled by HDF5.
+                        posx_h5.read_direct(asarray(component.posx_mv),
+                                            source_sel=np.s_[start_local:end_local],
+                                            dest_sel=np.s_[:N_local])
+                        posy_h5.read_direct(asarray(component.posy_mv),
+                                            source_sel=np.s_[start_local:end_local],
+                                            dest_sel=np.s_[:N_local])
+                        posz_h5.read_direct(asarray(component.posz_mv),
+                                            source_sel=np.s_[start_local:end_local],
+                                            dest_sel=np.s_[:N_local])
+                        momx_h5.read_direct(asarray(component.momx_mv),
+                                            source_sel=np.s_[start_local:end_local],
+                                            dest_sel=np.s_[:N_local])
+                        momy_h5.read_direct(asarray(component.momy_mv),
+                                            source_sel=np.s_[start_local:end_local],
+                                            dest_sel=np.s_[:N_local])
+                        momz_h5.read_direct(asarray(component.momz_mv),
+                                            source_sel=np.s_[start_local:end_local],
+                                            dest_sel=np.s_[:N_local])
                     # If the snapshot and the current run uses different
                     # systems of units, mulitply the component positions
                     # and momenta by the snapshot units.
@@ -462,6 +523,366 @@ class StandardSnapshot:
         self.units['length'] = unit_length
         self.units['mass']   = unit_mass
 
+# Function returning the keyword arguments to use when creating
+# datasets of the given shape and data type within standard snapshots,
+# implementing the chunked layout and compression specified by the
+# snapshot_* parameters. Chunks are filled up from the last dimension
+# and backwards, spanning whole trailing dimensions as long as these
+# fit within the chunk size. Without a snapshot_chunk_size, chunks are
+# limited to snapshot_chunk_bytes bytes, keeping e.g. the chunks of
+# large fluid grids from becoming whole planes of many megabytes.
+@cython.pheader(# Arguments
+                shape=tuple,
+                dtype=object,
+                # Locals
+                chunk_size='Py_ssize_t',
+                chunks=list,
+                dataset_options=dict,
+                dim='int',
+                itemsize='Py_ssize_t',
+                size='Py_ssize_t',
+                size_chunk='Py_ssize_t',
+                returns=dict,
+                )
+def get_dataset_options(shape, dtype):
+    # Use contiguous layout unless chunking or compression is requested.
+    # Empty datasets cannot be chunked.
+    if not snapshot_compression and snapshot_chunk_size == 0:
+        return {}
+    if 0 in shape:
+        return {}
+    chunk_size = snapshot_chunk_size
+    if chunk_size == 0:
+        itemsize = np.dtype(dtype).itemsize
+        chunk_size = pairmax(1, snapshot_chunk_bytes//itemsize)
+    chunks = [1]*len(shape)
+    for dim in range(len(shape) - 1, -1, -1):
+        size = shape[dim]
+        size_chunk = pairmin(size, chunk_size)
+        chunks[dim] = size_chunk
+        chunk_size //= size_chunk
+        if chunk_size <= 1:
+            break
+    dataset_options = {'chunks': tuple(chunks)}
+    if snapshot_compression:
+        dataset_options['compression'] = snapshot_compression
+        dataset_options['shuffle'] = snapshot_shuffle
+    return dataset_options
+# The size in bytes of automatically sized chunks
+cython.declare(snapshot_chunk_bytes='Py_ssize_t')
+snapshot_chunk_bytes = 2**21
+
+# Function for writing local data to the rows
+# [start:start + data.shape[0]] of a dataset within a standard
+# snapshot. If requested, the data is bit-rounded, keeping only
+# snapshot_mantissa_bits bits of the mantissa. The zeroed bits are
+# then efficiently compressed away. In parallel, filtered (compressed)
+# datasets can only be written collectively, and so all processes
+# must call this function, even when having no data to write.
+@cython.pheader(# Arguments
+                dataset=object,  # h5py.Dataset
+                start='Py_ssize_t',
+                data=object,  # memoryview or np.ndarray
+                # Locals
+                arr=object,  # np.ndarray
+                fspace=object,  # h5py.h5s.SpaceID
+                mspace=object,  # h5py.h5s.SpaceID
+                )
+def write_dataset(dataset, start, data):
+    arr = asarray(data)
+    if snapshot_mantissa_bits > 0:
+        arr = round_mantissa(arr.astype(dataset.dtype), snapshot_mantissa_bits)
+    if dataset.compression is None:
+        # For asynchronous output, stage a copy of the data
+        # for later writing, if possible.
+        if snapshot_async and stage_async_write(dataset, start, arr):
+            return
+        dataset[start:start + arr.shape[0]] = arr
+        return
+    with dataset.collective:
+        if arr.shape[0] > 0:
+            dataset[start:start + arr.shape[0]] = arr
+        else:
+            # Take part in the collective write using empty selections
+            fspace = dataset.id.get_space()
+            fspace.select_none()
+            mspace = h5py.h5s.create_simple((1, ))
+            mspace.select_none()
+            dataset.id.write(mspace, fspace, empty(1, dtype=dataset.dtype), dxpl=dataset._dxpl)
+
+# Function for staging the rows [start:start + arr.shape[0]] of a
+# dataset for asynchronous output. A copy of the data is placed in
+# the async_writes list together with the byte offset within the
+# file at which it should be written. This is only possible for
+# contiguous (unchunked) datasets which have already been allocated
+# in the file, as is the case for datasets created using the MPI-IO
+# driver. The return value signals whether the data was staged.
+@cython.pheader(# Arguments
+                dataset=object,  # h5py.Dataset
+                start='Py_ssize_t',
+                arr=object,  # np.ndarray
+                # Locals
+                dim='int',
+                offset=object,  # int or None
+                size_row='Py_ssize_t',
+                returns='bint',
+                )
+def stage_async_write(dataset, start, arr):
+    if dataset.chunks is not None:
+        return False
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return False
+    size_row = dataset.dtype.itemsize
+    for dim in range(1, len(dataset.shape)):
+        size_row *= dataset.shape[dim]
+    async_writes.append((offset + start*size_row, np.array(arr, dtype=dataset.dtype, order='C')))
+    return True
+# List of staged (offset, data) pairs, and the thread
+# carrying out the asynchronous output.
+cython.declare(async_writes=list, async_thread=object)
+async_writes = []
+async_thread = None
+
+# Function which starts writing the staged data to the given file
+# in a background thread. The file must have been closed by HDF5.
+# Each process writes its own data, with no communication taking
+# place in the background.
+@cython.header(# Arguments
+               filename=str,
+               )
+def start_async_output(filename):
+    global async_writes, async_thread
+    async_thread = threading.Thread(
+        target=write_async_output,
+        args=(filename, async_writes),
+        daemon=False,
+    )
+    async_writes = []
+    async_thread.start()
+
+# Function carrying out the writing of staged data,
+# to be run in a background thread.
+@cython.pheader(# Arguments
+                filename=str,
+                writes=list,
+                # Locals
+                arr=object,  # np.ndarray
+                fd='int',
+                offset='Py_ssize_t',
+                size='Py_ssize_t',
+                view=object,  # memoryview
+                )
+def write_async_output(filename, writes):
+    fd = os.open(filename, os.O_WRONLY)
+    try:
+        for offset, arr in writes:
+            view = memoryview(arr).cast('B')
+            while len(view) > 0:
+                size = os.pwrite(fd, view, offset)
+                view = view[size:]
+                offset += size
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Function which waits for any ongoing asynchronous output
+# to complete on all processes. This must be called collectively
+# before the written files are used or overwritten.
+@cython.pheader()
+def wait_for_output():
+    global async_thread
+    if async_thread is None:
+        return
+    async_thread.join()
+    async_thread = None
+    Barrier()
+
+# Function which rounds the mantissa of the passed floating-point
+# array in-place to the nearest value with only the given number of
+# mantissa bits, zeroing the remaining bits. The array is returned.
+@cython.pheader(# Arguments
+                arr=object,  # np.ndarray of np.float32 or np.float64
+                bits='int',
+                # Locals
+                arr_bits=object,  # np.ndarray
+                bits_dropped='int',
+                bits_mantissa='int',
+                dtype_bits=object,  # np.dtype
+                returns=object,  # np.ndarray
+                )
+def round_mantissa(arr, bits):
+    if arr.dtype.itemsize == 4:
+        bits_mantissa = 23
+        dtype_bits = np.uint32
+    else:
+        bits_mantissa = 52
+        dtype_bits = np.uint64
+    if bits >= bits_mantissa:
+        return arr
+    bits_dropped = bits_mantissa - bits
+    arr_bits = arr.view(dtype_bits)
+    # Adding half of the last kept bit before truncating implements
+    # rounding to nearest. A carry into the exponent correctly
+    # rounds up to the next power of two.
+    arr_bits += dtype_bits(1 << (bits_dropped - 1))
+    arr_bits &= ~dtype_bits((1 << bits_dropped) - 1)
+    return arr
+
+# Function for saving the number of particles written by each process
+# to a standard snapshot, together with the bounding box of these
+# particles. As the particles of each process are written
+# contiguously, this serves as a coarse spatial index into the
+# particle datasets. These are stored as datasets rather than as
+# attributes, as attributes are limited in size.
+@cython.pheader(# Arguments
+                component='Component',
+                component_h5=object,  # h5py.Group
+                # Locals
+                box=object,  # np.ndarray
+                boxes=object,  # np.ndarray
+                counts=object,  # np.ndarray
+                counts_h5=object,  # h5py.Dataset
+                boxes_h5=object,  # h5py.Dataset
+                N_local='Py_ssize_t',
+                )
+def save_particle_domains(component, component_h5):
+    N_local = component.N_local
+    if N_local > 0:
+        box = asarray([
+            np.min(component.posx_mv[:N_local]), np.max(component.posx_mv[:N_local]),
+            np.min(component.posy_mv[:N_local]), np.max(component.posy_mv[:N_local]),
+            np.min(component.posz_mv[:N_local]), np.max(component.posz_mv[:N_local]),
+        ], dtype=C2np['double'])
+    else:
+        # Empty boxes never intersect any region
+        box = asarray([ထ, -ထ]*3, dtype=C2np['double'])
+    counts = asarray(allgather(N_local), dtype=C2np['Py_ssize_t'])
+    boxes = asarray(allgather(box), dtype=C2np['double'])
+    # Dataset creation is collective,
+    # while the small datasets are written by the master alone.
+    counts_h5 = component_h5.create_dataset('domain_counts', (nprocs, ),
+                                            dtype=C2np['Py_ssize_t'])
+    boxes_h5 = component_h5.create_dataset('domain_boxes', (nprocs, 6),
+                                           dtype=C2np['double'])
+    if master:
+        counts_h5[...] = counts
+        boxes_h5[...] = boxes
+
+# Function for reading in only a part of the particles of a component
+# from a standard snapshot. Only every 1/subsample'th particle is read
+# in, with the particle mass and momenta scaled up correspondingly.
+# If a subregion
+# (x_min, x_max, y_min, y_max, z_min, z_max) in snapshot units is
+# given, only particles within this region are kept. When particle
+# domains are stored in the snapshot, only the contiguous particle
+# ranges whose bounding boxes intersect the subregion are read. The
+# particles to read are distributed fairly among the processes.
+@cython.pheader(# Arguments
+                component='Component',
+                component_h5=object,  # h5py.Group
+                subsample='double',
+                subregion=object,  # tuple of 6 floats or None
+                # Locals
+                N_local='Py_ssize_t',
+                N_range='Py_ssize_t',
+                N_total='Py_ssize_t',
+                box=object,  # np.ndarray
+                boxes=object,  # np.ndarray
+                count='Py_ssize_t',
+                counts=object,  # np.ndarray
+                data=dict,
+                end_local='Py_ssize_t',
+                hi='Py_ssize_t',
+                i='Py_ssize_t',
+                lo='Py_ssize_t',
+                mask=object,  # np.ndarray
+                offset='Py_ssize_t',
+                range_start='Py_ssize_t',
+                range_stop='Py_ssize_t',
+                ranges=list,
+                start_local='Py_ssize_t',
+                step='Py_ssize_t',
+                var=str,
+                )
+def read_particles_partial(component, component_h5, subsample, subregion):
+    # Only every step'th particle will be read in
+    step = int(round(1/subsample))
+    if step < 1:
+        step = 1
+    # Determine the ranges of particle indices to consider
+    ranges = []
+    if (subregion is not None
+        and 'domain_counts' in component_h5 and 'domain_boxes' in component_h5):
+        counts = component_h5['domain_counts'][...]
+        boxes = component_h5['domain_boxes'][...]
+        offset = 0
+        for i in range(counts.shape[0]):
+            count = counts[i]
+            box = boxes[i]
+            if (count > 0
+                and box[0] <= subregion[1] and box[1] >= subregion[0]
+                and box[2] <= subregion[3] and box[3] >= subregion[2]
+                and box[4] <= subregion[5] and box[5] >= subregion[4]
+            ):
+                ranges.append((offset, offset + count))
+            offset += count
+    else:
+        ranges.append((0, component.N))
+    # Distribute the considered particles fairly among the processes
+    N_total = 0
+    for range_start, range_stop in ranges:
+        N_total += range_stop - range_start
+    start_local, N_local = partition(N_total)
+    end_local = start_local + N_local
+    # Read in the local share of the particles. Particles are picked
+    # out at global indices which are multiples of step, ensuring
+    # a consistent subsample regardless of the number of processes.
+    data = {var: [] for var in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz')}
+    offset = 0
+    for range_start, range_stop in ranges:
+        N_range = range_stop - range_start
+        lo = range_start + start_local - offset
+        hi = range_start + end_local - offset
+        offset += N_range
+        if lo < range_start:
+            lo = range_start
+        if hi > range_stop:
+            hi = range_stop
+        lo = (lo + step - 1)//step*step
+        if lo >= hi:
+            continue
+        for var in data:
+            data[var].append(component_h5[var][lo:hi:step])
+    for var in data:
+        if data[var]:
+            data[var] = np.concatenate(data[var])
+        else:
+            data[var] = empty(0, dtype=C2np['particle_float'])
+    # Only keep particles within the subregion
+    if subregion is not None:
+        mask = (
+              (data['posx'] >= subregion[0]) & (data['posx'] < subregion[1])
+            & (data['posy'] >= subregion[2]) & (data['posy'] < subregion[3])
+            & (data['posz'] >= subregion[4]) & (data['posz'] < subregion[5])
+        )
+        for var in data:
+            data[var] = data[var][mask]
+    # Populate the component with the read in particles
+    N_local = data['posx'].shape[0]
+    component.N_local = N_local
+    component.resize(N_local)
+    asarray(component.posx_mv)[:N_local] = data['posx']
+    asarray(component.posy_mv)[:N_local] = data['posy']
+    asarray(component.posz_mv)[:N_local] = data['posz']
+    asarray(component.momx_mv)[:N_local] = data['momx']
+    asarray(component.momy_mv)[:N_local] = data['momy']
+    asarray(component.momz_mv)[:N_local] = data['momz']
+    # Each particle now represents step particles. The momenta are
+    # scaled along with the mass, leaving the velocities unchanged.
+    component.N = allreduce(N_local, op=MPI.SUM)
+    scale_subsampled_particles(component, step)
+
 # Class storing a Gadget2 snapshot. Besides holding methods for
 # saving/loading, it stores particle data (positions, momenta, mass)
 # and also Gadget ID's and the Gadget header.
@@ -539,17 +960,39 @@ class Gadget2Snapshot:
                     filename=str,
                     # Locals
                     N='Py_ssize_t',
+                    N_file='Py_ssize_t',
+                    N_files=list,
                     N_local='Py_ssize_t',
-                    i='int',
+                    N_write='Py_ssize_t',
                     component='Component',
+                    end_write='Py_ssize_t',
+                    f=object,  # mpi4py.MPI.File
+                    file_start='Py_ssize_t',
+                    filename_file=str,
+                    filenames=list,
+                    i='int',
+                    ID=object,  # np.ndarray
+                    index_file='Py_ssize_t',
+                    index_local='Py_ssize_t',
+                    offset_id='Py_ssize_t',
+                    offset_pos='Py_ssize_t',
+                    offset_vel='Py_ssize_t',
+                    pos=object,  # np.ndarray
+                    start_local='Py_ssize_t',
+                    start_write='Py_ssize_t',
                     unit='double',
+                    vel=object,  # np.ndarray
                     returns=str,
                     )
     def save(self, filename):
         """The snapshot data (positions and velocities) are stored in
         single precision. Only GADGET2 type 1 (halo) particles,
         corresponding to dark matter (or matter) particles,
-        are supported.
+        are supported. The particles are split over
+        snapshot_numfiles files. When this is larger than 1, the files
+        are named filename.0, filename.1, ..., as done by GADGET2.
+        All processes write their particles simultaneously
+        using collective MPI-IO.
         """
         masterprint('Saving GADGET2 snapshot "{}" ...'.format(filename))
         component = self.component
@@ -560,127 +1003,167 @@ class Gadget2Snapshot:
         N = component.N
         N_local = component.N_local
         header = self.params['header']
-        # The master process write the HEAD block
-        if master:
-            with open(filename, 'wb') as f:
-                # 8 = 4*1 + 4 = 4*sizeof(s) + sizeof(i)
-                f.write(struct.pack('I', 8))
-                f.write(struct.pack('4s', b'HEAD'))
-                # sizeof(i) + 256 + sizeof(i)
-                f.write(struct.pack('I', 4 + 256 + 4))
-                f.write(struct.pack('I', 8))
-                f.write(struct.pack('I', 256))
-                f.write(struct.pack('6I', *header['Npart']))
-                f.write(struct.pack('6d', *header['Massarr']))
-                f.write(struct.pack('d',   header['Time']))
-                f.write(struct.pack('d',   header['Redshift']))
-                f.write(struct.pack('i',   header['FlagSfr']))
-                f.write(struct.pack('i',   header['FlagFeedback']))
-                f.write(struct.pack('6i', *header['Nall']))
-                f.write(struct.pack('i',   header['FlagCooling']))
-                f.write(struct.pack('i',   header['Numfiles']))
-                f.write(struct.pack('d',   header['BoxSize']))
-                f.write(struct.pack('d',   header['Omega0']))
-                f.write(struct.pack('d',   header['OmegaLambda']))
-                f.write(struct.pack('d',   header['HubbleParam']))
-                f.write(struct.pack('i',   header['FlagAge']))
-                f.write(struct.pack('i',   header['FlagMetals']))
-                f.write(struct.pack('6i', *header['NallHW']))
-                f.write(struct.pack('i',   header['flag_entr_ics']))
-                # Padding to fill out the 256 bytes
-                f.write(struct.pack('60s', b' '*60))
-                f.write(struct.pack('I', 256))
+        # The global index of the first local particle,
+        # with particles ordered by process rank. The exclusive scan
+        # results in None on the first process.
+        start_local = exscan(N_local) or 0
+        # Distribute the particles fairly among the files
+        N_files = [N//snapshot_numfiles + (i < N%snapshot_numfiles)
+            for i in range(snapshot_numfiles)]
+        if snapshot_numfiles == 1:
+            filenames = [filename]
+        else:
+            filenames = [f'{filename}.{i}' for i in range(snapshot_numfiles)]
         masterprint(f'Writing out {component.name} ({component.N} {component.species}) ...')
-        # Write the POS block in serial, one process at a time
+        # Prepare the local particle data in the on-disk format
         unit = units.kpc/header['HubbleParam']
-        for i in range(nprocs):
-            Barrier()
-            if i == rank:
-                with open(filename, 'ab') as f:
-                    # The identifier
-                    if i == 0:
-                        # 8 = 4*1 + 4 = 4*sizeof(s) + sizeof(i)
-                        f.write(struct.pack('I', 8))
-                        f.write(struct.pack('4s', b'POS '))
-                        # sizeof(i) + 3*N*sizeof(f) + sizeof(i)
-                        f.write(struct.pack('I', 4 + 3*N*4 + 4))
-                        f.write(struct.pack('I', 8))
-                        f.write(struct.pack('I', 3*N*4))
-                    # The data
-                    (np.mod(asarray(np.vstack((component.posx_mv[:N_local],
-                                               component.posy_mv[:N_local],
-                                               component.posz_mv[:N_local])
-                                              ).T.flatten(),
-                                    dtype=C2np['float'])/unit, boxsize/unit)).tofile(f)
-                    # The closing int
-                    if i == nprocs - 1:
-                        f.write(struct.pack('I', 3*N*4))
-        # Write the VEL block in serial, one process at a time
+        pos = np.mod(
+            asarray(np.vstack((component.posx_mv[:N_local],
+                               component.posy_mv[:N_local],
+                               component.posz_mv[:N_local]),
+                              ).T.flatten(),
+                    dtype=C2np['float'])/unit,
+            boxsize/unit,
+        ).astype(C2np['float'])
         unit = units.km/units.s*component.mass*header['Time']**1.5
-        for i in range(nprocs):
-            Barrier()
-            if i == rank:
-                with open(filename, 'ab') as f:
-                    # The identifier
-                    if i == 0:
-                        # 8 = 4*1 + 4 = 4*sizeof(s) + sizeof(i)
-                        f.write(struct.pack('I', 8))
-                        f.write(struct.pack('4s', b'VEL '))
-                        # sizeof(i) + 3*N*sizeof(f) + sizeof(i)
-                        f.write(struct.pack('I', 4 + 3*N*4 + 4))
-                        f.write(struct.pack('I', 8))
-                        f.write(struct.pack('I', 3*N*4))
-                    # The data
-                    (asarray(np.vstack((component.momx_mv[:N_local],
-                                        component.momy_mv[:N_local],
-                                        component.momz_mv[:N_local])
-                                       ).T.flatten(),
-                             dtype=C2np['float'])/unit).tofile(f)
-                    # The closing int
-                    if i == nprocs - 1:
-                        f.write(struct.pack('i', 3*N*4))
-        # Write the ID block in serial, one process at a time
-        for i in range(nprocs):
-            Barrier()
-            if i == rank:
-                with open(filename, 'ab') as f:
-                    # The identifier
-                    if i == 0:
-                        # 8 = 4*1 + 4 = 4*sizeof(s) + sizeof(i)
-                        f.write(struct.pack('I', 8))
-                        f.write(struct.pack('4s', b'ID  '))
-                        # sizeof(i) + N*sizeof(I) + sizeof(i)
-                        f.write(struct.pack('I', 4 + N*4 + 4))
-                        f.write(struct.pack('I', 8))
-                        f.write(struct.pack('I', N*4))
-                    # The data
-                    asarray(self.ID, dtype=C2np['unsigned int']).tofile(f)
-                    # The closing int
-                    if i == nprocs - 1:
-                        f.write(struct.pack('I', N*4))
+        vel = (
+            asarray(np.vstack((component.momx_mv[:N_local],
+                               component.momy_mv[:N_local],
+                               component.momz_mv[:N_local]),
+                              ).T.flatten(),
+                    dtype=C2np['float'])/unit
+        ).astype(C2np['float'])
+        ID = asarray(self.ID, dtype=C2np['unsigned int'])
+        # Write each file
+        file_start = 0
+        for filename_file, N_file in zip(filenames, N_files):
+            # The byte offsets of the data within the POS, VEL and ID
+            # blocks. Each block is preceded by a 16 byte block
+            # containing its name and begins and ends with
+            # a 4 byte int containing its size.
+            offset_pos = (16 + 4 + 256 + 4) + 16 + 4
+            offset_vel = offset_pos + 3*N_file*4 + 4 + 16 + 4
+            offset_id  = offset_vel + 3*N_file*4 + 4 + 16 + 4
+            f = MPI.File.Open(comm, filename_file, MPI.MODE_WRONLY | MPI.MODE_CREATE)
+            f.Set_size(offset_id + N_file*4 + 4)
+            # The master process writes the HEAD block
+            # and all the block delimiters.
+            if master:
+                f.Write_at(0, self.pack_header(N_file, len(filenames)))
+                f.Write_at(offset_pos - 20, self.pack_block_delimiter('POS ', 3*N_file*4))
+                f.Write_at(offset_pos + 3*N_file*4,
+                    struct.pack('I', 3*N_file*4) + self.pack_block_delimiter('VEL ', 3*N_file*4))
+                f.Write_at(offset_vel + 3*N_file*4,
+                    struct.pack('I', 3*N_file*4) + self.pack_block_delimiter('ID  ', N_file*4))
+                f.Write_at(offset_id + N_file*4, struct.pack('I', N_file*4))
+            # Each process writes the part of its particles which
+            # belong to this file. Processes without any such particles
+            # still take part in the collective writes.
+            start_write = pairmax(start_local, file_start)
+            end_write = pairmin(start_local + N_local, file_start + N_file)
+            N_write = pairmax(0, end_write - start_write)
+            index_file = start_write - file_start
+            index_local = start_write - start_local
+            if N_write == 0:
+                index_file = index_local = 0
+            f.Write_at_all(offset_pos + 3*4*index_file,
+                pos[3*index_local:3*(index_local + N_write)])
+            f.Write_at_all(offset_vel + 3*4*index_file,
+                vel[3*index_local:3*(index_local + N_write)])
+            f.Write_at_all(offset_id + 4*index_file,
+                ID[index_local:index_local + N_write])
+            f.Close()
+            file_start += N_file
         # Finalize progress messages
         masterprint('done')
         masterprint('done')
         # Return the filename of the saved file
         return filename
 
+    # Method returning the bytes of the HEAD block, including its
+    # preceding name block, for a file containing N_file particles.
+    @cython.header(# Arguments
+                   N_file='Py_ssize_t',
+                   numfiles='int',
+                   # Locals
+                   header=object,  # collections.OrderedDict
+                   returns=bytes,
+                   )
+    def pack_header(self, N_file, numfiles):
+        header = self.params['header']
+        return b''.join([
+            self.pack_block_delimiter('HEAD', 256),
+            struct.pack('6I', *[0, N_file, 0, 0, 0, 0]),
+            struct.pack('6d', *header['Massarr']),
+            struct.pack('d',   header['Time']),
+            struct.pack('d',   header['Redshift']),
+            struct.pack('i',   header['FlagSfr']),
+            struct.pack('i',   header['FlagFeedback']),
+            struct.pack('6i', *header['Nall']),
+            struct.pack('i',   header['FlagCooling']),
+            struct.pack('i',   numfiles),
+            struct.pack('d',   header['BoxSize']),
+            struct.pack('d',   header['Omega0']),
+            struct.pack('d',   header['OmegaLambda']),
+            struct.pack('d',   header['HubbleParam']),
+            struct.pack('i',   header['FlagAge']),
+            struct.pack('i',   header['FlagMetals']),
+            struct.pack('6i', *header['NallHW']),
+            struct.pack('i',   header['flag_entr_ics']),
+            # Padding to fill out the 256 bytes
+            struct.pack('60s', b' '*60),
+            struct.pack('I', 256),
+        ])
+
+    # Method returning the bytes of the 16 byte block holding the name
+    # of the following block, together with the initial int of this
+    # following block, holding its size.
+    @cython.header(# Arguments
+                   blockname=str,
+                   size='Py_ssize_t',
+                   returns=bytes,
+                   )
+    def pack_block_delimiter(self, blockname, size):
+        return b''.join([
+            # 8 = 4*1 + 4 = 4*sizeof(s) + sizeof(i)
+            struct.pack('I', 8),
+            struct.pack('4s', blockname.encode('utf8')),
+            # sizeof(i) + size + sizeof(i)
+            struct.pack('I', 4 + size + 4),
+            struct.pack('I', 8),
+            struct.pack('I', size),
+        ])
+
     # Method for loading in a GADGET2 snapshot of type 2 from disk
     @cython.pheader(# Arguments
                     filename=str,
                     only_params='bint',
                     # Locals
+                    ID=object,  # np.ndarray
                     N='Py_ssize_t',
+                    N_file='Py_ssize_t',
+                    N_files=list,
                     N_local='Py_ssize_t',
+                    N_read='Py_ssize_t',
                     blockname=str,
-                    file_position='Py_ssize_t',
+                    end_read='Py_ssize_t',
+                    file_start='Py_ssize_t',
+                    filename_file=str,
+                    filenames=list,
                     header=object,  # collections.OrderedDict
+                    i='int',
+                    index_file='Py_ssize_t',
+                    index_local='Py_ssize_t',
                     mass='double',
                     name=str,
                     offset='Py_ssize_t',
+                    pos=object,  # np.ndarray
                     size='unsigned int',
                     species=str,
                     start_local='Py_ssize_t',
+                    start_read='Py_ssize_t',
                     unit='double',
+                    vel=object,  # np.ndarray
                     )
     def load(self, filename, only_params=False):
         """ It is assumed that the snapshot on the disk is a GADGET2
@@ -688,7 +1171,9 @@ class Gadget2Snapshot:
         Gadget2Snapshot instance stores the data (positions and
         velocities) in double precision. Only GADGET type 1 (halo)
         particles, corresponding to dark matter particles,
-        are supported.
+        are supported. Snapshots split over several files may be
+        loaded by passing either the name of any of these files
+        or the common base name.
         """
         if only_params:
             masterprint('Loading parameters of snapshot "{}" ...'.format(filename))
@@ -702,9 +1187,10 @@ class Gadget2Snapshot:
         # baryons are missing.
         name = 'GADGET halos'
         species = 'matter particles'
-        # Read in the snapshot
+        # Read in the header of the first file
+        filenames = get_gadget2_filenames(filename)
         offset = 0
-        with open(filename, 'rb') as f:
+        with open(filenames[0], 'rb') as f:
             # Read the HEAD block into a params['header'] dict.
             # No unit conversion will be done.
             offset = self.new_block(f, offset)
@@ -721,7 +1207,7 @@ class Gadget2Snapshot:
             header['FlagFeedback']  = self.read(f, 'i')
             header['Nall']          = self.read(f, '6i')
             header['FlagCooling']   = self.read(f, 'i')
-            header['NumFiles']      = self.read(f, 'i')
+            header['Numfiles']      = self.read(f, 'i')
             header['BoxSize']       = self.read(f, 'd')
             header['Omega0']        = self.read(f, 'd')
             header['OmegaLambda']   = self.read(f, 'd')
@@ -730,83 +1216,109 @@ class Gadget2Snapshot:
             header['FlagMetals']    = self.read(f, 'i')
             header['NallHW']        = self.read(f, '6i')
             header['flag_entr_ics'] = self.read(f, 'i')
-            # Also include some of the header fields as parameters
-            # directly in the params dict. These are the same as
-            # those included in the params dict of
-            # standard type snapshots.
-            unit = 100*units.km/(units.s*units.Mpc)
-            self.params['H0']      = header['HubbleParam']*unit
-            self.params['a']       = header['Time']
-            unit = units.kpc/header['HubbleParam']
-            self.params['boxsize'] = header['BoxSize']*unit
-            self.params['Ωm']      = header['Omega0']
-            self.params['ΩΛ']      = header['OmegaLambda']
-            # Construct a Component instance and pack it
-            # into this snapshot's list of components.
-            N = header['Npart'][1]
-            unit = 1e+10*units.m_sun/header['HubbleParam']
-            mass = header['Massarr'][1]*unit
-            self.component = Component(name, species, N, mass=mass)
-            self.components = [self.component]
-            # Done loading component attributes
-            if only_params:
-                masterprint('done')
-                return
-            masterprint('Reading in {} ({} {}) ...'.format(name, N, species))
-            # Compute a fair distribution
-            # of component data to the processes.
-            start_local, N_local = partition(N)
-            # Read in the POS block. The positions are given in kpc/h.
-            offset = self.new_block(f, offset)
-            unit = units.kpc/header['HubbleParam']
-            blockname = self.read(f, '4s').decode('utf8')  # "POS "
-            size = self.read(f, 'I')
-            offset = self.new_block(f, offset)
-            f.seek(12*start_local, 1)  # 12 = sizeof(float)*3
-            file_position = f.tell()
-            self.component.populate(asarray(np.fromfile(f, dtype=C2np['float'], count=3*N_local)
-                                            [0::3], dtype=C2np['double'])*unit,
-                                    'posx')
-            f.seek(file_position)
-            self.component.populate(asarray(np.fromfile(f, dtype=C2np['float'], count=3*N_local)
-                                            [1::3], dtype=C2np['double'])*unit,
-                                    'posy')
-            f.seek(file_position)
-            self.component.populate(asarray(np.fromfile(f, dtype=C2np['float'], count=3*N_local)
-                                            [2::3], dtype=C2np['double'])*unit,
-                                    'posz')
-            # Read in the VEL block. The velocities are peculiar
-            # velocities u=a*dx/dt divided by sqrt(a), given in km/s.
-            offset = self.new_block(f, offset)
-            unit = units.km/units.s*mass*header['Time']**1.5
-            blockname = self.read(f, '4s').decode('utf8')  # "VEL "
-            size = self.read(f, 'I')
-            offset = self.new_block(f, offset)
-            f.seek(12*start_local, 1)  # 12 = sizeof(float)*3
-            file_position = f.tell()
-            self.component.populate(asarray(np.fromfile(f, dtype=C2np['float'], count=3*N_local)
-                                            [0::3], dtype=C2np['double'])*unit,
-                                    'momx')
-            f.seek(file_position)
-            self.component.populate(asarray(np.fromfile(f, dtype=C2np['float'], count=3*N_local)
-                                            [1::3], dtype=C2np['double'])*unit,
-                                    'momy')
-            f.seek(file_position)
-            self.component.populate(asarray(np.fromfile(f, dtype=C2np['float'], count=3*N_local)
-                                            [2::3], dtype=C2np['double'])*unit,
-                                    'momz')
-            # Read in the ID block.
-            # The ID's will be distributed among all processes.
-            offset = self.new_block(f, offset)
-            blockname = self.read(f, '4s').decode('utf8')  # "ID  "
-            size = self.read(f, 'I')
-            offset = self.new_block(f, offset)
-            f.seek(4*start_local, 1)  # 4 = sizeof(unsigned int)
-            file_position = f.tell()
-            self.ID = np.fromfile(f, dtype=C2np['unsigned int'], count=N_local)
-            # Done reading in particles
+        # Also include some of the header fields as parameters
+        # directly in the params dict. These are the same as
+        # those included in the params dict of
+        # standard type snapshots.
+        unit = 100*units.km/(units.s*units.Mpc)
+        self.params['H0']      = header['HubbleParam']*unit
+        self.params['a']       = header['Time']
+        unit = units.kpc/header['HubbleParam']
+        self.params['boxsize'] = header['BoxSize']*unit
+        self.params['Ωm']      = header['Omega0']
+        self.params['ΩΛ']      = header['OmegaLambda']
+        # The number of particles within each file
+        if len(filenames) != header['Numfiles']:
+            abort(f'The GADGET2 snapshot "{filename}" should consist of {header["Numfiles"]} '
+                  f'files, but {len(filenames)} were found')
+        if header['Numfiles'] == 1:
+            N_files = [header['Npart'][1]]
+        else:
+            N_files = None
+            if master:
+                N_files = []
+                for filename_file in filenames:
+                    with open(filename_file, 'rb') as f:
+                        offset = self.new_block(f, 0)
+                        offset = self.new_block(f, offset)
+                        N_files.append(self.read(f, '6I')[1])
+            N_files = bcast(N_files)
+        # Construct a Component instance and pack it
+        # into this snapshot's list of components.
+        N = int(np.sum(N_files))
+        unit = 1e+10*units.m_sun/header['HubbleParam']
+        mass = header['Massarr'][1]*unit
+        self.component = Component(name, species, N, mass=mass)
+        self.components = [self.component]
+        # Done loading component attributes
+        if only_params:
             masterprint('done')
-            # Possible additional meta data ignored
+            return
+        masterprint('Reading in {} ({} {}) ...'.format(name, N, species))
+        # Compute a fair distribution
+        # of component data to the processes.
+        start_local, N_local = partition(N)
+        pos = empty(3*N_local, dtype=C2np['float'])
+        vel = empty(3*N_local, dtype=C2np['float'])
+        ID = empty(N_local, dtype=C2np['unsigned int'])
+        # Read in the local particles from each file
+        # in which they are stored.
+        file_start = 0
+        for filename_file, N_file in zip(filenames, N_files):
+            start_read = pairmax(start_local, file_start)
+            end_read = pairmin(start_local + N_local, file_start + N_file)
+            N_read = end_read - start_read
+            index_file = start_read - file_start
+            index_local = start_read - start_local
+            file_start += N_file
+            if N_read <= 0:
+                continue
+            offset = 0
+            with open(filename_file, 'rb') as f:
+                # Skip the HEAD block
+                offset = self.new_block(f, offset)
+                offset = self.new_block(f, offset)
+                # Read in the POS block. The positions are given
+                # in kpc/h.
+                offset = self.new_block(f, offset)
+                blockname = self.read(f, '4s').decode('utf8')  # "POS "
+                size = self.read(f, 'I')
+                offset = self.new_block(f, offset)
+                f.seek(12*index_file, 1)  # 12 = sizeof(float)*3
+                pos[3*index_local:3*(index_local + N_read)] = np.fromfile(
+                    f, dtype=C2np['float'], count=3*N_read)
+                # Read in the VEL block. The velocities are peculiar
+                # velocities u=a*dx/dt divided by sqrt(a),
+                # given in km/s.
+                offset = self.new_block(f, offset)
+                blockname = self.read(f, '4s').decode('utf8')  # "VEL "
+                size = self.read(f, 'I')
+                offset = self.new_block(f, offset)
+                f.seek(12*index_file, 1)  # 12 = sizeof(float)*3
+                vel[3*index_local:3*(index_local + N_read)] = np.fromfile(
+                    f, dtype=C2np['float'], count=3*N_read)
+                # Read in the ID block.
+                # The ID's will be distributed among all processes.
+                offset = self.new_block(f, offset)
+                blockname = self.read(f, '4s').decode('utf8')  # "ID  "
+                size = self.read(f, 'I')
+                offset = self.new_block(f, offset)
+                f.seek(4*index_file, 1)  # 4 = sizeof(unsigned int)
+                ID[index_local:index_local + N_read] = np.fromfile(
+                    f, dtype=C2np['unsigned int'], count=N_read)
+                # Possible additional meta data ignored
+        # Populate the component with the read in data
+        unit = units.kpc/header['HubbleParam']
+        self.component.populate(asarray(pos[0::3], dtype=C2np['double'])*unit, 'posx')
+        self.component.populate(asarray(pos[1::3], dtype=C2np['double'])*unit, 'posy')
+        self.component.populate(asarray(pos[2::3], dtype=C2np['double'])*unit, 'posz')
+        unit = units.km/units.s*mass*header['Time']**1.5
+        self.component.populate(asarray(vel[0::3], dtype=C2np['double'])*unit, 'momx')
+        self.component.populate(asarray(vel[1::3], dtype=C2np['double'])*unit, 'momy')
+        self.component.populate(asarray(vel[2::3], dtype=C2np['double'])*unit, 'momz')
+        self.ID = ID
+        # Done reading in particles
+        masterprint('done')
         # Done loading the snapshot
         masterprint('done')
 
@@ -884,7 +1396,7 @@ class Gadget2Snapshot:
         header['FlagFeedback']  = 0
         header['Nall']          = [0, component.N, 0, 0, 0, 0]
         header['FlagCooling']   = 0
-        header['Numfiles']      = 1
+        header['Numfiles']      = snapshot_numfiles
         unit = units.kpc/h
         header['BoxSize']       = params['boxsize']/unit
         header['Omega0']        = params['Ωm']
@@ -927,6 +1439,721 @@ class Gadget2Snapshot:
         offset += 8 + self.read(f, 'I')
         return offset
 
+# Class storing a GADGET snapshot in HDF5 format
+@cython.cclass
+class Gadgethdf5Snapshot:
+    """This class represents snapshots of the "gadgethdf5" type, meaning
+    the HDF5 snapshot format (format 3) of GADGET, as also used by
+    e.g. AREPO. As for the Gadget2Snapshot class, only GADGET type 1
+    (halo) particles are supported, and any loaded snapshot will
+    produce a component of the "matter particles" species. Similarly,
+    the params dict contains the "header" key, the item of which is the
+    attributes of the HDF5 Header group, represented as an ordered
+    dict. The components list will always contain the single component
+    only, which may also be accessed through the component attribute.
+    The GADGET IDs of the particles are held by the ID attribute.
+    The particle data are read and written in parallel
+    using HDF5 hyperslabs.
+    """
+    # The properly written name of this snapshot type
+    # (only used for printing).
+    name = 'GADGET HDF5'
+    # The filename extension for this type of snapshot
+    extension = '.hdf5'
+
+    # Static method for identifying a file to be a snapshot of this type
+    @staticmethod
+    def is_this_type(filename):
+        # Test for GADGET HDF5 format by looking up the 'NumPart_Total'
+        # attribute of the Header group.
+        try:
+            with open_hdf5(filename, mode='r') as hdf5_file:
+                hdf5_file['Header'].attrs['NumPart_Total']
+                return True
+        except:
+            ...
+        return False
+
+    # Initialization method
+    @cython.header
+    def __init__(self):
+        # The triple quoted string below serves as the type declaration
+        # for the data attributes of the Gadgethdf5Snapshot type.
+        # It will get picked up by the pyxpp script
+        # and indluded in the .pxd file.
+        """
+        public dict params
+        public list components
+        Component component
+        object ID  # np.ndarray of np.uint32 or np.uint64
+        """
+        # Dict containing all the parameters of the snapshot
+        self.params = {}
+        # List of Component instances (will only ever hold
+        # self.component, which can only be GADGET halos).
+        self.components = []
+        # The actual component data
+        self.component = None
+        # The ID of each particle (not used by the CO𝘕CEPT code).
+        # The IDs are stored as 32-bit unsigned integers, unless the
+        # number of particles requires 64 bits.
+        self.ID = None
+
+    # Method for saving a GADGET HDF5 snapshot to disk
+    @cython.pheader(# Arguments
+                    filename=str,
+                    # Locals
+                    N='Py_ssize_t',
+                    N_local='Py_ssize_t',
+                    component='Component',
+                    coordinates_h5=object,  # h5py.Dataset
+                    end_local='Py_ssize_t',
+                    header=object,  # collections.OrderedDict
+                    header_h5=object,  # h5py.Group
+                    ids_h5=object,  # h5py.Dataset
+                    key=str,
+                    parttype_h5=object,  # h5py.Group
+                    start_local='Py_ssize_t',
+                    unit='double',
+                    velocities_h5=object,  # h5py.Dataset
+                    returns=str,
+                    )
+    def save(self, filename):
+        """The snapshot data (positions and velocities) are stored in
+        single precision. Only GADGET type 1 (halo) particles,
+        corresponding to dark matter (or matter) particles,
+        are supported.
+        """
+        # Attach missing extension to filename
+        if not filename.endswith('.hdf5'):
+            filename += '.hdf5'
+        masterprint(f'Saving GADGET HDF5 snapshot "{filename}" ...')
+        component = self.component
+        if master and component.species not in ('dark matter particles', 'matter particles'):
+            abort('The GAGDET HDF5 snapshot type can only store dark matter or matter particles '
+                  '(the species of the {} component is "{}")'
+                  .format(component.name, component.species))
+        N = component.N
+        N_local = component.N_local
+        header = self.params['header']
+        # The global index range of the local particles,
+        # with particles ordered by process rank. The exclusive scan
+        # results in None on the first process.
+        start_local = exscan(N_local) or 0
+        end_local = start_local + N_local
+        with open_hdf5(filename, mode='w', driver='mpio', comm=comm) as hdf5_file:
+            # Save the header
+            header_h5 = hdf5_file.create_group('Header')
+            for key, val in header.items():
+                header_h5.attrs[key] = val
+            masterprint(f'Writing out {component.name} ({component.N} {component.species}) ...')
+            # Create the particle datasets
+            parttype_h5 = hdf5_file.create_group('PartType1')
+            coordinates_h5 = parttype_h5.create_dataset('Coordinates', (N, 3),
+                                                        dtype=C2np['float'])
+            velocities_h5 = parttype_h5.create_dataset('Velocities', (N, 3),
+                                                       dtype=C2np['float'])
+            ids_h5 = parttype_h5.create_dataset('ParticleIDs', (N, ),
+                                                dtype=self.ID.dtype)
+            # Write the positions in units of kpc/h,
+            # each process writing its own hyperslab.
+            unit = units.kpc/header['HubbleParam']
+            coordinates_h5[start_local:end_local, :] = np.mod(
+                np.vstack((component.posx_mv[:N_local],
+                           component.posy_mv[:N_local],
+                           component.posz_mv[:N_local]),
+                          ).T/unit,
+                header['BoxSize'],
+            )
+            # Write the velocities. These are peculiar velocities
+            # u=a*dx/dt divided by sqrt(a), given in km/s.
+            unit = units.km/units.s*component.mass*header['Time']**1.5
+            velocities_h5[start_local:end_local, :] = (
+                np.vstack((component.momx_mv[:N_local],
+                           component.momy_mv[:N_local],
+                           component.momz_mv[:N_local]),
+                          ).T/unit
+            )
+            # Write the IDs
+            ids_h5[start_local:end_local] = self.ID
+        # Finalize progress messages
+        masterprint('done')
+        masterprint('done')
+        # Return the filename of the saved file
+        return filename
+
+    # Method for loading in a GADGET HDF5 snapshot from disk
+    @cython.pheader(# Arguments
+                    filename=str,
+                    only_params='bint',
+                    # Locals
+                    N='Py_ssize_t',
+                    N_local='Py_ssize_t',
+                    data=object,  # np.ndarray
+                    end_local='Py_ssize_t',
+                    header=object,  # collections.OrderedDict
+                    mass='double',
+                    name=str,
+                    parttype_h5=object,  # h5py.Group
+                    species=str,
+                    start_local='Py_ssize_t',
+                    unit='double',
+                    )
+    def load(self, filename, only_params=False):
+        """The Gadgethdf5Snapshot instance stores the data (positions
+        and velocities) in double precision, regardless of the precision
+        used within the snapshot on disk. Only GADGET type 1 (halo)
+        particles, corresponding to dark matter particles,
+        are supported.
+        """
+        if only_params:
+            masterprint('Loading parameters of snapshot "{}" ...'.format(filename))
+        else:
+            masterprint('Loading snapshot "{}" ...'.format(filename))
+        # Only type 1 (halo) particles are supported. As for GADGET2
+        # snapshots, we make the species of the particles
+        # 'matter particles'.
+        name = 'GADGET halos'
+        species = 'matter particles'
+        with open_hdf5(filename, mode='r', driver='mpio', comm=comm) as hdf5_file:
+            # Read the Header group into a params['header'] dict.
+            # No unit conversion will be done.
+            self.params['header'] = collections.OrderedDict(hdf5_file['Header'].attrs.items())
+            header = self.params['header']
+            if header['NumFilesPerSnapshot'] != 1:
+                abort(f'The GADGET HDF5 snapshot "{filename}" is split over '
+                      f'{header["NumFilesPerSnapshot"]} files, which is not supported')
+            # Also include some of the header fields as parameters
+            # directly in the params dict. These are the same as
+            # those included in the params dict of
+            # GADGET2 type snapshots.
+            unit = 100*units.km/(units.s*units.Mpc)
+            self.params['H0']      = float(header['HubbleParam'])*unit
+            self.params['a']       = float(header['Time'])
+            unit = units.kpc/header['HubbleParam']
+            self.params['boxsize'] = float(header['BoxSize'])*unit
+            self.params['Ωm']      = float(header['Omega0'])
+            self.params['ΩΛ']      = float(header['OmegaLambda'])
+            # Construct a Component instance and pack it
+            # into this snapshot's list of components.
+            # Particles with individual masses have a zero entry
+            # in the mass table, with the masses stored in the
+            # Masses dataset. As CO𝘕CEPT requires all particles
+            # of a component to share the same mass, the first
+            # of these is used.
+            N = int(header['NumPart_Total'][1]) + (
+                int(header.get('NumPart_Total_HighWord', zeros(6, dtype=C2np['int']))[1]) << 32)
+            parttype_h5 = hdf5_file['PartType1']
+            mass = float(header['MassTable'][1])
+            if mass == 0 and 'Masses' in parttype_h5 and N > 0:
+                mass = float(parttype_h5['Masses'][0])
+            unit = 1e+10*units.m_sun/header['HubbleParam']
+            mass *= unit
+            self.component = Component(name, species, N, mass=mass)
+            self.components = [self.component]
+            # Done loading component attributes
+            if only_params:
+                masterprint('done')
+                return
+            masterprint('Reading in {} ({} {}) ...'.format(name, N, species))
+            # Compute a fair distribution
+            # of component data to the processes.
+            start_local, N_local = partition(N)
+            end_local = start_local + N_local
+            # Read in the positions, given in kpc/h,
+            # each process reading its own hyperslab.
+            unit = units.kpc/header['HubbleParam']
+            data = parttype_h5['Coordinates'][start_local:end_local, :]
+            self.component.populate(asarray(data[:, 0], dtype=C2np['double'])*unit, 'posx')
+            self.component.populate(asarray(data[:, 1], dtype=C2np['double'])*unit, 'posy')
+            self.component.populate(asarray(data[:, 2], dtype=C2np['double'])*unit, 'posz')
+            # Read in the velocities. These are peculiar
+            # velocities u=a*dx/dt divided by sqrt(a), given in km/s.
+            unit = units.km/units.s*mass*header['Time']**1.5
+            data = parttype_h5['Velocities'][start_local:end_local, :]
+            self.component.populate(asarray(data[:, 0], dtype=C2np['double'])*unit, 'momx')
+            self.component.populate(asarray(data[:, 1], dtype=C2np['double'])*unit, 'momy')
+            self.component.populate(asarray(data[:, 2], dtype=C2np['double'])*unit, 'momz')
+            # Read in the IDs, keeping the data type used on disk
+            self.ID = parttype_h5['ParticleIDs'][start_local:end_local]
+            # Done reading in particles
+            masterprint('done')
+            # Possible additional particle data ignored
+        # Done loading the snapshot
+        masterprint('done')
+
+    # This method populate the snapshot with component data
+    # as well as ID's (which are not used by this code) and
+    # additional header information.
+    @cython.pheader(# Arguments
+                    components=list,
+                    params=dict,
+                    # Locals
+                    component='Component',
+                    start_local='Py_ssize_t',
+                    ΩΛ='double',
+                    )
+    def populate(self, components, params=None):
+        """The following header fields depend on the particles:
+            NumPart_ThisFile, NumPart_Total, NumPart_Total_HighWord,
+            MassTable.
+        The following header fields depend on the current time:
+            Time, Redshift.
+        The following header fields correspond to the parameters
+        used in the current run:
+            BoxSize, Omega0, OmegaLambda, HubbleParam.
+        All other fields get generic values.
+        """
+        if params is None:
+            params = {}
+        # Pupulate snapshot with the GADGTE halos
+        component = components[0]
+        self.component = component
+        self.components = [component]
+        # The ID's of the local particles, generated such that
+        # the process with the lowest rank has the lowest ID's.
+        # 64-bit IDs are used only when the number of particles
+        # does not fit within 32 bits.
+        start_local = exscan(component.N_local) or 0
+        self.ID = arange(
+            start_local, start_local + component.N_local,
+            dtype=(np.uint32 if component.N < 2**32 else np.uint64),
+        )
+        # Populate snapshot with the passed scalefactor
+        # and global parameters. If a params dict is passed,
+        # use values from this instead.
+        self.params['H0']      = params.get('H0',      H0)
+        if enable_Hubble:
+            self.params['a']   = params.get('a',       universals.a)
+        else:
+            self.params['a']   = universals.a
+        self.params['boxsize'] = params.get('boxsize', boxsize)
+        self.params['Ωm']      = params.get('Ωm',      Ωm)
+        ΩΛ = 1 - self.params['Ωm']  # Flat universe with only matter and cosmological constant
+        self.params['ΩΛ']      = params.get('ΩΛ',      ΩΛ)
+        # Build the GADGET header
+        self.update_header()
+
+    # Method for constructing the GADGET header from the other
+    # parameters in the params dict.
+    @cython.header(# Locals
+                   N_hw='unsigned int',
+                   N_lw='unsigned int',
+                   component='Component',
+                   h='double',
+                   header=object,  # collections.OrderedDict
+                   params=dict,
+                   unit='double',
+                   )
+    def update_header(self):
+        # Extract variabled
+        component = self.component
+        params = self.params
+        # The GADGET header is constructed from scratch.
+        # The total particle number is split into its lower
+        # and higher 32 bits.
+        params['header'] = collections.OrderedDict()
+        header = params['header']
+        N_lw = component.N % 2**32
+        N_hw = component.N//2**32
+        # Fill the header
+        header['NumPart_ThisFile'] = asarray([0, N_lw, 0, 0, 0, 0], dtype=C2np['unsigned int'])
+        header['NumPart_Total'] = asarray([0, N_lw, 0, 0, 0, 0], dtype=C2np['unsigned int'])
+        header['NumPart_Total_HighWord'] = asarray([0, N_hw, 0, 0, 0, 0],
+                                                   dtype=C2np['unsigned int'])
+        unit = 100*units.km/(units.s*units.Mpc)
+        h = params['H0']/unit
+        unit = 1e+10*units.m_sun/h
+        header['MassTable'] = asarray([0, component.mass/unit, 0, 0, 0, 0], dtype=C2np['double'])
+        header['Time']                  = params['a']
+        header['Redshift']              = 1/params['a'] - 1
+        header['NumFilesPerSnapshot']   = 1
+        unit = units.kpc/h
+        header['BoxSize']               = params['boxsize']/unit
+        header['Omega0']                = params['Ωm']
+        header['OmegaLambda']           = params['ΩΛ']
+        header['HubbleParam']           = h
+        header['Flag_Sfr']              = 0
+        header['Flag_Cooling']          = 0
+        header['Flag_StellarAge']       = 0
+        header['Flag_Metals']           = 0
+        header['Flag_Feedback']         = 0
+        header['Flag_DoublePrecision']  = 0
+
+# Class storing a checkpoint, consisting of one raw binary file
+# per process. Besides holding methods for saving/loading,
+# it stores component data.
+@cython.cclass
+class CheckpointSnapshot:
+    """This class represents checkpoints, used for fast autosaving.
+    Each process writes its local particle and fluid data as raw
+    binary to its own file, with no communication or reorganization
+    of the data. The file of process r is named filename.r. Each file
+    begins with a magic string and ends with a pickled dict of meta
+    data (followed by its size as 8 bytes), specifying the components,
+    the byte offsets of their data, the domain decomposition
+    and the global parameters.
+    When loaded using the same number of processes as was used for
+    saving, each process reads back in its own file directly, also
+    restoring the (possibly rebalanced) domain decomposition.
+    Otherwise, the particles of the files are distributed among the
+    processes and later exchanged, while each process reads the parts
+    of the fluid grids overlapping with its domain from all files.
+    Checkpoints are meant for restarting the same simulation and so
+    must be loaded using the same unit system.
+    """
+    # The properly written name of this snapshot type
+    # (only used for printing).
+    name = 'checkpoint'
+    # The filename extension for this type of snapshot
+    extension = ''
+    # The magic string beginning each checkpoint file
+    magic = b'CONCEPT CHECKPNT'
+
+    # Static method for identifying a file to be a snapshot of this type
+    @staticmethod
+    def is_this_type(filename):
+        # Test for checkpoint format by checking the magic string
+        try:
+            with open(filename, 'rb') as f:
+                if f.read(len(CheckpointSnapshot.magic)) == CheckpointSnapshot.magic:
+                    return True
+        except:
+            ...
+        return False
+
+    # Initialization method
+    @cython.header
+    def __init__(self):
+        # The triple quoted string below serves as the type declaration
+        # for the data attributes of the CheckpointSnapshot type.
+        # It will get picked up by the pyxpp script
+        # and indluded in the .pxd file.
+        """
+        public dict params
+        public list components
+        public dict units
+        """
+        # Dict containing all the parameters of the snapshot
+        self.params = {}
+        # List of components
+        self.components = []
+        # Dict containing the base units in str format
+        self.units = {}
+
+    # Method that saves the local data to the checkpoint file
+    # of this process.
+    @cython.pheader(# Argument
+                    filename=str,
+                    # Locals
+                    arr=object,  # np.ndarray
+                    arrays=list,
+                    component='Component',
+                    component_info=dict,
+                    fluidscalar='FluidScalar',
+                    fluidvar=object,  # Tensor
+                    metadata=dict,
+                    metadata_bytes=bytes,
+                    offset='Py_ssize_t',
+                    shape=tuple,
+                    returns=str,
+                    )
+    def save(self, filename):
+        masterprint(f'Saving checkpoint "{filename}" ...')
+        metadata = {
+            'nprocs'             : nprocs,
+            'rank'               : rank,
+            'params'             : self.params,
+            'units'              : self.units,
+            'domain_subdivisions': list(domain_subdivisions),
+            'domain_bounds'      : [
+                asarray(domain_bounds_x).copy(),
+                asarray(domain_bounds_y).copy(),
+                asarray(domain_bounds_z).copy(),
+            ],
+            'domains_uniform'    : bool(domains_uniform[0]),
+            'components'         : [],
+        }
+        with open(f'{filename}.{rank}', 'wb') as f:
+            f.write(self.magic)
+            offset = len(self.magic)
+            for component in self.components:
+                component_info = {
+                    'name'          : component.name,
+                    'species'       : component.species,
+                    'representation': component.representation,
+                    'arrays'        : [],
+                }
+                if component.representation == 'particles':
+                    component_info['N'] = component.N
+                    component_info['N_local'] = component.N_local
+                    component_info['mass'] = component.mass
+                    arrays = [
+                        asarray(component.posx_mv[:component.N_local]),
+                        asarray(component.posy_mv[:component.N_local]),
+                        asarray(component.posz_mv[:component.N_local]),
+                        asarray(component.momx_mv[:component.N_local]),
+                        asarray(component.momy_mv[:component.N_local]),
+                        asarray(component.momz_mv[:component.N_local]),
+                    ]
+                elif component.representation == 'fluid':
+                    # Store the fluid grids without
+                    # pseudo and ghost points.
+                    component_info['gridsize'] = component.gridsize
+                    component_info['boltzmann_order'] = component.boltzmann_order
+                    shape = tuple([s - 1 for s in component.fluidvars[0][0].shape_noghosts])
+                    component_info['start'] = [
+                        domain_layout_local_indices[0]*shape[0],
+                        domain_layout_local_indices[1]*shape[1],
+                        domain_layout_local_indices[2]*shape[2],
+                    ]
+                    arrays = []
+                    for fluidvar in component.fluidvars[:component.boltzmann_order]:
+                        for fluidscalar in fluidvar:
+                            arrays.append(asarray(fluidscalar.grid_noghosts[
+                                :shape[0], :shape[1], :shape[2]]))
+                elif master:
+                    abort('Does not know how to save component "{}" with representation "{}"'
+                          .format(component.name, component.representation))
+                # Write out the raw data
+                for arr in arrays:
+                    arr = np.ascontiguousarray(arr)
+                    component_info['arrays'].append((offset, arr.dtype.str, arr.shape))
+                    f.write(memoryview(arr).cast('B'))
+                    offset += arr.nbytes
+                metadata['components'].append(component_info)
+            # Write out the meta data, followed by its size
+            metadata_bytes = pickle.dumps(metadata)
+            f.write(metadata_bytes)
+            f.write(struct.pack('Q', len(metadata_bytes)))
+        Barrier()
+        masterprint('done')
+        return filename
+
+    # Method for loading in a checkpoint from disk
+    @cython.pheader(# Arguments
+                    filename=str,
+                    only_params='bint',
+                    # Locals
+                    N_local='Py_ssize_t',
+                    arr=object,  # np.ndarray
+                    arrays=list,
+                    component='Component',
+                    component_info=dict,
+                    components_info=list,
+                    dim='int',
+                    filename_rank=str,
+                    fluid_info=dict,
+                    fluidscalar='FluidScalar',
+                    fluidvar=object,  # Tensor
+                    index='Py_ssize_t',
+                    metadata=dict,
+                    metadata_rank=dict,
+                    metadatas=list,
+                    nprocs_checkpoint='int',
+                    overlap_dst=tuple,
+                    overlap_src=tuple,
+                    overlap_start='Py_ssize_t',
+                    overlap_stop='Py_ssize_t',
+                    rank_checkpoint='int',
+                    ranks_checkpoint=list,
+                    shape=tuple,
+                    shape_checkpoint=tuple,
+                    start=list,
+                    start_local=list,
+                    stop_local=list,
+                    )
+    def load(self, filename, only_params=False):
+        if only_params:
+            masterprint(f'Loading parameters of checkpoint "{filename}" ...')
+        else:
+            masterprint(f'Loading checkpoint "{filename}" ...')
+        # Strip off any process number from the filename
+        filename = get_checkpoint_basename(filename)
+        # Read in the meta data of the first file
+        metadata = read_checkpoint_metadata(f'{filename}.0')
+        self.params = metadata['params']
+        self.units = metadata['units']
+        if master and self.units != {'time': unit_time,
+                                     'length': unit_length,
+                                     'mass': unit_mass}:
+            abort(f'The checkpoint "{filename}" uses the units {self.units}, '
+                  f'different from those of the current run')
+        nprocs_checkpoint = metadata['nprocs']
+        components_info = metadata['components']
+        # Determine which of the checkpoint files to read particles
+        # from. With matching numbers of processes, each process
+        # reads its own file. Otherwise, the files are handed out
+        # to the processes in a round-robin fashion.
+        if nprocs_checkpoint == nprocs:
+            ranks_checkpoint = [rank]
+        else:
+            ranks_checkpoint = list(range(rank, nprocs_checkpoint, nprocs))
+        if not only_params:
+            metadatas = [read_checkpoint_metadata(f'{filename}.{rank_checkpoint}')
+                for rank_checkpoint in ranks_checkpoint]
+        # Restore the domain decomposition
+        # when this is possible.
+        if not only_params and nprocs_checkpoint == nprocs:
+            domain_bounds_x[:] = metadata['domain_bounds'][0]
+            domain_bounds_y[...] = metadata['domain_bounds'][1]
+            domain_bounds_z[...] = metadata['domain_bounds'][2]
+            domains_uniform[0] = metadata['domains_uniform']
+        # Load all components
+        for index, component_info in enumerate(components_info):
+            if component_info['representation'] == 'particles':
+                component = Component(component_info['name'], component_info['species'],
+                    component_info['N'], mass=component_info['mass'])
+                self.components.append(component)
+                if only_params:
+                    continue
+                masterprint(
+                    f'Reading in {component.name} ({component.N} {component.species}) ...'
+                )
+                # Read in the particles of each checkpoint file
+                # assigned to this process.
+                arrays = [[] for dim in range(6)]
+                for rank_checkpoint, metadata_rank in zip(ranks_checkpoint, metadatas):
+                    for dim, (offset, dtype, shape) in enumerate(
+                        metadata_rank['components'][index]['arrays']
+                    ):
+                        arrays[dim].append(np.fromfile(f'{filename}.{rank_checkpoint}',
+                            dtype=dtype, count=np.prod(shape), offset=offset))
+                arrays = [np.concatenate(arrs) if arrs else empty(0, dtype=C2np['double'])
+                    for arrs in arrays]
+                N_local = arrays[0].shape[0]
+                component.N_local = N_local
+                component.resize(N_local)
+                component.posx_mv[:N_local] = arrays[0]
+                component.posy_mv[:N_local] = arrays[1]
+                component.posz_mv[:N_local] = arrays[2]
+                component.momx_mv[:N_local] = arrays[3]
+                component.momy_mv[:N_local] = arrays[4]
+                component.momz_mv[:N_local] = arrays[5]
+                masterprint('done')
+            elif component_info['representation'] == 'fluid':
+                component = Component(component_info['name'], component_info['species'],
+                    component_info['gridsize'],
+                    boltzmann_order=component_info['boltzmann_order'])
+                self.components.append(component)
+                if only_params:
+                    continue
+                masterprint(
+                    f'Reading in {component.name} ({component.species} with gridsize '
+                    f'{component.gridsize}, Boltzmann order {component.boltzmann_order}) ...'
+                )
+                # Compute local indices of fluid grids
+                shape = tuple([component.gridsize//domain_subdivisions[dim] for dim in range(3)])
+                if master and any([shape[dim]*domain_subdivisions[dim] != component.gridsize
+                    for dim in range(3)]):
+                    abort(f'The gridsize of the {component.name} component is '
+                          f'{component.gridsize} which cannot be equally shared '
+                          f'among {nprocs} processes')
+                component.resize(shape)
+                start_local = [domain_layout_local_indices[dim]*shape[dim] for dim in range(3)]
+                stop_local = [start_local[dim] + shape[dim] for dim in range(3)]
+                # Read in the part of each checkpoint file
+                # overlapping with the local domain.
+                for rank_checkpoint in range(nprocs_checkpoint):
+                    if nprocs_checkpoint == nprocs and rank_checkpoint != rank:
+                        continue
+                    filename_rank = f'{filename}.{rank_checkpoint}'
+                    if rank_checkpoint == 0:
+                        fluid_info = components_info[index]
+                    else:
+                        fluid_info = read_checkpoint_metadata(filename_rank)['components'][index]
+                    start = fluid_info['start']
+                    shape_checkpoint = fluid_info['arrays'][0][2]
+                    # Find the overlapping region, in global grid
+                    # indices [overlap_start, overlap_stop).
+                    overlap_src = ()
+                    overlap_dst = ()
+                    for dim in range(3):
+                        overlap_start = start_local[dim]
+                        if start[dim] > overlap_start:
+                            overlap_start = start[dim]
+                        overlap_stop = stop_local[dim]
+                        if start[dim] + shape_checkpoint[dim] < overlap_stop:
+                            overlap_stop = start[dim] + shape_checkpoint[dim]
+                        if overlap_start >= overlap_stop:
+                            break
+                        overlap_src += (slice(overlap_start - start[dim],
+                                              overlap_stop - start[dim]), )
+                        overlap_dst += (slice(overlap_start - start_local[dim],
+                                              overlap_stop - start_local[dim]), )
+                    if len(overlap_src) < 3:
+                        continue
+                    arrays = [np.memmap(filename_rank, dtype=dtype, mode='r',
+                        offset=offset, shape=shape)
+                        for offset, dtype, shape in fluid_info['arrays']]
+                    for fluidvar in component.fluidvars[:component.boltzmann_order]:
+                        for fluidscalar in fluidvar:
+                            arr = arrays.pop(0)
+                            asarray(fluidscalar.grid_noghosts)[overlap_dst] = arr[overlap_src]
+                masterprint('done')
+            elif master:
+                abort('Does not know how to load component "{}" with representation "{}"'
+                      .format(component_info['name'], component_info['representation']))
+        # Done loading the checkpoint
+        masterprint('done')
+
+    # This method populate the snapshot with component data
+    # and additional parameters.
+    @cython.pheader(# Arguments
+                    components=list,
+                    params=dict,
+                    )
+    def populate(self, components, params=None):
+        if params is None:
+            params = {}
+        # Pupulate snapshot with the components
+        self.components = components
+        # Populate snapshot with the passed scalefactor
+        # and global parameters. If a params dict is passed,
+        # use values from this instead.
+        self.params['H0']      = params.get('H0',      H0)
+        if enable_Hubble:
+            self.params['a']   = params.get('a',       universals.a)
+        else:
+            self.params['a']   = universals.a
+        self.params['boxsize'] = params.get('boxsize', boxsize)
+        self.params['Ωcdm']    = params.get('Ωcdm'   , Ωcdm)
+        self.params['Ωb']      = params.get('Ωb'     , Ωb)
+        # Populate the base units with the global base units
+        self.units['time']   = unit_time
+        self.units['length'] = unit_length
+        self.units['mass']   = unit_mass
+
+# Function for reading in the meta data at the end
+# of a checkpoint file.
+@cython.pheader(# Arguments
+                filename=str,
+                # Locals
+                size='Py_ssize_t',
+                returns=dict,
+                )
+def read_checkpoint_metadata(filename):
+    with open(filename, 'rb') as f:
+        f.seek(-8, os.SEEK_END)
+        size = struct.unpack('Q', f.read(8))[0]
+        f.seek(-8 - size, os.SEEK_END)
+        return pickle.loads(f.read(size))
+
+# Function returning the base name of a checkpoint,
+# given either the base name itself or the name
+# of any of its files.
+@cython.pheader(# Arguments
+                filename=str,
+                # Locals
+                match=object,  # re.Match
+                returns=str,
+                )
+def get_checkpoint_basename(filename):
+    match = re.fullmatch(r'(.*)\.\d+', filename)
+    if match and not os.path.isfile(f'{filename}.0'):
+        return match.group(1)
+    return filename
+
 # Function that saves the current state of the simulation
 # - consisting of global parameters as well as the list of components -
 # to a snapshot file. Note that since we want this function to be
@@ -958,6 +2185,8 @@ def save(one_or_more_components, filename, params=None, snapshot_type=snapshot_t
     """
     if params is None:
         params = {}
+    # Wait for any previous asynchronous output to finish
+    wait_for_output()
     # Filter out the components which should be saved
     if isinstance(one_or_more_components, Component):
         components = [one_or_more_components]
@@ -991,6 +2220,9 @@ def save(one_or_more_components, filename, params=None, snapshot_type=snapshot_t
                 only_components='bint',
                 do_exchange='bint',
                 as_if=str,
+                component_names=object,  # Container of str's or None
+                subsample='double',
+                subregion=object,  # Container of 6 floats or None
                 # Locals
                 component='Component',
                 i='Py_ssize_t',
@@ -1003,7 +2235,10 @@ def load(filename, compare_params=True,
                    only_params=False,
                    only_components=False,
                    do_exchange=True,
-                   as_if=''):
+                   as_if='',
+                   component_names=None,
+                   subsample=1,
+                   subregion=None):
     """When only_params is False and only_components is False,
     the return type is simply a snapshot object containing all the
     data in the snapshot on disk.
@@ -1013,10 +2248,20 @@ def load(filename, compare_params=True,
     containing both parameters (.params) and components (.components),
     just as when only_params is False. These components will have
     correctly specified attributes, but no actual component data.
+    The component_names, subsample and subregion arguments may be used
+    to load only some of the components, only a fraction of the
+    particles and only the particles within a region
+    (x_min, x_max, y_min, y_max, z_min, z_max), respectively.
+    For standard snapshots, this reduces the amount of data read.
+    For other snapshot types, the reduction happens after the
+    entire snapshot has been read in.
     """
     # If no snapshot should be loaded, return immediately
     if not filename:
         return
+    check_subsample(subsample)
+    # Make sure that the snapshot is not still being written
+    wait_for_output()
     # Determine snapshot type
     input_type = get_snapshot_type(filename)
     if master and input_type is None:
@@ -1026,7 +2271,20 @@ def load(filename, compare_params=True,
     # Instantiate snapshot of the appropriate type
     snapshot = eval(input_type.capitalize() + 'Snapshot()')
     # Load the snapshot from disk
-    snapshot.load(filename, only_params=only_params)
+    if input_type == 'standard':
+        snapshot.load(filename, only_params=only_params, component_names=component_names,
+            subsample=subsample, subregion=subregion)
+    else:
+        snapshot.load(filename, only_params=only_params)
+        if component_names is not None:
+            snapshot.components = [
+                component for component in snapshot.components
+                if component.name in component_names
+            ]
+        if not only_params and (subsample != 1 or subregion is not None):
+            for component in snapshot.components:
+                if component.representation == 'particles':
+                    select_particles(component, subsample, subregion)
     # Check if the parameters of the snapshot matches those of the
     # current simulation run. Display a warning if they do not.
     if compare_params:
@@ -1047,8 +2305,7 @@ def load(filename, compare_params=True,
             exchange(component, reset_buffers=(i == len(snapshot.components) - 1))
         # Communicate the pseudo and ghost points
         # of all fluid variables in fluid components.
-        for component in snapshot.components:
-            component.communicate_fluid_grids(mode='populate')
+        communicate_components_fluid_grids(snapshot.components, mode='populate')
     # If the caller is interested in the components only,
     # return the list of components.
     if only_components:
@@ -1062,6 +2319,87 @@ def load(filename, compare_params=True,
     # Return the loaded snapshot
     return snapshot
 
+# Function for reducing the particles of an already loaded component
+# to every 1/subsample'th particle (counted globally), and to the
+# particles within the given subregion. The particle mass and momenta
+# are scaled up according to the subsampling.
+@cython.pheader(# Arguments
+                component='Component',
+                subsample='double',
+                subregion=object,  # Container of 6 floats or None
+                # Locals
+                N_local='Py_ssize_t',
+                indices=object,  # np.ndarray
+                mask=object,  # np.ndarray
+                posx=object,  # np.ndarray
+                posy=object,  # np.ndarray
+                posz=object,  # np.ndarray
+                start_local='Py_ssize_t',
+                step='Py_ssize_t',
+                )
+def select_particles(component, subsample, subregion):
+    step = int(round(1/subsample))
+    if step < 1:
+        step = 1
+    N_local = component.N_local
+    start_local = exscan(N_local) or 0
+    indices = start_local + arange(N_local)
+    mask = (indices % step == 0)
+    if subregion is not None:
+        posx = asarray(component.posx_mv[:N_local])
+        posy = asarray(component.posy_mv[:N_local])
+        posz = asarray(component.posz_mv[:N_local])
+        mask &= (
+              (posx >= subregion[0]) & (posx < subregion[1])
+            & (posy >= subregion[2]) & (posy < subregion[3])
+            & (posz >= subregion[4]) & (posz < subregion[5])
+        )
+    N_local = int(np.sum(mask))
+    asarray(component.posx_mv)[:N_local] = asarray(component.posx_mv)[:component.N_local][mask]
+    asarray(component.posy_mv)[:N_local] = asarray(component.posy_mv)[:component.N_local][mask]
+    asarray(component.posz_mv)[:N_local] = asarray(component.posz_mv)[:component.N_local][mask]
+    asarray(component.momx_mv)[:N_local] = asarray(component.momx_mv)[:component.N_local][mask]
+    asarray(component.momy_mv)[:N_local] = asarray(component.momy_mv)[:component.N_local][mask]
+    asarray(component.momz_mv)[:N_local] = asarray(component.momz_mv)[:component.N_local][mask]
+    component.N_local = N_local
+    component.resize(N_local)
+    component.N = allreduce(N_local, op=MPI.SUM)
+    scale_subsampled_particles(component, step)
+
+# Function which scales up the mass and momenta of the particles of a
+# component which have been subsampled to every step'th particle, so
+# that each particle represents step particles with unchanged velocity.
+@cython.header(# Arguments
+               component='Component',
+               step='Py_ssize_t',
+               # Locals
+               i='Py_ssize_t',
+               momx='particle_float*',
+               momy='particle_float*',
+               momz='particle_float*',
+               )
+def scale_subsampled_particles(component, step):
+    if step == 1:
+        return
+    component.mass *= step
+    momx = component.momx
+    momy = component.momy
+    momz = component.momz
+    for i in range(component.N_local):
+        momx[i] *= step
+        momy[i] *= step
+        momz[i] *= step
+
+# Function which checks that the given subsample fraction
+# lies in the interval ]0, 1].
+@cython.header(# Arguments
+               subsample='double',
+               )
+def check_subsample(subsample):
+    if master and not (0 < subsample <= 1):
+        abort(f'A subsample of {subsample} was requested, '
+              f'but the subsample must lie in the interval ]0, 1]')
+
 # Function for determining the snapshot type of a file
 @cython.header(filename=str, returns=str)
 def get_snapshot_type(filename):
@@ -1080,13 +2418,51 @@ def get_snapshot_type(filename):
     # does the check.
     if master:
         if not os.path.isfile(filename):
-            abort(f'The snapshot file "{filename}" does not exist')
+            # The filename may be the base name of
+            # a snapshot split over several files.
+            if os.path.isfile(f'{filename}.0'):
+                filename = f'{filename}.0'
+            else:
+                abort(f'The snapshot file "{filename}" does not exist')
         for snapshot_class in snapshot_classes:
             if snapshot_class.is_this_type(filename):
-                determined_type = snapshot_class.__name__.rstrip('Snapshot').lower()
+                determined_type = snapshot_class.__name__[:-len('Snapshot')].lower()
                 break
     return bcast(determined_type)
 
+# Function returning the names of all files making up the GADGET2
+# snapshot given by filename, which may be either the name of any of
+# these files or (for snapshots split over several files)
+# the base name. Multiple files are named
+# filename.0, filename.1, ..., as done by GADGET2.
+@cython.header(# Arguments
+               filename=str,
+               # Locals
+               basename=str,
+               filenames=list,
+               i='int',
+               match=object,  # re.Match
+               returns=list,
+               )
+def get_gadget2_filenames(filename):
+    if master:
+        filenames = [filename]
+        # Find the base name, if any
+        basename = ''
+        if os.path.isfile(f'{filename}.0'):
+            basename = filename
+        else:
+            match = re.fullmatch(r'(.*)\.\d+', filename)
+            if match and os.path.isfile(f'{match.group(1)}.0'):
+                basename = match.group(1)
+        if basename:
+            filenames = []
+            i = 0
+            while os.path.isfile(f'{basename}.{i}'):
+                filenames.append(f'{basename}.{i}')
+                i += 1
+    return bcast(filenames if master else None)
+
 # Function whick takes in a dict of parameters and compare their
 # values to those of the current run. If any disagreement is found,
 # write a warning message.
@@ -1150,9 +2526,9 @@ def compare_parameters(params, filename):
                snapshot_boxsize='double',
                # Locals
                i='Py_ssize_t',
-               posx='double*',
-               posy='double*',
-               posz='double*',
+               posx='particle_float*',
+               posy='particle_float*',
+               posz='particle_float*',
                )
 def out_of_bounds_check(component, snapshot_boxsize=-1):
     """If any particles are outside of the box, the program
@@ -24,9 +24,13 @@
 # In the .pyx file, Cython declared variables will also get cimported.
 from commons import *
 
+# OpenMP parallelization
+from cython.parallel import prange
+
 # Cython imports
 cimport('from analysis import measure')
-cimport('from communication import communicate_domain, domain_subdivisions, exchange, smart_mpi')
+cimport('from communication import communicate_domain, communicate_domains, '
+        'domain_subdivisions, exchange, smart_mpi')
 cimport('from fluid import maccormack, maccormack_internal_sources, '
     'kurganov_tadmor, kurganov_tadmor_internal_sources'
 )
@@ -524,26 +528,32 @@ class Component:
         # Particle attributes
         public Py_ssize_t N
         public Py_ssize_t N_allocated
+        public Py_ssize_t N_allocated_max
+        public Py_ssize_t N_reallocations
         public Py_ssize_t N_local
         public double mass
         public double softening_length
-        # Particle data
-        double* posx
-        double* posy
-        double* posz
-        double* momx
-        double* momy
-        double* momz
-        double** pos
-        double** mom
-        public double[::1] posx_mv
-        public double[::1] posy_mv
-        public double[::1] posz_mv
-        public double[::1] momx_mv
-        public double[::1] momy_mv
-        public double[::1] momz_mv
+        # Particle data, stored in single or double precision
+        # depending on the particle_float type (see the commons module).
+        particle_float* posx
+        particle_float* posy
+        particle_float* posz
+        particle_float* momx
+        particle_float* momy
+        particle_float* momz
+        particle_float** pos
+        particle_float** mom
+        public particle_float[::1] posx_mv
+        public particle_float[::1] posy_mv
+        public particle_float[::1] posz_mv
+        public particle_float[::1] momx_mv
+        public particle_float[::1] momy_mv
+        public particle_float[::1] momz_mv
         public list pos_mv
         public list mom_mv
+        # Particle time step rungs
+        char* rung
+        public char[::1] rung_mv
         # Particle Δ buffers
         double* Δposx
         double* Δposy
@@ -852,31 +862,39 @@ class Component:
         self.mass = mass
         self.N_allocated = 1
         self.N_local = 1
+        # Memory statistics, namely the high-water mark of N_allocated
+        # and the number of reallocations of the particle data.
+        self.N_allocated_max = self.N_allocated
+        self.N_reallocations = 0
         # Particle data
-        self.posx = malloc(self.N_allocated*sizeof('double'))
-        self.posy = malloc(self.N_allocated*sizeof('double'))
-        self.posz = malloc(self.N_allocated*sizeof('double'))
-        self.momx = malloc(self.N_allocated*sizeof('double'))
-        self.momy = malloc(self.N_allocated*sizeof('double'))
-        self.momz = malloc(self.N_allocated*sizeof('double'))
-        self.posx_mv = cast(self.posx, 'double[:self.N_allocated]')
-        self.posy_mv = cast(self.posy, 'double[:self.N_allocated]')
-        self.posz_mv = cast(self.posz, 'double[:self.N_allocated]')
-        self.momx_mv = cast(self.momx, 'double[:self.N_allocated]')
-        self.momy_mv = cast(self.momy, 'double[:self.N_allocated]')
-        self.momz_mv = cast(self.momz, 'double[:self.N_allocated]')
+        self.posx = malloc(self.N_allocated*sizeof('particle_float'))
+        self.posy = malloc(self.N_allocated*sizeof('particle_float'))
+        self.posz = malloc(self.N_allocated*sizeof('particle_float'))
+        self.momx = malloc(self.N_allocated*sizeof('particle_float'))
+        self.momy = malloc(self.N_allocated*sizeof('particle_float'))
+        self.momz = malloc(self.N_allocated*sizeof('particle_float'))
+        self.posx_mv = cast(self.posx, 'particle_float[:self.N_allocated]')
+        self.posy_mv = cast(self.posy, 'particle_float[:self.N_allocated]')
+        self.posz_mv = cast(self.posz, 'particle_float[:self.N_allocated]')
+        self.momx_mv = cast(self.momx, 'particle_float[:self.N_allocated]')
+        self.momy_mv = cast(self.momy, 'particle_float[:self.N_allocated]')
+        self.momz_mv = cast(self.momz, 'particle_float[:self.N_allocated]')
         # Pack particle data into a pointer array of pointers
         # and a list of memoryviews.
-        self.pos = malloc(3*sizeof('double*'))
+        self.pos = malloc(3*sizeof('particle_float*'))
         self.pos[0] = self.posx
         self.pos[1] = self.posy
         self.pos[2] = self.posz
-        self.mom = malloc(3*sizeof('double*'))
+        self.mom = malloc(3*sizeof('particle_float*'))
         self.mom[0] = self.momx
         self.mom[1] = self.momy
         self.mom[2] = self.momz
         self.pos_mv = [self.posx_mv, self.posy_mv, self.posz_mv]
         self.mom_mv = [self.momx_mv, self.momy_mv, self.momz_mv]
+        # Time step rungs of the particles, used with block time steps
+        self.rung = malloc(self.N_allocated*sizeof('char'))
+        self.rung_mv = cast(self.rung, 'char[:self.N_allocated]')
+        self.rung_mv[...] = 0
         # Particle data buffers
         self.Δposx = malloc(self.N_allocated*sizeof('double'))
         self.Δposy = malloc(self.N_allocated*sizeof('double'))
@@ -1196,37 +1214,42 @@ class Component:
             # Enlarge data attributes if necessary
             if self.N_allocated < self.N_local:
                 self.resize(self.N_local)
-            # Update the data corresponding to the passed string
+            # Update the data corresponding to the passed string.
+            # The particle data may be stored in single precision,
+            # so we copy through NumPy which converts as needed.
             if var == 'posx':
                 if buffer:
                     self.Δposx_mv[:self.N_local] = mv1D[:]
                 else:
-                    self.posx_mv [:self.N_local] = mv1D[:]
+                    asarray(self.posx_mv)[:self.N_local] = mv1D
+                    # Newly populated particles start out
+                    # on the lowest time step rung.
+                    self.rung_mv[:self.N_local] = 0
             elif var == 'posy':
                 if buffer:
                     self.Δposy_mv[:self.N_local] = mv1D[:]
                 else:
-                    self.posy_mv [:self.N_local] = mv1D[:]
+                    asarray(self.posy_mv)[:self.N_local] = mv1D
             elif var == 'posz':
                 if buffer:
                     self.Δposz_mv[:self.N_local] = mv1D[:]
                 else:
-                    self.posz_mv [:self.N_local] = mv1D[:]
+                    asarray(self.posz_mv)[:self.N_local] = mv1D
             elif var == 'momx':
                 if buffer:
                     self.Δmomx_mv[:self.N_local] = mv1D[:]
                 else:
-                    self.momx_mv [:self.N_local] = mv1D[:]
+                    asarray(self.momx_mv)[:self.N_local] = mv1D
             elif var == 'momy':
                 if buffer:
                     self.Δmomy_mv[:self.N_local] = mv1D[:]
                 else:
-                    self.momy_mv [:self.N_local] = mv1D[:]
+                    asarray(self.momy_mv)[:self.N_local] = mv1D
             elif var == 'momz':
                 if buffer:
                     self.Δmomz_mv[:self.N_local] = mv1D[:]
                 else:
-                    self.momz_mv [:self.N_local] = mv1D[:]
+                    asarray(self.momz_mv)[:self.N_local] = mv1D
             elif master:
                 abort('Wrong component attribute name "{}"!'.format(var))
         elif self.representation == 'fluid':
@@ -1303,26 +1326,31 @@ class Component:
             size = size_or_shape_nopseudo_noghosts
             if size != self.N_allocated:
                 self.N_allocated = size
+                self.N_allocated_max = pairmax(self.N_allocated_max, size)
+                self.N_reallocations += 1
                 # Reallocate particle data
-                self.posx = realloc(self.posx, self.N_allocated*sizeof('double'))
-                self.posy = realloc(self.posy, self.N_allocated*sizeof('double'))
-                self.posz = realloc(self.posz, self.N_allocated*sizeof('double'))
-                self.momx = realloc(self.momx, self.N_allocated*sizeof('double'))
-                self.momy = realloc(self.momy, self.N_allocated*sizeof('double'))
-                self.momz = realloc(self.momz, self.N_allocated*sizeof('double'))
+                self.posx = realloc(self.posx, self.N_allocated*sizeof('particle_float'))
+                self.posy = realloc(self.posy, self.N_allocated*sizeof('particle_float'))
+                self.posz = realloc(self.posz, self.N_allocated*sizeof('particle_float'))
+                self.momx = realloc(self.momx, self.N_allocated*sizeof('particle_float'))
+                self.momy = realloc(self.momy, self.N_allocated*sizeof('particle_float'))
+                self.momz = realloc(self.momz, self.N_allocated*sizeof('particle_float'))
                 # Reassign particle data memory views
-                self.posx_mv = cast(self.posx, 'double[:self.N_allocated]')
-                self.posy_mv = cast(self.posy, 'double[:self.N_allocated]')
-                self.posz_mv = cast(self.posz, 'double[:self.N_allocated]')
-                self.momx_mv = cast(self.momx, 'double[:self.N_allocated]')
-                self.momy_mv = cast(self.momy, 'double[:self.N_allocated]')
-                self.momz_mv = cast(self.momz, 'double[:self.N_allocated]')
+                self.posx_mv = cast(self.posx, 'particle_float[:self.N_allocated]')
+                self.posy_mv = cast(self.posy, 'particle_float[:self.N_allocated]')
+                self.posz_mv = cast(self.posz, 'particle_float[:self.N_allocated]')
+                self.momx_mv = cast(self.momx, 'particle_float[:self.N_allocated]')
+                self.momy_mv = cast(self.momy, 'particle_float[:self.N_allocated]')
+                self.momz_mv = cast(self.momz, 'particle_float[:self.N_allocated]')
                 # Repack particle data into pointer arrays of pointers
                 # and lists of memoryviews.
                 self.pos[0], self.pos[1], self.pos[2] = self.posx, self.posy, self.posz
                 self.mom[0], self.mom[1], self.mom[2] = self.momx, self.momy, self.momz
                 self.pos_mv = [self.posx_mv, self.posy_mv, self.posz_mv]
                 self.mom_mv = [self.momx_mv, self.momy_mv, self.momz_mv]
+                # Reallocate time step rungs
+                self.rung = realloc(self.rung, self.N_allocated*sizeof('char'))
+                self.rung_mv = cast(self.rung, 'char[:self.N_allocated]')
                 # Reallocate particle buffers
                 # (commented as these are not currently used).
                 #self.Δposx = realloc(self.Δposx, self.N_allocated*sizeof('double'))
@@ -1368,6 +1396,78 @@ class Component:
             for fluidscalar in self.iterate_fluidscalars():
                 fluidscalar.resize(shape_nopseudo_noghosts)
 
+    # Method ensuring that the particle data attributes can hold at
+    # least N_needed particles. Unlike resize, the allocation grows
+    # geometrically, so that a steady trickle of incoming particles
+    # results in only a logarithmic number of reallocations.
+    @cython.pheader(# Arguments
+                    N_needed='Py_ssize_t',
+                    # Locals
+                    size='Py_ssize_t',
+                    )
+    def grow(self, N_needed):
+        if N_needed <= self.N_allocated:
+            return
+        size = pairmax(N_needed, cast(particle_growth_factor*self.N_allocated, 'Py_ssize_t'))
+        self.resize(size)
+
+    # Method releasing particle memory which has been left unused.
+    # When the local particles occupy less than the fraction
+    # particle_shrink_threshold of the allocation, the allocation is
+    # shrunk so that only the geometric growth margin remains.
+    # Note that this nullifies the Δ buffers.
+    @cython.pheader(# Locals
+                    size='Py_ssize_t',
+                    )
+    def shrink(self):
+        if self.representation != 'particles' or particle_shrink_threshold == 0:
+            return
+        if self.N_local >= particle_shrink_threshold*self.N_allocated:
+            return
+        size = pairmax(1, cast(particle_growth_factor*self.N_local, 'Py_ssize_t'))
+        if size < self.N_allocated:
+            self.resize(size)
+
+    # Method which sorts the local particles according to their
+    # position along a Morton (Z-order) space-filling curve, so that
+    # particles close in space are also close in memory. This improves
+    # the cache locality of the mesh interpolations and the
+    # particle-particle interactions. The Δ buffers are not sorted,
+    # as these hold no data in between interactions.
+    @cython.pheader(# Locals
+                    N_local='Py_ssize_t',
+                    data=object,  # np.ndarray
+                    data_mv=object,  # particle_float[::1] or char[::1]
+                    i='Py_ssize_t',
+                    keys='Py_ssize_t[::1]',
+                    order=object,  # np.ndarray
+                    posx='particle_float*',
+                    posy='particle_float*',
+                    posz='particle_float*',
+                    )
+    def sort_particles(self):
+        if self.representation != 'particles':
+            return
+        N_local = self.N_local
+        if allreduce(N_local, op=MPI.SUM) == 0:
+            return
+        masterprint(f'Sorting particles of {self.name} along a space-filling curve ...')
+        # Compute the Morton key of each particle
+        posx = self.posx
+        posy = self.posy
+        posz = self.posz
+        keys = empty(N_local, dtype=C2np['Py_ssize_t'])
+        for i in range(N_local):
+            keys[i] = morton_key(posx[i], posy[i], posz[i])
+        # Reorder all particle data according to the keys
+        order = np.argsort(keys, kind='stable')
+        for data_mv in (self.posx_mv, self.posy_mv, self.posz_mv,
+                        self.momx_mv, self.momy_mv, self.momz_mv,
+                        self.rung_mv):
+            data = asarray(data_mv)
+            data[:N_local] = data[order]
+        masterprint('done')
+
     # Method for 3D realisation of linear transfer functions.
     # As all arguments are optional,
     # this has to be a pure Python method.
@@ -1756,12 +1856,12 @@ class Component:
         a_next='double',
         # Locals
         i='Py_ssize_t',
-        momx='double*',
-        momy='double*',
-        momz='double*',
-        posx='double*',
-        posy='double*',
-        posz='double*',
+        momx='particle_float*',
+        momy='particle_float*',
+        momz='particle_float*',
+        posx='particle_float*',
+        posy='particle_float*',
+        posz='particle_float*',
         rk_order='int',
         scheme=str,
     )
@@ -1774,15 +1874,24 @@ class Component:
             momx = self.momx
             momy = self.momy
             momz = self.momz
-            # Update positions
-            for i in range(self.N_local):
-                posx[i] += momx[i]*ℝ[ᔑdt['a**(-2)']/self.mass]
-                posy[i] += momy[i]*ℝ[ᔑdt['a**(-2)']/self.mass]
-                posz[i] += momz[i]*ℝ[ᔑdt['a**(-2)']/self.mass]
-                # Toroidal boundaries
-                posx[i] = mod(posx[i], boxsize)
-                posy[i] = mod(posy[i], boxsize)
-                posz[i] = mod(posz[i], boxsize)
+            # Update positions. The particles are independent,
+            # so this is done in parallel by num_threads threads.
+            # The new positions are computed in double precision
+            # (with toroidal boundaries) and then stored. When the
+            # particle data is stored in single precision, the rounding
+            # may place a particle exactly at the upper boundary of the
+            # box, in which case it is wrapped around to 0.
+            for i in prange(self.N_local, nogil=True, num_threads=num_threads):
+                posx[i] = mod(posx[i] + momx[i]*ℝ[ᔑdt['a**(-2)']/self.mass], boxsize)
+                posy[i] = mod(posy[i] + momy[i]*ℝ[ᔑdt['a**(-2)']/self.mass], boxsize)
+                posz[i] = mod(posz[i] + momz[i]*ℝ[ᔑdt['a**(-2)']/self.mass], boxsize)
+                if single_precision:
+                    if posx[i] >= boxsize:
+                        posx[i] = 0
+                    if posy[i] >= boxsize:
+                        posy[i] = 0
+                    if posz[i] >= boxsize:
+                        posz[i] = 0
             masterprint('done')
             # Some partiles may have drifted out of the local domain.
             # Exchange particles to the correct processes.
@@ -2470,70 +2579,70 @@ class Component:
                         continue
                     yield fluidscalar
 
-    # Method for communicating pseudo and ghost points
-    # of all fluid variables.
+    # Method returning a list of the domain grids of all fluid scalars,
+    # or of all non-linear fluid scalars. Which grid of each fluid
+    # scalar to return is specified by kind, which may be 'grid',
+    # 'gridˣ' or 'Δ'.
     @cython.header(# Arguments
-                   mode=str,
+                   kind=str,
+                   nonlinear='bint',
                    # Locals
+                   domain_grids=list,
                    fluidscalar='FluidScalar',
+                   fluidscalars=object,  # generator
+                   returns=list,
                    )
-    def communicate_fluid_grids(self, mode=''):
+    def get_fluid_domain_grids(self, kind='grid', nonlinear=False):
         if self.representation != 'fluid':
-            return
-        for fluidscalar in self.iterate_fluidscalars():
-            communicate_domain(fluidscalar.grid_mv, mode=mode)
+            return []
+        if nonlinear:
+            fluidscalars = self.iterate_nonlinear_fluidscalars()
+        else:
+            fluidscalars = self.iterate_fluidscalars()
+        domain_grids = []
+        for fluidscalar in fluidscalars:
+            if kind == 'grid':
+                domain_grids.append(fluidscalar.grid_mv)
+            elif kind == unicode('gridˣ'):
+                domain_grids.append(fluidscalar.gridˣ_mv)
+            elif kind == unicode('Δ'):
+                domain_grids.append(fluidscalar.Δ_mv)
+            else:
+                abort(f'get_fluid_domain_grids() got unknown kind "{kind}"')
+        return domain_grids
+
+    # Method for communicating pseudo and ghost points
+    # of all fluid variables. The grids of all fluid scalars
+    # are communicated together.
+    @cython.header(mode=str)
+    def communicate_fluid_grids(self, mode=''):
+        communicate_domains(self.get_fluid_domain_grids('grid'), mode=mode)
 
     # Method for communicating pseudo and ghost points
     # of all starred fluid variables.
-    @cython.header(# Arguments
-                   mode=str,
-                   # Locals
-                   fluidscalar='FluidScalar',
-                   )
+    @cython.header(mode=str)
     def communicate_fluid_gridsˣ(self, mode=''):
-        if self.representation != 'fluid':
-            return
-        for fluidscalar in self.iterate_fluidscalars():
-            communicate_domain(fluidscalar.gridˣ_mv, mode=mode)
+        communicate_domains(self.get_fluid_domain_grids(unicode('gridˣ')), mode=mode)
 
     # Method for communicating pseudo and ghost points
     # of all non-linear fluid variables.
-    @cython.header(# Arguments
-                   mode=str,
-                   # Locals
-                   fluidscalar='FluidScalar',
-                   )
+    @cython.header(mode=str)
     def communicate_nonlinear_fluid_grids(self, mode=''):
-        if self.representation != 'fluid':
-            return
-        for fluidscalar in self.iterate_nonlinear_fluidscalars():
-            communicate_domain(fluidscalar.grid_mv, mode=mode)
+        communicate_domains(self.get_fluid_domain_grids('grid', nonlinear=True), mode=mode)
 
     # Method for communicating pseudo and ghost points
     # of all starred non-linear fluid variables.
-    @cython.header(# Arguments
-                   mode=str,
-                   # Locals
-                   fluidscalar='FluidScalar',
-                   )
+    @cython.header(mode=str)
     def communicate_nonlinear_fluid_gridsˣ(self, mode=''):
-        if self.representation != 'fluid':
-            return
-        for fluidscalar in self.iterate_nonlinear_fluidscalars():
-            communicate_domain(fluidscalar.gridˣ_mv, mode=mode)
+        communicate_domains(
+            self.get_fluid_domain_grids(unicode('gridˣ'), nonlinear=True), mode=mode,
+        )
 
     # Method for communicating pseudo and ghost points
     # of all fluid Δ buffers.
-    @cython.header(# Arguments
-                   mode=str,
-                   # Locals
-                   fluidscalar='FluidScalar',
-                   )
+    @cython.header(mode=str)
     def communicate_fluid_Δ(self, mode=''):
-        if self.representation != 'fluid':
-            return
-        for fluidscalar in self.iterate_fluidscalars():
-            communicate_domain(fluidscalar.Δ_mv, mode=mode)
+        communicate_domains(self.get_fluid_domain_grids(unicode('Δ')), mode=mode)
 
     # Method which calls scale_grid on all non-linear fluid scalars
     @cython.header(# Arguments
@@ -2628,6 +2737,7 @@ class Component:
         free(self.momx)
         free(self.momy)
         free(self.momz)
+        free(self.rung)
 
     # String representation
     def __repr__(self):
@@ -2651,6 +2761,105 @@ def get_representation(species):
             return representation
     abort('Species "{}" not implemented'.format(species))
 
+# Function computing the Morton (Z-order) key of a position within the
+# box. Each coordinate is discretized into morton_bits bits, which are
+# then interleaved.
+@cython.header(# Arguments
+               x='double',
+               y='double',
+               z='double',
+               # Locals
+               key='Py_ssize_t',
+               returns='Py_ssize_t',
+               )
+def morton_key(x, y, z):
+    key = (
+          spread_bits(pairmin(cast(x*ℝ[2**morton_bits/boxsize], 'Py_ssize_t'),
+                              ℤ[2**morton_bits - 1]))
+        | spread_bits(pairmin(cast(y*ℝ[2**morton_bits/boxsize], 'Py_ssize_t'),
+                              ℤ[2**morton_bits - 1])) << 1
+        | spread_bits(pairmin(cast(z*ℝ[2**morton_bits/boxsize], 'Py_ssize_t'),
+                              ℤ[2**morton_bits - 1])) << 2
+    )
+    return key
+# Helper function for morton_key, spreading out the lower 20 bits of n
+# so that two zero bits separate each bit.
+@cython.header(# Arguments
+               n='Py_ssize_t',
+               returns='Py_ssize_t',
+               )
+def spread_bits(n):
+    n &= 0xfffff
+    n = (n | (n << 32)) & 0x1f00000000ffff
+    n = (n | (n << 16)) & 0x1f0000ff0000ff
+    n = (n | (n <<  8)) & 0x100f00f00f00f00f
+    n = (n | (n <<  4)) & 0x10c30c30c30c30c3
+    n = (n | (n <<  2)) & 0x1249249249249249
+    return n
+# Number of bits per dimension in the Morton keys.
+# With 3×20 bits, the keys fit within a 64-bit integer.
+cython.declare(morton_bits='int')
+morton_bits = 20
+
+# Function for communicating pseudo and ghost points of all fluid
+# variables of several components. The grids of all components
+# (of the same gridsize) are communicated together.
+@cython.pheader(# Arguments
+                components=list,
+                mode=str,
+                # Locals
+                component='Component',
+                domain_grids=list,
+                )
+def communicate_components_fluid_grids(components, mode=''):
+    domain_grids = []
+    for component in components:
+        domain_grids += component.get_fluid_domain_grids('grid')
+    communicate_domains(domain_grids, mode=mode)
+
+# Function which prints out the current and peak memory allocated for
+# the particle data of all components, together with the number of
+# reallocations carried out, for each process.
+@cython.pheader(# Arguments
+                components=list,
+                # Locals
+                N_allocated='Py_ssize_t',
+                N_allocated_max='Py_ssize_t',
+                N_reallocations='Py_ssize_t',
+                bytes_per_particle='Py_ssize_t',
+                component='Component',
+                memory_info=tuple,
+                memory_infos=list,
+                other_rank='int',
+                )
+def report_particle_memory(components):
+    # Memory per particle for the positions, momenta, rungs and
+    # momentum Δ buffers.
+    bytes_per_particle = (
+        6*np.dtype(C2np['particle_float']).itemsize
+        + np.dtype(C2np['char']).itemsize
+        + 3*np.dtype(C2np['double']).itemsize
+    )
+    N_allocated = N_allocated_max = N_reallocations = 0
+    for component in components:
+        if component.representation != 'particles':
+            continue
+        N_allocated     += component.N_allocated
+        N_allocated_max += component.N_allocated_max
+        N_reallocations += component.N_reallocations
+    memory_infos = gather((N_allocated, N_allocated_max, N_reallocations))
+    if not master or N_allocated_max == 0:
+        return
+    masterprint('Particle memory (current, peak, reallocations):')
+    for other_rank, memory_info in enumerate(memory_infos):
+        N_allocated, N_allocated_max, N_reallocations = memory_info
+        masterprint(
+            f'    Process {other_rank}: '
+            f'{significant_figures(N_allocated*bytes_per_particle/2**20, 4, fmt="unicode")} MB, '
+            f'{significant_figures(N_allocated_max*bytes_per_particle/2**20, 4, fmt="unicode")} MB, '
+            f'{N_reallocations}'
+        )
+
 # Function for adding species to the universals_dict,
 # recording the presence of any species in use.
 @cython.header(# Arguments
@@ -2758,6 +2967,10 @@ approximations_implemented = {
 # and which the user should generally avoid.
 cython.declare(internally_defined_names=set)
 internally_defined_names = {'all', 'all combinations', 'buffer', 'default', 'total'}
+# Factor by which the particle data of a component is at least enlarged
+# when it needs to grow, see Component.grow.
+cython.declare(particle_growth_factor='double')
+particle_growth_factor = 1.25
 # Names of all implemented fluid variables in order.
 # Note that 𝒫 is not considered a seperate fluid variable,
 # but rather a fluid scalar that lives on ς.
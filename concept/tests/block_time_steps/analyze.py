@@ -0,0 +1,103 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load
+import species
+import scipy.spatial
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Read in data from the CO𝘕CEPT snapshots. The results using a single
+# rung are stored under the key 'single', while the results using
+# block time steps are stored under the number of processes used.
+species.allow_similarly_named_components = True
+nprocs_list = sorted(int(dname[(dname.index('_') + 1):])
+                     for dname in [os.path.basename(dname)
+                                   for dname in glob('{}/output_[0-9]*'.format(this_dir))])
+a = []
+components = {n: [] for n in ['single'] + nprocs_list}
+for n in components:
+    for fname in sorted(glob('{}/output_{}/snapshot_a=*'.format(this_dir, n)),
+                        key=lambda s: s[(s.index('=') + 1):]):
+        snapshot = load(fname, compare_params=False)
+        if n == 'single':
+            a.append(snapshot.params['a'])
+        components[n].append(snapshot.components[0])
+N_snapshots = len(a)
+
+# Begin analysis
+masterprint('Analyzing {} data ...'.format(this_test))
+
+# For each particle of the single-rung snapshots, find the distance
+# to the nearest particle of the corresponding snapshot using block
+# time steps. As the box is not periodic, particles may have left the
+# box, and so the positions are wrapped before matching.
+N = components['single'][0].N
+dist = collections.OrderedDict((n, []) for n in nprocs_list)
+for i in range(N_snapshots):
+    pos = np.mod(np.array([components['single'][i].posx,
+                           components['single'][i].posy,
+                           components['single'][i].posz]).T, boxsize)
+    for n in nprocs_list:
+        pos_rungs = np.mod(np.array([components[n][i].posx,
+                                     components[n][i].posy,
+                                     components[n][i].posz]).T, boxsize)
+        tree = scipy.spatial.cKDTree(pos_rungs, boxsize=boxsize)
+        dist[n].append(tree.query(pos)[0])
+
+# Plot
+fig_file = this_dir + '/result.png'
+fig, ax = plt.subplots(len(nprocs_list), sharex=True, sharey=True)
+for n, d, ax_i in zip(dist.keys(), dist.values(), ax):
+    for i in range(N_snapshots):
+        ax_i.semilogy(machine_ϵ + np.array(d[i])/boxsize,
+                      '.',
+                      alpha=0.7,
+                      label='$a={}$'.format(a[i]),
+                      zorder=-i,
+                      )
+    ax_i.set_ylabel('$|\mathbf{{x}}_{{\mathrm{{rungs}}, {}}} - \mathbf{{x}}_{{\mathrm{{single}}}}|/\mathrm{{boxsize}}$'.format(n))
+ax[-1].set_xlabel('Particle number')
+plt.xlim(0, N - 1)
+fig.subplots_adjust(hspace=0)
+plt.setp([ax_i.get_xticklabels() for ax_i in ax[:-1]], visible=False)
+ax[0].legend(loc='best').get_frame().set_alpha(0.7)
+plt.tight_layout()
+plt.savefig(fig_file)
+
+# Printout error message for unsuccessful test. The block time steps
+# resolve the close encounters better than the single rung, and so
+# the results are expected to agree only to the level of the
+# time stepping errors.
+tol = 1e-2
+if any(np.mean(np.array(d)/boxsize) > tol for d in dist.values()):
+    abort('The results with and without block time steps disagree.\n'
+          'See "{}" for a visualization.'.format(fig_file))
+
+# Done analyzing
+masterprint('done')
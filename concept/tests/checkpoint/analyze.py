@@ -0,0 +1,94 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load
+import species
+import scipy.spatial
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Read in the final snapshots of the uninterrupted simulation,
+# the simulation carrying out the autosaves
+# and the restarted simulations.
+species.allow_similarly_named_components = True
+runs = ['uninterrupted', 'autosave'] + sorted(
+    os.path.basename(dname)[len('output_'):]
+    for dname in glob(f'{this_dir}/output_restart_*')
+)
+components = {}
+for run in runs:
+    fname = sorted(glob(f'{this_dir}/output_{run}/snapshot_a=*'))[-1]
+    components[run] = load(fname, compare_params=False, only_components=True)
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data ...')
+
+# Compare the final state of each simulation
+# to that of the uninterrupted simulation.
+tol = 1e-6
+for run in runs[1:]:
+    for component_uninterrupted, component in zip(components['uninterrupted'], components[run]):
+        if component.representation == 'particles':
+            # As the particle order depends on the number of
+            # processes, the particles are matched up
+            # as nearest neighbours.
+            pos_uninterrupted = np.array(
+                [component_uninterrupted.posx, component_uninterrupted.posy,
+                 component_uninterrupted.posz]).T
+            pos = np.array([component.posx, component.posy, component.posz]).T
+            tree = scipy.spatial.cKDTree(np.mod(pos_uninterrupted, boxsize), boxsize=boxsize)
+            dist, indices = tree.query(np.mod(pos, boxsize))
+            mom_uninterrupted = np.array(
+                [component_uninterrupted.momx, component_uninterrupted.momy,
+                 component_uninterrupted.momz]).T[indices]
+            mom = np.array([component.momx, component.momy, component.momz]).T
+            if (   np.mean(dist)/boxsize > tol
+                or np.mean(np.linalg.norm(mom - mom_uninterrupted, axis=1))
+                    > tol*np.mean(np.linalg.norm(mom_uninterrupted, axis=1))
+            ):
+                abort(f'The particles of {component.name} of the {run} simulation '
+                      f'disagree with those of the uninterrupted simulation')
+        else:
+            gridsize = component.gridsize
+            for fluidvar_uninterrupted, fluidvar in zip(
+                component_uninterrupted.fluidvars[:component.boltzmann_order],
+                component.fluidvars[:component.boltzmann_order],
+            ):
+                for fluidscalar_uninterrupted, fluidscalar in zip(
+                    fluidvar_uninterrupted, fluidvar,
+                ):
+                    grid_uninterrupted = asarray(
+                        fluidscalar_uninterrupted.grid_noghosts)[:gridsize, :gridsize, :gridsize]
+                    grid = asarray(fluidscalar.grid_noghosts)[:gridsize, :gridsize, :gridsize]
+                    if np.max(np.abs(grid - grid_uninterrupted)) > tol*np.max(
+                        np.abs(grid_uninterrupted)):
+                        abort(f'The fluid grids of {component.name} of the {run} simulation '
+                              f'disagree with those of the uninterrupted simulation')
+
+# Done analyzing
+masterprint('done')
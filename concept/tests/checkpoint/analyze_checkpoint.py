@@ -0,0 +1,160 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+# It may be run with any number of processes.
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from communication import domain_bounds_x, domain_bounds_y, domain_bounds_z
+from communication import domain_layout_local_indices
+from snapshot import get_checkpoint_basename, load, read_checkpoint_metadata
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Function for reading in the raw arrays of a component
+# from one of the files of the checkpoint.
+def read_arrays(filename, component_info):
+    return [
+        np.fromfile(filename, dtype=dtype, count=np.prod(shape), offset=offset).reshape(shape)
+        for offset, dtype, shape in component_info['arrays']
+    ]
+
+# Function returning the local particle data of a component
+def get_particle_arrays(component):
+    return [
+        asarray(getattr(component, f'{attr}_mv'))[:component.N_local].copy()
+        for attr in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz')
+    ]
+
+# Function returning the local fluid grids of a component,
+# without pseudo and ghost points.
+def get_fluid_arrays(component):
+    shape = [s - 1 for s in component.fluidvars[0][0].shape_noghosts]
+    return [
+        asarray(fluidscalar.grid_noghosts)[:shape[0], :shape[1], :shape[2]].copy()
+        for fluidvar in component.fluidvars[:component.boltzmann_order]
+        for fluidscalar in fluidvar
+    ]
+
+# Function assembling global fluid grids from (start, arrays) pairs.
+# Grid points not covered by any of the pairs are left as NaN.
+def assemble_grids(gridsize, parts):
+    grids = None
+    for start, arrays in parts:
+        if grids is None:
+            grids = [np.full([gridsize]*3, np.nan) for arr in arrays]
+        for grid, arr in zip(grids, arrays):
+            grid[
+                start[0]:start[0] + arr.shape[0],
+                start[1]:start[1] + arr.shape[1],
+                start[2]:start[2] + arr.shape[2],
+            ] = arr
+    return grids
+
+# Read in the meta data of all files of the checkpoint
+filename = get_checkpoint_basename(initial_conditions)
+nprocs_checkpoint = read_checkpoint_metadata(f'{filename}.0')['nprocs']
+metadatas = [
+    read_checkpoint_metadata(f'{filename}.{rank_checkpoint}')
+    for rank_checkpoint in range(nprocs_checkpoint)
+]
+
+# Load the checkpoint as done when restarting
+components = load(initial_conditions, compare_params=False, only_components=True)
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data using {nprocs} processes ...')
+
+# The checkpoint files should all have been written at the time
+# specified by the accompanying parameter file.
+for metadata in metadatas:
+    if not isclose(metadata['params']['a'], a_begin, rel_tol=1e-12):
+        abort(f'The checkpoint "{filename}" was written at a = {metadata["params"]["a"]}, '
+              f'but the parameter file specifies a_begin = {a_begin}')
+
+# With the same number of processes as was used for saving, the
+# domain decomposition should be restored, leaving each process with
+# exactly the data of its own checkpoint file.
+if nprocs == nprocs_checkpoint:
+    for domain_bounds, domain_bounds_checkpoint in zip(
+        (domain_bounds_x, domain_bounds_y, domain_bounds_z),
+        metadatas[rank]['domain_bounds'],
+    ):
+        if not np.array_equal(asarray(domain_bounds), domain_bounds_checkpoint):
+            abort(f'The domain decomposition of "{filename}" was not restored on process {rank}')
+    for index, component in enumerate(components):
+        arrays = read_arrays(f'{filename}.{rank}', metadatas[rank]['components'][index])
+        if component.representation == 'particles':
+            arrays_loaded = get_particle_arrays(component)
+        else:
+            arrays_loaded = get_fluid_arrays(component)
+        if len(arrays) != len(arrays_loaded) or not all([
+            arr.shape == arr_loaded.shape and np.array_equal(arr, arr_loaded)
+            for arr, arr_loaded in zip(arrays, arrays_loaded)
+        ]):
+            abort(f'The data of {component.name} on process {rank} differ from those of '
+                  f'"{filename}.{rank}", though the same number of processes is used')
+
+# Regardless of the number of processes, all data of the checkpoint
+# should be present after loading. The particles of all processes are
+# compared to those of all files after sorting, while the fluid grids
+# are compared after being assembled into global grids.
+for index, component in enumerate(components):
+    if component.representation == 'particles':
+        data = gather(np.array(get_particle_arrays(component)))
+        if master:
+            data = np.concatenate(data, axis=1)
+            data_checkpoint = np.concatenate([
+                np.array(read_arrays(f'{filename}.{rank_checkpoint}',
+                    metadatas[rank_checkpoint]['components'][index]))
+                for rank_checkpoint in range(nprocs_checkpoint)
+            ], axis=1)
+            if data.shape != data_checkpoint.shape or not np.array_equal(
+                data[:, np.lexsort(data)], data_checkpoint[:, np.lexsort(data_checkpoint)],
+            ):
+                abort(f'The particles of {component.name} in "{filename}" were not '
+                      f'correctly distributed among {nprocs} processes')
+    else:
+        shape = [s - 1 for s in component.fluidvars[0][0].shape_noghosts]
+        start = [domain_layout_local_indices[dim]*shape[dim] for dim in range(3)]
+        data = gather((start, get_fluid_arrays(component)))
+        if master:
+            grids = assemble_grids(component.gridsize, data)
+            grids_checkpoint = assemble_grids(component.gridsize, [
+                (
+                    metadata['components'][index]['start'],
+                    read_arrays(f'{filename}.{rank_checkpoint}', metadata['components'][index]),
+                )
+                for rank_checkpoint, metadata in enumerate(metadatas)
+            ])
+            if len(grids) != len(grids_checkpoint) or not all([
+                np.array_equal(grid, grid_checkpoint)
+                for grid, grid_checkpoint in zip(grids, grids_checkpoint)
+            ]):
+                abort(f'The fluid grids of {component.name} in "{filename}" were not '
+                      f'correctly distributed among {nprocs} processes')
+
+# Done analyzing
+masterprint('done')
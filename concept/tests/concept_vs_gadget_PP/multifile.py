@@ -0,0 +1,75 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+# It may be run with any number of processes.
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load, save
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Read in the last CO𝘕CEPT snapshot. The particles are not exchanged,
+# leaving each process with a contiguous slice of the particles
+# as stored on disk.
+fname = sorted(glob(this_dir + '/output/snapshot_a=*'),
+               key=lambda s: s[(s.index('=') + 1):])[-1]
+snapshot = load(fname, compare_params=False, do_exchange=False)
+component = snapshot.components[0]
+
+# Save the snapshot again, now split over several files
+masterprint(f'Saving {this_test} data split over {snapshot_numfiles} files ...')
+if snapshot_numfiles < 2:
+    abort(f'The multi-file part of the {this_test} test requires snapshot_numfiles > 1')
+fname_multifile = save(component, this_dir + '/output/multifile', snapshot.params)
+masterprint('done')
+
+# Reload the split snapshot from both the common base name
+# and the name of one of the files. As the same number of processes
+# are used and no exchange is performed, each process will hold the
+# same particles as in the original snapshot, which should have
+# survived the round trip exactly.
+masterprint(f'Analyzing {this_test} multi-file data ...')
+for fname_reload in (fname_multifile, f'{fname_multifile}.1'):
+    snapshot_reloaded = load(fname_reload, compare_params=False, do_exchange=False)
+    component_reloaded = snapshot_reloaded.components[0]
+    if component_reloaded.N != component.N:
+        abort(f'The snapshot "{fname_reload}" contains {component_reloaded.N} particles, '
+              f'whereas {component.N} particles were saved')
+    if component_reloaded.N_local != component.N_local:
+        abort(f'Process {rank} received {component_reloaded.N_local} particles from '
+              f'"{fname_reload}", but should have received {component.N_local}')
+    for attr in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz'):
+        if not np.array_equal(
+            asarray(getattr(component_reloaded, f'{attr}_mv'))[:component.N_local],
+            asarray(getattr(component,          f'{attr}_mv'))[:component.N_local],
+        ):
+            abort(f'The {attr} data of "{fname}" did not survive the round trip '
+                  f'through "{fname_reload}"')
+    if not np.array_equal(asarray(snapshot_reloaded.ID), asarray(snapshot.ID)):
+        abort(f'The particle IDs of "{fname}" did not survive the round trip '
+              f'through "{fname_reload}"')
+    Barrier()
+masterprint('done')
@@ -0,0 +1,143 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+# It may be run with any number of processes.
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import Gadgethdf5Snapshot, get_snapshot_type, load, save
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Read in the standard snapshot. The particles are not exchanged,
+# leaving each process with a contiguous slice of the particles
+# as stored on disk.
+snapshot = load(this_dir + '/IC.hdf5', compare_params=False, do_exchange=False)
+component = snapshot.components[0]
+N = component.N
+N_local = component.N_local
+start_local = exscan(N_local) or 0
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data ...')
+
+# Function checking that the particle data of two components agree,
+# either exactly or to within single precision.
+def compare_components(component_0, component_1, fname, exact):
+    for attr in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz'):
+        data_0 = asarray(getattr(component_0, f'{attr}_mv'))[:N_local]
+        data_1 = asarray(getattr(component_1, f'{attr}_mv'))[:N_local]
+        if exact:
+            agree = np.array_equal(data_0, data_1)
+        else:
+            agree = np.allclose(data_0, data_1, rtol=0,
+                atol=1e-6*(boxsize if attr.startswith('pos') else np.max(np.abs(data_0))))
+        if not agree:
+            abort(f'The {attr} data of the GADGET HDF5 snapshot "{fname}" '
+                  f'disagree with those of the original snapshot')
+
+# Function checking that the GADGET HDF5 snapshot in fname
+# is detected and loaded as such, with the same particle
+# distribution as the original snapshot.
+def load_gadgethdf5(fname):
+    snapshot_type_detected = get_snapshot_type(fname)
+    if snapshot_type_detected != 'gadgethdf5':
+        abort(f'The GADGET HDF5 snapshot "{fname}" was detected '
+              f'as being of type "{snapshot_type_detected}"')
+    snapshot_loaded = load(fname, compare_params=False, do_exchange=False)
+    if not isinstance(snapshot_loaded, Gadgethdf5Snapshot):
+        abort(f'The GADGET HDF5 snapshot "{fname}" was loaded as a {type(snapshot_loaded)}')
+    component_loaded = snapshot_loaded.components[0]
+    if component_loaded.N != N:
+        abort(f'The snapshot "{fname}" contains {component_loaded.N} particles, '
+              f'whereas {N} particles were saved')
+    if component_loaded.N_local != N_local:
+        abort(f'Process {rank} received {component_loaded.N_local} particles from '
+              f'"{fname}", but should have received {N_local}')
+    # As less than 2**32 particles are used, the IDs should be
+    # 32-bit and the higher 32 bits of the total particle number
+    # should be zero.
+    if snapshot_loaded.ID.dtype != np.uint32:
+        abort(f'The particle IDs of "{fname}" were loaded as {snapshot_loaded.ID.dtype}')
+    if not np.array_equal(snapshot_loaded.ID, arange(start_local, start_local + N_local)):
+        abort(f'The particle IDs of "{fname}" are not consecutive')
+    if master:
+        with open_hdf5(fname, mode='r') as hdf5_file:
+            if hdf5_file['PartType1/ParticleIDs'].dtype != np.uint32:
+                abort(f'The particle IDs of "{fname}" are stored as '
+                      f'{hdf5_file["PartType1/ParticleIDs"].dtype}')
+            if np.any(hdf5_file['Header'].attrs['NumPart_Total_HighWord']):
+                abort(f'Non-zero NumPart_Total_HighWord in "{fname}"')
+    return snapshot_loaded
+
+# The original standard snapshot should not
+# be mistaken for a GADGET HDF5 snapshot.
+if get_snapshot_type(this_dir + '/IC.hdf5') != 'standard':
+    abort(f'The standard snapshot "{this_dir}/IC.hdf5" was not detected as such')
+
+# Save the standard snapshot as a GADGET HDF5 snapshot and load it
+# back in. As the positions and momenta are stored in single
+# precision, the round trip is only accurate to this precision.
+fname = save(component, this_dir + '/output/snapshot', snapshot.params, 'gadgethdf5')
+snapshot_gadget = load_gadgethdf5(fname)
+compare_components(component, snapshot_gadget.components[0], fname, exact=False)
+
+# Saving and loading the already single precision data
+# again should result in an exact round trip.
+fname = save(snapshot_gadget.components[0], this_dir + '/output/snapshot_resaved',
+    snapshot_gadget.params, 'gadgethdf5')
+snapshot_resaved = load_gadgethdf5(fname)
+compare_components(snapshot_gadget.components[0], snapshot_resaved.components[0], fname,
+    exact=True)
+
+# Make a copy of the snapshot, in which the higher 32 bits
+# of the total particle number is set to 1. The total number
+# of particles should then be reconstructed as N + 2**32.
+fname_highword = this_dir + '/output/snapshot_highword.hdf5'
+if master:
+    shutil.copy(fname, fname_highword)
+    with open_hdf5(fname_highword, mode='a') as hdf5_file:
+        hdf5_file['Header'].attrs['NumPart_Total_HighWord'] = asarray(
+            [0, 1, 0, 0, 0, 0], dtype=C2np['unsigned int'])
+Barrier()
+snapshot_highword = load(fname_highword, compare_params=False, only_params=True)
+if snapshot_highword.components[0].N != N + 2**32:
+    abort(f'The total number of particles in "{fname_highword}" was reconstructed as '
+          f'{snapshot_highword.components[0].N}, but should be {N + 2**32}')
+# Constructing a GADGET HDF5 snapshot from this (data-less) component
+# should now result in 64-bit IDs, with the total number of particles
+# split correctly over the two header fields.
+snapshot_64bit = Gadgethdf5Snapshot()
+snapshot_64bit.populate(snapshot_highword.components, snapshot_highword.params)
+if snapshot_64bit.ID.dtype != np.uint64:
+    abort(f'Particle IDs of type {snapshot_64bit.ID.dtype} were used for {N + 2**32} particles')
+header = snapshot_64bit.params['header']
+if header['NumPart_Total'][1] != N or header['NumPart_Total_HighWord'][1] != 1:
+    abort(f'The total number of particles {N + 2**32} was split into the header fields as '
+          f'NumPart_Total = {header["NumPart_Total"]}, '
+          f'NumPart_Total_HighWord = {header["NumPart_Total_HighWord"]}')
+
+# Done analyzing
+masterprint('done')
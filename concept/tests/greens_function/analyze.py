@@ -0,0 +1,103 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+
+# This file has to be run in pure Python mode!
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load
+import scipy.spatial
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Read in the final snapshots and the execution times
+variants = ('cached', 'uncached', 'fourier')
+components = {}
+times = {}
+for variant in variants:
+    fname = glob(f'{this_dir}/output_{variant}/snapshot*')[0]
+    components[variant] = load(fname, compare_params=False).components[0]
+    with open(f'{this_dir}/time_{variant}', 'r') as f:
+        times[variant] = float(f.read())
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data ...')
+
+# Report the execution times
+masterprint(
+    f'Execution time with cached Green\'s function: {times["cached"]:.2f} s\n'
+    f'Execution time with Green\'s function tabulated at every time step: '
+    f'{times["uncached"]:.2f} s\n'
+    f'Speedup from caching: {times["uncached"]/times["cached"]:.3f}\n'
+    f'Execution time with differentiation in Fourier space: {times["fourier"]:.2f} s\n'
+    f'Speedup from differentiation in Fourier space: '
+    f'{times["cached"]/times["fourier"]:.3f}'
+)
+
+# The tabulated values do not depend on whether they are cached,
+# and so the cached and uncached runs should yield identical results.
+# This checks that cached Green's functions are correctly reused
+# and retabulated after being released.
+tol = 1e-9
+for var in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz'):
+    data_cached   = getattr(components['cached'  ], var)
+    data_uncached = getattr(components['uncached'], var)
+    if not np.allclose(data_cached, data_uncached, rtol=tol, atol=0):
+        abort(
+            f'The runs with and without caching of the Green\'s function '
+            f'yield different results for {var}'
+        )
+
+# Compare the results using differentiation in Fourier space with those
+# using finite differences. As the particles may be ordered differently
+# in the two snapshots, each particle of the finite difference run is
+# matched to the nearest particle of the Fourier space run.
+# The two methods differ in their treatment of the forces on scales
+# near the grid scale, and so the positions are required to agree
+# only to within a fraction of the mean interparticle distance.
+pos_fd = np.mod(np.array(
+    [components['cached'].posx, components['cached'].posy, components['cached'].posz]
+).T, boxsize)
+pos_fourier = np.mod(np.array(
+    [components['fourier'].posx, components['fourier'].posy, components['fourier'].posz]
+).T, boxsize)
+tree = scipy.spatial.cKDTree(pos_fourier, boxsize=boxsize)
+dist = tree.query(pos_fd)[0]
+dist_mean_rel = np.mean(dist)/(boxsize/cbrt(components['cached'].N))
+masterprint(
+    f'Mean distance between particles using differentiation in Fourier space '
+    f'and using finite differences, relative to the mean interparticle distance: '
+    f'{dist_mean_rel:.2e}'
+)
+tol = 0.2
+if dist_mean_rel > tol:
+    abort(
+        f'The runs with differentiation in Fourier space and with finite differences '
+        f'disagree, with a mean particle distance of {dist_mean_rel:.2e} '
+        f'times the mean interparticle distance, exceeding the tolerance of {tol}'
+    )
+
+# Done analyzing
+masterprint('done')
@@ -0,0 +1,60 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from gravity import get_shortrange_table, shortrange_factor, shortrange_factor_exact
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data with p3m_table_order = {p3m_table_order} ...')
+
+# Tabulate the short-range force factor (unless no table is used)
+if p3m_table_order:
+    get_shortrange_table()
+
+# Compare the (possibly interpolated) short-range force factor with
+# the exact expression over the entire cutoff range. The number of
+# sample points is chosen so that these do not coincide with
+# the tabulated points.
+r2_values = linspace(0, p3m_cutoff_phys**2, 10**5 + 7)
+error_max = max([abs(shortrange_factor(r2) - shortrange_factor_exact(r2)) for r2 in r2_values])
+masterprint(f'Maximum absolute error of the short-range force factor: {error_max:.2e}')
+
+# The maximally allowed absolute error for each interpolation order.
+# With the default table size of 2¹⁴ points, the errors should be about
+# 2×10⁻⁶ for linear and 4×10⁻⁷ for cubic interpolation.
+tols = {0: 0, 1: 1e-5, 3: 1e-6}
+if error_max > tols[p3m_table_order]:
+    abort(
+        f'The short-range force factor with p3m_table_order = {p3m_table_order} deviates '
+        f'from the exact expression by as much as {error_max:.2e}, '
+        f'exceeding the tolerance of {tols[p3m_table_order]:.0e}'
+    )
+
+# Done analyzing
+masterprint('done')
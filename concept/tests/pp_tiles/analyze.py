@@ -0,0 +1,94 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load
+import scipy.spatial
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Read in the final snapshots and the execution times of all runs,
+# stored under the keys (periodicity, nprocs, tile_size).
+components = {}
+times = {}
+for dname in glob(f'{this_dir}/output_*'):
+    periodicity, n, tile_size = os.path.basename(dname).split('_')[1:]
+    key = (periodicity, int(n), int(tile_size))
+    components[key] = load(glob(f'{dname}/snapshot*')[0], compare_params=False).components[0]
+    with open(f'{this_dir}/time_{periodicity}_{n}_{tile_size}', 'r') as f:
+        times[key] = float(f.read())
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data ...')
+
+# Compare each tiled run to the corresponding untiled run
+tol = 1e-9
+for key in sorted(components):
+    periodicity, n, tile_size = key
+    if tile_size == 0:
+        continue
+    component_tiled   = components[key]
+    component_untiled = components[periodicity, n, 0]
+    # The particles may be ordered differently in the two snapshots.
+    # Match each untiled particle to the nearest tiled particle.
+    pos_tiled = np.array([component_tiled.posx, component_tiled.posy, component_tiled.posz]).T
+    pos_untiled = np.array(
+        [component_untiled.posx, component_untiled.posy, component_untiled.posz]
+    ).T
+    tree = scipy.spatial.cKDTree(np.mod(pos_tiled, boxsize), boxsize=boxsize)
+    dist, indices = tree.query(np.mod(pos_untiled, boxsize))
+    mom_tiled = np.array([component_tiled.momx, component_tiled.momy, component_tiled.momz]).T
+    mom_untiled = np.array(
+        [component_untiled.momx, component_untiled.momy, component_untiled.momz]
+    ).T
+    mom_tiled = mom_tiled[indices]
+    # The deviations in positions relative to the box size
+    # and in momenta relative to the typical momentum.
+    dist_rel = np.mean(dist)/boxsize
+    mom_rel = (
+        np.mean(np.sqrt(np.sum((mom_tiled - mom_untiled)**2, axis=1)))
+        /np.mean(np.sqrt(np.sum(mom_untiled**2, axis=1)))
+    )
+    masterprint(
+        f'{periodicity.capitalize()} PP on {n} process{"es" if n > 1 else ""}:\n'
+        f'    Execution time (untiled): {times[periodicity, n, 0]:.2f} s\n'
+        f'    Execution time (tiles of {tile_size}): {times[key]:.2f} s\n'
+        f'    Speedup: {times[periodicity, n, 0]/times[key]:.3f}\n'
+        f'    Mean relative deviation in positions: {dist_rel:.2e}\n'
+        f'    Mean relative deviation in momenta: {mom_rel:.2e}'
+    )
+    # The tiled and untiled kernels differ only in the order in which
+    # the forces are summed up, and so the results should agree to
+    # within (accumulated) rounding errors.
+    if dist_rel > tol or mom_rel > tol:
+        abort(
+            f'The tiled and untiled PP kernels yield different results '
+            f'for {periodicity} gravity on {n} process{"es" if n > 1 else ""}'
+        )
+
+# Done analyzing
+masterprint('done')
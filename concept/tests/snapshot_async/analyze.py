@@ -0,0 +1,63 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data ...')
+
+# The snapshots written asynchronously should be identical to those
+# written synchronously, as the same number of processes were used.
+fnames_sync = sorted(glob(f'{this_dir}/output_sync/snapshot_a=*'))
+fnames_async = sorted(glob(f'{this_dir}/output_async/snapshot_a=*'))
+if len(fnames_sync) != len(output_times['a']['snapshot']):
+    abort(f'Found {len(fnames_sync)} synchronously written snapshots, '
+          f'but expected {len(output_times["a"]["snapshot"])}')
+if [os.path.basename(fname) for fname in fnames_sync] != [
+    os.path.basename(fname) for fname in fnames_async
+]:
+    abort('The synchronously and asynchronously written snapshots do not match up')
+for fname_sync, fname_async in zip(fnames_sync, fnames_async):
+    snapshot_sync = load(fname_sync, compare_params=False)
+    snapshot_async = load(fname_async, compare_params=False)
+    if snapshot_sync.params['a'] != snapshot_async.params['a']:
+        abort(f'The scale factors of "{fname_sync}" and "{fname_async}" disagree')
+    component_sync = snapshot_sync.components[0]
+    component_async = snapshot_async.components[0]
+    if component_sync.N != component_async.N:
+        abort(f'The snapshots "{fname_sync}" and "{fname_async}" contain '
+              f'{component_sync.N} and {component_async.N} particles')
+    for attr in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz'):
+        if not np.array_equal(getattr(component_sync, attr), getattr(component_async, attr)):
+            abort(f'The {attr} data of the asynchronously written snapshot "{fname_async}" '
+                  f'differ from those of the synchronously written snapshot "{fname_sync}"')
+
+# Done analyzing
+masterprint('done')
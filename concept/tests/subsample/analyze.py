@@ -0,0 +1,179 @@
+# This file is part of CO𝘕CEPT, the cosmological 𝘕-body code in Python.
+# Copyright © 2015–2018 Jeppe Mosgaard Dakin.
+#
+# CO𝘕CEPT is free software: You can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CO𝘕CEPT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CO𝘕CEPT. If not, see http://www.gnu.org/licenses/
+#
+# The author of CO𝘕CEPT can be contacted at dakin(at)phys.au.dk
+# The latest version of CO𝘕CEPT is available at
+# https://github.com/jmd-dk/concept/
+
+
+
+# This file has to be run in pure Python mode!
+# It may be run with any number of processes.
+
+# Imports from the CO𝘕CEPT code
+from commons import *
+from snapshot import load, read_particles_partial, save
+from species import Component
+
+# Absolute path and name of the directory of this file
+this_dir  = os.path.dirname(os.path.realpath(__file__))
+this_test = os.path.basename(this_dir)
+
+# Function returning all particle data (positions followed by
+# momenta) of a component as a (6, N) array on the master process,
+# with the particles ordered by process rank.
+def gather_particles(component):
+    data = gather(np.array([
+        asarray(getattr(component, f'{attr}_mv'))[:component.N_local]
+        for attr in ('posx', 'posy', 'posz', 'momx', 'momy', 'momz')
+    ]))
+    if master:
+        return np.concatenate(data, axis=1)
+
+# Class wrapping an HDF5 group of a particle component,
+# recording all slices read from its particle datasets.
+class RecordingGroup:
+    def __init__(self, component_h5):
+        self.component_h5 = component_h5
+        self.reads = []
+    def __contains__(self, key):
+        return key in self.component_h5
+    def __getitem__(self, key):
+        if key.startswith('domain_'):
+            return self.component_h5[key]
+        return RecordingDataset(self.component_h5[key], self.reads)
+class RecordingDataset:
+    def __init__(self, dataset, reads):
+        self.dataset = dataset
+        self.reads = reads
+    def __getitem__(self, key):
+        self.reads.append(key)
+        return self.dataset[key]
+
+# The subsample and subregion to use. The subregion is chosen within
+# the domain of the first process when using 4 processes.
+subsample = 0.5
+step = int(round(1/subsample))
+subregion = (0.1*boxsize, 0.4*boxsize)*3
+
+# Read in the initial conditions, exchanging the particles
+# to their domains, and save them as a standard snapshot (including
+# the bounding boxes of the domains) as well as a GADGET2 snapshot.
+component = load(initial_conditions, compare_params=False, only_components=True)[0]
+fnames = {
+    snapshot_type: save(component, f'{this_dir}/output/snapshot_{snapshot_type}',
+        snapshot_type=snapshot_type)
+    for snapshot_type in ('standard', 'gadget2')
+}
+
+# Begin analysis
+masterprint(f'Analyzing {this_test} data ...')
+
+# Load each snapshot fully as well as partially,
+# and compare the partial data against the full data.
+for snapshot_type, fname in fnames.items():
+    component_full = load(fname, compare_params=False, only_components=True,
+        do_exchange=False)[0]
+    data_full = gather_particles(component_full)
+    for region in (None, subregion):
+        component_partial = load(fname, compare_params=False, only_components=True,
+            subsample=subsample, subregion=region)[0]
+        data_partial = gather_particles(component_partial)
+        if not master:
+            continue
+        description = f'{snapshot_type} snapshot with subsample {subsample}'
+        if region is not None:
+            description += f' and subregion {region}'
+        # Every step'th particle (in the order of the snapshot) within
+        # the subregion should be loaded, with the momenta and the mass
+        # scaled up by step, leaving the velocities unchanged.
+        data_expected = data_full[:, ::step].copy()
+        if region is not None:
+            data_expected = data_expected[:, (
+                  (data_expected[0] >= region[0]) & (data_expected[0] < region[1])
+                & (data_expected[1] >= region[2]) & (data_expected[1] < region[3])
+                & (data_expected[2] >= region[4]) & (data_expected[2] < region[5])
+            )]
+        if (   component_partial.N != data_expected.shape[1]
+            or data_partial.shape[1] != data_expected.shape[1]
+        ):
+            abort(f'Loading the {description} resulted in {component_partial.N} particles, '
+                  f'but {data_expected.shape[1]} were expected')
+        if component_partial.mass != step*component_full.mass:
+            abort(f'Loading the {description} resulted in a particle mass of '
+                  f'{component_partial.mass}, but {step*component_full.mass} was expected')
+        if region is None and not isclose(
+            component_partial.mass*component_partial.N, component_full.mass*component_full.N,
+            rel_tol=1e-12,
+        ):
+            abort(f'Loading the {description} did not conserve the total mass')
+        data_partial = data_partial[:, np.lexsort(data_partial[:3])]
+        data_expected = data_expected[:, np.lexsort(data_expected[:3])]
+        if not np.array_equal(data_partial[:3], data_expected[:3]):
+            abort(f'Loading the {description} resulted in wrong particle positions')
+        if region is not None and not np.all(
+              (data_partial[0] >= region[0]) & (data_partial[0] < region[1])
+            & (data_partial[1] >= region[2]) & (data_partial[1] < region[3])
+            & (data_partial[2] >= region[4]) & (data_partial[2] < region[5])
+        ):
+            abort(f'Loading the {description} resulted in particles outside of the subregion')
+        if not np.allclose(
+            data_partial[3:]/component_partial.mass, data_expected[3:]/component_full.mass,
+            rtol=10*np.finfo(C2np['particle_float']).eps, atol=0,
+        ):
+            abort(f'Loading the {description} changed the particle velocities')
+
+# The standard snapshot stores the bounding boxes of the particles
+# of each process. When loading a subregion, only the contiguous
+# particle ranges of the processes whose boxes intersect the subregion
+# should be read. Read in the subregion directly, recording the
+# slices read from the particle datasets.
+with open_hdf5(fnames['standard'], mode='r', driver='mpio', comm=comm) as hdf5_file:
+    component_h5 = hdf5_file[f'components/{component.name}']
+    counts = component_h5['domain_counts'][...]
+    boxes = component_h5['domain_boxes'][...]
+    unit = eval_unit(hdf5_file.attrs['unit length'])
+    component_partial = Component(component.name, component.species, component.N,
+        mass=component.mass)
+    component_h5 = RecordingGroup(component_h5)
+    read_particles_partial(component_partial, component_h5, subsample,
+        tuple([x/unit for x in subregion]))
+    reads = gather(component_h5.reads)
+if master:
+    ranges_intersecting = []
+    offset = 0
+    for count, box in zip(counts, boxes):
+        if (count > 0
+            and box[0] <= subregion[1]/unit and box[1] >= subregion[0]/unit
+            and box[2] <= subregion[3]/unit and box[3] >= subregion[2]/unit
+            and box[4] <= subregion[5]/unit and box[5] >= subregion[4]/unit
+        ):
+            ranges_intersecting.append((offset, offset + count))
+        offset += count
+    if len(ranges_intersecting) == len(counts):
+        abort(f'The subregion {subregion} intersects the particles of all {len(counts)} '
+              f'processes, and so cannot be used to test partial reading')
+    for key in itertools.chain(*reads):
+        if not any([
+            range_start <= key.start and key.stop <= range_stop
+            for range_start, range_stop in ranges_intersecting
+        ]):
+            abort(f'The particles [{key.start}:{key.stop}] were read from '
+                  f'"{fnames["standard"]}", though they lie outside of the ranges '
+                  f'{ranges_intersecting} intersecting the subregion {subregion}')
+
+# Done analyzing
+masterprint('done')
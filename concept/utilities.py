@@ -361,8 +361,12 @@ def powerspec():
     initiate_time()
     # Extract the snapshot filename
     snapshot_filename = special_params['snapshot_filename']
-    # Read in the snapshot
-    snapshot = load(snapshot_filename, compare_params=False)
+    # Read in the snapshot, possibly only some of its components
+    # and only a fraction of the particles.
+    snapshot = load(snapshot_filename, compare_params=False,
+                    component_names=special_params.get('components'),
+                    subsample=special_params.get('subsample', 1),
+                    )
     # Construct output filename based on the snapshot filename.
     # Importantly, remove any file extension signalling a snapshot.
     output_dir, basename = os.path.split(snapshot_filename)
@@ -399,8 +403,13 @@ def render3D():
     initiate_time()
     # Extract the snapshot filename
     snapshot_filename = special_params['snapshot_filename']
-    # Read in the snapshot
-    snapshot = load(snapshot_filename, compare_params=True)
+    # Read in the snapshot, possibly only some of its components,
+    # only a fraction of the particles and only a subregion.
+    snapshot = load(snapshot_filename, compare_params=True,
+                    component_names=special_params.get('components'),
+                    subsample=special_params.get('subsample', 1),
+                    subregion=special_params.get('subregion'),
+                    )
     # Construct output filename based on the snapshot filename.
     # Importantly, remove any file extension signalling a snapshot.
     output_dir, basename = os.path.split(snapshot_filename)
@@ -569,7 +578,7 @@ def info():
             alt_str = ' = {:.12g}/{:.12g} {}'.format(int(round(value)), h, unit_length)
         masterprint('{:<20} {:.12g} {}{}'.format('boxsize', params['boxsize'], unit_length, alt_str))
         # Print out the cosmological density parameters Ωcdm and Ωb.
-        # These are only present in the standard snapshots. In gadget2
+        # These are only present in the standard snapshots. In GADGET
         # snapshots, instead we have ΩΛ and Ωm. We do not print these
         # out here, as these will be printed as part
         # of the GADGET header.
@@ -634,8 +643,8 @@ def info():
                                                                                  scientific=True),
                                                             'm☉ {} {}⁻¹'.format(unit_length, unit_time)),
                             indent=4)
-        # Print out GADGET header for GADGET2 snapshots
-        if snapshot_type == 'gadget2':
+        # Print out GADGET header for GADGET2 and GADGET HDF5 snapshots
+        if snapshot_type in ('gadget2', 'gadgethdf5'):
             masterprint('GADGET header:')
             for key, val in params['header'].items():
                 masterprint('{:<16} {}'.format(key, val), indent=4)